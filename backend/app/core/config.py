@@ -40,6 +40,130 @@ class Settings(BaseSettings):
     OPENAI_MODEL_TEXT: str = os.getenv("OPENAI_MODEL_TEXT", "gpt-4o-mini")
     OPENAI_MAX_TOKENS: int = int(os.getenv("OPENAI_MAX_TOKENS", "1500"))
     
+    # Retry de transações (deadlock / lock wait timeout)
+    DB_RETRY_MAX_ATTEMPTS: int = int(os.getenv("DB_RETRY_MAX_ATTEMPTS", "5"))
+    DB_RETRY_BASE_DELAY_MS: int = int(os.getenv("DB_RETRY_BASE_DELAY_MS", "20"))
+    DB_RETRY_MAX_DELAY_MS: int = int(os.getenv("DB_RETRY_MAX_DELAY_MS", "500"))
+    
+    # Carteiras striped (sub-saldos para contas de alta concorrência)
+    WALLET_MAX_STRIPES: int = int(os.getenv("WALLET_MAX_STRIPES", "32"))
+    
+    # Câmbio (provider: static, file ou http)
+    FX_PROVIDER: str = os.getenv("FX_PROVIDER", "static")
+    FX_RATES_FILE: str = os.getenv("FX_RATES_FILE", "fx_rates.json")
+    FX_RATES_URL: str = os.getenv("FX_RATES_URL", "http://localhost:8090/rates")
+    FX_RATES_TTL_SECONDS: int = int(os.getenv("FX_RATES_TTL_SECONDS", "300"))
+    FX_HTTP_TIMEOUT_SECONDS: float = float(os.getenv("FX_HTTP_TIMEOUT_SECONDS", "2"))
+    FX_BATCH_MAX_ITEMS: int = int(os.getenv("FX_BATCH_MAX_ITEMS", "10000"))
+    
+    # Resolução de participantes (índice parties, cache curto por processo)
+    PARTY_CACHE_SIZE: int = int(os.getenv("PARTY_CACHE_SIZE", "50000"))
+    PARTY_CACHE_TTL_SECONDS: int = int(os.getenv("PARTY_CACHE_TTL_SECONDS", "30"))
+    
+    # PIX em lote (folha de pagamento / pagamentos em massa)
+    PIX_BATCH_MAX_ITEMS: int = int(os.getenv("PIX_BATCH_MAX_ITEMS", "5000"))
+    
+    # Diretório de chaves PIX (LRU em memória por processo)
+    PIX_KEY_CACHE_SIZE: int = int(os.getenv("PIX_KEY_CACHE_SIZE", "100000"))
+    PIX_KEY_CACHE_TTL_SECONDS: int = int(os.getenv("PIX_KEY_CACHE_TTL_SECONDS", "300"))
+    PIX_MAX_KEYS_PER_OWNER: int = int(os.getenv("PIX_MAX_KEYS_PER_OWNER", "5"))
+    
+    # Liquidação PIX assíncrona (sync: liquida no request; async: reserva + fila)
+    PIX_SETTLEMENT_MODE: str = os.getenv("PIX_SETTLEMENT_MODE", "sync")
+    PIX_SETTLEMENT_WORKERS: int = int(os.getenv("PIX_SETTLEMENT_WORKERS", "2"))
+    PIX_SETTLEMENT_BATCH_SIZE: int = int(os.getenv("PIX_SETTLEMENT_BATCH_SIZE", "100"))
+    PIX_SETTLEMENT_MAX_ATTEMPTS: int = int(os.getenv("PIX_SETTLEMENT_MAX_ATTEMPTS", "5"))
+    PIX_SSE_TIMEOUT_SECONDS: int = int(os.getenv("PIX_SSE_TIMEOUT_SECONDS", "60"))
+    
+    # QR Code PIX (BR Code)
+    PIX_MERCHANT_CITY: str = os.getenv("PIX_MERCHANT_CITY", "SAO PAULO")
+    PIX_QR_CACHE_SIZE: int = int(os.getenv("PIX_QR_CACHE_SIZE", "10000"))
+    
+    # Limites de velocidade PIX por remetente (0 = sem limite) e alertas de fan-in
+    PIX_VELOCITY_ENABLED: bool = os.getenv("PIX_VELOCITY_ENABLED", "true").lower() == "true"
+    PIX_LIMIT_COUNT_MINUTE: int = int(os.getenv("PIX_LIMIT_COUNT_MINUTE", "10"))
+    PIX_LIMIT_COUNT_HOUR: int = int(os.getenv("PIX_LIMIT_COUNT_HOUR", "100"))
+    PIX_LIMIT_COUNT_DAY: int = int(os.getenv("PIX_LIMIT_COUNT_DAY", "500"))
+    PIX_LIMIT_AMOUNT_MINUTE: float = float(os.getenv("PIX_LIMIT_AMOUNT_MINUTE", "20000"))
+    PIX_LIMIT_AMOUNT_HOUR: float = float(os.getenv("PIX_LIMIT_AMOUNT_HOUR", "100000"))
+    PIX_LIMIT_AMOUNT_DAY: float = float(os.getenv("PIX_LIMIT_AMOUNT_DAY", "500000"))
+    PIX_FANIN_ALERT_COUNT_MINUTE: int = int(os.getenv("PIX_FANIN_ALERT_COUNT_MINUTE", "30"))
+    PIX_FANIN_ALERT_COUNT_HOUR: int = int(os.getenv("PIX_FANIN_ALERT_COUNT_HOUR", "300"))
+    PIX_FANIN_ALERT_AMOUNT_DAY: float = float(os.getenv("PIX_FANIN_ALERT_AMOUNT_DAY", "1000000"))
+    
+    # Matching de solicitações de crédito (sync: no request; async: fila + worker)
+    CREDIT_MATCHING_MODE: str = os.getenv("CREDIT_MATCHING_MODE", "sync")
+    CREDIT_MATCHING_WORKERS: int = int(os.getenv("CREDIT_MATCHING_WORKERS", "1"))
+    CREDIT_MATCHING_BATCH_SIZE: int = int(os.getenv("CREDIT_MATCHING_BATCH_SIZE", "50"))
+    CREDIT_MATCHING_CLAIM_TIMEOUT_SECONDS: int = int(os.getenv("CREDIT_MATCHING_CLAIM_TIMEOUT_SECONDS", "300"))
+    CREDIT_SSE_TIMEOUT_SECONDS: int = int(os.getenv("CREDIT_SSE_TIMEOUT_SECONDS", "60"))
+    # Alocação dos lotes do worker: clearing (lote inteiro de uma vez) ou greedy (um a um)
+    CREDIT_MATCHING_ENGINE: str = os.getenv("CREDIT_MATCHING_ENGINE", "clearing")
+    CREDIT_CLEARING_MAX_REQUESTS: int = int(os.getenv("CREDIT_CLEARING_MAX_REQUESTS", "10000"))
+    # Financiamento dividido entre várias pools quando nenhuma comporta o valor sozinha
+    CREDIT_SPLIT_FUNDING_ENABLED: bool = os.getenv("CREDIT_SPLIT_FUNDING_ENABLED", "true").lower() == "true"
+    CREDIT_SPLIT_MAX_POOLS: int = int(os.getenv("CREDIT_SPLIT_MAX_POOLS", "5"))
+    CREDIT_SPLIT_MIN_ALLOCATION: float = float(os.getenv("CREDIT_SPLIT_MIN_ALLOCATION", "100"))
+    
+    # Simulação em grade (POST /credit/simulate): limite de células por resposta
+    CREDIT_SIMULATION_MAX_CELLS: int = int(os.getenv("CREDIT_SIMULATION_MAX_CELLS", "10000"))
+    
+    # Servicing diário de empréstimos (parcelas vencidas, atraso, inadimplência)
+    LOAN_SERVICING_ENABLED: bool = os.getenv("LOAN_SERVICING_ENABLED", "true").lower() == "true"
+    LOAN_SERVICING_HOUR: int = int(os.getenv("LOAN_SERVICING_HOUR", "2"))
+    LOAN_SERVICING_CHUNK_SIZE: int = int(os.getenv("LOAN_SERVICING_CHUNK_SIZE", "5000"))
+    LOAN_SERVICING_PAUSE_MS: int = int(os.getenv("LOAN_SERVICING_PAUSE_MS", "0"))
+    LOAN_SERVICING_STALE_SECONDS: int = int(os.getenv("LOAN_SERVICING_STALE_SECONDS", "600"))
+    LOAN_DEFAULT_DAYS_PAST_DUE: int = int(os.getenv("LOAN_DEFAULT_DAYS_PAST_DUE", "90"))
+    
+    # Cobrança automática de parcelas nas carteiras BRL dos tomadores
+    LOAN_COLLECTION_ENABLED: bool = os.getenv("LOAN_COLLECTION_ENABLED", "true").lower() == "true"
+    LOAN_COLLECTION_CHUNK_SIZE: int = int(os.getenv("LOAN_COLLECTION_CHUNK_SIZE", "2000"))
+    LOAN_COLLECTION_INTERVAL_SECONDS: int = int(os.getenv("LOAN_COLLECTION_INTERVAL_SECONDS", "3600"))
+    
+    # Cache das cotações de quitação antecipada, por (empréstimo, data)
+    LOAN_QUOTE_CACHE_SIZE: int = int(os.getenv("LOAN_QUOTE_CACHE_SIZE", "20000"))
+    LOAN_QUOTE_CACHE_TTL_SECONDS: int = int(os.getenv("LOAN_QUOTE_CACHE_TTL_SECONDS", "60"))
+    
+    # Snapshot do dashboard do tomador (invalidado em desembolsos e cobranças)
+    BORROWER_DASHBOARD_CACHE_SIZE: int = int(os.getenv("BORROWER_DASHBOARD_CACHE_SIZE", "20000"))
+    BORROWER_DASHBOARD_CACHE_TTL_SECONDS: int = int(os.getenv("BORROWER_DASHBOARD_CACHE_TTL_SECONDS", "30"))
+    
+    # Pools compatíveis do simulador: snapshot de capacidade, faixas e score do tomador
+    COMPATIBLE_POOLS_CACHE_SIZE: int = int(os.getenv("COMPATIBLE_POOLS_CACHE_SIZE", "10000"))
+    COMPATIBLE_POOLS_CACHE_TTL_SECONDS: int = int(os.getenv("COMPATIBLE_POOLS_CACHE_TTL_SECONDS", "30"))
+    
+    # Distribuição dos repasses das pools aos investidores (dono e cotistas)
+    POOL_DISTRIBUTION_ENABLED: bool = os.getenv("POOL_DISTRIBUTION_ENABLED", "true").lower() == "true"
+    POOL_DISTRIBUTION_INTERVAL_SECONDS: int = int(os.getenv("POOL_DISTRIBUTION_INTERVAL_SECONDS", "3600"))
+    
+    # Idempotency-Key em POSTs que movimentam dinheiro
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+    IDEMPOTENCY_CACHE_SIZE: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+    IDEMPOTENCY_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+    # Reivindicação IN_PROGRESS sem commit há mais que isso pode ser assumida por uma repetição
+    IDEMPOTENCY_LEASE_SECONDS: int = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+    
+    # Grafo de transferências (antifraude)
+    GRAPH_WINDOW_SECONDS: int = int(os.getenv("GRAPH_WINDOW_SECONDS", str(7 * 24 * 3600)))
+    GRAPH_MAX_CYCLE_LENGTH: int = int(os.getenv("GRAPH_MAX_CYCLE_LENGTH", "4"))
+    GRAPH_MAX_BRANCHING: int = int(os.getenv("GRAPH_MAX_BRANCHING", "16"))
+    GRAPH_MAX_CYCLES: int = int(os.getenv("GRAPH_MAX_CYCLES", "1000"))
+    GRAPH_INGEST_ENABLED: bool = os.getenv("GRAPH_INGEST_ENABLED", "true").lower() == "true"
+    GRAPH_INGEST_BATCH_SIZE: int = int(os.getenv("GRAPH_INGEST_BATCH_SIZE", "1000"))
+    GRAPH_INGEST_INTERVAL_SECONDS: float = float(os.getenv("GRAPH_INGEST_INTERVAL_SECONDS", "2"))
+    GRAPH_INGEST_LAG_SECONDS: int = int(os.getenv("GRAPH_INGEST_LAG_SECONDS", "2"))
+    # Janela relida atrás do cursor a cada passada (transações commitadas bem depois do INSERT)
+    GRAPH_INGEST_OVERLAP_SECONDS: int = int(os.getenv("GRAPH_INGEST_OVERLAP_SECONDS", "300"))
+    GRAPH_REBUILD_CHUNK_SIZE: int = int(os.getenv("GRAPH_REBUILD_CHUNK_SIZE", "5000"))
+    
+    # Contadores de velocidade (local: por processo; shared: servidor único entre workers)
+    VELOCITY_BACKEND: str = os.getenv("VELOCITY_BACKEND", "local")
+    VELOCITY_MAX_KEYS: int = int(os.getenv("VELOCITY_MAX_KEYS", "50000"))
+    VELOCITY_SHARED_ADDRESS: str = os.getenv("VELOCITY_SHARED_ADDRESS", "127.0.0.1:50055")
+    # Sem padrão: obrigatória com VELOCITY_BACKEND=shared (servidor e clientes)
+    VELOCITY_SHARED_AUTHKEY: str = os.getenv("VELOCITY_SHARED_AUTHKEY", "")
+    
     @property
     def DATABASE_URL(self) -> str:
         return f"mysql+pymysql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}?charset=utf8mb4&ssl_disabled=true"
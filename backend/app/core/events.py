@@ -0,0 +1,52 @@
+"""
+Notificações em processo para eventos de status (ex: PIX liquidado).
+
+Workers publicam o novo estado de um tópico (ex: transaction_id); endpoints
+SSE aguardam a próxima publicação do tópico. É apenas um atalho de latência:
+quem aguarda também relê o estado no banco, então eventos publicados em outro
+processo são percebidos no próximo timeout.
+"""
+from typing import Any, Dict, Optional, Tuple
+import threading
+import time
+
+from app.core.cache import TTLCache
+
+
+class EventNotifier:
+    """Pub/sub por tópico com o último evento de cada tópico guardado por um TTL."""
+    
+    def __init__(self, ttl_seconds: float = 300, maxsize: int = 10000):
+        self._condition = threading.Condition()
+        self._events = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds, name="events")
+    
+    def publish(self, topic: str, payload: Dict[str, Any]) -> None:
+        """Publica o evento e acorda quem está aguardando o tópico."""
+        with self._condition:
+            self._events.set(topic, (time.monotonic(), payload))
+            self._condition.notify_all()
+    
+    def last(self, topic: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """Último evento publicado no tópico: (instante, payload) ou None."""
+        return self._events.get(topic)
+    
+    def wait(self, topic: str, after: float, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Aguarda um evento do tópico publicado depois de `after` (time.monotonic()).
+        
+        Returns:
+            O payload, ou None se o timeout expirar
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                event = self._events.get(topic)
+                if event is not None and event[0] > after:
+                    return event[1]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+
+
+notifier = EventNotifier()
@@ -0,0 +1,427 @@
+"""
+Idempotency-Key para POSTs que movimentam dinheiro.
+
+O cliente envia `Idempotency-Key: <uuid>`; a primeira execução grava a
+resposta (status e body) em idempotency_keys, e repetições com a mesma chave
+recebem a mesma resposta sem executar o service de novo.
+
+- A chave é reivindicada com INSERT IGNORE (IN_PROGRESS) antes de executar;
+  só quem inseriu a linha executa
+- Duplicatas concorrentes no mesmo processo aguardam o resultado em memória;
+  em outro processo, consultam a linha até ela ficar COMPLETED
+- Respostas concluídas ficam em um LRU na frente da tabela
+- Mesma chave com outro body = 422; erros 5xx e 409/429 não são gravados
+  (a chave é liberada e o cliente pode repetir) desde que o handler não tenha
+  feito commit
+- O primeiro commit do handler marca a chave como COMMITTED na mesma transação
+  do efeito (evento before_commit da sessão). Se algo falhar depois disso a
+  chave vira FAILED em vez de ser liberada: a repetição recebe 409 e não
+  movimenta dinheiro de novo
+- Cada reivindicação tem um token e um lease (IDEMPOTENCY_LEASE_SECONDS). Se o
+  worker morre antes do primeiro commit, uma repetição assume a linha
+  IN_PROGRESS com lease vencido (UPDATE condicionado ao token antigo); o dono
+  anterior perde o token e o seu commit é abortado. COMMITTED com lease vencido
+  vira FAILED (409), já que o efeito pode ter acontecido
+"""
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, text, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.models import IdempotencyKey, IdempotencyStatus
+
+logger = logging.getLogger(__name__)
+
+# (fingerprint do request, status HTTP, body)
+StoredResponse = Tuple[str, int, Any]
+
+_cache = TTLCache(
+    maxsize=settings.IDEMPOTENCY_CACHE_SIZE,
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+    name="idempotency"
+)
+
+_claims = itertools.count(1)
+_PURGE_EVERY = 500
+
+
+class _InFlight:
+    __slots__ = ("event", "result")
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Optional[StoredResponse] = None
+
+
+_inflight: Dict[str, _InFlight] = {}
+_inflight_lock = threading.Lock()
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def request_fingerprint(payload: Any) -> str:
+    """Hash do body canônico (chaves ordenadas)."""
+    return _sha256(json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str))
+
+
+def _is_stored_error(status_code: int) -> bool:
+    return 400 <= status_code < 500 and status_code not in (409, 429)
+
+
+def _replay(stored: StoredResponse, fingerprint: str) -> Any:
+    stored_fingerprint, status_code, body = stored
+    if stored_fingerprint != fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key já utilizada com outro conteúdo de requisição"
+        )
+    if status_code >= 400:
+        raise HTTPException(status_code=status_code, detail=(body or {}).get("detail"))
+    return body
+
+
+def run_idempotent(
+    db: Session,
+    key: Optional[str],
+    scope: str,
+    payload: Any,
+    handler: Callable[[], Any],
+    status_code: int = 200
+) -> Any:
+    """
+    Executa `handler` uma única vez por (escopo, Idempotency-Key).
+    
+    Args:
+        db: Sessão do request
+        key: Valor do header Idempotency-Key (None = executa normalmente)
+        scope: Endpoint (ex: "pix.send"); a mesma chave em escopos diferentes é independente
+        payload: Body do request (compõe o fingerprint)
+        handler: Chamada ao service
+        status_code: Status HTTP da resposta de sucesso do endpoint
+    
+    Returns:
+        O body da resposta (o original ou o armazenado)
+    """
+    if not key:
+        return handler()
+    if len(key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key deve ter até 255 caracteres")
+    
+    key_hash = _sha256(f"{scope}:{key}")
+    fingerprint = request_fingerprint(payload)
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    
+    while True:
+        stored = _cache.get(key_hash)
+        if stored is not None:
+            metrics.increment("idempotency.replayed")
+            return _replay(stored, fingerprint)
+        
+        with _inflight_lock:
+            inflight = _inflight.get(key_hash)
+            owner = inflight is None
+            if owner:
+                inflight = _inflight[key_hash] = _InFlight()
+        
+        if not owner:
+            # Duplicata concorrente neste processo: aguarda a execução original
+            metrics.increment("idempotency.waited")
+            inflight.event.wait(max(0.0, deadline - time.monotonic()))
+            if inflight.result is not None:
+                return _replay(inflight.result, fingerprint)
+            if time.monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail="Requisição com esta Idempotency-Key ainda em processamento")
+            continue  # a execução original falhou sem resposta gravável
+        
+        try:
+            token = str(uuid.uuid4())
+            stored = _claim(db, key_hash, scope, fingerprint, token, deadline)
+            if stored is None:
+                stored = _execute(db, key_hash, token, fingerprint, handler, status_code)
+            else:
+                metrics.increment("idempotency.replayed")
+            inflight.result = stored
+            return _replay(stored, fingerprint)
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key_hash, None)
+            inflight.event.set()
+
+
+class IdempotencyLeaseLost(Exception):
+    """A reivindicação foi assumida por outra requisição (lease vencido); o commit é abortado."""
+
+
+_FAILED_BODY = {
+    "detail": "Requisição já processada, mas a resposta não pôde ser gerada; "
+              "confira o extrato antes de repetir com outra Idempotency-Key"
+}
+
+
+def _claim(
+    db: Session,
+    key_hash: str,
+    scope: str,
+    fingerprint: str,
+    token: str,
+    deadline: float
+) -> Optional[StoredResponse]:
+    """
+    Reivindica a chave no banco (nova ou com lease vencido) com o token `token`.
+    
+    Returns:
+        None se este request deve executar; a resposta gravada se já existe
+    """
+    delay = 0.05
+    while True:
+        now = datetime.utcnow()
+        result = db.execute(
+            mysql_insert(IdempotencyKey).values(
+                key_hash=key_hash,
+                scope=scope,
+                request_fingerprint=fingerprint,
+                status=IdempotencyStatus.IN_PROGRESS,
+                claim_token=token,
+                claimed_at=now,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+            ).prefix_with("IGNORE")
+        )
+        db.commit()
+        if result.rowcount == 1:
+            if next(_claims) % _PURGE_EVERY == 0:
+                purge_expired(db)
+            return None
+        
+        row = db.query(IdempotencyKey).filter(IdempotencyKey.key_hash == key_hash).first()
+        if row is None:
+            continue
+        if row.expires_at <= now:
+            db.delete(row)
+            db.commit()
+            continue
+        if row.status in (IdempotencyStatus.COMPLETED, IdempotencyStatus.FAILED):
+            stored = (row.request_fingerprint, row.response_status, row.response_body)
+            db.rollback()
+            _cache.set(key_hash, stored)
+            return stored
+        
+        stored_fingerprint, status, previous_token = row.request_fingerprint, row.status, row.claim_token
+        lease_start = now - timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)
+        lease_expired = row.claimed_at is None or row.claimed_at <= lease_start
+        db.rollback()
+        if stored_fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key já utilizada com outro conteúdo de requisição"
+            )
+        
+        if lease_expired:
+            if status == IdempotencyStatus.IN_PROGRESS:
+                # Dono anterior caiu antes de efetivar qualquer coisa: assume a execução
+                if _take_over(db, key_hash, previous_token, token, IdempotencyStatus.IN_PROGRESS, {}):
+                    metrics.increment("idempotency.reclaimed")
+                    return None
+            elif _take_over(db, key_hash, previous_token, token, IdempotencyStatus.COMMITTED, {
+                IdempotencyKey.status: IdempotencyStatus.FAILED,
+                IdempotencyKey.response_status: 409,
+                IdempotencyKey.response_body: _FAILED_BODY
+            }):
+                # Efetivou e não gravou a resposta: resultado desconhecido
+                metrics.increment("idempotency.failed_after_commit")
+                stored = (fingerprint, 409, _FAILED_BODY)
+                _cache.set(key_hash, stored)
+                return stored
+            continue  # outra repetição assumiu primeiro; relê a linha
+        
+        # Em processamento em outro worker: aguarda a conclusão
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=409, detail="Requisição com esta Idempotency-Key ainda em processamento")
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+
+def _take_over(
+    db: Session,
+    key_hash: str,
+    previous_token: Optional[str],
+    token: str,
+    status: IdempotencyStatus,
+    values: Dict[Any, Any]
+) -> bool:
+    """Troca o dono da linha se ela ainda pertence a `previous_token` com `status` (UPDATE condicional)."""
+    result = db.execute(
+        update(IdempotencyKey)
+        .where(
+            IdempotencyKey.key_hash == key_hash,
+            IdempotencyKey.status == status,
+            IdempotencyKey.claim_token == previous_token if previous_token else IdempotencyKey.claim_token.is_(None)
+        )
+        .values({IdempotencyKey.claim_token: token, IdempotencyKey.claimed_at: datetime.utcnow(), **values})
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def _owned(key_hash: str, token: str):
+    """Filtro da linha da chave enquanto ainda pertence a `token`."""
+    return (IdempotencyKey.key_hash == key_hash, IdempotencyKey.claim_token == token)
+
+
+class _CommitTracker:
+    """
+    Acompanha os commits da sessão durante o handler.
+    
+    No primeiro commit, a chave passa a COMMITTED dentro da mesma transação do
+    efeito colateral; `committed` só fica True depois que esse commit conclui.
+    Se a linha não pertence mais ao token (lease assumido por uma repetição), o
+    commit é abortado com IdempotencyLeaseLost.
+    """
+    
+    def __init__(self, db: Session, key_hash: str, token: str):
+        self.db = db
+        self.key_hash = key_hash
+        self.token = token
+        self.committed = False
+        self.lost = False
+        event.listen(db, "before_commit", self._before_commit)
+        event.listen(db, "after_commit", self._after_commit)
+    
+    def _before_commit(self, session: Session) -> None:
+        if self.committed:
+            return
+        result = session.execute(
+            update(IdempotencyKey)
+            .where(*_owned(self.key_hash, self.token), IdempotencyKey.status == IdempotencyStatus.IN_PROGRESS)
+            .values(status=IdempotencyStatus.COMMITTED, claimed_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            self.lost = True
+            metrics.increment("idempotency.lease_lost")
+            raise IdempotencyLeaseLost(self.key_hash)
+    
+    def _after_commit(self, session: Session) -> None:
+        self.committed = True
+    
+    def stop(self) -> None:
+        event.remove(self.db, "before_commit", self._before_commit)
+        event.remove(self.db, "after_commit", self._after_commit)
+
+
+def _execute(
+    db: Session,
+    key_hash: str,
+    token: str,
+    fingerprint: str,
+    handler: Callable[[], Any],
+    status_code: int
+) -> StoredResponse:
+    """Executa o handler e grava a resposta (ou libera a chave se nada foi efetivado)."""
+    tracker = _CommitTracker(db, key_hash, token)
+    try:
+        body = jsonable_encoder(handler())
+    except HTTPException as e:
+        tracker.stop()
+        if tracker.lost or not _is_stored_error(e.status_code):
+            _abandon(db, key_hash, token, fingerprint, tracker)
+            raise
+        body = {"detail": jsonable_encoder(e.detail)}
+        status_code = e.status_code
+    except Exception:
+        tracker.stop()
+        _abandon(db, key_hash, token, fingerprint, tracker)
+        raise
+    else:
+        tracker.stop()
+        if tracker.lost:
+            # Handler engoliu o IdempotencyLeaseLost: nada foi efetivado por ele
+            _abandon(db, key_hash, token, fingerprint, tracker)
+    
+    stored = (fingerprint, status_code, body)
+    try:
+        db.rollback()
+        db.query(IdempotencyKey).filter(*_owned(key_hash, token)).update({
+            IdempotencyKey.status: IdempotencyStatus.COMPLETED,
+            IdempotencyKey.response_status: status_code,
+            IdempotencyKey.response_body: body
+        }, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        # O efeito já foi efetivado: devolve a resposta mesmo sem gravá-la. A chave
+        # fica COMMITTED (repetições aguardam o lease e recebem 409, sem reexecutar)
+        logger.error(f"[Idempotency] Falha ao gravar resposta da chave {key_hash}: {str(e)}")
+        db.rollback()
+        if not tracker.committed:
+            _release(db, key_hash, token)
+    _cache.set(key_hash, stored)
+    return stored
+
+
+def _abandon(db: Session, key_hash: str, token: str, fingerprint: str, tracker: _CommitTracker) -> None:
+    """
+    Trata a falha do handler sem resposta gravável.
+    
+    Sem commit, libera a chave (o cliente pode repetir). Com commit, o efeito
+    pode ter acontecido: a chave vira FAILED e repetições recebem 409. Se o
+    lease foi perdido, a linha é de outra requisição e não é alterada.
+    """
+    if tracker.lost:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Requisição com esta Idempotency-Key assumida por outra execução")
+    if not tracker.committed:
+        _release(db, key_hash, token)
+        return
+    
+    metrics.increment("idempotency.failed_after_commit")
+    try:
+        db.rollback()
+        db.query(IdempotencyKey).filter(*_owned(key_hash, token)).update({
+            IdempotencyKey.status: IdempotencyStatus.FAILED,
+            IdempotencyKey.response_status: 409,
+            IdempotencyKey.response_body: _FAILED_BODY
+        }, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        logger.error(f"[Idempotency] Falha ao marcar chave {key_hash} como FAILED: {str(e)}")
+        db.rollback()
+    _cache.set(key_hash, (fingerprint, 409, _FAILED_BODY))
+
+
+def _release(db: Session, key_hash: str, token: str) -> None:
+    """Remove a reivindicação para que o cliente possa repetir o request."""
+    try:
+        db.rollback()
+        db.query(IdempotencyKey).filter(
+            *_owned(key_hash, token),
+            IdempotencyKey.status == IdempotencyStatus.IN_PROGRESS
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        logger.error(f"[Idempotency] Falha ao liberar chave {key_hash}: {str(e)}")
+
+
+def purge_expired(db: Session, limit: int = 1000) -> int:
+    """Remove chaves expiradas (até `limit` por chamada)."""
+    result = db.execute(
+        text("DELETE FROM idempotency_keys WHERE expires_at < :now LIMIT :limit"),
+        {"now": datetime.utcnow(), "limit": limit}
+    )
+    db.commit()
+    return result.rowcount
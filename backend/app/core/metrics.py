@@ -0,0 +1,58 @@
+"""
+Métricas internas do processo (contadores e tempos).
+
+Registro simples em memória, exposto em /metrics. Em produção seria
+substituído por Prometheus/StatsD mantendo a mesma interface.
+"""
+from contextlib import contextmanager
+from typing import Dict
+import threading
+import time
+
+
+class MetricsRegistry:
+    """Registro thread-safe de contadores e resumos de tempo."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+    
+    def increment(self, name: str, value: float = 1) -> None:
+        """Incrementa um contador."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+    
+    def observe(self, name: str, seconds: float) -> None:
+        """Registra uma medição de tempo (count, total, max)."""
+        with self._lock:
+            timing = self._timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+    
+    @contextmanager
+    def timer(self, name: str):
+        """Mede o tempo do bloco e registra em `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+    
+    def snapshot(self) -> dict:
+        """Retorna cópia dos contadores e tempos (com média calculada)."""
+        with self._lock:
+            timings = {
+                name: {
+                    "count": t["count"],
+                    "total_seconds": round(t["total"], 6),
+                    "avg_seconds": round(t["total"] / t["count"], 6) if t["count"] else 0.0,
+                    "max_seconds": round(t["max"], 6)
+                }
+                for name, t in self._timings.items()
+            }
+            return {"counters": dict(self._counters), "timings": timings}
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,81 @@
+"""
+Rateio exato de valores monetários.
+
+Os valores são tratados em centavos inteiros: cada parte recebe o piso da sua
+fração e os centavos que sobram vão para as maiores frações (método do maior
+resto), então a soma das partes é sempre exatamente o total.
+"""
+from decimal import Decimal
+from typing import List, Sequence
+
+import numpy as np
+
+CENT = Decimal("0.01")
+
+
+def to_cents(amount) -> int:
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+def from_cents(cents: int) -> Decimal:
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+
+def allocate(amount, weights: Sequence) -> List[Decimal]:
+    """
+    Divide `amount` proporcionalmente a `weights` (Decimal, float ou int).
+    
+    Returns:
+        Uma parte por peso, em reais com 2 casas, somando exatamente `amount`
+    """
+    total_cents = to_cents(amount)
+    weights = [Decimal(str(weight)) for weight in weights]
+    weight_sum = sum(weights, Decimal(0))
+    if not weights or weight_sum <= 0:
+        raise ValueError("Rateio requer pesos positivos")
+    
+    exact = [Decimal(total_cents) * weight / weight_sum for weight in weights]
+    parts = [int(value) for value in exact]
+    leftover = total_cents - sum(parts)
+    by_remainder = sorted(range(len(parts)), key=lambda i: exact[i] - parts[i], reverse=True)
+    for i in by_remainder[:leftover]:
+        parts[i] += 1
+    return [from_cents(part) for part in parts]
+
+
+def allocate_many(totals_cents: np.ndarray, groups: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Mesmo rateio de `allocate` para vários totais de uma vez (aritmética inteira).
+    
+    Args:
+        totals_cents: Total de cada grupo em centavos (int64)
+        groups: Índice do grupo de cada parte
+        weights: Peso inteiro de cada parte (ex: percentual x 10⁴)
+    
+    Returns:
+        Centavos de cada parte; por grupo, a soma é exatamente o total
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.int64)
+    totals_cents = np.asarray(totals_cents, dtype=np.int64)
+    weight_sum = _group_sum(groups, weights, len(totals_cents))
+    if (weight_sum[groups] <= 0).any():
+        raise ValueError("Rateio requer pesos positivos")
+    
+    numerator = totals_cents[groups] * weights
+    parts, remainders = np.divmod(numerator, weight_sum[groups])
+    leftover = totals_cents - _group_sum(groups, parts, len(totals_cents))
+    
+    # Posição de cada parte no seu grupo por resto decrescente (empate: ordem original)
+    order = np.lexsort((np.arange(len(parts)), -remainders, groups))
+    group_start = np.searchsorted(groups[order], groups[order], side="left")
+    rank = np.empty(len(parts), dtype=np.int64)
+    rank[order] = np.arange(len(parts)) - group_start
+    return parts + (rank < leftover[groups])
+
+
+def _group_sum(groups: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    """Soma por grupo em int64 (bincount somaria em float)."""
+    sums = np.zeros(size, dtype=np.int64)
+    np.add.at(sums, groups, values)
+    return sums
@@ -0,0 +1,295 @@
+"""
+Contadores de velocidade em janela deslizante (ring buffers por chave).
+
+Cada chave (ex: remetente PIX) guarda, para cada janela configurada, um anel
+de N buckets com contagem e soma de valores (em centavos). O bucket de um
+instante é `int(t / largura) % N`; um bucket de outra volta do anel é zerado
+ao ser reutilizado, então a memória por chave é fixa e não há limpeza
+periódica. Chaves ociosas saem por LRU quando o limite de chaves é atingido.
+
+O backend local vive no processo: com vários workers (uvicorn --workers N)
+cada um enxerga só o próprio tráfego. `SharedVelocityBackend` encaminha as
+operações para um servidor de contadores único (multiprocessing.managers),
+substituto local para um Redis; se o servidor cair, usa o backend local.
+Servidor e clientes exigem VELOCITY_SHARED_AUTHKEY explícita (não há padrão).
+"""
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from multiprocessing.managers import BaseManager
+from typing import Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# {janela: (contagem, centavos)}
+Totals = Dict[str, Tuple[int, int]]
+# {janela: (contagem máxima ou None, centavos máximos ou None)}
+Limits = Dict[str, Tuple[Optional[int], Optional[int]]]
+
+
+@dataclass(frozen=True)
+class Window:
+    name: str
+    span_seconds: int
+    buckets: int
+
+
+# Granularidade: 5s no minuto, 5min na hora, 1h no dia (48 buckets por chave)
+DEFAULT_WINDOWS = (
+    Window("minute", 60, 12),
+    Window("hour", 3600, 12),
+    Window("day", 86400, 24),
+)
+
+
+class _KeyCounters:
+    """Anéis de todas as janelas de uma chave, contíguos em três arrays."""
+    
+    __slots__ = ("stamps", "counts", "cents")
+    
+    def __init__(self, size: int):
+        self.stamps = array("q", [-1]) * size
+        self.counts = array("q", [0]) * size
+        self.cents = array("q", [0]) * size
+
+
+class LocalVelocityBackend:
+    """Contadores em memória do processo, LRU por chave."""
+    
+    def __init__(self, windows=DEFAULT_WINDOWS, max_keys: int = 50000):
+        self.windows = tuple(windows)
+        self.max_keys = max_keys
+        # (nome, offset no array, buckets, largura do bucket em segundos)
+        self._layout: List[Tuple[str, int, int, float]] = []
+        offset = 0
+        for window in self.windows:
+            self._layout.append((window.name, offset, window.buckets, window.span_seconds / window.buckets))
+            offset += window.buckets
+        self._size = offset
+        self._lock = threading.Lock()
+        self._keys: "OrderedDict[str, _KeyCounters]" = OrderedDict()
+        self.evictions = 0
+    
+    def _counters(self, key: str, create: bool) -> Optional[_KeyCounters]:
+        counters = self._keys.get(key)
+        if counters is not None:
+            self._keys.move_to_end(key)
+        elif create:
+            counters = _KeyCounters(self._size)
+            self._keys[key] = counters
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+                self.evictions += 1
+        return counters
+    
+    def _totals(self, counters: _KeyCounters, now: float) -> Totals:
+        totals: Totals = {}
+        stamps, counts, cents = counters.stamps, counters.counts, counters.cents
+        for name, offset, buckets, width in self._layout:
+            oldest = int(now // width) - buckets + 1
+            count = amount = 0
+            for i in range(offset, offset + buckets):
+                if stamps[i] >= oldest:
+                    count += counts[i]
+                    amount += cents[i]
+            totals[name] = (count, amount)
+        return totals
+    
+    def _add(self, counters: _KeyCounters, now: float, count: int, cents: int) -> None:
+        for _, offset, buckets, width in self._layout:
+            stamp = int(now // width)
+            i = offset + stamp % buckets
+            if counters.stamps[i] != stamp:
+                counters.stamps[i] = stamp
+                counters.counts[i] = 0
+                counters.cents[i] = 0
+            counters.counts[i] += count
+            counters.cents[i] += cents
+    
+    def hit(
+        self,
+        key: str,
+        cents: int,
+        limits: Optional[Limits] = None,
+        now: Optional[float] = None,
+        count: int = 1
+    ) -> Tuple[Optional[str], Totals]:
+        """
+        Registra `count` eventos somando `cents` na chave, respeitando `limits`.
+        
+        Se algum limite seria excedido, nada é registrado.
+        
+        Returns:
+            (janela violada ou None, totais após o registro ou atuais se violou)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            counters = self._counters(key, create=True)
+            totals = self._totals(counters, now)
+            for name, (max_count, max_cents) in (limits or {}).items():
+                current, amount = totals.get(name, (0, 0))
+                if max_count is not None and current + count > max_count:
+                    return name, totals
+                if max_cents is not None and amount + cents > max_cents:
+                    return name, totals
+            self._add(counters, now, count, cents)
+            return None, {name: (current + count, amount + cents) for name, (current, amount) in totals.items()}
+    
+    def undo(self, key: str, cents: int, at: float, count: int = 1) -> None:
+        """Desfaz um `hit` feito no instante `at` (nos buckets que ainda o contêm)."""
+        with self._lock:
+            counters = self._counters(key, create=False)
+            if counters is None:
+                return
+            for _, offset, buckets, width in self._layout:
+                stamp = int(at // width)
+                i = offset + stamp % buckets
+                if counters.stamps[i] == stamp:
+                    counters.counts[i] = max(0, counters.counts[i] - count)
+                    counters.cents[i] = max(0, counters.cents[i] - cents)
+    
+    def totals(self, key: str, now: Optional[float] = None) -> Totals:
+        """Totais atuais da chave por janela (zeros se a chave não existe)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            counters = self._keys.get(key)
+            if counters is None:
+                return {window.name: (0, 0) for window in self.windows}
+            return self._totals(counters, now)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "local",
+                "keys": len(self._keys),
+                "max_keys": self.max_keys,
+                "evictions": self.evictions,
+                "windows": {w.name: {"span_seconds": w.span_seconds, "buckets": w.buckets} for w in self.windows}
+            }
+
+
+class _VelocityServerManager(BaseManager):
+    pass
+
+
+class _VelocityClientManager(BaseManager):
+    pass
+
+
+_VelocityClientManager.register("velocity")
+
+
+def _parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class SharedVelocityBackend:
+    """
+    Cliente do servidor de contadores compartilhado entre workers.
+    
+    Cada operação é uma chamada IPC (sem banco). Em falha de conexão cai para
+    o backend local e tenta reconectar após `retry_seconds`.
+    """
+    
+    def __init__(self, address: str, authkey: bytes, fallback: LocalVelocityBackend, retry_seconds: float = 10.0):
+        self.address = _parse_address(address)
+        self.authkey = authkey
+        self.fallback = fallback
+        self.retry_seconds = retry_seconds
+        self._proxy = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+    
+    def _remote(self):
+        if self._proxy is not None:
+            return self._proxy
+        if time.monotonic() < self._retry_at:
+            return None
+        with self._lock:
+            if self._proxy is None:
+                try:
+                    manager = _VelocityClientManager(address=self.address, authkey=self.authkey)
+                    manager.connect()
+                    self._proxy = manager.velocity()
+                except Exception as e:
+                    self._retry_at = time.monotonic() + self.retry_seconds
+                    logger.warning(f"[Velocity] Servidor compartilhado indisponível, usando contadores locais: {str(e)}")
+            return self._proxy
+    
+    def _call(self, method: str, *args):
+        remote = self._remote()
+        if remote is not None:
+            try:
+                return getattr(remote, method)(*args)
+            except Exception as e:
+                metrics.increment("velocity.shared.errors")
+                logger.warning(f"[Velocity] Falha no servidor compartilhado: {str(e)}")
+                self._proxy = None
+                self._retry_at = time.monotonic() + self.retry_seconds
+        return getattr(self.fallback, method)(*args)
+    
+    def hit(self, key: str, cents: int, limits: Optional[Limits] = None, now: Optional[float] = None, count: int = 1):
+        return self._call("hit", key, cents, limits, now, count)
+    
+    def undo(self, key: str, cents: int, at: float, count: int = 1) -> None:
+        self._call("undo", key, cents, at, count)
+    
+    def totals(self, key: str, now: Optional[float] = None) -> Totals:
+        return self._call("totals", key, now)
+    
+    def stats(self) -> dict:
+        stats = dict(self._call("stats"))
+        stats["backend"] = "shared" if self._proxy is not None else "local (fallback)"
+        return stats
+
+
+def _shared_authkey() -> bytes:
+    """
+    Chave de autenticação do servidor compartilhado.
+    
+    Raises:
+        RuntimeError: se VELOCITY_SHARED_AUTHKEY não estiver definida
+    """
+    if not settings.VELOCITY_SHARED_AUTHKEY:
+        raise RuntimeError("VELOCITY_BACKEND=shared exige VELOCITY_SHARED_AUTHKEY definida")
+    return settings.VELOCITY_SHARED_AUTHKEY.encode()
+
+
+def serve_velocity_backend(address: str, authkey: bytes, max_keys: int) -> None:
+    """Executa o servidor de contadores compartilhado (bloqueante)."""
+    if not authkey:
+        raise RuntimeError("O servidor de contadores exige VELOCITY_SHARED_AUTHKEY definida")
+    backend = LocalVelocityBackend(max_keys=max_keys)
+    _VelocityServerManager.register("velocity", callable=lambda: backend)
+    manager = _VelocityServerManager(address=_parse_address(address), authkey=authkey)
+    logger.info(f"[Velocity] Servidor de contadores em {address}")
+    manager.get_server().serve_forever()
+
+
+def build_velocity_backend():
+    """Backend conforme VELOCITY_BACKEND (local ou shared)."""
+    local = LocalVelocityBackend(max_keys=settings.VELOCITY_MAX_KEYS)
+    if settings.VELOCITY_BACKEND == "shared":
+        return SharedVelocityBackend(
+            settings.VELOCITY_SHARED_ADDRESS,
+            _shared_authkey(),
+            fallback=local
+        )
+    return local
+
+
+if __name__ == "__main__":
+    # python -m app.core.velocity
+    logging.basicConfig(level=logging.INFO)
+    serve_velocity_backend(
+        settings.VELOCITY_SHARED_ADDRESS,
+        _shared_authkey(),
+        settings.VELOCITY_MAX_KEYS
+    )
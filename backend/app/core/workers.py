@@ -0,0 +1,77 @@
+"""
+Pool de workers em background (threads) para filas persistidas no banco.
+
+Cada worker abre sua própria sessão a cada ciclo e chama `handler(db)`, que
+processa um micro-lote e retorna quantos itens tratou. Quando a fila está
+vazia o worker dorme `idle_interval` segundos antes de consultar de novo.
+"""
+from typing import Callable, List
+import logging
+import threading
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """Conjunto de threads daemon que drenam uma fila chamando `handler`."""
+    
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Session], int],
+        workers: int = 1,
+        idle_interval: float = 0.5
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.idle_interval = idle_interval
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads: List[threading.Thread] = []
+    
+    def start(self) -> None:
+        """Inicia as threads (idempotente)."""
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"[Workers] {self.name}: {self.workers} worker(s) iniciados")
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        """Sinaliza parada e aguarda as threads terminarem o ciclo atual."""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+    
+    def notify(self) -> None:
+        """Acorda os workers ociosos (ex: logo após enfileirar um job)."""
+        self._wakeup.set()
+    
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            processed = 0
+            db = SessionLocal()
+            try:
+                processed = self.handler(db)
+                if processed:
+                    metrics.increment(f"workers.{self.name}.processed", processed)
+            except Exception as e:
+                metrics.increment(f"workers.{self.name}.errors")
+                logger.error(f"[Workers] {self.name}: erro no ciclo: {str(e)}")
+            finally:
+                db.close()
+            
+            if not processed:
+                self._wakeup.wait(self.idle_interval)
+                self._wakeup.clear()
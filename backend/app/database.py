@@ -1,7 +1,18 @@
 from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from typing import Callable, Optional, TypeVar
+import logging
+import random
+import time
+
 from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
 
 # Database engine
 engine = create_engine(
@@ -28,3 +39,65 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Erros do MySQL que indicam conflito de lock e podem ser repetidos com segurança:
+# 1213 = deadlock detectado, 1205 = lock wait timeout
+RETRYABLE_MYSQL_ERRORS = (1205, 1213)
+
+
+def is_retryable_error(exc: DBAPIError) -> bool:
+    """Verifica se o erro do banco é deadlock/lock wait timeout."""
+    orig = getattr(exc, "orig", None)
+    args = getattr(orig, "args", None)
+    return bool(args) and args[0] in RETRYABLE_MYSQL_ERRORS
+
+
+def run_in_transaction(
+    db: Session,
+    work: Callable[[], T],
+    max_attempts: Optional[int] = None,
+    name: str = "transaction"
+) -> T:
+    """
+    Executa `work` e faz commit, repetindo em caso de deadlock/lock wait.
+    
+    A cada falha repetível faz rollback e aguarda um backoff exponencial com
+    jitter ("full jitter") antes de tentar novamente. `work` precisa ser
+    idempotente dentro da transação: ele é reexecutado do zero a cada tentativa.
+    
+    Args:
+        db: Sessão do request
+        work: Função que executa as operações (sem commit)
+        max_attempts: Número máximo de tentativas (padrão: DB_RETRY_MAX_ATTEMPTS)
+        name: Nome usado em logs e métricas
+    
+    Returns:
+        O retorno de `work`
+    """
+    attempts = max_attempts or settings.DB_RETRY_MAX_ATTEMPTS
+    base_delay = settings.DB_RETRY_BASE_DELAY_MS / 1000
+    max_delay = settings.DB_RETRY_MAX_DELAY_MS / 1000
+    
+    for attempt in range(1, attempts + 1):
+        try:
+            result = work()
+            db.commit()
+            if attempt > 1:
+                metrics.increment(f"db.retry.{name}.recovered")
+            return result
+        except DBAPIError as exc:
+            db.rollback()
+            if not is_retryable_error(exc):
+                raise
+            if attempt == attempts:
+                metrics.increment(f"db.retry.{name}.exhausted")
+                logger.error(f"[DB] {name}: conflito de lock após {attempts} tentativas")
+                raise
+            metrics.increment(f"db.retry.{name}.attempts")
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            logger.warning(f"[DB] {name}: conflito de lock (tentativa {attempt}), repetindo em {delay * 1000:.0f}ms")
+            time.sleep(delay)
+        except Exception:
+            db.rollback()
+            raise
@@ -2,6 +2,13 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.modules.pix.settlement import settlement_workers
+from app.modules.graph.ingest import graph_workers
+from app.modules.credit.matching import credit_matching_workers
+from app.modules.loan.servicing import servicing_workers
+from app.modules.loan.collection import collection_workers
+from app.modules.pool.distribution import distribution_workers
 
 # Import modular routers
 from app.modules.auth import router as auth_router
@@ -18,6 +25,7 @@ from app.modules.deposit import router as deposit_router
 from app.modules.open_finance import router as open_finance_router
 from app.modules.kyc import router as kyc_router
 from app.modules.score import router as score_router
+from app.modules.graph import router as graph_router
 
 # Create FastAPI application
 app = FastAPI(
@@ -96,6 +104,35 @@ app.include_router(deposit_router, prefix=settings.API_V1_PREFIX)
 app.include_router(open_finance_router, prefix=settings.API_V1_PREFIX)
 app.include_router(kyc_router, prefix=settings.API_V1_PREFIX)
 app.include_router(score_router, prefix=settings.API_V1_PREFIX)
+app.include_router(graph_router, prefix=settings.API_V1_PREFIX)
+
+
+@app.on_event("startup")
+def start_background_workers():
+    """Inicia os workers de liquidação PIX, matching de crédito, servicing, cobrança, distribuição e ingestão do grafo."""
+    # As filas só recebem itens no modo async; no sync os pools não são iniciados
+    if settings.PIX_SETTLEMENT_MODE == "async" and settings.PIX_SETTLEMENT_WORKERS > 0:
+        settlement_workers.start()
+    if settings.CREDIT_MATCHING_MODE == "async" and settings.CREDIT_MATCHING_WORKERS > 0:
+        credit_matching_workers.start()
+    if settings.LOAN_SERVICING_ENABLED:
+        servicing_workers.start()
+    if settings.LOAN_COLLECTION_ENABLED:
+        collection_workers.start()
+    if settings.POOL_DISTRIBUTION_ENABLED:
+        distribution_workers.start()
+    if settings.GRAPH_INGEST_ENABLED:
+        graph_workers.start()
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    settlement_workers.stop()
+    credit_matching_workers.stop()
+    servicing_workers.stop()
+    collection_workers.stop()
+    distribution_workers.stop()
+    graph_workers.stop()
 
 
 @app.get("/")
@@ -119,6 +156,12 @@ def health_check():
     }
 
 
+@app.get("/metrics")
+def get_metrics():
+    """Métricas internas do processo (tempo de espera de locks, retries, etc.)."""
+    return metrics.snapshot()
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler."""
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, Date, DateTime, JSON, Enum as SQLEnum, DECIMAL, Text
+from sqlalchemy import Column, String, Integer, Boolean, Date, DateTime, Float, JSON, Enum as SQLEnum, DECIMAL, Text, UniqueConstraint
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -99,6 +99,18 @@ class CollateralType(str, enum.Enum):
     NONE = "none"
 
 
+class ApprovalType(str, enum.Enum):
+    AUTOMATIC = "automatic"
+    MANUAL = "manual"
+    BOTH = "both"
+
+
+class MatchingStatus(str, enum.Enum):
+    QUEUED = "queued"
+    MATCHING = "matching"
+    DONE = "done"
+
+
 class CreditRequest(Base):
     __tablename__ = "credit_requests"
     
@@ -112,6 +124,10 @@ class CreditRequest(Base):
     collateral_docs = Column(JSON)
     collateral_type = Column(SQLEnum(CollateralType), default=CollateralType.NONE)
     collateral_description = Column(Text)
+    approval_type = Column(SQLEnum(ApprovalType), default=ApprovalType.AUTOMATIC)
+    # Matching em background: None = feito no request (ou não se aplica)
+    matching_status = Column(SQLEnum(MatchingStatus), index=True)
+    matching_claimed_at = Column(DateTime)
     requested_at = Column(DateTime, server_default=func.now())
     approved_at = Column(DateTime)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -129,20 +145,46 @@ class OwnerType(str, enum.Enum):
     USER = "user"
 
 
+class Party(Base):
+    """Índice unificado de usuários e investidores (mantido por triggers)."""
+    __tablename__ = "parties"
+    
+    party_id = Column(String(36), primary_key=True)
+    party_type = Column(SQLEnum(OwnerType), nullable=False)
+    email = Column(String(255), nullable=False, unique=True)
+    cpf_cnpj = Column(String(14), nullable=False, unique=True)
+    full_name = Column(String(255), nullable=False)
+
+
 class Wallet(Base):
     __tablename__ = "wallets"
+    __table_args__ = (
+        UniqueConstraint("owner_id", "owner_type", "currency", name="uq_wallet_owner_currency"),
+    )
     
     wallet_id = Column(String(36), primary_key=True, index=True)
     owner_id = Column(String(36), nullable=False, index=True)
     owner_type = Column(SQLEnum(OwnerType), nullable=False)
-    currency = Column(SQLEnum(Currency), default=Currency.BRL, index=True)
+    currency = Column(SQLEnum(Currency), nullable=False, default=Currency.BRL, index=True)
     balance = Column(DECIMAL(15, 2), default=0.00)
     blocked = Column(DECIMAL(15, 2), default=0.00)
     wallet_address = Column(String(255))
+    # Número de sub-saldos (stripes) para carteiras com alta concorrência; 0 = desativado
+    stripe_count = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
 
+class WalletStripe(Base):
+    """Sub-saldo de uma carteira em modo striped (créditos caem em um stripe aleatório)."""
+    __tablename__ = "wallet_stripes"
+    
+    wallet_id = Column(String(36), primary_key=True)
+    stripe_no = Column(Integer, primary_key=True)
+    balance = Column(DECIMAL(15, 2), nullable=False, default=0.00)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
 class RiskProfile(str, enum.Enum):
     LOW = "low"
     MEDIUM = "medium"
@@ -163,6 +205,8 @@ class Pool(Base):
     name = Column(String(255), nullable=False)
     target_amount = Column(DECIMAL(15, 2), nullable=False)
     raised_amount = Column(DECIMAL(15, 2), default=0.00)
+    # Capital já alocado em empréstimos; só cresce via UPDATE condicional (≤ raised_amount)
+    allocated_amount = Column(DECIMAL(15, 2), nullable=False, default=0.00)
     risk_profile = Column(SQLEnum(RiskProfile), default=RiskProfile.MEDIUM)
     expected_return = Column(DECIMAL(5, 2))
     duration_months = Column(Integer, nullable=False)
@@ -201,10 +245,25 @@ class PoolLoan(Base):
     pool_id = Column(String(36), nullable=False, index=True)
     credit_request_id = Column(String(36), nullable=False, index=True)
     allocated_amount = Column(DECIMAL(15, 2), nullable=False)
+    # Participação da pool no empréstimo (%); < 100 quando financiado por várias pools
+    share_percentage = Column(DECIMAL(7, 4), default=100)
     status = Column(SQLEnum(LoanStatus), default=LoanStatus.ACTIVE)
     allocated_at = Column(DateTime, server_default=func.now())
 
 
+class DelinquencyBucket(str, enum.Enum):
+    CURRENT = "current"
+    DPD_1_30 = "dpd_1_30"
+    DPD_31_60 = "dpd_31_60"
+    DPD_61_90 = "dpd_61_90"
+    DPD_90_PLUS = "dpd_90_plus"
+
+
+class AmortizationSystem(str, enum.Enum):
+    PRICE = "price"  # Parcelas fixas
+    SAC = "sac"      # Amortização constante, parcelas decrescentes
+
+
 class Loan(Base):
     __tablename__ = "loans"
     
@@ -216,7 +275,14 @@ class Loan(Base):
     principal = Column(DECIMAL(15, 2), nullable=False)
     interest_rate = Column(DECIMAL(5, 2), nullable=False)
     duration_months = Column(Integer, nullable=False)
+    amortization_system = Column(SQLEnum(AmortizationSystem), nullable=False, default=AmortizationSystem.PRICE)
     status = Column(SQLEnum(LoanStatus), default=LoanStatus.ACTIVE, index=True)
+    # Atraso da parcela vencida mais antiga (atualizado pelo servicing diário)
+    days_past_due = Column(Integer, nullable=False, default=0)
+    delinquency_bucket = Column(SQLEnum(DelinquencyBucket), default=DelinquencyBucket.CURRENT)
+    # Cronograma compacto: parcelas futuras são calculadas; só as vencidas viram linha
+    next_installment = Column(Integer, nullable=False, default=1)
+    next_due_date = Column(Date)
     disbursed_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
@@ -229,6 +295,9 @@ class PaymentStatus(str, enum.Enum):
 
 class LoanPayment(Base):
     __tablename__ = "loan_payments"
+    __table_args__ = (
+        UniqueConstraint("loan_id", "installment_number", name="uq_payment_installment"),
+    )
     
     payment_id = Column(String(36), primary_key=True, index=True)
     loan_id = Column(String(36), nullable=False, index=True)
@@ -247,6 +316,7 @@ class TransactionType(str, enum.Enum):
     INVESTMENT = "investment"
     SWAP = "swap"
     POOL_CONTRIBUTION = "pool_contribution"
+    POOL_DISTRIBUTION = "pool_distribution"
 
 
 class TransactionStatus(str, enum.Enum):
@@ -272,3 +342,153 @@ class Transaction(Base):
     blockchain_tx_hash = Column(String(255))
     created_at = Column(DateTime, server_default=func.now(), index=True)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class FxRateHistory(Base):
+    """Histórico append-only de cotações (BRL por unidade da moeda)."""
+    __tablename__ = "fx_rate_history"
+    
+    currency = Column(SQLEnum(Currency), primary_key=True)
+    observed_at = Column(DateTime, primary_key=True)
+    rate = Column(DECIMAL(18, 8), nullable=False)
+
+
+class PixKeyType(str, enum.Enum):
+    EMAIL = "email"
+    CPF = "cpf"
+    CNPJ = "cnpj"
+    PHONE = "phone"
+    EVP = "evp"
+
+
+class PixKey(Base):
+    """Chave PIX (normalizada) apontando para a carteira BRL do dono."""
+    __tablename__ = "pix_keys"
+    
+    key_value = Column(String(255), primary_key=True)
+    key_type = Column(SQLEnum(PixKeyType), nullable=False)
+    owner_id = Column(String(36), nullable=False, index=True)
+    owner_type = Column(SQLEnum(OwnerType), nullable=False)
+    wallet_id = Column(String(36), nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class SettlementJobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class PixSettlementJob(Base):
+    """Job de liquidação de um PIX aceito em modo assíncrono."""
+    __tablename__ = "pix_settlement_jobs"
+    
+    job_id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    transaction_id = Column(String(36), nullable=False, unique=True)
+    sender_wallet_id = Column(String(36), nullable=False)
+    receiver_wallet_id = Column(String(36))  # None = saque para chave externa
+    amount = Column(DECIMAL(15, 2), nullable=False)
+    status = Column(SQLEnum(SettlementJobStatus), nullable=False, default=SettlementJobStatus.QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Instante do registro nos limites de velocidade (desfeito se o job falhar)
+    velocity_at = Column(Float)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class IdempotencyStatus(str, enum.Enum):
+    IN_PROGRESS = "in_progress"
+    # O handler já efetivou (commit) algum efeito; a resposta ainda não foi gravada
+    COMMITTED = "committed"
+    COMPLETED = "completed"
+    # Falhou depois de efetivar: a resposta é desconhecida e a chave não é liberada
+    FAILED = "failed"
+
+
+class IdempotencyKey(Base):
+    """Resposta armazenada de um POST com Idempotency-Key (expira em expires_at)."""
+    __tablename__ = "idempotency_keys"
+    
+    key_hash = Column(String(64), primary_key=True)
+    scope = Column(String(64), nullable=False)
+    request_fingerprint = Column(String(64), nullable=False)
+    status = Column(SQLEnum(IdempotencyStatus), nullable=False, default=IdempotencyStatus.IN_PROGRESS)
+    # Dono atual da reivindicação e início do lease (renovado no primeiro commit)
+    claim_token = Column(String(36))
+    claimed_at = Column(DateTime)
+    response_status = Column(Integer)
+    response_body = Column(JSON)
+    created_at = Column(DateTime, server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class ServicingRunStatus(str, enum.Enum):
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class LoanServicingRun(Base):
+    """Execução diária do servicing de empréstimos (checkpoint para retomada)."""
+    __tablename__ = "loan_servicing_runs"
+    
+    run_id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    business_date = Column(Date, nullable=False, unique=True)
+    status = Column(SQLEnum(ServicingRunStatus), nullable=False, default=ServicingRunStatus.RUNNING)
+    phase = Column(String(32), nullable=False)
+    cursor = Column(String(36))
+    stats = Column(JSON)
+    last_error = Column(Text)
+    started_at = Column(DateTime, server_default=func.now())
+    heartbeat_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class LoanRepayment(Base):
+    """
+    Valor cobrado de uma parcela, por credor.
+    
+    Parcelas de empréstimos via pool geram uma linha por pool financiadora
+    (pela share_percentage de pool_loans), que fica pendente de distribuição
+    aos investidores da pool até distribution_run_id ser preenchido.
+    """
+    __tablename__ = "loan_repayments"
+    
+    repayment_id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    payment_id = Column(String(36), nullable=False, index=True)
+    loan_id = Column(String(36), nullable=False, index=True)
+    pool_id = Column(String(36))
+    investor_id = Column(String(36))
+    amount = Column(DECIMAL(15, 2), nullable=False)
+    transaction_id = Column(String(36), nullable=False)
+    collected_at = Column(DateTime, nullable=False)
+    distribution_run_id = Column(String(36))
+
+
+class PoolDistributionRun(Base):
+    """Execução da distribuição de repasses de pools aos investidores (auditoria)."""
+    __tablename__ = "pool_distribution_runs"
+    
+    run_id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    business_date = Column(Date, nullable=False, index=True)
+    pools_count = Column(Integer, nullable=False, default=0)
+    repayments_count = Column(Integer, nullable=False, default=0)
+    lines_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(DECIMAL(15, 2), nullable=False, default=0)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+class PoolDistributionLine(Base):
+    """Valor creditado a um investidor (dono ou cotista) de uma pool em uma distribuição."""
+    __tablename__ = "pool_distribution_lines"
+    
+    line_id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    run_id = Column(String(36), nullable=False, index=True)
+    pool_id = Column(String(36), nullable=False, index=True)
+    investor_id = Column(String(36), nullable=False, index=True)
+    is_owner = Column(Boolean, nullable=False, default=False)
+    share_percentage = Column(DECIMAL(7, 4), nullable=False)
+    amount = Column(DECIMAL(15, 2), nullable=False)
+    transaction_id = Column(String(36))
@@ -15,6 +15,8 @@ from app.core.security import (
 )
 from app.core.config import settings
 from app.models.models import Wallet, OwnerType, Currency
+from app.modules.party import PartyResolver
+from app.modules.pix.keys import PixKeyDirectory
 
 # Configuração básica do logger
 logger = logging.getLogger(__name__)
@@ -27,6 +29,7 @@ class AuthService:
     def __init__(self, db: Session):
         self.db = db
         self.repository = AuthRepository(db)
+        self.parties = PartyResolver(db)
     
     def register(self, data: dict) -> Tuple[dict, dict]:
         logger.info("[AuthService/Register] Iniciando registro")
@@ -52,13 +55,14 @@ class AuthService:
         # 1. Verifica duplicidade em ambas as tabelas
         email = data["email"]
         cpf_cnpj = data["cpf_cnpj"]
-        if self.repository.get_user_by_email(email) or self.repository.get_investor_by_email(email):
+        email_taken, cpf_cnpj_taken = self.parties.find_conflicts(email, cpf_cnpj)
+        if email_taken:
             logger.error("[AuthService/Register] Email já está em uso")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email já está em uso."
             )
-        if self.repository.get_user_by_cpf_cnpj(cpf_cnpj) or self.repository.get_investor_by_cpf_cnpj(cpf_cnpj):
+        if cpf_cnpj_taken:
             logger.error("[AuthService/Register] CPF ou CNPJ já está em uso")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -81,11 +85,12 @@ class AuthService:
                 logger.info("[AuthService/Register] Investidor criado com sucesso: %s", entity.email)
                 
                 # Criar carteira inicial para investidor com R$ 50.000
-                self._create_initial_wallet(
+                wallet = self._create_initial_wallet(
                     owner_id=entity.investor_id,
                     owner_type=OwnerType.INVESTOR,
                     initial_balance=50000.0
                 )
+                self._register_pix_keys(entity, entity.investor_id, OwnerType.INVESTOR, wallet)
                 
             else: # Padrão é BORROWER (User)
                 logger.info("[AuthService/Register] Criando um USUÁRIO (Tomador)")
@@ -96,11 +101,12 @@ class AuthService:
                 logger.info("[AuthService/Register] Usuário criado com sucesso: %s", entity.email)
                 
                 # Criar carteira inicial para tomador com R$ 5.000
-                self._create_initial_wallet(
+                wallet = self._create_initial_wallet(
                     owner_id=entity.user_id,
                     owner_type=OwnerType.USER,
                     initial_balance=5000.0
                 )
+                self._register_pix_keys(entity, entity.user_id, OwnerType.USER, wallet)
 
         except Exception as e:
             logger.error("[AuthService/Register] Erro ao criar no banco de dados: %s", str(e))
@@ -128,18 +134,17 @@ class AuthService:
         Returns:
             Tuple[tokens_dict, user_data_dict]
         """
-        # Tentar encontrar usuário ou investidor
-        user = self.repository.get_user_by_email(email)
-        investor = self.repository.get_investor_by_email(email)
+        # Usuário ou investidor em uma consulta (índice parties)
+        found = self.parties.load_entity(email=email)
         
-        if not user and not investor:
+        if not found:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
             )
         
         # Verificar senha
-        entity = user if user else investor
+        owner_type, entity = found
         if not verify_password(password, entity.password_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -147,11 +152,11 @@ class AuthService:
             )
         
         # Determinar tipo
-        if user:
-            entity_id = user.user_id
+        if owner_type == OwnerType.USER:
+            entity_id = entity.user_id
             user_type = "user"
         else:
-            entity_id = investor.investor_id
+            entity_id = entity.investor_id
             user_type = "investor"
         
         # Gerar tokens
@@ -278,11 +283,32 @@ class AuthService:
                 f"[AuthService] Carteira inicial criada: owner_id={owner_id}, "
                 f"owner_type={owner_type.value}, balance=R$ {initial_balance:,.2f}"
             )
+            return wallet
         except Exception as e:
             logger.error(f"[AuthService] Erro ao criar carteira inicial: {str(e)}")
             self.db.rollback()
             # Não falha o registro se a carteira não for criada
             # O usuário pode criar manualmente depois
+            return None
+    
+    def _register_pix_keys(self, entity: Any, owner_id: str, owner_type: OwnerType, wallet: Optional[Wallet]):
+        """Cadastra as chaves PIX padrão (email, CPF/CNPJ, telefone e aleatória) na carteira BRL."""
+        if wallet is None:
+            return
+        try:
+            keys = PixKeyDirectory(self.db).register_default_keys(
+                owner_id=owner_id,
+                owner_type=owner_type,
+                wallet_id=wallet.wallet_id,
+                email=entity.email,
+                cpf_cnpj=entity.cpf_cnpj,
+                phone=entity.phone
+            )
+            logger.info(f"[AuthService] {len(keys)} chaves PIX cadastradas para owner_id={owner_id}")
+        except Exception as e:
+            logger.error(f"[AuthService] Erro ao cadastrar chaves PIX: {str(e)}")
+            self.db.rollback()
+            # Não falha o registro; as chaves podem ser cadastradas depois em /pix/keys
     
     def _entity_to_dict(self, entity: Any, user_type: str) -> dict:
         if user_type == "user":
@@ -0,0 +1,274 @@
+"""
+Clearing em lote: aloca muitas solicitações de crédito às pools de uma vez.
+
+O matching individual pega, para cada solicitação, a pool de maior
+expected_return que comporta o valor; em sequência isso fragmenta a capacidade
+das pools. O clearing olha o lote inteiro:
+
+1. Elegibilidade estática (score, garantia, prazo, valor <= capacidade) como
+   uma máscara booleana (solicitações x pools) calculada com broadcasting
+2. Solicitações em ordem de score do tomador (maior primeiro, empate por ordem
+   de chegada); cada uma vai para a pool elegível menos disputada: menor
+   razão entre a demanda elegível das solicitações que ainda faltam e a
+   capacidade que sobra, empate pela maior expected_return. Assim quem tem
+   várias opções não consome a pool de que outra solicitação depende
+3. Tudo é gravado em uma transação com INSERTs em lote (pool_loans, loans,
+   transactions), um UPDATE para as solicitações, a reserva condicional da
+   capacidade de cada pool (pools.allocated_amount) e um UPDATE ... CASE para
+   as carteiras; as parcelas são calculadas a partir do empréstimo
+
+Benchmark do cálculo (sem banco): python -m scripts.clearing_benchmark (a partir de backend/)
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Sequence, Set, Tuple
+import logging
+import time
+import uuid
+
+import numpy as np
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.core.metrics import metrics
+from app.database import run_in_transaction
+from app.models.models import (
+    CollateralType, CreditRequest, CreditRequestStatus, Currency, Loan,
+    LoanStatus, OwnerType, Pool, PoolLoan, PoolStatus, Transaction, TransactionStatus,
+    TransactionType, User
+)
+from app.modules.pool.capacity import invalidate_pool_capacity
+from app.modules.pool.repository import PoolRepository, PoolCapacityConflict
+from app.modules.wallet.repository import WalletRepository
+from .dashboard import invalidate_borrower_dashboard
+from .schedule import schedule_fields
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ClearingInput:
+    """Lote em forma de arrays (índice i = solicitação i, índice j = pool j)."""
+    amounts: np.ndarray
+    scores: np.ndarray
+    has_collateral: np.ndarray
+    terms: np.ndarray
+    pool_capacity: np.ndarray
+    pool_min_score: np.ndarray
+    pool_requires_collateral: np.ndarray
+    pool_max_term: np.ndarray
+    pool_expected_return: np.ndarray
+
+
+def eligibility_mask(batch: ClearingInput) -> np.ndarray:
+    """Máscara (solicitações x pools) dos critérios que não dependem da alocação."""
+    return (
+        (batch.scores[:, None] >= batch.pool_min_score[None, :])
+        & (batch.has_collateral[:, None] | ~batch.pool_requires_collateral[None, :])
+        & (batch.terms[:, None] <= batch.pool_max_term[None, :])
+        & (batch.amounts[:, None] <= batch.pool_capacity[None, :])
+    )
+
+
+def clear(batch: ClearingInput) -> np.ndarray:
+    """
+    Calcula a alocação do lote.
+    
+    Returns:
+        Array com o índice da pool de cada solicitação (-1 = sem alocação)
+    """
+    n_requests = len(batch.amounts)
+    assignment = np.full(n_requests, -1, dtype=np.int64)
+    if n_requests == 0 or len(batch.pool_capacity) == 0:
+        return assignment
+    
+    # Pools em ordem de expected_return: no empate, argmin fica com a primeira
+    pool_order = np.argsort(-batch.pool_expected_return, kind="stable")
+    ordered = ClearingInput(
+        amounts=batch.amounts,
+        scores=batch.scores,
+        has_collateral=batch.has_collateral,
+        terms=batch.terms,
+        pool_capacity=batch.pool_capacity[pool_order],
+        pool_min_score=batch.pool_min_score[pool_order],
+        pool_requires_collateral=batch.pool_requires_collateral[pool_order],
+        pool_max_term=batch.pool_max_term[pool_order],
+        pool_expected_return=batch.pool_expected_return[pool_order]
+    )
+    eligible = eligibility_mask(ordered)
+    remaining = ordered.pool_capacity.astype(np.float64).copy()
+    
+    # Demanda elegível ainda não atendida por pool (em blocos: evita a matriz em float)
+    demand = np.zeros(len(remaining), dtype=np.float64)
+    for start in range(0, n_requests, 1024):
+        demand += batch.amounts[start:start + 1024] @ eligible[start:start + 1024]
+    
+    candidates = np.flatnonzero(eligible.any(axis=1))
+    request_order = candidates[np.argsort(-batch.scores[candidates], kind="stable")]
+    for i in request_order:
+        amount = batch.amounts[i]
+        row = eligible[i]
+        demand -= row * amount
+        fits = row & (remaining >= amount)
+        if not fits.any():
+            continue
+        # Menor pressão: pool menos disputada pelas solicitações que ainda faltam
+        pressure = np.where(fits, demand / np.maximum(remaining - amount, 1.0), np.inf)
+        j = int(np.argmin(pressure))
+        remaining[j] -= amount
+        assignment[i] = pool_order[j]
+    return assignment
+
+
+class CreditClearing:
+    """Executa o clearing de um lote de solicitações contra as pools ativas."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.wallet_repository = WalletRepository(db)
+        self.pool_repository = PoolRepository(db)
+    
+    def run(self, request_ids: Sequence[str]) -> Dict[str, str]:
+        """
+        Aloca as solicitações PENDING de `request_ids` e desembolsa os empréstimos.
+        
+        As pools ativas ficam travadas (FOR UPDATE) durante o cálculo, então
+        clearings concorrentes não alocam a mesma capacidade.
+        
+        Returns:
+            {request_id: pool_id} das solicitações aprovadas
+        """
+        if not request_ids:
+            return {}
+        
+        def work() -> Tuple[Dict[str, str], Set[str]]:
+            started = time.perf_counter()
+            requests = self.db.query(CreditRequest).filter(
+                CreditRequest.request_id.in_(list(request_ids)),
+                CreditRequest.status == CreditRequestStatus.PENDING
+            ).order_by(CreditRequest.requested_at).with_for_update(skip_locked=True).all()
+            pools = self.db.query(Pool).filter(
+                Pool.status == PoolStatus.ACTIVE
+            ).order_by(Pool.pool_id).with_for_update().all()
+            if not requests or not pools:
+                return {}, set()
+            
+            users = {
+                user.user_id: user
+                for user in self.db.query(User).filter(
+                    User.user_id.in_({r.user_id for r in requests})
+                ).all()
+            }
+            requests = [r for r in requests if r.user_id in users]
+            allocated = self.pool_repository.get_allocated_amounts([p.pool_id for p in pools])
+            
+            batch = ClearingInput(
+                amounts=np.array([float(r.amount_requested) for r in requests], dtype=np.float64),
+                scores=np.array([_user_score(users[r.user_id]) for r in requests], dtype=np.int64),
+                has_collateral=np.array(
+                    [r.collateral_type not in (None, CollateralType.NONE) for r in requests], dtype=bool
+                ),
+                terms=np.array([r.duration_months for r in requests], dtype=np.int64),
+                pool_capacity=np.array(
+                    [float(p.raised_amount or 0) - float(allocated.get(p.pool_id) or 0) for p in pools],
+                    dtype=np.float64
+                ),
+                pool_min_score=np.array([p.min_score or 0 for p in pools], dtype=np.int64),
+                pool_requires_collateral=np.array([bool(p.requires_collateral) for p in pools], dtype=bool),
+                pool_max_term=np.array([p.max_term_months or 0 for p in pools], dtype=np.int64),
+                pool_expected_return=np.array([float(p.expected_return or 0) for p in pools], dtype=np.float64)
+            )
+            assignment = clear(batch)
+            matches = [(requests[i], pools[j]) for i, j in enumerate(assignment.tolist()) if j >= 0]
+            if matches:
+                self._disburse(matches, users)
+            
+            metrics.observe("credit.clearing.seconds", time.perf_counter() - started)
+            metrics.increment("credit.clearing.matched", len(matches))
+            logger.info(
+                f"[Credit Clearing] {len(matches)}/{len(requests)} solicitações alocadas "
+                f"em {len(pools)} pools ({time.perf_counter() - started:.3f}s)"
+            )
+            return {r.request_id: p.pool_id for r, p in matches}, {r.user_id for r, _ in matches}
+        
+        approved, borrowers = run_in_transaction(self.db, work, name="credit_clearing")
+        invalidate_borrower_dashboard(borrowers)
+        if approved:
+            invalidate_pool_capacity()
+        return approved
+    
+    def _disburse(self, matches: List[tuple], users: Dict[str, User]) -> None:
+        """Grava as alocações com INSERTs em lote e credita os tomadores. Não faz commit."""
+        now = datetime.now()
+        wallets = self.wallet_repository.get_wallets_for_owners(
+            [(r.user_id, OwnerType.USER) for r, _ in matches], Currency.BRL
+        )
+        pool_loans, loans, transactions = [], [], []
+        credits: Dict[str, Decimal] = {}
+        reserved: Dict[str, Decimal] = {}
+        
+        for credit_request, pool in matches:
+            amount = credit_request.amount_requested
+            interest_rate = max(float(credit_request.interest_rate or 0), float(pool.min_interest_rate or 0))
+            wallet = wallets[(credit_request.user_id, OwnerType.USER)]
+            
+            pool_loans.append({
+                "pool_loan_id": str(uuid.uuid4()),
+                "pool_id": pool.pool_id,
+                "credit_request_id": credit_request.request_id,
+                "allocated_amount": amount,
+                "share_percentage": 100,
+                "status": LoanStatus.ACTIVE,
+                "allocated_at": now
+            })
+            loans.append({
+                "loan_id": str(uuid.uuid4()),
+                "credit_request_id": credit_request.request_id,
+                "user_id": credit_request.user_id,
+                "pool_id": pool.pool_id,
+                "principal": amount,
+                "interest_rate": interest_rate,
+                "duration_months": credit_request.duration_months,
+                "status": LoanStatus.ACTIVE,
+                "disbursed_at": now,
+                **schedule_fields(now)
+            })
+            transactions.append({
+                "transaction_id": str(uuid.uuid4()),
+                "sender_id": pool.investor_id,
+                "sender_type": OwnerType.INVESTOR,
+                "receiver_id": credit_request.user_id,
+                "receiver_type": OwnerType.USER,
+                "wallet_id": wallet.wallet_id,
+                "amount": amount,
+                "currency": Currency.BRL,
+                "type": TransactionType.INVESTMENT,
+                "status": TransactionStatus.COMPLETED,
+                "description": f"Empréstimo via pool {pool.name}",
+                "created_at": now
+            })
+            credits[wallet.wallet_id] = credits.get(wallet.wallet_id, Decimal(0)) + Decimal(str(amount))
+            reserved[pool.pool_id] = reserved.get(pool.pool_id, Decimal(0)) + Decimal(str(amount))
+        
+        # As pools estão travadas (FOR UPDATE): o gate só falha se o lido divergir do banco
+        for pool_id, amount in sorted(reserved.items()):
+            if not self.pool_repository.reserve_capacity(pool_id, amount):
+                raise PoolCapacityConflict(pool_id, amount)
+        
+        self.db.execute(insert(PoolLoan), pool_loans)
+        self.db.execute(insert(Loan), loans)
+        self.db.execute(insert(Transaction), transactions)
+        self.db.execute(
+            update(CreditRequest)
+            .where(CreditRequest.request_id.in_([r.request_id for r, _ in matches]))
+            .values(status=CreditRequestStatus.APPROVED, approved_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        self.wallet_repository.credit_many(credits)
+        for credit_request, _ in matches:
+            self.db.expire(credit_request)
+
+
+def _user_score(user: User) -> int:
+    return user.calculated_score if user.calculated_score else (user.credit_score or 0)
@@ -0,0 +1,117 @@
+"""
+Pools compatíveis com uma simulação de crédito, em cache.
+
+A compatibilidade depende apenas de (score, garantia, prazo, valor) contra o
+snapshot de capacidade das pools. Cada dimensão é reduzida à sua faixa entre os
+limiares distintos do snapshot (min_score, max_term_months, capital disponível),
+então todas as consultas de uma mesma faixa têm exatamente o mesmo resultado e
+compartilham a entrada do cache. A chave inclui a versão do snapshot: após uma
+invalidação as entradas antigas deixam de ser alcançadas.
+
+O score do tomador também fica em cache curto, invalidado quando o score é
+recalculado; movimentos repetidos do simulador não vão ao banco.
+"""
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.models import User
+from app.modules.pool.capacity import CapacitySnapshot, capacity_snapshot
+
+_lookup_cache = TTLCache(
+    maxsize=settings.COMPATIBLE_POOLS_CACHE_SIZE,
+    ttl_seconds=settings.COMPATIBLE_POOLS_CACHE_TTL_SECONDS,
+    name="compatible_pools"
+)
+_score_cache = TTLCache(
+    maxsize=settings.COMPATIBLE_POOLS_CACHE_SIZE,
+    ttl_seconds=settings.COMPATIBLE_POOLS_CACHE_TTL_SECONDS,
+    name="borrower_scores"
+)
+
+
+def borrower_score(db: Session, user_id: str) -> Optional[int]:
+    """Score usado na elegibilidade (calculated_score ou credit_score); None se o usuário não existe."""
+    def load() -> Optional[int]:
+        row = db.query(User.calculated_score, User.credit_score).filter(User.user_id == user_id).first()
+        if row is None:
+            return None
+        return row.calculated_score if row.calculated_score else row.credit_score
+    return _score_cache.get_or_set(user_id, load)
+
+
+def lookup_key(
+    snapshot: CapacitySnapshot,
+    score: int,
+    has_collateral: Optional[bool],
+    duration_months: int,
+    amount: float
+) -> Tuple:
+    """(versão, faixa de score, garantia, faixa de prazo, faixa de valor) da consulta."""
+    return (
+        snapshot.version,
+        bisect_right(snapshot.min_scores, score),
+        has_collateral,
+        bisect_left(snapshot.max_terms, duration_months),
+        bisect_left(snapshot.available_amounts, amount)
+    )
+
+
+def _match(
+    snapshot: CapacitySnapshot,
+    score: int,
+    has_collateral: Optional[bool],
+    duration_months: int,
+    amount: float
+) -> List[dict]:
+    return [
+        {
+            "pool_id": pool.pool_id,
+            "name": pool.name,
+            "investor_id": pool.investor_id,
+            "available_amount": pool.available_amount,
+            "expected_return": pool.expected_return,
+            "min_interest_rate": pool.min_interest_rate,
+            "min_score": pool.min_score,
+            "requires_collateral": pool.requires_collateral,
+            "max_term_months": pool.max_term_months,
+            "risk_profile": pool.risk_profile
+        }
+        for pool in snapshot.pools
+        if score >= pool.min_score
+        and duration_months <= pool.max_term_months
+        and pool.available_amount >= amount
+        and not (has_collateral is False and pool.requires_collateral)
+    ]
+
+
+def find_compatible_pools(
+    db: Session,
+    score: int,
+    duration_months: int,
+    amount: float,
+    has_collateral: Optional[bool] = None
+) -> List[dict]:
+    """
+    Pools ativas que aceitam a simulação.
+    
+    Args:
+        has_collateral: False exclui pools que exigem garantia; None não filtra
+    """
+    snapshot = capacity_snapshot(db)
+    key = lookup_key(snapshot, score, has_collateral, duration_months, amount)
+    return _lookup_cache.get_or_set(
+        key, lambda: _match(snapshot, score, has_collateral, duration_months, amount)
+    )
+
+
+def invalidate_borrower_score(user_id: str) -> None:
+    """Descarta o score em cache do tomador (após recálculo)."""
+    _score_cache.pop(user_id)
+
+
+def compatibility_cache_stats() -> dict:
+    return {"lookups": _lookup_cache.stats(), "scores": _score_cache.stats()}
@@ -1,8 +1,15 @@
-from fastapi import APIRouter, Depends, status, Body
+from fastapi import APIRouter, Depends, status, Body, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import json
+import time
 
-from app.database import get_db
+from app.core.config import settings
+from app.core.events import notifier
+from app.core.idempotency import run_idempotent
+from app.database import get_db, SessionLocal
 from .service import CreditService
 
 router = APIRouter(prefix="/credit", tags=["Credit"])
@@ -24,6 +31,7 @@ def create_credit_request(
         "duration_months": 12,
         "interest_rate": 2.5,
         "approval_type": "automatic",  // "automatic", "manual" ou "both"
+        "async": false,  // Opcional: false = matching no request mesmo com CREDIT_MATCHING_MODE=async
         "collateral_type": "VEHICLE",  // Opcional
         "collateral_description": "Honda Civic 2019",  // Opcional
         "collateral_docs": ["url1", "url2"]  // Opcional
@@ -32,9 +40,17 @@ def create_credit_request(
     
     **Approval Types:**
     - `automatic`: Tenta match automático com pools. Se não houver, rejeita.
-    - `manual`: Vai direto para marketplace manual (não implementado ainda)
+    - `manual`: Vai direto para o marketplace manual (fica PENDING para investidores)
     - `both`: Tenta automático primeiro, se não houver match vai para manual
     
+    Se nenhuma pool comporta o valor sozinha, o matching automático pode
+    dividir o financiamento entre até CREDIT_SPLIT_MAX_POOLS pools compatíveis.
+    
+    **Modo assíncrono** (CREDIT_MATCHING_MODE=async, salvo `"async": false`):
+    a solicitação é gravada como PENDING com `matching_status: "queued"` e o
+    matching roda em background. Acompanhe via GET /credit/{request_id}
+    (polling) ou GET /credit/{request_id}/events (SSE).
+    
     **Retorna:**
     - Status da solicitação (PENDING, APPROVED ou REJECTED)
     - Se aprovado automaticamente, o crédito é imediatamente liberado na carteira
@@ -55,6 +71,56 @@ def create_credit_request(
 # ROTAS ESPECÍFICAS DEVEM VIR ANTES DAS ROTAS PARAMETRIZADAS
 # Exemplo: /opportunities ANTES de /{request_id}
 
+@router.post("/clearing")
+def run_credit_clearing(
+    db: Session = Depends(get_db)
+):
+    """
+    Executa o clearing em lote das solicitações PENDING (administrativo).
+    
+    Aloca de uma vez todas as solicitações 'automatic'/'both' que aguardam no
+    marketplace contra as pools ativas com capacidade (best fit por score do
+    tomador). As não alocadas continuam PENDING.
+    
+    **Retorna:**
+    - candidates: solicitações consideradas
+    - matched: quantas foram aprovadas
+    - allocations: pares request_id / pool_id
+    """
+    service = CreditService(db)
+    return service.run_clearing()
+
+
+@router.post("/simulate")
+def simulate_credit(
+    data: Dict[str, Any] = Body(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Simula parcelas para várias combinações de valor, prazo e taxa (Tabela Price).
+    
+    **Body JSON:**
+    ```json
+    {
+        "amounts": [5000, 10000, 20000],
+        "terms": {"start": 6, "stop": 36, "step": 6},
+        "rates": [18.0, 24.0, 30.0],  // Taxas anuais em %
+        "upfront_fee_percent": 2.0  // Opcional: tarifa na liberação (entra no CET)
+    }
+    ```
+    
+    Cada eixo aceita uma lista ou um intervalo `{start, stop, step}` (stop
+    incluso). A grade completa é limitada a CREDIT_SIMULATION_MAX_CELLS células.
+    
+    **Retorna:**
+    - Eixos normalizados e `shape` [valores, prazos, taxas]
+    - monthly_payment, total_payment, total_interest,
+      cet_monthly_percent e cet_annual_percent como matrizes [valor][prazo][taxa]
+    """
+    service = CreditService(db)
+    return service.simulate(data)
+
+
 @router.get("/opportunities")
 def get_investment_opportunities(
     db: Session = Depends(get_db)
@@ -88,6 +154,46 @@ def get_credit_request(
     return result
 
 
+def _read_request(request_id: str) -> dict:
+    """Lê a solicitação em uma sessão própria (usado pelo stream SSE)."""
+    db = SessionLocal()
+    try:
+        return CreditService(db).get_credit_request(request_id)
+    finally:
+        db.close()
+
+
+def _matching_pending(credit_request: dict) -> bool:
+    return credit_request.get("matching_status") in ("queued", "matching")
+
+
+@router.get("/{request_id}/events")
+async def credit_request_events(request_id: str):
+    """
+    Server-Sent Events com o resultado do matching da solicitação.
+    
+    Envia o estado atual e, se o matching ainda estiver na fila, aguarda o
+    resultado e envia o estado final (ou encerra após CREDIT_SSE_TIMEOUT_SECONDS).
+    """
+    current = await run_in_threadpool(_read_request, request_id)
+    
+    async def stream():
+        request_data = current
+        yield f"event: status\ndata: {json.dumps(request_data)}\n\n"
+        deadline = time.monotonic() + settings.CREDIT_SSE_TIMEOUT_SECONDS
+        after = time.monotonic()
+        while _matching_pending(request_data) and time.monotonic() < deadline:
+            await run_in_threadpool(notifier.wait, request_id, after, 2.0)
+            after = time.monotonic()
+            request_data = await run_in_threadpool(_read_request, request_id)
+            if _matching_pending(request_data):
+                yield ": keep-alive\n\n"
+        if request_data != current:
+            yield f"event: status\ndata: {json.dumps(request_data)}\n\n"
+    
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
 @router.get("/user/{user_id}")
 def get_user_credit_requests(
     user_id: str,
@@ -144,6 +250,7 @@ def get_compatible_pools(
     user_id: str,
     amount: float,
     duration_months: int,
+    has_collateral: Optional[bool] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -152,13 +259,17 @@ def get_compatible_pools(
     **Query Parameters:**
     - amount: Valor solicitado
     - duration_months: Prazo em meses
+    - has_collateral: Opcional; `false` exclui pools que exigem garantia
+    
+    Resultados em cache por faixa de score/prazo/valor contra um snapshot da
+    capacidade das pools (invalidado em desembolsos e alterações de pools).
     
     **Retorna:**
     - Lista de pools que atendem aos critérios do usuário
     - Para cada pool: nome, taxa esperada, disponibilidade
     """
     service = CreditService(db)
-    result = service.get_compatible_pools(user_id, amount, duration_months)
+    result = service.get_compatible_pools(user_id, amount, duration_months, has_collateral)
     
     return result
 
@@ -166,6 +277,7 @@ def get_compatible_pools(
 @router.post("/invest", status_code=status.HTTP_201_CREATED)
 def invest_in_credit_request(
     data: Dict[str, Any] = Body(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db)
 ):
     """
@@ -192,11 +304,16 @@ def invest_in_credit_request(
     **Retorna:**
     - Detalhes do empréstimo criado
     - ID da transação
+    
+    **Idempotência:** envie o header `Idempotency-Key` para que repetições
+    (ex: retry após timeout) retornem a resposta original sem movimentar de novo.
     """
     service = CreditService(db)
-    result = service.invest_in_credit_request(data)
     
-    return {
-        "message": "Investimento realizado com sucesso!",
-        "data": result
-    }
+    def invest() -> dict:
+        return {
+            "message": "Investimento realizado com sucesso!",
+            "data": service.invest_in_credit_request(data)
+        }
+    
+    return run_idempotent(db, idempotency_key, "credit.invest", data, invest, status_code=status.HTTP_201_CREATED)
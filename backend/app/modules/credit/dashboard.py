@@ -0,0 +1,32 @@
+"""
+Snapshot em cache do dashboard do tomador.
+
+O dashboard é montado com um número fixo de consultas (empréstimos com
+agregados e joins, transações recentes) e guardado por
+BORROWER_DASHBOARD_CACHE_TTL_SECONDS. Desembolsos e cobranças de parcelas
+invalidam o snapshot dos tomadores envolvidos.
+"""
+from typing import Any, Callable, Iterable
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+_dashboard_cache = TTLCache(
+    maxsize=settings.BORROWER_DASHBOARD_CACHE_SIZE,
+    ttl_seconds=settings.BORROWER_DASHBOARD_CACHE_TTL_SECONDS,
+    name="borrower_dashboard"
+)
+
+
+def cached_dashboard(user_id: str, build: Callable[[], Any]) -> Any:
+    return _dashboard_cache.get_or_set(user_id, build)
+
+
+def invalidate_borrower_dashboard(user_ids: Iterable[str]) -> None:
+    """Descarta o snapshot dos tomadores (após desembolso ou pagamento de parcelas)."""
+    for user_id in set(user_ids):
+        _dashboard_cache.pop(user_id)
+
+
+def dashboard_cache_stats() -> dict:
+    return _dashboard_cache.stats()
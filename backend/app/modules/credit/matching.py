@@ -0,0 +1,148 @@
+"""
+Matching de solicitações de crédito em background.
+
+No modo assíncrono a solicitação é gravada como PENDING com matching_status
+QUEUED e o request retorna imediatamente. Um pool de workers reivindica lotes
+com SELECT ... FOR UPDATE SKIP LOCKED (marcando MATCHING), aloca o lote pelo
+clearing (ou pelo mesmo matching do modo síncrono) e marca DONE. Reivindicações mais antigas que
+CREDIT_MATCHING_CLAIM_TIMEOUT_SECONDS (worker que caiu no meio) voltam a ser
+elegíveis. O resultado é publicado para quem acompanha via SSE.
+"""
+from datetime import datetime, timedelta
+from typing import List
+import logging
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.events import notifier
+from app.core.workers import WorkerPool
+from app.database import run_in_transaction
+from app.models.models import (
+    ApprovalType, CreditRequest, CreditRequestStatus, MatchingStatus, User
+)
+from .clearing import CreditClearing
+
+logger = logging.getLogger(__name__)
+
+
+class CreditMatchingQueue:
+    """Fila de matching (credit_requests com matching_status QUEUED)."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def claim(self, limit: int) -> List[str]:
+        """Reivindica até `limit` solicitações para este worker."""
+        def claim_batch() -> List[str]:
+            now = datetime.now()
+            stale = now - timedelta(seconds=settings.CREDIT_MATCHING_CLAIM_TIMEOUT_SECONDS)
+            requests = self.db.query(CreditRequest).filter(
+                or_(
+                    CreditRequest.matching_status == MatchingStatus.QUEUED,
+                    and_(
+                        CreditRequest.matching_status == MatchingStatus.MATCHING,
+                        CreditRequest.matching_claimed_at < stale
+                    )
+                )
+            ).order_by(CreditRequest.requested_at).limit(limit).with_for_update(skip_locked=True).all()
+            for credit_request in requests:
+                credit_request.matching_status = MatchingStatus.MATCHING
+                credit_request.matching_claimed_at = now
+            return [credit_request.request_id for credit_request in requests]
+        
+        return run_in_transaction(self.db, claim_batch, name="credit_matching_claim")
+    
+    def process_batch(self, limit: int) -> int:
+        """
+        Reivindica e processa até `limit` solicitações.
+        
+        Com CREDIT_MATCHING_ENGINE=clearing o lote inteiro é alocado de uma vez
+        (ver clearing.py); se o clearing falhar, ou com engine=greedy, cada
+        solicitação é processada e concluída na sua própria transação.
+        
+        Returns:
+            Número de solicitações tratadas
+        """
+        request_ids = self.claim(limit)
+        if not request_ids:
+            return 0
+        
+        if settings.CREDIT_MATCHING_ENGINE == "clearing":
+            try:
+                return self._process_clearing(request_ids)
+            except Exception as e:
+                self.db.rollback()
+                logger.warning(f"[Credit Matching] Clearing de {len(request_ids)} falhou, processando individualmente: {str(e)}")
+        return self._process_greedy(request_ids)
+    
+    def _process_clearing(self, request_ids: List[str]) -> int:
+        matched = CreditClearing(self.db).run(request_ids)
+        
+        # Sem alocação: 'automatic' é rejeitada, 'both' segue PENDING no marketplace
+        unmatched = [request_id for request_id in request_ids if request_id not in matched]
+        if unmatched:
+            self.db.query(CreditRequest).filter(
+                CreditRequest.request_id.in_(unmatched),
+                CreditRequest.status == CreditRequestStatus.PENDING,
+                CreditRequest.approval_type == ApprovalType.AUTOMATIC
+            ).update({CreditRequest.status: CreditRequestStatus.REJECTED}, synchronize_session=False)
+        self.db.query(CreditRequest).filter(
+            CreditRequest.request_id.in_(request_ids)
+        ).update({CreditRequest.matching_status: MatchingStatus.DONE}, synchronize_session=False)
+        self.db.commit()
+        
+        for request_id, status in self.db.query(CreditRequest.request_id, CreditRequest.status).filter(
+            CreditRequest.request_id.in_(request_ids)
+        ).all():
+            self._publish(request_id, status)
+        return len(request_ids)
+    
+    def _process_greedy(self, request_ids: List[str]) -> int:
+        # Import local: o service importa este módulo para notificar os workers
+        from .service import CreditService
+        
+        requests = self.db.query(CreditRequest).filter(
+            CreditRequest.request_id.in_(request_ids)
+        ).order_by(CreditRequest.requested_at).all()
+        users = {
+            user.user_id: user
+            for user in self.db.query(User).filter(
+                User.user_id.in_({credit_request.user_id for credit_request in requests})
+            ).all()
+        }
+        service = CreditService(self.db)
+        
+        for credit_request in requests:
+            request_id = credit_request.request_id
+            user = users.get(credit_request.user_id)
+            if user is not None:
+                service.run_matching(credit_request, user)
+            else:
+                logger.error(f"[Credit Matching] Usuário {credit_request.user_id} não encontrado (request {request_id})")
+            
+            self.db.query(CreditRequest).filter(
+                CreditRequest.request_id == request_id
+            ).update({CreditRequest.matching_status: MatchingStatus.DONE}, synchronize_session=False)
+            self.db.commit()
+            
+            self.db.refresh(credit_request)
+            self._publish(request_id, credit_request.status)
+        
+        return len(requests)
+    
+    def _publish(self, request_id: str, status: CreditRequestStatus) -> None:
+        notifier.publish(request_id, {
+            "request_id": request_id,
+            "status": status.value,
+            "matching_status": MatchingStatus.DONE.value
+        })
+
+
+# Pool de workers de matching (iniciado no startup da aplicação)
+credit_matching_workers = WorkerPool(
+    "credit_matching",
+    handler=lambda db: CreditMatchingQueue(db).process_batch(settings.CREDIT_MATCHING_BATCH_SIZE),
+    workers=settings.CREDIT_MATCHING_WORKERS
+)
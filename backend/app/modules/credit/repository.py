@@ -1,6 +1,15 @@
 from sqlalchemy.orm import Session
 from typing import Optional, List
-from app.models.models import CreditRequest
+from app.models.models import CreditRequest, CreditRequestStatus
+
+
+class CreditRequestNotPending(Exception):
+    """A solicitação deixou de estar PENDING (financiada/rejeitada por outra transação)."""
+    
+    def __init__(self, request_id: str, status: CreditRequestStatus):
+        super().__init__(f"Solicitação {request_id} não está mais pendente ({status.value})")
+        self.request_id = request_id
+        self.status = status
 
 
 class CreditRepository:
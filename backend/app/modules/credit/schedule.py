@@ -0,0 +1,152 @@
+"""
+Cronograma de parcelas (Sistema Price ou SAC).
+
+O cronograma não é gravado no desembolso: cada parcela é calculada a partir de
+(principal, taxa, prazo, disbursed_at), com vencimentos a cada 30 dias. Só as
+parcelas que vencem (e a partir daí são cobradas e pagas) viram linha em
+loan_payments, materializadas pelo servicing e pela cobrança; o empréstimo
+guarda apenas a próxima parcela a materializar (next_installment/next_due_date).
+
+Desembolso individual, clearing em lote, materialização e API usam as mesmas
+funções, então todos os caminhos enxergam exatamente as mesmas parcelas. A
+simulação em grade usa price_installments, a mesma fórmula sobre arrays NumPy.
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from app.core.money import CENT
+from app.models.models import AmortizationSystem
+
+DateLike = Union[date, datetime]
+
+
+def _price_factor(monthly_rate, months):
+    """Fator da Tabela Price i·(1+i)^n / ((1+i)^n − 1), para float ou array NumPy (i > 0)."""
+    growth = (1 + monthly_rate) ** months
+    return monthly_rate * growth / (growth - 1)
+
+
+def price_installment(principal: float, annual_rate: float, months: int) -> float:
+    """Valor da parcela fixa (Sistema Price) para taxa anual em %."""
+    monthly_rate = annual_rate / 100 / 12
+    if monthly_rate > 0:
+        return principal * _price_factor(monthly_rate, months)
+    return principal / months
+
+
+def price_installments(principal: np.ndarray, annual_rate: np.ndarray, months: np.ndarray) -> np.ndarray:
+    """`price_installment` com broadcasting (taxa zero → principal/prazo)."""
+    monthly_rate = annual_rate / 100 / 12
+    safe_rate = np.where(monthly_rate > 0, monthly_rate, 1.0)
+    return np.where(monthly_rate > 0, principal * _price_factor(safe_rate, months), principal / months)
+
+
+def installment_amount(
+    principal,
+    annual_rate,
+    months: int,
+    number: int = 1,
+    system: AmortizationSystem = AmortizationSystem.PRICE
+) -> Decimal:
+    """
+    Valor da parcela `number` em reais, arredondado em centavos (valor gravado em amount_due).
+    
+    Price: parcela fixa. SAC: amortização P/n mais juros sobre o saldo anterior.
+    """
+    if system == AmortizationSystem.SAC:
+        amortization = float(principal) / months
+        balance = float(principal) - amortization * (number - 1)
+        value = amortization + balance * float(annual_rate) / 1200
+    else:
+        value = price_installment(float(principal), float(annual_rate), months)
+    return Decimal(str(value)).quantize(CENT)
+
+
+def installments_total(
+    principal,
+    annual_rate,
+    months: int,
+    first: int,
+    last: int,
+    system: AmortizationSystem = AmortizationSystem.PRICE
+) -> Decimal:
+    """Soma das parcelas `first`..`last` em forma fechada (sem percorrer o cronograma)."""
+    count = last - first + 1
+    if count <= 0:
+        return Decimal("0.00")
+    if system == AmortizationSystem.SAC:
+        # Σ (A + i·(P − (j−1)·A)) para j = first..last
+        amortization = float(principal) / months
+        rate = float(annual_rate) / 1200
+        prior_sum = (first - 1 + last - 1) * count / 2
+        value = count * amortization + rate * (count * float(principal) - amortization * prior_sum)
+        return Decimal(str(value)).quantize(CENT)
+    return installment_amount(principal, annual_rate, months) * count
+
+
+def due_date(start: DateLike, number: int) -> date:
+    """Vencimento da parcela `number` (a primeira vence 30 dias após o desembolso)."""
+    start_date = start.date() if isinstance(start, datetime) else start
+    return start_date + timedelta(days=30 * number)
+
+
+def installments_due(start: DateLike, months: int, as_of: date) -> int:
+    """Quantas parcelas já venceram até `as_of` (inclusive)."""
+    start_date = start.date() if isinstance(start, datetime) else start
+    return max(0, min(months, (as_of - start_date).days // 30))
+
+
+def schedule_fields(start: Optional[DateLike] = None) -> Dict[str, object]:
+    """Colunas do cronograma compacto de um empréstimo recém-desembolsado."""
+    return {"next_installment": 1, "next_due_date": due_date(start or datetime.now(), 1)}
+
+
+def scheduled_installments(
+    principal,
+    annual_rate,
+    months: int,
+    start: DateLike,
+    first: int = 1,
+    last: Optional[int] = None,
+    system: AmortizationSystem = AmortizationSystem.PRICE
+) -> List[dict]:
+    """Parcelas `first`..`last` calculadas (sem acesso ao banco)."""
+    return [
+        {
+            "installment_number": number,
+            "amount_due": installment_amount(principal, annual_rate, months, number, system),
+            "due_date": due_date(start, number)
+        }
+        for number in range(first, (last or months) + 1)
+    ]
+
+
+def remaining_principal(
+    principal,
+    annual_rate,
+    months: int,
+    paid: int,
+    system: AmortizationSystem = AmortizationSystem.PRICE
+) -> Decimal:
+    """
+    Saldo devedor após `paid` parcelas, em forma fechada.
+    
+    Price: B_k = P·(1+i)^k − PMT·((1+i)^k − 1)/i
+    SAC:   B_k = P − k·P/n
+    """
+    if paid >= months:
+        return Decimal("0.00")
+    principal = float(principal)
+    if system == AmortizationSystem.SAC:
+        return Decimal(str(principal - paid * principal / months)).quantize(CENT)
+    monthly_rate = float(annual_rate) / 100 / 12
+    payment = price_installment(principal, float(annual_rate), months)
+    if monthly_rate > 0:
+        growth = (1 + monthly_rate) ** paid
+        balance = principal * growth - payment * (growth - 1) / monthly_rate
+    else:
+        balance = principal - payment * paid
+    return Decimal(str(max(balance, 0.0))).quantize(CENT)
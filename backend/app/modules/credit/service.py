@@ -1,22 +1,45 @@
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_DOWN
 import uuid
 import logging
 
-from .repository import CreditRepository
-from app.modules.wallet.repository import WalletRepository
-from app.modules.pool.repository import PoolRepository
+from .repository import CreditRepository, CreditRequestNotPending
+from .clearing import CreditClearing
+from .matching import credit_matching_workers
+from .compatibility import borrower_score, find_compatible_pools
+from .dashboard import cached_dashboard, invalidate_borrower_dashboard
+from .simulation import axis_values, simulate_grid
+from .schedule import due_date, installment_amount, price_installment, schedule_fields
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.database import run_in_transaction
+from app.modules.party import PartyResolver
+from app.modules.wallet.repository import WalletRepository, InsufficientFundsError
+from app.modules.pool.capacity import invalidate_pool_capacity
+from app.modules.pool.repository import PoolRepository, PoolCapacityConflict
 from app.models.models import (
     Loan, LoanStatus, LoanPayment, PaymentStatus, Transaction, TransactionType,
-    CreditRequest, CreditRequestStatus, Pool, PoolStatus, PoolLoan,
-    User, Currency, OwnerType, TransactionStatus
+    CollateralType, CreditRequest, CreditRequestStatus, Pool, PoolStatus, PoolLoan,
+    User, Investor, Currency, OwnerType, TransactionStatus, ApprovalType, MatchingStatus
 )
 
 logger = logging.getLogger(__name__)
 
 
+def pro_rata_shares(values: List[Decimal], places: int = 4) -> List[Decimal]:
+    """Participação percentual de cada valor no total; o resíduo do arredondamento vai para a maior."""
+    total = sum(values, Decimal(0))
+    quantum = Decimal(1).scaleb(-places)
+    shares = [(value * 100 / total).quantize(quantum, rounding=ROUND_DOWN) for value in values]
+    largest = max(range(len(values)), key=lambda i: values[i])
+    shares[largest] += Decimal(100) - sum(shares, Decimal(0))
+    return shares
+
+
 class CreditService:
     """Service layer para lógica de negócio de crédito."""
     
@@ -39,6 +62,7 @@ class CreditService:
                 - collateral_type: Tipo de garantia (opcional)
                 - collateral_description: Descrição da garantia (opcional)
                 - approval_type: 'automatic', 'manual' ou 'both'
+                - async: True para gravar como PENDING e fazer o matching em background
         
         Returns:
             Dicionário com dados da solicitação e status de aprovação
@@ -47,7 +71,6 @@ class CreditService:
         user_id = data.get('user_id')
         amount_requested = data.get('amount_requested')
         duration_months = data.get('duration_months')
-        approval_type = data.get('approval_type', 'automatic')
         
         if not all([user_id, amount_requested, duration_months]):
             raise HTTPException(
@@ -61,6 +84,14 @@ class CreditService:
                 detail="O valor mínimo é R$ 100"
             )
         
+        try:
+            approval_type = ApprovalType(str(data.get('approval_type') or 'automatic').lower())
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail="approval_type deve ser 'automatic', 'manual' ou 'both'"
+            )
+        
         # Buscar usuário e verificar score
         user = self.db.query(User).filter(User.user_id == user_id).first()
         if not user:
@@ -69,8 +100,8 @@ class CreditService:
                 detail="Usuário não encontrado"
             )
         
-        # Usar calculated_score ou credit_score
-        user_score = user.calculated_score if user.calculated_score else user.credit_score
+        # Matching em background: a solicitação é gravada como PENDING e enfileirada
+        deferred = approval_type != ApprovalType.MANUAL and self._is_async(data)
         
         # Criar solicitação
         request_data = {
@@ -83,40 +114,112 @@ class CreditService:
             'collateral_type': data.get('collateral_type', 'NONE'),
             'collateral_description': data.get('collateral_description'),
             'collateral_docs': data.get('collateral_docs'),
+            'approval_type': approval_type,
+            'matching_status': MatchingStatus.QUEUED if deferred else None,
             'requested_at': datetime.now()
         }
         
         credit_request = self.repository.create_credit_request(request_data)
         logger.info(f"[CreditService] Credit request criado: {credit_request.request_id}")
         
-        # Se for automático ou ambos, tentar matching com pools
-        if approval_type in ['automatic', 'both']:
-            try:
-                matched = self._try_automatic_matching(
-                    credit_request=credit_request,
-                    user_score=user_score,
-                    user=user
-                )
-                
-                if matched:
-                    logger.info(f"[CreditService] Matching automático bem-sucedido para request {credit_request.request_id}")
-                    # Recarregar para pegar status atualizado
-                    self.db.refresh(credit_request)
-                elif approval_type == 'both':
-                    logger.info(f"[CreditService] Sem match automático, enviando para marketplace manual")
-                else:
-                    logger.info(f"[CreditService] Sem match automático e tipo é 'automatic', rejeitando")
-                    credit_request.status = CreditRequestStatus.REJECTED
-                    self.db.commit()
-                    
-            except Exception as e:
-                logger.error(f"[CreditService] Erro no matching automático: {str(e)}")
-                if approval_type == 'automatic':
-                    credit_request.status = CreditRequestStatus.REJECTED
-                    self.db.commit()
+        if deferred:
+            credit_matching_workers.notify()
+            logger.info(f"[CreditService] Request {credit_request.request_id} enfileirado para matching")
+        elif approval_type != ApprovalType.MANUAL:
+            self.run_matching(credit_request, user)
         
         return self._to_dict(credit_request)
     
+    def run_matching(self, credit_request: CreditRequest, user: User) -> bool:
+        """
+        Executa o matching automático e aplica o desfecho conforme approval_type.
+        
+        - automatic: sem match (ou erro), a solicitação é rejeitada
+        - both: sem match, segue PENDING no marketplace manual
+        
+        Returns:
+            True se um empréstimo foi criado
+        """
+        # Usar calculated_score ou credit_score
+        user_score = user.calculated_score if user.calculated_score else user.credit_score
+        approval_type = credit_request.approval_type or ApprovalType.AUTOMATIC
+        matched = False
+        
+        try:
+            matched = self._try_automatic_matching(
+                credit_request=credit_request,
+                user_score=user_score,
+                user=user
+            )
+            
+            if matched:
+                logger.info(f"[CreditService] Matching automático bem-sucedido para request {credit_request.request_id}")
+                # Recarregar para pegar status atualizado
+                self.db.refresh(credit_request)
+            elif approval_type == ApprovalType.BOTH:
+                logger.info(f"[CreditService] Sem match automático, enviando para marketplace manual")
+            else:
+                logger.info(f"[CreditService] Sem match automático e tipo é 'automatic', rejeitando")
+                self._reject_if_pending(credit_request)
+        
+        except CreditRequestNotPending as e:
+            # Financiada (ou rejeitada) por outro caminho durante o matching: mantém o desfecho
+            logger.info(f"[CreditService] {e}; matching descartado")
+            self.db.refresh(credit_request)
+        except Exception as e:
+            logger.error(f"[CreditService] Erro no matching automático: {str(e)}")
+            self.db.rollback()
+            if approval_type == ApprovalType.AUTOMATIC:
+                self._reject_if_pending(credit_request)
+        
+        return matched
+    
+    def _reject_if_pending(self, credit_request: CreditRequest) -> None:
+        """Rejeita a solicitação só se ainda estiver PENDING (não sobrescreve um financiamento concorrente)."""
+        self.db.query(CreditRequest).filter(
+            CreditRequest.request_id == credit_request.request_id,
+            CreditRequest.status == CreditRequestStatus.PENDING
+        ).update({CreditRequest.status: CreditRequestStatus.REJECTED}, synchronize_session=False)
+        self.db.commit()
+        self.db.refresh(credit_request)
+    
+    def run_clearing(self) -> dict:
+        """
+        Clearing das solicitações PENDING fora da fila de matching.
+        
+        Considera as solicitações 'automatic'/'both' que aguardam no marketplace
+        (até CREDIT_CLEARING_MAX_REQUESTS, mais antigas primeiro) e aloca todas
+        de uma vez contra as pools ativas. As não alocadas seguem PENDING.
+        """
+        request_ids = [
+            request_id for (request_id,) in self.db.query(CreditRequest.request_id).filter(
+                CreditRequest.status == CreditRequestStatus.PENDING,
+                CreditRequest.approval_type != ApprovalType.MANUAL,
+                or_(
+                    CreditRequest.matching_status.is_(None),
+                    CreditRequest.matching_status == MatchingStatus.DONE
+                )
+            ).order_by(CreditRequest.requested_at).limit(settings.CREDIT_CLEARING_MAX_REQUESTS).all()
+        ]
+        matched = CreditClearing(self.db).run(request_ids)
+        return {
+            "candidates": len(request_ids),
+            "matched": len(matched),
+            "allocations": [
+                {"request_id": request_id, "pool_id": pool_id}
+                for request_id, pool_id in matched.items()
+            ]
+        }
+    
+    def _is_async(self, data: dict) -> bool:
+        """
+        Modo de matching: CREDIT_MATCHING_MODE, que o campo "async" do body só
+        pode desligar (no modo sync o worker de matching não roda).
+        """
+        if settings.CREDIT_MATCHING_MODE != "async":
+            return False
+        return data.get('async') is None or bool(data.get('async'))
+    
     def _try_automatic_matching(
         self, 
         credit_request: CreditRequest, 
@@ -143,6 +246,10 @@ class CreditService:
             logger.info("[CreditService] Nenhuma pool ativa disponível")
             return False
         
+        # Capacidade já alocada de todas as pools em uma única consulta agregada
+        allocated = self.pool_repository.get_allocated_amounts([pool.pool_id for pool in active_pools])
+        amount = Decimal(str(credit_request.amount_requested))
+        
         # Filtrar pools compatíveis com critérios
         compatible_pools = []
         for pool in active_pools:
@@ -151,7 +258,7 @@ class CreditService:
                 logger.debug(f"Pool {pool.pool_id} requer score {pool.min_score}, usuário tem {user_score}")
                 continue
             
-            if pool.requires_collateral and credit_request.collateral_type.value == 'NONE':
+            if pool.requires_collateral and credit_request.collateral_type in (None, CollateralType.NONE):
                 logger.debug(f"Pool {pool.pool_id} requer garantia, solicitação não tem")
                 continue
             
@@ -159,18 +266,10 @@ class CreditService:
                 logger.debug(f"Pool {pool.pool_id} permite max {pool.max_term_months} meses, solicitado {credit_request.duration_months}")
                 continue
             
-            # Verificar se a pool tem saldo disponível
-            # raised_amount é o capital total da pool
-            # Precisamos calcular quanto já foi alocado
-            allocated = self.db.query(PoolLoan).filter(
-                PoolLoan.pool_id == pool.pool_id
-            ).all()
-            
-            total_allocated = sum(float(pl.allocated_amount) for pl in allocated)
-            available = float(pool.raised_amount) - total_allocated
-            
-            if available < float(credit_request.amount_requested):
-                logger.debug(f"Pool {pool.pool_id} tem apenas R$ {available:.2f} disponível, solicitado R$ {credit_request.amount_requested}")
+            # raised_amount é o capital total da pool; disponível = raised - alocado
+            available = Decimal(str(pool.raised_amount or 0)) - allocated.get(pool.pool_id, Decimal(0))
+            if available <= 0:
+                logger.debug(f"Pool {pool.pool_id} sem capacidade disponível")
                 continue
             
             compatible_pools.append((pool, available))
@@ -180,162 +279,210 @@ class CreditService:
             return False
         
         # Ordenar por melhor match (maior taxa de retorno esperado)
-        compatible_pools.sort(key=lambda x: float(x[0].expected_return), reverse=True)
-        selected_pool = compatible_pools[0][0]
-        
-        logger.info(f"[CreditService] Pool selecionada: {selected_pool.name} (ID: {selected_pool.pool_id})")
+        compatible_pools.sort(key=lambda x: float(x[0].expected_return or 0), reverse=True)
+        
+        # A capacidade lida acima pode ser consumida por matchings concorrentes: a reserva
+        # no desembolso é condicional e, em conflito, tenta a próxima melhor candidata
+        # (sem recarregar a lista)
+        while compatible_pools:
+            allocations = self._plan_allocations(amount, compatible_pools)
+            if not allocations:
+                return False
+            try:
+                return self._create_loan_from_pools(
+                    credit_request=credit_request,
+                    allocations=allocations,
+                    user=user
+                )
+            except PoolCapacityConflict as conflict:
+                metrics.increment("credit.matching.capacity_conflicts")
+                logger.info(f"[CreditService] {conflict}; tentando a próxima pool candidata")
+                compatible_pools = [
+                    (pool, available) for pool, available in compatible_pools
+                    if pool.pool_id != conflict.pool_id
+                ]
+        
+        logger.info("[CreditService] Pools candidatas esgotadas por alocações concorrentes")
+        return False
+    
+    def _plan_allocations(
+        self,
+        amount: Decimal,
+        candidates: List[Tuple[Pool, Decimal]]
+    ) -> Optional[List[Tuple[Pool, Decimal]]]:
+        """
+        Pool de maior retorno que comporta o valor inteiro ou, se nenhuma
+        comporta, a divisão entre várias pools.
         
-        # Criar empréstimo
-        loan_created = self._create_loan_from_pool(
-            credit_request=credit_request,
-            pool=selected_pool,
-            user=user
+        Returns:
+            Lista de (pool, valor alocado) ou None se não for possível
+        """
+        whole = [pool for pool, available in candidates if available >= amount]
+        if whole:
+            selected_pool = whole[0]
+            logger.info(f"[CreditService] Pool selecionada: {selected_pool.name} (ID: {selected_pool.pool_id})")
+            return [(selected_pool, amount)]
+        
+        # Nenhuma pool comporta o valor inteiro: tenta dividir entre várias
+        allocations = self._plan_split_funding(amount, candidates)
+        if not allocations:
+            logger.info(f"[CreditService] Nenhuma pool comporta R$ {amount} e a divisão entre pools não é possível")
+            return None
+        logger.info(
+            f"[CreditService] Financiamento dividido entre {len(allocations)} pools: "
+            + ", ".join(f"{pool.name} (R$ {value})" for pool, value in allocations)
         )
+        return allocations
+    
+    def _plan_split_funding(
+        self,
+        amount: Decimal,
+        candidates: List[Tuple[Pool, Decimal]]
+    ) -> Optional[List[Tuple[Pool, Decimal]]]:
+        """
+        Divide o valor entre várias pools compatíveis (capacidade já calculada).
         
-        return loan_created
+        Preenche pelas pools de maior retorno; se isso exigir mais que
+        CREDIT_SPLIT_MAX_POOLS pools, tenta pelas de maior capacidade.
+        Pools com menos de CREDIT_SPLIT_MIN_ALLOCATION disponível são ignoradas.
+        
+        Returns:
+            Lista de (pool, valor alocado) ou None se não for possível
+        """
+        if not settings.CREDIT_SPLIT_FUNDING_ENABLED:
+            return None
+        min_allocation = Decimal(str(settings.CREDIT_SPLIT_MIN_ALLOCATION))
+        usable = [(pool, available) for pool, available in candidates if available >= min_allocation]
+        if sum((available for _, available in usable), Decimal(0)) < amount:
+            return None
+        
+        for ordering in (usable, sorted(usable, key=lambda x: x[1], reverse=True)):
+            allocations = []
+            remaining = amount
+            for pool, available in ordering:
+                if len(allocations) == settings.CREDIT_SPLIT_MAX_POOLS:
+                    break
+                portion = min(available, remaining).quantize(Decimal("0.01"), rounding=ROUND_DOWN)
+                allocations.append((pool, portion))
+                remaining -= portion
+                if remaining <= 0:
+                    return allocations
+        return None
     
-    def _create_loan_from_pool(
+    def _create_loan_from_pools(
         self,
         credit_request: CreditRequest,
-        pool: Pool,
+        allocations: List[Tuple[Pool, Decimal]],
         user: User
     ) -> bool:
         """
-        Cria empréstimo a partir de uma pool e efetua transferência.
+        Cria empréstimo financiado por uma ou mais pools e efetua a transferência.
+        
+        Cada pool recebe um PoolLoan com o valor alocado e a participação
+        pro-rata no empréstimo; o Loan aponta para a pool de maior participação.
+        Tudo em uma única transação.
         
         Args:
             credit_request: Solicitação de crédito
-            pool: Pool que vai fornecer o crédito
+            allocations: (pool, valor) de cada pool financiadora
             user: Usuário tomador
         
         Returns:
             True se empréstimo foi criado com sucesso
         """
-        try:
-            # Definir taxa de juros (usar a mínima da pool ou a solicitada, o que for maior)
-            interest_rate = max(
-                float(credit_request.interest_rate or 0),
-                float(pool.min_interest_rate or 0)
-            )
-            
-            # Criar registro de alocação da pool
-            pool_loan = PoolLoan(
-                pool_loan_id=str(uuid.uuid4()),
-                pool_id=pool.pool_id,
-                credit_request_id=credit_request.request_id,
-                allocated_amount=credit_request.amount_requested,
-                status=LoanStatus.ACTIVE,
-                allocated_at=datetime.now()
-            )
-            self.db.add(pool_loan)
+        principal = sum((value for _, value in allocations), Decimal(0))
+        lead_pool = max(allocations, key=lambda x: x[1])[0]
+        shares = pro_rata_shares([value for _, value in allocations])
+        
+        # Definir taxa de juros (a solicitada ou a mínima exigida pelas pools, o que for maior)
+        interest_rate = max(
+            [float(credit_request.interest_rate or 0)]
+            + [float(pool.min_interest_rate or 0) for pool, _ in allocations]
+        )
+        
+        def disburse() -> Loan:
+            now = datetime.now()
+            # Relê a solicitação com lock: investimento direto ou outro worker pode tê-la financiado
+            locked_request = self.db.query(CreditRequest).filter(
+                CreditRequest.request_id == credit_request.request_id
+            ).with_for_update().populate_existing().one()
+            if locked_request.status != CreditRequestStatus.PENDING:
+                raise CreditRequestNotPending(locked_request.request_id, locked_request.status)
+            
+            # Reserva atômica da capacidade (ordem fixa por pool_id evita deadlock entre divisões)
+            for pool, value in sorted(allocations, key=lambda x: x[0].pool_id):
+                if not self.pool_repository.reserve_capacity(pool.pool_id, value):
+                    raise PoolCapacityConflict(pool.pool_id, value)
+            
+            # Criar registros de alocação das pools
+            for (pool, value), share in zip(allocations, shares):
+                self.db.add(PoolLoan(
+                    pool_loan_id=str(uuid.uuid4()),
+                    pool_id=pool.pool_id,
+                    credit_request_id=credit_request.request_id,
+                    allocated_amount=value,
+                    share_percentage=share,
+                    status=LoanStatus.ACTIVE,
+                    allocated_at=now
+                ))
             
             # Criar empréstimo
             loan = Loan(
                 loan_id=str(uuid.uuid4()),
                 credit_request_id=credit_request.request_id,
                 user_id=user.user_id,
-                pool_id=pool.pool_id,
-                principal=credit_request.amount_requested,
+                pool_id=lead_pool.pool_id,
+                principal=principal,
                 interest_rate=interest_rate,
                 duration_months=credit_request.duration_months,
                 status=LoanStatus.ACTIVE,
-                disbursed_at=datetime.now()
+                disbursed_at=now,
+                **schedule_fields(now)
             )
             self.db.add(loan)
             
             # Atualizar status do credit request
             credit_request.status = CreditRequestStatus.APPROVED
-            credit_request.approved_at = datetime.now()
-            
-            # Buscar carteira BRL do tomador
-            user_wallets = self.wallet_repository.get_wallet_by_owner(user.user_id, 'USER')
-            user_brl_wallet = next((w for w in user_wallets if w.currency == 'BRL'), None)
-            
-            if not user_brl_wallet:
-                # Criar carteira BRL se não existir
-                from app.models.models import Wallet
-                user_brl_wallet = Wallet(
-                    wallet_id=str(uuid.uuid4()),
-                    owner_id=user.user_id,
-                    owner_type=OwnerType.USER,
-                    currency=Currency.BRL,
-                    balance=0,
-                    blocked=0
-                )
-                self.db.add(user_brl_wallet)
-                self.db.flush()  # Para obter o ID
-            
-            # Creditar valor na carteira do tomador
-            new_balance = float(user_brl_wallet.balance) + float(credit_request.amount_requested)
-            self.wallet_repository.update_balance(user_brl_wallet.wallet_id, new_balance)
+            credit_request.approved_at = now
             
-            # Criar transação
-            transaction = Transaction(
-                transaction_id=str(uuid.uuid4()),
-                sender_id=pool.investor_id,
-                sender_type=OwnerType.INVESTOR,
-                receiver_id=user.user_id,
-                receiver_type=OwnerType.USER,
-                wallet_id=user_brl_wallet.wallet_id,
-                amount=credit_request.amount_requested,
-                currency=Currency.BRL,
-                type=TransactionType.INVESTMENT,
-                status=TransactionStatus.COMPLETED,
-                description=f"Empréstimo via pool {pool.name}",
-                created_at=datetime.now()
+            # Buscar carteira BRL do tomador e creditar o valor (com lock)
+            user_brl_wallet = self.wallet_repository.get_wallet(
+                user.user_id, OwnerType.USER, Currency.BRL, create=True
             )
-            self.db.add(transaction)
-            
-            # Criar parcelas do empréstimo
-            self._create_loan_payments(loan)
-            
-            self.db.commit()
+            self.wallet_repository.credit(user_brl_wallet.wallet_id, principal)
+            
+            # Criar uma transação por pool financiadora
+            for pool, value in allocations:
+                self.db.add(Transaction(
+                    transaction_id=str(uuid.uuid4()),
+                    sender_id=pool.investor_id,
+                    sender_type=OwnerType.INVESTOR,
+                    receiver_id=user.user_id,
+                    receiver_type=OwnerType.USER,
+                    wallet_id=user_brl_wallet.wallet_id,
+                    amount=value,
+                    currency=Currency.BRL,
+                    type=TransactionType.INVESTMENT,
+                    status=TransactionStatus.COMPLETED,
+                    description=f"Empréstimo via pool {pool.name}",
+                    created_at=now
+                ))
+            return loan
+        
+        try:
+            loan = run_in_transaction(self.db, disburse, name="credit_disburse")
+            invalidate_borrower_dashboard([user.user_id])
+            invalidate_pool_capacity()
             
             logger.info(f"[CreditService] Empréstimo {loan.loan_id} criado com sucesso")
             return True
             
+        except (PoolCapacityConflict, CreditRequestNotPending):
+            raise
         except Exception as e:
-            self.db.rollback()
             logger.error(f"[CreditService] Erro ao criar empréstimo: {str(e)}")
             raise
     
-    def _create_loan_payments(self, loan: Loan) -> None:
-        """
-        Cria as parcelas do empréstimo.
-        
-        Args:
-            loan: Empréstimo
-        """
-        # Calcular valor da parcela (principal + juros / número de meses)
-        principal = float(loan.principal)
-        interest_rate_monthly = float(loan.interest_rate) / 100 / 12
-        n_payments = loan.duration_months
-        
-        # Fórmula de parcela fixa (Sistema Price)
-        if interest_rate_monthly > 0:
-            monthly_payment = principal * (
-                interest_rate_monthly * (1 + interest_rate_monthly) ** n_payments
-            ) / (
-                (1 + interest_rate_monthly) ** n_payments - 1
-            )
-        else:
-            monthly_payment = principal / n_payments
-        
-        # Criar parcelas
-        for i in range(1, n_payments + 1):
-            due_date = datetime.now() + timedelta(days=30 * i)
-            
-            payment = LoanPayment(
-                payment_id=str(uuid.uuid4()),
-                loan_id=loan.loan_id,
-                installment_number=i,
-                amount_due=monthly_payment,
-                amount_paid=0,
-                due_date=due_date.date(),
-                status=PaymentStatus.PENDING
-            )
-            self.db.add(payment)
-    
     def get_credit_request(self, request_id: str) -> dict:
         """
         Busca solicitação de crédito por ID.
@@ -373,17 +520,46 @@ class CreditService:
         """
         Retorna dados consolidados do dashboard do tomador.
         
+        Duas consultas, independente do número de empréstimos: empréstimos
+        ativos com total pago (subconsulta agregada), nome da pool e do
+        investidor (joins); e transações recentes. Próxima parcela e
+        vencimento vêm do cronograma calculado. O resultado fica em cache
+        até o próximo desembolso ou cobrança do tomador.
+        
         Args:
             user_id: ID do usuário
         
         Returns:
             Dicionário com empréstimos ativos, transações e estatísticas
         """
-        # Buscar empréstimos ativos
-        active_loans = self.db.query(Loan).filter(
+        return cached_dashboard(user_id, lambda: self._build_borrower_dashboard(user_id))
+    
+    def _build_borrower_dashboard(self, user_id: str) -> dict:
+        paid = self.db.query(
+            LoanPayment.loan_id.label("loan_id"),
+            func.sum(LoanPayment.amount_paid).label("amount_paid")
+        ).join(
+            Loan, Loan.loan_id == LoanPayment.loan_id
+        ).filter(
             Loan.user_id == user_id,
             Loan.status == LoanStatus.ACTIVE
-        ).all()
+        ).group_by(LoanPayment.loan_id).subquery()
+        
+        rows = self.db.query(
+            Loan,
+            func.coalesce(paid.c.amount_paid, 0),
+            Pool.name,
+            Investor.full_name
+        ).outerjoin(
+            paid, paid.c.loan_id == Loan.loan_id
+        ).outerjoin(
+            Pool, Pool.pool_id == Loan.pool_id
+        ).outerjoin(
+            Investor, Investor.investor_id == Loan.investor_id
+        ).filter(
+            Loan.user_id == user_id,
+            Loan.status == LoanStatus.ACTIVE
+        ).order_by(Loan.disbursed_at).all()
         
         # Buscar transações recentes (últimos 30 dias)
         thirty_days_ago = datetime.now() - timedelta(days=30)
@@ -393,66 +569,58 @@ class CreditService:
         ).order_by(Transaction.created_at.desc()).limit(10).all()
         
         # Calcular estatísticas
-        total_borrowed = sum(float(loan.principal or 0) for loan in active_loans)
-        # Para calcular total pago, precisamos buscar os pagamentos
-        total_paid = 0
-        for loan in active_loans:
-            payments = self.db.query(LoanPayment).filter(
-                LoanPayment.loan_id == loan.loan_id,
-                LoanPayment.status == PaymentStatus.PAID
-            ).all()
-            total_paid += sum(float(p.amount_paid or 0) for p in payments)
-        total_remaining = total_borrowed - total_paid
+        total_borrowed = sum(float(loan.principal or 0) for loan, _, _, _ in rows)
+        total_paid = sum(float(amount_paid) for _, amount_paid, _, _ in rows)
         
         return {
             "user_id": user_id,
-            "active_loans": [self._loan_to_dict(loan) for loan in active_loans],
+            "active_loans": [
+                self._loan_to_dict(loan, float(amount_paid), pool_name, investor_name)
+                for loan, amount_paid, pool_name, investor_name in rows
+            ],
             "recent_transactions": [self._transaction_to_dict(tx) for tx in recent_transactions],
             "statistics": {
                 "total_borrowed": total_borrowed,
                 "total_paid": total_paid,
-                "total_remaining": total_remaining,
-                "active_loans_count": len(active_loans)
+                "total_remaining": total_borrowed - total_paid,
+                "active_loans_count": len(rows)
             }
         }
     
-    def _loan_to_dict(self, loan: Loan) -> dict:
-        """Converte empréstimo para dicionário."""
+    def _loan_to_dict(
+        self,
+        loan: Loan,
+        amount_paid: float,
+        pool_name: Optional[str] = None,
+        investor_name: Optional[str] = None
+    ) -> dict:
+        """Converte empréstimo para dicionário (sem consultas: os nomes e o total pago vêm da query)."""
         # Calcular próximo pagamento e dias até vencimento
         next_payment_amount = None
         days_until_payment = None
         
         if loan.principal and loan.duration_months and loan.duration_months > 0:
-            monthly_payment = float(loan.principal) / loan.duration_months
-            next_payment_amount = monthly_payment
-            
-            # Calcular dias até próximo pagamento (estimativa baseada na data de desembolso)
-            if loan.disbursed_at:
+            next_payment_amount = float(installment_amount(
+                loan.principal, loan.interest_rate or 0, loan.duration_months,
+                min(loan.next_installment or 1, loan.duration_months), loan.amortization_system
+            ))
+            
+            # Próximo vencimento pelo cronograma (sem consultar as parcelas)
+            next_payment_date = loan.next_due_date
+            if next_payment_date is None and loan.disbursed_at:
                 months_since_disbursement = (datetime.now() - loan.disbursed_at).days // 30
-                next_payment_date = loan.disbursed_at + timedelta(days=(months_since_disbursement + 1) * 30)
-                days_until_payment = (next_payment_date - datetime.now()).days
-        
-        # Calcular total pago
-        payments = self.db.query(LoanPayment).filter(
-            LoanPayment.loan_id == loan.loan_id,
-            LoanPayment.status == PaymentStatus.PAID
-        ).all()
-        amount_paid = sum(float(p.amount_paid or 0) for p in payments)
+                next_payment_date = due_date(loan.disbursed_at, months_since_disbursement + 1)
+            if next_payment_date:
+                days_until_payment = (next_payment_date - datetime.now().date()).days
         
         # Determinar a fonte do empréstimo
         source = "Direto"
         loan_type = "direct"
         if loan.pool_id:
-            # Buscar nome da pool
-            from app.models.models import Pool
-            pool = self.db.query(Pool).filter(Pool.pool_id == loan.pool_id).first()
-            source = pool.name if pool else "Pool"
+            source = pool_name or "Pool"
             loan_type = "pool"
         elif loan.investor_id:
-            # Buscar nome do investidor
-            from app.models.models import User
-            investor = self.db.query(User).filter(User.user_id == loan.investor_id).first()
-            source = investor.name if investor else "Investidor"
+            source = investor_name or "Investidor"
         
         return {
             "id": loan.loan_id,
@@ -507,65 +675,36 @@ class CreditService:
             "count": len(approved_requests)
         }
     
-    def get_compatible_pools(self, user_id: str, amount: float, duration_months: int) -> dict:
+    def get_compatible_pools(
+        self,
+        user_id: str,
+        amount: float,
+        duration_months: int,
+        has_collateral: Optional[bool] = None
+    ) -> dict:
         """
         Retorna pools compatíveis com os critérios do usuário.
         
+        Consulta o snapshot de capacidade das pools e o cache de faixas
+        (score, garantia, prazo, valor): simulações repetidas não vão ao banco.
+        
         Args:
             user_id: ID do usuário
             amount: Valor solicitado
             duration_months: Prazo em meses
+            has_collateral: Se False, exclui pools que exigem garantia
         
         Returns:
             Dicionário com lista de pools compatíveis
         """
-        # Buscar usuário e score
-        user = self.db.query(User).filter(User.user_id == user_id).first()
-        if not user:
+        user_score = borrower_score(self.db, user_id)
+        if user_score is None:
             raise HTTPException(
                 status_code=404,
                 detail="Usuário não encontrado"
             )
         
-        user_score = user.calculated_score if user.calculated_score else user.credit_score
-        
-        # Buscar pools ativas
-        active_pools = self.db.query(Pool).filter(
-            Pool.status == PoolStatus.ACTIVE
-        ).all()
-        
-        compatible = []
-        for pool in active_pools:
-            # Verificar critérios
-            if user_score < pool.min_score:
-                continue
-            
-            if duration_months > pool.max_term_months:
-                continue
-            
-            # Calcular disponibilidade
-            allocated = self.db.query(PoolLoan).filter(
-                PoolLoan.pool_id == pool.pool_id
-            ).all()
-            
-            total_allocated = sum(float(pl.allocated_amount) for pl in allocated)
-            available = float(pool.raised_amount) - total_allocated
-            
-            if available < amount:
-                continue
-            
-            compatible.append({
-                "pool_id": pool.pool_id,
-                "name": pool.name,
-                "investor_id": pool.investor_id,
-                "available_amount": available,
-                "expected_return": float(pool.expected_return or 0),
-                "min_interest_rate": float(pool.min_interest_rate or 0),
-                "min_score": pool.min_score,
-                "requires_collateral": pool.requires_collateral,
-                "max_term_months": pool.max_term_months,
-                "risk_profile": pool.risk_profile.value if hasattr(pool.risk_profile, 'value') else pool.risk_profile
-            })
+        compatible = find_compatible_pools(self.db, user_score, duration_months, amount, has_collateral)
         
         return {
             "user_id": user_id,
@@ -622,6 +761,29 @@ class CreditService:
         
         return opportunities
     
+    def simulate(self, data: dict) -> dict:
+        """
+        Simula parcela, juros totais e CET para uma grade de valores, prazos e taxas.
+        
+        Cada eixo ('amounts', 'terms', 'rates') é uma lista ou um intervalo
+        {"start", "stop", "step"}; o produto dos tamanhos é limitado a
+        CREDIT_SIMULATION_MAX_CELLS.
+        """
+        max_cells = settings.CREDIT_SIMULATION_MAX_CELLS
+        try:
+            axes = [
+                axis_values(name, data.get(name), max_cells)
+                for name in ('amounts', 'terms', 'rates')
+            ]
+            cells = axes[0].size * axes[1].size * axes[2].size
+            if cells > max_cells:
+                raise ValueError(
+                    f"A grade tem {cells} combinações; máximo de {max_cells} por requisição"
+                )
+            return simulate_grid(*axes, upfront_fee_percent=float(data.get('upfront_fee_percent') or 0))
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
     def _calculate_risk_level(self, score: int) -> str:
         """Calcula nível de risco baseado no score."""
         if score >= 700:
@@ -633,12 +795,7 @@ class CreditService:
     
     def _estimate_monthly_payment(self, principal: float, annual_rate: float, months: int) -> float:
         """Estima valor da parcela mensal usando Tabela Price."""
-        if annual_rate == 0:
-            return principal / months
-        
-        monthly_rate = annual_rate / 100 / 12
-        pmt = principal * (monthly_rate * (1 + monthly_rate) ** months) / ((1 + monthly_rate) ** months - 1)
-        return round(pmt, 2)
+        return round(price_installment(principal, annual_rate, months), 2)
     
     def invest_in_credit_request(self, data: dict) -> dict:
         """
@@ -683,26 +840,24 @@ class CreditService:
         
         user_id = credit_request.user_id
         
-        # Buscar usuário tomador
-        user = self.db.query(User).filter(User.user_id == user_id).first()
-        if not user:
+        # Tomador e investidor em uma consulta (índice parties)
+        parties = PartyResolver(self.db).get_many([user_id, investor_id])
+        user = parties.get(user_id)
+        if not user or user.party_type != OwnerType.USER:
             raise HTTPException(
                 status_code=404,
                 detail="Usuário tomador não encontrado"
             )
         
-        # Buscar investidor
-        from app.models.models import Investor
-        investor = self.db.query(Investor).filter(Investor.investor_id == investor_id).first()
-        if not investor:
+        investor = parties.get(investor_id)
+        if not investor or investor.party_type != OwnerType.INVESTOR:
             raise HTTPException(
                 status_code=404,
                 detail="Investidor não encontrado"
             )
         
         # Buscar carteiras BRL
-        investor_wallets = self.wallet_repository.get_wallet_by_owner(investor_id, 'INVESTOR')
-        investor_wallet = next((w for w in investor_wallets if w.currency == 'BRL'), None)
+        investor_wallet = self.wallet_repository.get_wallet(investor_id, OwnerType.INVESTOR, Currency.BRL)
         
         if not investor_wallet:
             raise HTTPException(
@@ -710,41 +865,36 @@ class CreditService:
                 detail="Carteira BRL do investidor não encontrada"
             )
         
-        # Validar saldo do investidor
-        if float(investor_wallet.balance) < amount:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Saldo insuficiente. Disponível: R$ {float(investor_wallet.balance):.2f}"
-            )
-        
-        # Buscar ou criar carteira do tomador
-        user_wallets = self.wallet_repository.get_wallet_by_owner(user_id, 'USER')
-        user_wallet = next((w for w in user_wallets if w.currency == 'BRL'), None)
-        
-        if not user_wallet:
-            from app.models.models import Wallet
-            user_wallet = Wallet(
-                wallet_id=str(uuid.uuid4()),
-                owner_id=user_id,
-                owner_type=OwnerType.USER,
-                currency=Currency.BRL,
-                balance=0,
-                blocked=0
-            )
-            self.db.add(user_wallet)
-            self.db.flush()
-        
-        try:
-            # 1. Debitar do investidor
-            new_investor_balance = float(investor_wallet.balance) - amount
-            self.wallet_repository.update_balance(investor_wallet.wallet_id, new_investor_balance)
+        loan_id = str(uuid.uuid4())
+        
+        def fund() -> Transaction:
+            # Travar a solicitação para evitar financiamento duplo concorrente
+            locked_request = self.db.query(CreditRequest).filter(
+                CreditRequest.request_id == credit_request_id
+            ).with_for_update().populate_existing().first()
+            if locked_request.status == CreditRequestStatus.APPROVED:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Esta solicitação já foi aprovada"
+                )
+            if locked_request.status != CreditRequestStatus.PENDING:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Solicitação não está disponível para investimento (status: {locked_request.status.value})"
+                )
+            if locked_request.matching_status == MatchingStatus.MATCHING:
+                raise HTTPException(
+                    status_code=409,
+                    detail="Solicitação em processamento pelo matching automático; tente novamente"
+                )
+            
+            # Buscar ou criar carteira do tomador
+            user_wallet = self.wallet_repository.get_wallet(user_id, OwnerType.USER, Currency.BRL, create=True)
             
-            # 2. Creditar no tomador
-            new_user_balance = float(user_wallet.balance) + amount
-            self.wallet_repository.update_balance(user_wallet.wallet_id, new_user_balance)
+            # 1-2. Debitar do investidor e creditar no tomador (locks em ordem canônica)
+            self.wallet_repository.transfer(investor_wallet.wallet_id, user_wallet.wallet_id, amount)
             
             # 3. Criar Loan
-            loan_id = str(uuid.uuid4())
             loan = Loan(
                 loan_id=loan_id,
                 credit_request_id=credit_request_id,
@@ -753,8 +903,10 @@ class CreditService:
                 pool_id=None,
                 principal=amount,
                 interest_rate=interest_rate,
-                duration_months=credit_request.duration_months,
-                status=LoanStatus.ACTIVE
+                duration_months=locked_request.duration_months,
+                status=LoanStatus.ACTIVE,
+                disbursed_at=datetime.now(),
+                **schedule_fields()
             )
             self.db.add(loan)
             
@@ -775,17 +927,17 @@ class CreditService:
             )
             self.db.add(transaction)
             
-            # 5. Gerar parcelas
-            self._create_loan_payments(loan)
-            
-            # 6. Atualizar credit request
-            credit_request.status = CreditRequestStatus.APPROVED
-            credit_request.investor_id = investor_id
-            credit_request.interest_rate = interest_rate
-            credit_request.approved_at = datetime.now()
-            credit_request.updated_at = datetime.now()
-            
-            self.db.commit()
+            # 5. Atualizar credit request (as parcelas são calculadas a partir do empréstimo)
+            locked_request.status = CreditRequestStatus.APPROVED
+            locked_request.investor_id = investor_id
+            locked_request.interest_rate = interest_rate
+            locked_request.approved_at = datetime.now()
+            locked_request.updated_at = datetime.now()
+            return transaction
+        
+        try:
+            transaction = run_in_transaction(self.db, fund, name="credit_invest")
+            invalidate_borrower_dashboard([user_id])
             
             logger.info(f"[Investimento Direto] {investor.full_name} investiu R$ {amount:.2f} em {user.full_name}")
             
@@ -803,8 +955,14 @@ class CreditService:
                 "created_at": datetime.now().isoformat()
             }
             
+        except HTTPException:
+            raise
+        except InsufficientFundsError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Saldo insuficiente. Disponível: R$ {float(e.available):.2f}"
+            )
         except Exception as e:
-            self.db.rollback()
             logger.error(f"[Investimento Direto] Erro: {str(e)}")
             raise HTTPException(
                 status_code=500,
@@ -825,5 +983,7 @@ class CreditService:
             "interest_rate": float(entity.interest_rate) if entity.interest_rate else None,
             "requested_at": entity.requested_at.isoformat() if entity.requested_at else None,
             "approved_at": entity.approved_at.isoformat() if entity.approved_at else None,
-            "updated_at": entity.updated_at.isoformat() if entity.updated_at else None
+            "updated_at": entity.updated_at.isoformat() if entity.updated_at else None,
+            "approval_type": entity.approval_type.value if entity.approval_type else None,
+            "matching_status": entity.matching_status.value if entity.matching_status else None
         }
@@ -0,0 +1,137 @@
+"""
+Simulação em grade (valor × prazo × taxa) de empréstimos pelo Sistema Price.
+
+Os três eixos viram arrays NumPy com formatos (A,1,1), (1,T,1) e (1,1,R) e a
+fórmula da parcela do cronograma (schedule.price_installments) é aplicada por
+broadcasting, sem laço em Python por célula.
+
+CET (custo efetivo total): taxa r que iguala o valor líquido liberado (valor
+menos a tarifa inicial) ao valor presente das parcelas. Sem tarifa o CET é a
+própria taxa do contrato; com tarifa r é encontrado por bisseção vetorizada
+(o valor presente é decrescente em r).
+"""
+from typing import Any, Dict, Sequence, Union
+
+import numpy as np
+
+from .schedule import price_installments
+
+AxisSpec = Union[Sequence[float], Dict[str, float]]
+
+# Iterações de bisseção para o CET: intervalo [0, 1] a.m. reduzido a ~1e-15
+_CET_ITERATIONS = 50
+
+
+def axis_values(name: str, spec: AxisSpec, max_items: int) -> np.ndarray:
+    """
+    Valores de um eixo a partir de uma lista ou de {"start", "stop", "step"} (stop incluso).
+    
+    O tamanho de intervalos é calculado antes de gerar o array, então um passo
+    minúsculo é rejeitado sem alocar memória.
+    """
+    if isinstance(spec, dict):
+        try:
+            start, stop = float(spec["start"]), float(spec["stop"])
+            step = float(spec.get("step") or 1)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{name} deve ter start, stop e step numéricos")
+        if step <= 0 or stop < start:
+            raise ValueError(f"{name}: step deve ser positivo e stop >= start")
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        if count > max_items:
+            raise ValueError(f"{name}: máximo de {max_items} valores")
+        values = start + step * np.arange(count)
+    elif isinstance(spec, list):
+        if not spec:
+            raise ValueError(f"{name} não pode ser vazio")
+        if len(spec) > max_items:
+            raise ValueError(f"{name}: máximo de {max_items} valores")
+        try:
+            values = np.asarray(spec, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} deve conter apenas números")
+    else:
+        raise ValueError(f"{name} deve ser uma lista ou um intervalo {{start, stop, step}}")
+    if not np.all(np.isfinite(values)):
+        raise ValueError(f"{name} deve conter apenas números finitos")
+    return values
+
+
+def _present_value(payment: np.ndarray, rate: np.ndarray, months: np.ndarray) -> np.ndarray:
+    safe_rate = np.where(rate > 0, rate, 1.0)
+    annuity = np.where(rate > 0, (1 - (1 + safe_rate) ** -months) / safe_rate, months)
+    return payment * annuity
+
+
+def effective_monthly_rate(
+    net_amount: np.ndarray,
+    payment: np.ndarray,
+    months: np.ndarray,
+    contract_rate: np.ndarray
+) -> np.ndarray:
+    """Taxa mensal r com VP(parcelas, r) = valor líquido (bisseção em [taxa do contrato, 1])."""
+    low = np.broadcast_to(contract_rate, payment.shape).astype(np.float64)
+    high = np.ones_like(low)
+    for _ in range(_CET_ITERATIONS):
+        middle = (low + high) / 2
+        above = _present_value(payment, middle, months) > net_amount
+        low = np.where(above, middle, low)
+        high = np.where(above, high, middle)
+    return (low + high) / 2
+
+
+def simulate_grid(
+    amounts: np.ndarray,
+    terms: np.ndarray,
+    rates: np.ndarray,
+    upfront_fee_percent: float = 0.0
+) -> Dict[str, Any]:
+    """
+    Parcela, juros totais e CET para todas as combinações dos eixos.
+    
+    Args:
+        amounts: Valores solicitados (R$)
+        terms: Prazos em meses
+        rates: Taxas anuais em %
+        upfront_fee_percent: Tarifa cobrada na liberação, em % do valor (entra só no CET)
+    
+    Returns:
+        Matrizes [valor][prazo][taxa] em listas aninhadas
+    """
+    if np.any(amounts <= 0):
+        raise ValueError("amounts deve conter apenas valores positivos")
+    if np.any(terms < 1) or np.any(terms != np.floor(terms)):
+        raise ValueError("terms deve conter apenas meses inteiros >= 1")
+    if np.any(rates < 0):
+        raise ValueError("rates não pode conter taxas negativas")
+    if not 0 <= upfront_fee_percent < 100:
+        raise ValueError("upfront_fee_percent deve estar entre 0 e 100")
+    
+    principal = amounts[:, None, None]
+    months = terms[None, :, None]
+    annual_rate = rates[None, None, :]
+    
+    payment = price_installments(principal, annual_rate, months)
+    total_interest = payment * months - principal
+    
+    contract_rate = annual_rate / 100 / 12
+    if upfront_fee_percent > 0:
+        net_amount = principal * (1 - upfront_fee_percent / 100)
+        cet_monthly = effective_monthly_rate(net_amount, payment, months, contract_rate)
+    else:
+        cet_monthly = np.broadcast_to(contract_rate, payment.shape)
+    cet_annual = (1 + cet_monthly) ** 12 - 1
+    
+    return {
+        "amounts": amounts.round(2).tolist(),
+        "terms": terms.astype(int).tolist(),
+        "rates": rates.tolist(),
+        "upfront_fee_percent": upfront_fee_percent,
+        "shape": list(payment.shape),
+        "count": int(payment.size),
+        "monthly_payment": payment.round(2).tolist(),
+        "total_payment": (payment * months).round(2).tolist(),
+        "total_interest": total_interest.round(2).tolist(),
+        "cet_monthly_percent": (cet_monthly * 100).round(4).tolist(),
+        "cet_annual_percent": (cet_annual * 100).round(4).tolist()
+    }
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, Body
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from app.database import get_db
 from .service import CurrencyService
@@ -14,24 +14,67 @@ def convert_currency(
     db: Session = Depends(get_db)
 ):
     """
-    Converte valor entre moedas.
+    Converte valor entre moedas (taxas cruzadas trianguladas via BRL).
     
-    **Ainda não implementado - Placeholder**
+    **Body JSON (valor único):**
+    ```json
+    {
+        "amount": 100.0,
+        "from_currency": "USDT",
+        "to_currency": "EUR",
+        "at": "2024-05-10T14:30:00"  // opcional: cotação vigente nessa data
+    }
+    ```
+    
+    **Body JSON (lote):**
+    ```json
+    {
+        "amounts": [100.0, 250.5, 10.0],
+        "from_currency": "USDT",  // ou uma lista com uma moeda por valor
+        "to_currency": "BRL",
+        "at": ["2024-05-10T14:30:00", ...]  // opcional: uma data por valor
+    }
+    ```
     """
     service = CurrencyService(db)
+    if "amounts" in data:
+        return service.convert_batch(
+            data.get("amounts"),
+            data.get("from_currency"),
+            data.get("to_currency"),
+            data.get("at")
+        )
     result = service.convert_currency(
         data.get("amount"),
         data.get("from_currency"),
-        data.get("to_currency")
+        data.get("to_currency"),
+        data.get("at")
     )
     return result
 
 
 @router.get("/rates")
-def get_exchange_rates(db: Session = Depends(get_db)):
+def get_exchange_rates(base: Optional[str] = "BRL", db: Session = Depends(get_db)):
     """
-    Retorna taxas de câmbio atuais.
+    Retorna taxas de câmbio atuais (unidades de `base` por unidade de cada moeda).
     
-    **Ainda não implementado - Placeholder**
+    A tabela fica em memória e é recarregada do provider configurado
+    (FX_PROVIDER) quando o TTL expira.
     """
-    return {"message": "Exchange rates not implemented"}
+    service = CurrencyService(db)
+    return service.get_rates(base)
+
+
+@router.get("/revalue/{owner_id}")
+def revalue_transactions(
+    owner_id: str,
+    to_currency: str = "BRL",
+    limit: int = 5000,
+    db: Session = Depends(get_db)
+):
+    """
+    Reavalia as transações de um usuário/investidor pela cotação vigente na
+    data de cada transação (created_at), para relatórios e operações de SWAP.
+    """
+    service = CurrencyService(db)
+    return service.revalue_transactions(owner_id, to_currency, limit)
@@ -0,0 +1,193 @@
+"""
+Histórico de cotações com consulta point-in-time.
+
+Cada moeda tem uma série append-only (timestamps e cotações em BRL por unidade)
+guardada em dois array('d') contíguos. A consulta "qual cotação valia em t" é
+uma busca binária (bisect / numpy.searchsorted); reavaliar um histórico grande
+de transações é uma única busca vetorizada por moeda, em vez de uma consulta
+ao banco por linha.
+
+A série é persistida na tabela fx_rate_history e carregada sob demanda.
+Novas cotações entram pelo refresh da RateTable (só quando a cotação muda).
+"""
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+import logging
+import threading
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.models import Currency
+from .rates import CURRENCIES, CURRENCY_INDEX, _as_currency, rate_table
+from .repository import CurrencyRepository
+
+logger = logging.getLogger(__name__)
+
+
+def to_epoch(value: Union[datetime, float, int]) -> float:
+    """Converte datetime (naive = UTC) ou epoch para segundos epoch."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+class RateSeries:
+    """Série append-only de uma moeda: timestamps crescentes e cotações."""
+    
+    def __init__(self):
+        self.timestamps = array("d")
+        self.rates = array("d")
+    
+    def __len__(self) -> int:
+        return len(self.timestamps)
+    
+    def append(self, ts: float, rate: float) -> bool:
+        """
+        Adiciona um ponto ao fim da série.
+        
+        Returns:
+            False se o ponto foi ignorado (fora de ordem ou cotação inalterada)
+        """
+        if self.timestamps:
+            if ts < self.timestamps[-1]:
+                return False
+            if self.rates[-1] == rate:
+                return False
+        self.timestamps.append(ts)
+        self.rates.append(rate)
+        return True
+    
+    def at(self, ts: float) -> Optional[float]:
+        """Cotação vigente em `ts` (antes do primeiro ponto, usa o primeiro)."""
+        if not self.timestamps:
+            return None
+        i = bisect_right(self.timestamps, ts) - 1
+        return self.rates[max(i, 0)]
+    
+    def lookup_many(self, ts: np.ndarray) -> np.ndarray:
+        """Cotações vigentes para um vetor de timestamps (uma busca vetorizada)."""
+        timestamps = np.frombuffer(self.timestamps, dtype=np.float64)
+        rates = np.frombuffer(self.rates, dtype=np.float64)
+        idx = np.searchsorted(timestamps, ts, side="right") - 1
+        result = rates[np.clip(idx, 0, None)]
+        # Libera as views antes de retornar: array('d') não cresce com buffer exportado
+        del timestamps, rates
+        return result
+
+
+class RateHistory:
+    """Séries de cotação por moeda, carregadas do banco sob demanda."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Currency, RateSeries] = {c: RateSeries() for c in CURRENCIES}
+        self._loaded = False
+    
+    def ensure_loaded(self, db: Session) -> None:
+        """Carrega o histórico persistido (uma única consulta ordenada)."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            series = {c: RateSeries() for c in CURRENCIES}
+            for currency, observed_at, rate in CurrencyRepository(db).get_rate_history():
+                series[currency].append(to_epoch(observed_at), float(rate))
+            self._series = series
+            self._loaded = True
+            logger.info(f"[FX] Histórico carregado: {sum(len(s) for s in series.values())} pontos")
+    
+    def record_snapshot(self, brl_per_unit: Dict[str, float], observed_at: Optional[datetime] = None) -> None:
+        """
+        Registra as cotações de um refresh da RateTable.
+        
+        Apenas cotações que mudaram em relação ao último ponto são persistidas.
+        """
+        observed_at = observed_at or datetime.utcnow()
+        ts = to_epoch(observed_at)
+        db = SessionLocal()
+        try:
+            self.ensure_loaded(db)
+            rows = []
+            with self._lock:
+                for code, rate in brl_per_unit.items():
+                    currency = _as_currency(code)
+                    if currency != Currency.BRL and self._series[currency].append(ts, float(rate)):
+                        rows.append({"currency": currency, "observed_at": observed_at, "rate": rate})
+            if rows:
+                CurrencyRepository(db).insert_rates(rows)
+        except Exception as e:
+            logger.warning(f"[FX] Falha ao registrar histórico de cotações: {e}")
+        finally:
+            db.close()
+    
+    def _brl_rates_at(self, currency: Currency, ts: np.ndarray, current: np.ndarray) -> np.ndarray:
+        """BRL por unidade de `currency` em cada timestamp (cotação atual se não há histórico)."""
+        if currency == Currency.BRL:
+            return np.ones(ts.shape, dtype=np.float64)
+        series = self._series[currency]
+        if not series:
+            return np.full(ts.shape, current[CURRENCY_INDEX[currency]], dtype=np.float64)
+        return series.lookup_many(ts)
+    
+    def rate_at(
+        self,
+        from_currency: Union[Currency, str],
+        to_currency: Union[Currency, str],
+        at: Union[datetime, float]
+    ) -> float:
+        """Taxa from -> to vigente em `at` (triangulada via BRL)."""
+        ts = np.array([to_epoch(at)])
+        # Lê a tabela atual fora do lock (o refresh dela chama record_snapshot)
+        current = rate_table.vector()
+        with self._lock:
+            source = self._brl_rates_at(_as_currency(from_currency), ts, current)
+            target = self._brl_rates_at(_as_currency(to_currency), ts, current)
+        return float(source[0] / target[0])
+    
+    def convert_at_many(
+        self,
+        amounts: Sequence[float],
+        from_currencies: Union[Currency, str, Iterable[Union[Currency, str]]],
+        to_currency: Union[Currency, str],
+        timestamps: Sequence[Union[datetime, float]]
+    ) -> np.ndarray:
+        """
+        Converte cada valor pela cotação vigente no seu timestamp.
+        
+        Faz uma busca vetorizada por moeda de origem (e uma para a moeda de
+        destino), independente do número de valores.
+        """
+        values = np.asarray(amounts, dtype=np.float64)
+        ts = np.fromiter((to_epoch(t) for t in timestamps), dtype=np.float64, count=len(timestamps))
+        if ts.shape != values.shape:
+            raise ValueError("Quantidade de datas difere da quantidade de valores")
+        
+        if isinstance(from_currencies, (str, Currency)):
+            codes: List[Currency] = [_as_currency(from_currencies)] * len(values)
+        else:
+            codes = [_as_currency(c) for c in from_currencies]
+            if len(codes) != len(values):
+                raise ValueError("Quantidade de moedas de origem difere da quantidade de valores")
+        code_index = np.fromiter((CURRENCY_INDEX[c] for c in codes), dtype=np.intp, count=len(codes))
+        
+        current = rate_table.vector()
+        source_rates = np.empty_like(values)
+        with self._lock:
+            for i, currency in enumerate(CURRENCIES):
+                mask = code_index == i
+                if mask.any():
+                    source_rates[mask] = self._brl_rates_at(currency, ts[mask], current)
+            target_rates = self._brl_rates_at(_as_currency(to_currency), ts, current)
+        return np.round(values * source_rates / target_rates, 2)
+
+
+# Histórico global do processo; recebe os pontos de cada refresh da tabela atual
+rate_history = RateHistory()
+rate_table.add_listener(rate_history.record_snapshot)
@@ -0,0 +1,210 @@
+"""
+Tabela de câmbio em memória com refresh por TTL.
+
+Todas as cotações são armazenadas como "BRL por unidade da moeda" em um vetor
+numpy indexado pela ordem do enum Currency. Taxas cruzadas (ex: USDT -> EUR)
+são triangularizadas via BRL: rate(a, b) = brl_per[a] / brl_per[b].
+
+A origem das cotações é plugável (RateProvider): tabela estática, arquivo JSON
+ou feed HTTP local. Se o provider falhar no refresh, a última tabela válida
+continua em uso.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Union
+import json
+import logging
+import threading
+import time
+
+import httpx
+import numpy as np
+
+from app.core.config import settings
+from app.models.models import Currency
+
+logger = logging.getLogger(__name__)
+
+# Ordem fixa das moedas no vetor de cotações
+CURRENCIES = list(Currency)
+CURRENCY_INDEX = {currency: i for i, currency in enumerate(CURRENCIES)}
+
+# Cotações de referência (BRL por unidade), usadas quando nenhum provider está configurado
+DEFAULT_RATES = {
+    "BRL": 1.0,
+    "USDT": 5.40,
+    "USDC": 5.40,
+    "EUR": 5.85,
+}
+
+
+class RateProvider:
+    """Origem das cotações. Retorna {codigo_moeda: BRL por unidade}."""
+    
+    def fetch(self) -> Dict[str, float]:
+        raise NotImplementedError
+
+
+class StaticRateProvider(RateProvider):
+    """Cotações fixas (padrão em desenvolvimento)."""
+    
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        self.rates = dict(rates or DEFAULT_RATES)
+    
+    def fetch(self) -> Dict[str, float]:
+        return dict(self.rates)
+
+
+class FileRateProvider(RateProvider):
+    """Lê cotações de um arquivo JSON: {"USDT": 5.4, "EUR": 5.85, ...}."""
+    
+    def __init__(self, path: str):
+        self.path = path
+    
+    def fetch(self) -> Dict[str, float]:
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+class HttpRateProvider(RateProvider):
+    """
+    Busca cotações de um feed HTTP (ex: stub local).
+    
+    Aceita {"rates": {...}} ou o dicionário de cotações diretamente.
+    """
+    
+    def __init__(self, url: str, timeout: float = 2.0):
+        self.url = url
+        self.timeout = timeout
+    
+    def fetch(self) -> Dict[str, float]:
+        response = httpx.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        payload = response.json()
+        return payload.get("rates", payload)
+
+
+class RateTable:
+    """Tabela de cotações thread-safe com TTL."""
+    
+    def __init__(self, provider: RateProvider, ttl_seconds: int = 300):
+        self.provider = provider
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._brl_per_unit: Optional[np.ndarray] = None
+        self._loaded_at = 0.0
+        self._listeners: List[Callable[[Dict[str, float]], None]] = []
+    
+    def add_listener(self, listener: Callable[[Dict[str, float]], None]) -> None:
+        """Registra callback chamado com as cotações (BRL por unidade) a cada refresh."""
+        self._listeners.append(listener)
+    
+    def _load(self) -> None:
+        raw = self.provider.fetch()
+        brl_per_unit = np.array([DEFAULT_RATES[c.value] for c in CURRENCIES], dtype=np.float64)
+        for code, value in raw.items():
+            try:
+                currency = _as_currency(code)
+            except ValueError:
+                # Feeds costumam trazer moedas que não operamos: ignoradas, não invalidam o refresh
+                logger.warning(f"[FX] Cotação ignorada para moeda não suportada: {code}")
+                continue
+            brl_per_unit[CURRENCY_INDEX[currency]] = float(value)
+        brl_per_unit[CURRENCY_INDEX[Currency.BRL]] = 1.0
+        if not np.all(brl_per_unit > 0):
+            raise ValueError("Cotações devem ser positivas")
+        self._brl_per_unit = brl_per_unit
+        self._loaded_at = time.time()
+        rates = {c.value: float(brl_per_unit[i]) for i, c in enumerate(CURRENCIES)}
+        for listener in self._listeners:
+            listener(rates)
+    
+    def vector(self) -> np.ndarray:
+        """Vetor de cotações (BRL por unidade), recarregado se o TTL expirou."""
+        if self._brl_per_unit is None or time.time() - self._loaded_at >= self.ttl_seconds:
+            with self._lock:
+                if self._brl_per_unit is None or time.time() - self._loaded_at >= self.ttl_seconds:
+                    try:
+                        self._load()
+                    except Exception as e:
+                        if self._brl_per_unit is None:
+                            raise
+                        # Mantém a última tabela válida e tenta de novo no próximo TTL
+                        logger.warning(f"[FX] Falha ao atualizar cotações, usando tabela anterior: {e}")
+                        self._loaded_at = time.time()
+        return self._brl_per_unit
+    
+    def invalidate(self) -> None:
+        """Força recarga na próxima leitura."""
+        self._loaded_at = 0.0
+    
+    def rate(self, from_currency: Union[Currency, str], to_currency: Union[Currency, str]) -> float:
+        """Taxa de conversão from -> to (triangulada via BRL)."""
+        brl_per_unit = self.vector()
+        return float(
+            brl_per_unit[CURRENCY_INDEX[_as_currency(from_currency)]]
+            / brl_per_unit[CURRENCY_INDEX[_as_currency(to_currency)]]
+        )
+    
+    def convert_many(
+        self,
+        amounts: Sequence[float],
+        from_currencies: Union[Currency, str, Iterable[Union[Currency, str]]],
+        to_currency: Union[Currency, str]
+    ) -> np.ndarray:
+        """
+        Converte um vetor de valores em uma única passada vetorizada.
+        
+        Args:
+            amounts: Valores a converter (1D, ou 2D com uma coluna por moeda de origem)
+            from_currencies: Moeda de origem única ou uma por valor
+            to_currency: Moeda de destino
+        
+        Returns:
+            np.ndarray com os valores convertidos (arredondados em 2 casas)
+        """
+        brl_per_unit = self.vector()
+        values = np.asarray(amounts, dtype=np.float64)
+        if isinstance(from_currencies, (str, Currency)):
+            source_rates = brl_per_unit[CURRENCY_INDEX[_as_currency(from_currencies)]]
+        else:
+            indexes = np.fromiter(
+                (CURRENCY_INDEX[_as_currency(c)] for c in from_currencies),
+                dtype=np.intp
+            )
+            if indexes.shape[0] != values.shape[-1]:
+                raise ValueError("Quantidade de moedas de origem difere da quantidade de valores")
+            source_rates = brl_per_unit[indexes]
+        target_rate = brl_per_unit[CURRENCY_INDEX[_as_currency(to_currency)]]
+        return np.round(values * source_rates / target_rate, 2)
+    
+    def snapshot(self, base: Union[Currency, str] = Currency.BRL) -> Dict[str, float]:
+        """Cotações de todas as moedas em relação a `base`."""
+        brl_per_unit = self.vector()
+        base_rate = brl_per_unit[CURRENCY_INDEX[_as_currency(base)]]
+        return {c.value: float(brl_per_unit[i] / base_rate) for i, c in enumerate(CURRENCIES)}
+    
+    @property
+    def loaded_at(self) -> float:
+        return self._loaded_at
+
+
+def _as_currency(code: Union[Currency, str]) -> Currency:
+    """Normaliza código de moeda; ValueError se não suportada."""
+    if isinstance(code, Currency):
+        return code
+    try:
+        return Currency[str(code).upper()]
+    except KeyError:
+        raise ValueError(f"Moeda não suportada: {code}")
+
+
+def build_provider() -> RateProvider:
+    """Cria o provider configurado em FX_PROVIDER (static, file, http)."""
+    if settings.FX_PROVIDER == "file":
+        return FileRateProvider(settings.FX_RATES_FILE)
+    if settings.FX_PROVIDER == "http":
+        return HttpRateProvider(settings.FX_RATES_URL, timeout=settings.FX_HTTP_TIMEOUT_SECONDS)
+    return StaticRateProvider()
+
+
+# Tabela global do processo
+rate_table = RateTable(build_provider(), ttl_seconds=settings.FX_RATES_TTL_SECONDS)
@@ -1,4 +1,9 @@
 from sqlalchemy.orm import Session
+from typing import List, Tuple
+from datetime import datetime
+from decimal import Decimal
+
+from app.models.models import FxRateHistory, Transaction, Currency
 
 
 class CurrencyRepository:
@@ -7,6 +12,27 @@ class CurrencyRepository:
     def __init__(self, db: Session):
         self.db = db
     
-    # TODO: Implementar métodos para conversão de moeda
-    # TODO: Integrar com API de cotações
-    pass
+    def get_rate_history(self) -> List[Tuple[Currency, datetime, Decimal]]:
+        """Histórico completo de cotações, ordenado por moeda e data (uma consulta)."""
+        return self.db.query(
+            FxRateHistory.currency,
+            FxRateHistory.observed_at,
+            FxRateHistory.rate
+        ).order_by(FxRateHistory.currency, FxRateHistory.observed_at).all()
+    
+    def insert_rates(self, rows: List[dict]) -> None:
+        """Insere pontos no histórico em lote (executemany)."""
+        self.db.bulk_insert_mappings(FxRateHistory, rows)
+        self.db.commit()
+    
+    def get_owner_transactions(self, owner_id: str, limit: int) -> List[Tuple]:
+        """Transações enviadas ou recebidas pelo dono, ordenadas por data."""
+        return self.db.query(
+            Transaction.transaction_id,
+            Transaction.type,
+            Transaction.amount,
+            Transaction.currency,
+            Transaction.created_at
+        ).filter(
+            (Transaction.sender_id == owner_id) | (Transaction.receiver_id == owner_id)
+        ).order_by(Transaction.created_at).limit(limit).all()
@@ -1,7 +1,12 @@
 from sqlalchemy.orm import Session
-from typing import Dict
+from fastapi import HTTPException, status
+from typing import Dict, List, Optional, Union
+from datetime import datetime
 
+from app.core.config import settings
 from .repository import CurrencyRepository
+from .rates import rate_table
+from .history import rate_history
 
 
 class CurrencyService:
@@ -11,13 +16,129 @@ class CurrencyService:
         self.db = db
         self.repository = CurrencyRepository(db)
     
-    def convert_currency(self, amount: float, from_currency: str, to_currency: str) -> dict:
-        """Converte valor entre moedas."""
-        # TODO: Implementar conversão real com API
+    def convert_currency(
+        self,
+        amount: float,
+        from_currency: str,
+        to_currency: str,
+        at: Optional[str] = None
+    ) -> dict:
+        """Converte valor entre moedas (pela cotação atual ou pela vigente em `at`)."""
+        try:
+            if at:
+                rate_history.ensure_loaded(self.db)
+                when = self._parse_datetime(at)
+                exchange_rate = rate_history.rate_at(from_currency, to_currency, when)
+                converted = rate_history.convert_at_many([float(amount)], from_currency, to_currency, [when])
+            else:
+                exchange_rate = rate_table.rate(from_currency, to_currency)
+                converted = rate_table.convert_many([float(amount)], from_currency, to_currency)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
         return {
             "amount": amount,
             "from_currency": from_currency,
             "to_currency": to_currency,
-            "converted_amount": amount,  # Placeholder
-            "exchange_rate": 1.0  # Placeholder
+            "converted_amount": float(converted[0]),
+            "exchange_rate": exchange_rate,
+            "at": at
         }
+    
+    def convert_batch(
+        self,
+        amounts: List[float],
+        from_currency: Union[str, List[str]],
+        to_currency: str,
+        at: Optional[List[str]] = None
+    ) -> dict:
+        """
+        Converte uma lista de valores em uma única passada vetorizada.
+        
+        `from_currency` pode ser uma moeda única ou uma lista (uma por valor).
+        Se `at` for informado (uma data por valor), usa a cotação histórica de cada data.
+        """
+        if not isinstance(amounts, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="amounts deve ser uma lista")
+        if len(amounts) > settings.FX_BATCH_MAX_ITEMS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Máximo de {settings.FX_BATCH_MAX_ITEMS} valores por requisição"
+            )
+        
+        try:
+            if at is not None:
+                rate_history.ensure_loaded(self.db)
+                timestamps = [self._parse_datetime(t) for t in at]
+                converted = rate_history.convert_at_many(amounts, from_currency, to_currency, timestamps)
+            else:
+                converted = rate_table.convert_many(amounts, from_currency, to_currency)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
+        return {
+            "from_currency": from_currency,
+            "to_currency": to_currency,
+            "count": len(amounts),
+            "converted_amounts": converted.tolist()
+        }
+    
+    def get_rates(self, base: Optional[str] = "BRL") -> Dict:
+        """Retorna a tabela de cotações atual em relação à moeda base."""
+        try:
+            rates = rate_table.snapshot(base or "BRL")
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
+        return {
+            "base": (base or "BRL").upper(),
+            "rates": rates,
+            "ttl_seconds": rate_table.ttl_seconds,
+            "provider": settings.FX_PROVIDER
+        }
+    
+    def revalue_transactions(self, owner_id: str, to_currency: str = "BRL", limit: int = 5000) -> Dict:
+        """
+        Reavalia o histórico de transações de um dono pela cotação vigente em cada created_at.
+        
+        Uma consulta para as transações e uma busca vetorizada por moeda no
+        histórico de cotações (sem consulta por linha).
+        """
+        rate_history.ensure_loaded(self.db)
+        rows = self.repository.get_owner_transactions(owner_id, limit)
+        try:
+            values = rate_history.convert_at_many(
+                [float(r.amount) for r in rows],
+                [r.currency or "BRL" for r in rows],
+                to_currency,
+                [r.created_at for r in rows]
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
+        return {
+            "owner_id": owner_id,
+            "to_currency": to_currency.upper(),
+            "count": len(rows),
+            "total": round(float(values.sum()), 2),
+            "transactions": [
+                {
+                    "transaction_id": r.transaction_id,
+                    "type": r.type.value if hasattr(r.type, "value") else r.type,
+                    "amount": float(r.amount),
+                    "currency": r.currency.value if hasattr(r.currency, "value") else r.currency,
+                    "created_at": r.created_at.isoformat() if r.created_at else None,
+                    "value": float(value)
+                }
+                for r, value in zip(rows, values)
+            ]
+        }
+    
+    def _parse_datetime(self, value) -> datetime:
+        """Converte string ISO 8601 (ou datetime) para datetime."""
+        if isinstance(value, datetime):
+            return value
+        try:
+            return datetime.fromisoformat(str(value))
+        except ValueError:
+            raise ValueError(f"Data inválida: {value}")
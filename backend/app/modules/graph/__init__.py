@@ -0,0 +1,9 @@
+"""
+Módulo de grafo de transferências (análise antifraude).
+"""
+
+from .controller import router
+from .service import GraphService
+from .repository import GraphRepository
+
+__all__ = ["router", "GraphService", "GraphRepository"]
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db
+from .service import GraphService
+
+router = APIRouter(prefix="/graph", tags=["Transfer Graph"])
+
+
+@router.get("/stats")
+def get_graph_stats(db: Session = Depends(get_db)):
+    """
+    Tamanho do grafo (participantes, transferências na janela, ciclos) e cursor de ingestão.
+    """
+    service = GraphService(db)
+    return service.get_stats()
+
+
+@router.get("/cycles")
+def get_cycles(
+    party_id: Optional[str] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """
+    Lista fluxos circulares de dinheiro (A -> B -> ... -> A em ordem temporal)
+    detectados dentro da janela, opcionalmente filtrados por participante.
+    """
+    service = GraphService(db)
+    return service.get_cycles(party_id, limit)
+
+
+@router.get("/parties/{party_id}")
+def get_party_component(
+    party_id: str,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """
+    Componente conectado do participante: tamanho, membros (até `limit`) com
+    graus e valores, e ciclos em que ele aparece.
+    """
+    service = GraphService(db)
+    return service.get_component(party_id, limit)
+
+
+@router.post("/rebuild")
+def rebuild_graph(db: Session = Depends(get_db)):
+    """
+    Reconstrói o grafo a partir de todo o histórico de transações (passada única).
+    """
+    service = GraphService(db)
+    return service.rebuild()
@@ -0,0 +1,313 @@
+"""
+Grafo incremental de transferências (detecção de anéis de fraude).
+
+Cada participante vira um índice inteiro; todo o estado fica em arrays:
+
+- union-find (parent/size, com lista circular de membros por componente):
+  componentes conectados desde o último rebuild, união em O(α(n))
+- graus e valores enviados/recebidos por participante
+- adjacência das arestas recentes em "forward star": a aresta e guarda
+  destino, instante, valor e o índice da aresta anterior do mesmo remetente
+  (`edge_next`), e `head[nó]` aponta para a mais nova. Arestas fora da janela
+  são puladas e removidas em compactações periódicas.
+
+Ao inserir u -> v, uma busca limitada procura um caminho v -> ... -> u com
+instantes não decrescentes dentro da janela: dinheiro que volta à origem.
+
+Os IDs das transferências dos últimos `dedupe_seconds` ficam guardados, então
+reler uma janela já ingerida (transações commitadas fora de ordem) não duplica
+arestas; o cursor só avança.
+"""
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import threading
+
+
+@dataclass(frozen=True)
+class TransferEdge:
+    transaction_id: str
+    sender_id: str
+    receiver_id: str
+    amount: float
+    created_at: datetime
+
+
+class TransferGraph:
+    """Grafo de transferências mantido em memória, alimentado em ordem de created_at."""
+    
+    def __init__(
+        self,
+        window_seconds: float,
+        max_cycle_length: int = 4,
+        max_branching: int = 16,
+        max_cycles: int = 1000,
+        dedupe_seconds: float = 0
+    ):
+        self.window_seconds = window_seconds
+        self.max_cycle_length = max_cycle_length
+        self.max_branching = max_branching
+        self.max_cycles = max_cycles
+        self.dedupe_seconds = dedupe_seconds
+        self._lock = threading.RLock()
+        self.reset()
+    
+    def reset(self) -> None:
+        """Descarta todo o estado."""
+        with self._lock:
+            self._index: Dict[str, int] = {}
+            self._ids: List[str] = []
+            self._parent = array("l")
+            self._size = array("l")
+            self._next_member = array("l")
+            self._out_degree = array("l")
+            self._in_degree = array("l")
+            self._sent = array("d")
+            self._received = array("d")
+            self._head = array("l")
+            self._edge_src = array("l")
+            self._edge_dst = array("l")
+            self._edge_next = array("l")
+            self._edge_ts = array("d")
+            self._edge_amount = array("d")
+            self._first_live = 0
+            self._latest_ts = 0.0
+            self._cycles: "OrderedDict[Tuple[str, ...], dict]" = OrderedDict()
+            # transaction_id -> instante, em ordem de inserção (deduplicação da releitura)
+            self._recent_ids: "OrderedDict[str, float]" = OrderedDict()
+            self.edges_total = 0
+            self.cursor: Optional[Tuple[datetime, str]] = None
+    
+    # ========== NÓS E UNION-FIND ==========
+    
+    def _node(self, party_id: str) -> int:
+        node = self._index.get(party_id)
+        if node is None:
+            node = len(self._ids)
+            self._index[party_id] = node
+            self._ids.append(party_id)
+            self._parent.append(node)
+            self._size.append(1)
+            self._next_member.append(node)
+            self._out_degree.append(0)
+            self._in_degree.append(0)
+            self._sent.append(0.0)
+            self._received.append(0.0)
+            self._head.append(-1)
+        return node
+    
+    def _find(self, node: int) -> int:
+        parent = self._parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+    
+    def _union(self, a: int, b: int) -> None:
+        ra, rb = self._find(a), self._find(b)
+        if ra == rb:
+            return
+        if self._size[ra] < self._size[rb]:
+            ra, rb = rb, ra
+        self._parent[rb] = ra
+        self._size[ra] += self._size[rb]
+        # Une as listas circulares de membros trocando os sucessores das raízes
+        self._next_member[ra], self._next_member[rb] = self._next_member[rb], self._next_member[ra]
+    
+    # ========== INSERÇÃO ==========
+    
+    def add_edge(self, edge: TransferEdge) -> Optional[dict]:
+        """
+        Insere uma transferência e verifica se ela fecha um ciclo.
+        
+        Transferências já ingeridas (dentro de `dedupe_seconds`) são ignoradas.
+        
+        Returns:
+            O ciclo detectado (ou None)
+        """
+        with self._lock:
+            if edge.transaction_id in self._recent_ids:
+                return None
+            ts = edge.created_at.timestamp()
+            self._remember(edge.transaction_id, ts)
+            u = self._node(edge.sender_id)
+            v = self._node(edge.receiver_id)
+            amount = float(edge.amount)
+            
+            self._union(u, v)
+            self._out_degree[u] += 1
+            self._in_degree[v] += 1
+            self._sent[u] += amount
+            self._received[v] += amount
+            self.edges_total += 1
+            position = (edge.created_at, edge.transaction_id)
+            if self.cursor is None or position > self.cursor:
+                self.cursor = position
+            
+            self._latest_ts = max(self._latest_ts, ts)
+            self._expire()
+            
+            cycle = self._find_cycle(u, v, ts, amount) if u != v else None
+            
+            self._edge_src.append(u)
+            self._edge_dst.append(v)
+            self._edge_ts.append(ts)
+            self._edge_amount.append(amount)
+            self._edge_next.append(self._head[u])
+            self._head[u] = len(self._edge_dst) - 1
+            return cycle
+    
+    def add_many(self, edges: Iterable[TransferEdge]) -> int:
+        """Insere transferências em ordem; retorna quantos ciclos foram detectados."""
+        found = 0
+        with self._lock:
+            for edge in edges:
+                if self.add_edge(edge):
+                    found += 1
+        return found
+    
+    def is_known(self, transaction_id: str) -> bool:
+        """Indica se a transferência já foi ingerida (dentro de `dedupe_seconds`)."""
+        with self._lock:
+            return transaction_id in self._recent_ids
+    
+    def _remember(self, transaction_id: str, ts: float) -> None:
+        if self.dedupe_seconds <= 0:
+            return
+        recent = self._recent_ids
+        recent[transaction_id] = ts
+        cutoff = max(self._latest_ts, ts) - self.dedupe_seconds
+        while recent and next(iter(recent.values())) < cutoff:
+            recent.popitem(last=False)
+    
+    def _expire(self) -> None:
+        """Avança o início da janela e compacta quando metade das arestas expirou."""
+        cutoff = self._latest_ts - self.window_seconds
+        total = len(self._edge_ts)
+        while self._first_live < total and self._edge_ts[self._first_live] < cutoff:
+            self._first_live += 1
+        if self._first_live > 1024 and self._first_live * 2 > total:
+            self._compact(cutoff)
+    
+    def _compact(self, cutoff: float) -> None:
+        keep = [e for e in range(self._first_live, len(self._edge_ts)) if self._edge_ts[e] >= cutoff]
+        src = array("l", (self._edge_src[e] for e in keep))
+        dst = array("l", (self._edge_dst[e] for e in keep))
+        ts = array("d", (self._edge_ts[e] for e in keep))
+        amounts = array("d", (self._edge_amount[e] for e in keep))
+        head = array("l", [-1]) * len(self._ids)
+        edge_next = array("l", [-1]) * len(keep)
+        for e in range(len(keep)):
+            edge_next[e] = head[src[e]]
+            head[src[e]] = e
+        self._edge_src, self._edge_dst, self._edge_ts, self._edge_amount = src, dst, ts, amounts
+        self._edge_next, self._head = edge_next, head
+        self._first_live = 0
+    
+    def _find_cycle(self, u: int, v: int, ts: float, amount: float) -> Optional[dict]:
+        """Busca limitada de v até u por arestas recentes com instantes não decrescentes."""
+        cutoff = ts - self.window_seconds
+        max_depth = self.max_cycle_length - 1
+        first_live = self._first_live
+        # Pilha: (nó, instante da aresta de chegada, caminho de nós, caminho de arestas)
+        stack = [(v, cutoff, (v,), ())]
+        while stack:
+            node, arrived_at, path, path_edges = stack.pop()
+            e = self._head[node]
+            examined = 0
+            while e >= first_live and examined < self.max_branching:
+                edge_ts = self._edge_ts[e]
+                if edge_ts < cutoff:
+                    break
+                examined += 1
+                if arrived_at <= edge_ts <= ts:
+                    target = self._edge_dst[e]
+                    if target == u:
+                        return self._record_cycle(path + (u,), path_edges + (e,), ts, amount)
+                    if len(path_edges) + 1 < max_depth and target not in path:
+                        stack.append((target, edge_ts, path + (target,), path_edges + (e,)))
+                e = self._edge_next[e]
+        return None
+    
+    def _record_cycle(self, nodes: Tuple[int, ...], edges: Tuple[int, ...], closed_at: float, amount: float) -> dict:
+        parties = [self._ids[n] for n in nodes]
+        amounts = [self._edge_amount[e] for e in edges] + [amount]
+        # Mesma rota com outro ponto de partida é o mesmo ciclo
+        start = parties.index(min(parties))
+        key = tuple(parties[start:] + parties[:start])
+        cycle = {
+            "parties": parties,
+            "length": len(parties),
+            "amounts": amounts,
+            "min_amount": min(amounts),
+            "started_at": datetime.fromtimestamp(self._edge_ts[edges[0]]).isoformat(),
+            "closed_at": datetime.fromtimestamp(closed_at).isoformat(),
+        }
+        previous = self._cycles.pop(key, None)
+        cycle["occurrences"] = (previous["occurrences"] if previous else 0) + 1
+        self._cycles[key] = cycle
+        while len(self._cycles) > self.max_cycles:
+            self._cycles.popitem(last=False)
+        return cycle
+    
+    # ========== CONSULTAS ==========
+    
+    def _node_stats(self, node: int) -> dict:
+        return {
+            "party_id": self._ids[node],
+            "out_degree": self._out_degree[node],
+            "in_degree": self._in_degree[node],
+            "sent": round(self._sent[node], 2),
+            "received": round(self._received[node], 2)
+        }
+    
+    def component(self, party_id: str, limit: int = 100) -> Optional[dict]:
+        """Componente conectado do participante (até `limit` membros listados)."""
+        with self._lock:
+            node = self._index.get(party_id)
+            if node is None:
+                return None
+            root = self._find(node)
+            members = []
+            member = root
+            while len(members) < limit:
+                members.append(self._node_stats(member))
+                member = self._next_member[member]
+                if member == root:
+                    break
+            return {
+                "party": self._node_stats(node),
+                "component_id": self._ids[root],
+                "size": self._size[root],
+                "members": members
+            }
+    
+    def cycles(self, party_id: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """Ciclos detectados mais recentes primeiro (opcionalmente de um participante)."""
+        with self._lock:
+            result = []
+            for cycle in reversed(self._cycles.values()):
+                if party_id is None or party_id in cycle["parties"]:
+                    result.append(cycle)
+                    if len(result) >= limit:
+                        break
+            return result
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "parties": len(self._ids),
+                "edges_total": self.edges_total,
+                "edges_in_window": len(self._edge_ts) - self._first_live,
+                "window_seconds": self.window_seconds,
+                "cycles": len(self._cycles),
+                "cursor": self.cursor[0].isoformat() if self.cursor else None
+            }
+    
+    def replace_with(self, other: "TransferGraph") -> None:
+        """Adota o estado de outro grafo (usado ao final de um rebuild)."""
+        with self._lock, other._lock:
+            state = {k: v for k, v in other.__dict__.items() if k != "_lock"}
+            self.__dict__.update(state)
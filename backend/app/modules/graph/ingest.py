@@ -0,0 +1,117 @@
+"""
+Alimentação do grafo de transferências.
+
+Um worker acompanha a tabela transactions pelo cursor (created_at,
+transaction_id) do grafo e insere as novas transferências em micro-lotes.
+Só lê linhas com mais de GRAPH_INGEST_LAG_SECONDS.
+
+created_at é gravado no INSERT, não no commit: uma transação longa (lote de
+cobrança, PIX em lote, espera de lock, retry) fica visível já atrás do cursor.
+Por isso cada passada também relê os IDs dos últimos
+GRAPH_INGEST_OVERLAP_SECONDS antes do cursor e ingere os que o grafo ainda não
+conhece (o grafo deduplica por transaction_id). Commits ainda mais atrasados só
+entram no próximo rebuild.
+
+O rebuild percorre o histórico em uma passada (cursor no servidor) para um
+grafo novo, alcança a cauda e troca o estado sob o mesmo lock da ingestão.
+"""
+from datetime import datetime, timedelta
+from typing import List
+import logging
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.workers import WorkerPool
+from .graph import TransferEdge, TransferGraph
+from .repository import GraphRepository
+
+logger = logging.getLogger(__name__)
+
+
+def _new_graph() -> TransferGraph:
+    return TransferGraph(
+        window_seconds=settings.GRAPH_WINDOW_SECONDS,
+        max_cycle_length=settings.GRAPH_MAX_CYCLE_LENGTH,
+        max_branching=settings.GRAPH_MAX_BRANCHING,
+        max_cycles=settings.GRAPH_MAX_CYCLES,
+        dedupe_seconds=settings.GRAPH_INGEST_OVERLAP_SECONDS + settings.GRAPH_INGEST_LAG_SECONDS
+    )
+
+
+transfer_graph = _new_graph()
+
+# Serializa ingestão incremental e a troca de estado do rebuild
+_ingest_lock = threading.Lock()
+
+
+def _ingest_until() -> datetime:
+    return datetime.now() - timedelta(seconds=settings.GRAPH_INGEST_LAG_SECONDS)
+
+
+def _late_transfers(graph: TransferGraph, repository: GraphRepository) -> List[TransferEdge]:
+    """Transferências da janela de sobreposição que ficaram visíveis depois do cursor passar."""
+    if graph.cursor is None:
+        return []
+    since = graph.cursor[0] - timedelta(seconds=settings.GRAPH_INGEST_OVERLAP_SECONDS)
+    missing = [
+        transaction_id
+        for transaction_id in repository.get_transfer_ids_between(since, graph.cursor)
+        if not graph.is_known(transaction_id)
+    ]
+    if missing:
+        metrics.increment("graph.late_transfers", len(missing))
+    return repository.get_transfers_by_ids(missing)
+
+
+def _catch_up(graph: TransferGraph, repository: GraphRepository, limit: int) -> int:
+    """Ingere as transferências atrasadas e o próximo lote após o cursor; retorna o tamanho do lote."""
+    late = _late_transfers(graph, repository)
+    edges = repository.get_transfers_after(graph.cursor, _ingest_until(), limit)
+    cycles = graph.add_many(late) + graph.add_many(edges)
+    if cycles:
+        metrics.increment("graph.cycles_detected", cycles)
+        logger.warning(f"[Graph] {cycles} ciclo(s) de transferências detectado(s)")
+    return len(edges)
+
+
+def ingest_new_transfers(db: Session, limit: int) -> int:
+    """Insere no grafo as transferências criadas após o cursor (um micro-lote)."""
+    with _ingest_lock:
+        return _catch_up(transfer_graph, GraphRepository(db), limit)
+
+
+def rebuild_graph(db: Session) -> dict:
+    """
+    Reconstrói o grafo a partir de todo o histórico em uma passada.
+    
+    Returns:
+        Estatísticas do grafo reconstruído
+    """
+    started = time.perf_counter()
+    repository = GraphRepository(db)
+    fresh = _new_graph()
+    until = _ingest_until()
+    fresh.add_many(repository.stream_transfers(until=until, chunk_size=settings.GRAPH_REBUILD_CHUNK_SIZE))
+    
+    with _ingest_lock:
+        while _catch_up(fresh, repository, settings.GRAPH_INGEST_BATCH_SIZE) == settings.GRAPH_INGEST_BATCH_SIZE:
+            pass
+        transfer_graph.replace_with(fresh)
+    
+    elapsed = time.perf_counter() - started
+    metrics.observe("graph.rebuild", elapsed)
+    logger.info(f"[Graph] Rebuild concluído: {fresh.edges_total} transferências em {elapsed:.2f}s")
+    return {**transfer_graph.stats(), "rebuild_seconds": round(elapsed, 3)}
+
+
+# Worker de ingestão incremental (um só: a ordem do cursor importa)
+graph_workers = WorkerPool(
+    "graph_ingest",
+    handler=lambda db: ingest_new_transfers(db, settings.GRAPH_INGEST_BATCH_SIZE),
+    workers=1,
+    idle_interval=settings.GRAPH_INGEST_INTERVAL_SECONDS
+)
@@ -0,0 +1,81 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, select
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from app.models.models import Transaction, TransactionStatus
+from .graph import TransferEdge
+
+
+class GraphRepository:
+    """Repository para leitura de transferências que alimentam o grafo."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def _transfers_query(self, after: Optional[Tuple[datetime, str]], until: Optional[datetime]):
+        """Transferências entre participantes em ordem (created_at, transaction_id) após o cursor."""
+        query = select(
+            Transaction.transaction_id,
+            Transaction.sender_id,
+            Transaction.receiver_id,
+            Transaction.amount,
+            Transaction.created_at
+        ).where(
+            Transaction.sender_id.isnot(None),
+            Transaction.receiver_id.isnot(None),
+            Transaction.status != TransactionStatus.FAILED
+        )
+        if after is not None:
+            created_at, transaction_id = after
+            query = query.where(or_(
+                Transaction.created_at > created_at,
+                and_(Transaction.created_at == created_at, Transaction.transaction_id > transaction_id)
+            ))
+        if until is not None:
+            query = query.where(Transaction.created_at <= until)
+        return query.order_by(Transaction.created_at, Transaction.transaction_id)
+    
+    def get_transfers_after(
+        self,
+        after: Optional[Tuple[datetime, str]],
+        until: datetime,
+        limit: int
+    ) -> List[TransferEdge]:
+        """Próximo lote de transferências após o cursor (ingestão incremental)."""
+        rows = self.db.execute(self._transfers_query(after, until).limit(limit))
+        return [TransferEdge(*row) for row in rows]
+    
+    def get_transfer_ids_between(self, since: datetime, cursor: Tuple[datetime, str]) -> List[str]:
+        """IDs das transferências de `since` até o cursor, inclusive (releitura da janela de sobreposição)."""
+        created_at, transaction_id = cursor
+        query = self._transfers_query(None, None).with_only_columns(Transaction.transaction_id).where(
+            Transaction.created_at >= since,
+            or_(
+                Transaction.created_at < created_at,
+                and_(Transaction.created_at == created_at, Transaction.transaction_id <= transaction_id)
+            )
+        )
+        return list(self.db.execute(query).scalars())
+    
+    def get_transfers_by_ids(self, transaction_ids: List[str]) -> List[TransferEdge]:
+        """Transferências por ID, em ordem (created_at, transaction_id)."""
+        if not transaction_ids:
+            return []
+        rows = self.db.execute(
+            self._transfers_query(None, None).where(Transaction.transaction_id.in_(transaction_ids))
+        )
+        return [TransferEdge(*row) for row in rows]
+    
+    def stream_transfers(
+        self,
+        after: Optional[Tuple[datetime, str]] = None,
+        until: Optional[datetime] = None,
+        chunk_size: int = 5000
+    ) -> Iterator[TransferEdge]:
+        """Percorre o histórico com cursor no servidor (sem carregar tudo em memória)."""
+        result = self.db.execute(
+            self._transfers_query(after, until).execution_options(yield_per=chunk_size)
+        )
+        for row in result:
+            yield TransferEdge(*row)
@@ -0,0 +1,35 @@
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from typing import Optional
+
+from .ingest import transfer_graph, rebuild_graph
+
+
+class GraphService:
+    """Service layer para análise do grafo de transferências."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_component(self, party_id: str, limit: int = 100) -> dict:
+        """Componente conectado do participante, com graus e valores de cada membro."""
+        component = transfer_graph.component(party_id, limit)
+        if component is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Participante sem transferências no grafo"
+            )
+        component["cycles"] = transfer_graph.cycles(party_id, limit=20)
+        return component
+    
+    def get_cycles(self, party_id: Optional[str] = None, limit: int = 100) -> dict:
+        """Fluxos circulares detectados (dinheiro que volta à origem dentro da janela)."""
+        cycles = transfer_graph.cycles(party_id, limit)
+        return {"total": len(cycles), "cycles": cycles}
+    
+    def get_stats(self) -> dict:
+        return transfer_graph.stats()
+    
+    def rebuild(self) -> dict:
+        """Reprocessa o histórico de transações em uma passada."""
+        return rebuild_graph(self.db)
@@ -0,0 +1,421 @@
+"""
+Cobrança automática de parcelas (débito nas carteiras BRL dos tomadores).
+
+As parcelas vencidas até a data (PENDING ou OVERDUE, com saldo em aberto) são
+percorridas em lotes por (due_date, payment_id). Em cada lote, numa transação:
+
+1. As parcelas são travadas com FOR UPDATE SKIP LOCKED (execuções concorrentes
+   não cobram a mesma parcela) e as carteiras dos tomadores com uma única
+   consulta FOR UPDATE em ordem canônica
+2. O saldo disponível de cada carteira é distribuído entre as suas parcelas,
+   da mais antiga para a mais nova; sem saldo suficiente a parcela é paga
+   parcialmente (amount_paid aumenta e o status não muda)
+3. Um UPDATE ... CASE condicional debita todas as carteiras, dois UPDATEs
+   marcam as parcelas (quitadas e parciais) e executemany insere as transações
+   LOAN_PAYMENT e as linhas de loan_repayments
+
+Antes dos lotes, as parcelas que venceram e ainda não têm linha em
+loan_payments são materializadas (o cronograma futuro é só calculado).
+
+Empréstimos diretos creditam o investidor na hora; os via pool ficam em
+loan_repayments aguardando a distribuição aos investidores da pool.
+Com dry_run nada é gravado: a materialização é pulada e as parcelas vencidas
+sem linha são calculadas pelo cronograma (credit/schedule.py) e entram no plano
+depois das materializadas; o plano de cada lote é descartado (rollback) e os
+débitos planejados por carteira são acumulados entre os lotes, já que o saldo
+relido do banco não os desconta.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import logging
+import time
+import uuid
+
+from sqlalchemy import and_, case, insert, or_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.money import allocate
+from app.core.workers import WorkerPool
+from app.database import run_in_transaction
+from app.models.models import (
+    Currency, Loan, LoanPayment, LoanRepayment, LoanStatus, OwnerType, PaymentStatus,
+    Pool, PoolLoan, Transaction, TransactionStatus, TransactionType, Wallet
+)
+from app.modules.credit.dashboard import invalidate_borrower_dashboard
+from app.modules.credit.schedule import installments_due, scheduled_installments
+from app.modules.wallet.repository import WalletRepository
+from .quotes import invalidate_quotes
+from .repository import LoanRepository
+
+logger = logging.getLogger(__name__)
+
+Cursor = Tuple[date, str]
+
+
+class _DueInstallment(NamedTuple):
+    """Parcela vencida ainda não materializada (calculada pelo cronograma)."""
+    due_date: date
+    amount_due: Decimal
+    amount_paid: Decimal
+    loan_id: str
+    user_id: str
+
+
+class LoanCollectionEngine:
+    """Cobra as parcelas vencidas debitando as carteiras dos tomadores."""
+    
+    def __init__(self, db: Session, chunk_size: Optional[int] = None):
+        self.db = db
+        self.chunk_size = chunk_size or settings.LOAN_COLLECTION_CHUNK_SIZE
+        self.wallet_repository = WalletRepository(db)
+        self.loan_repository = LoanRepository(db)
+    
+    def run(self, business_date: Optional[date] = None, dry_run: bool = False) -> dict:
+        """
+        Cobra todas as parcelas vencidas até `business_date` (padrão: hoje).
+        
+        Cada lote tem o seu commit; com dry_run nada é gravado (nem a materialização).
+        
+        Returns:
+            Totais da execução (parcelas quitadas, parciais, sem saldo, valor cobrado)
+        """
+        business_date = business_date or date.today()
+        started = time.perf_counter()
+        report = {
+            "business_date": business_date.isoformat(),
+            "dry_run": dry_run,
+            "installments_materialized": 0 if dry_run else self._materialize_due(business_date),
+            "installments_scanned": 0,
+            "installments_paid": 0,
+            "installments_partial": 0,
+            "installments_unfunded": 0,
+            "amount_collected": Decimal(0),
+            "chunks": 0
+        }
+        cursor: Cursor = (date.min, "")
+        # dry_run: débitos já planejados por carteira (o rollback os apaga do saldo)
+        planned: Dict[str, Decimal] = defaultdict(Decimal)
+        
+        while True:
+            if dry_run:
+                try:
+                    chunk = self._collect_chunk(business_date, cursor, dry_run=True, planned=planned)
+                finally:
+                    self.db.rollback()
+            else:
+                chunk = run_in_transaction(
+                    self.db,
+                    lambda: self._collect_chunk(business_date, cursor, dry_run=False),
+                    name="loan_collection"
+                )
+                invalidate_quotes(chunk["loan_ids"])
+                invalidate_borrower_dashboard(chunk["user_ids"])
+            if chunk["scanned"] == 0:
+                break
+            
+            self._add_chunk(report, chunk)
+            cursor = chunk["cursor"]
+            if chunk["scanned"] < self.chunk_size:
+                break
+        
+        if dry_run:
+            self._plan_unmaterialized(business_date, report, planned)
+        
+        seconds = time.perf_counter() - started
+        report["amount_collected"] = float(report["amount_collected"])
+        report["seconds"] = round(seconds, 3)
+        report["installments_per_second"] = round(report["installments_scanned"] / seconds, 1) if seconds else None
+        if not dry_run:
+            metrics.increment("loan_collection.installments_paid", report["installments_paid"])
+            metrics.increment("loan_collection.amount_collected", report["amount_collected"])
+            metrics.observe("loan_collection.seconds", seconds)
+        logger.info(f"[Loan Collection] {report}")
+        return report
+    
+    def _materialize_due(self, business_date: date) -> int:
+        """Materializa as parcelas vencidas até a data, um lote de empréstimos por transação."""
+        materialized = 0
+        while True:
+            loans, rows = run_in_transaction(
+                self.db,
+                lambda: self.loan_repository.materialize_due(business_date, self.chunk_size),
+                name="loan_materialize"
+            )
+            materialized += rows
+            if loans < self.chunk_size:
+                return materialized
+    
+    @staticmethod
+    def _add_chunk(report: dict, chunk: dict) -> None:
+        report["chunks"] += 1
+        report["installments_scanned"] += chunk["scanned"]
+        report["installments_paid"] += chunk["paid"]
+        report["installments_partial"] += chunk["partial"]
+        report["installments_unfunded"] += chunk["unfunded"]
+        report["amount_collected"] += chunk["amount"]
+    
+    def _plan_unmaterialized(self, business_date: date, report: dict, planned: Dict[str, Decimal]) -> None:
+        """
+        dry_run: planeja as parcelas vencidas sem linha em loan_payments, calculadas
+        pelo cronograma, com o saldo que sobrou dos lotes já planejados.
+        """
+        after_loan_id = ""
+        while True:
+            loans = self.loan_repository.get_unmaterialized_due(business_date, after_loan_id, self.chunk_size)
+            if not loans:
+                return
+            after_loan_id = loans[-1].loan_id
+            
+            rows = sorted((
+                _DueInstallment(installment["due_date"], installment["amount_due"], Decimal(0), loan.loan_id, loan.user_id)
+                for loan in loans
+                for installment in scheduled_installments(
+                    loan.principal,
+                    loan.interest_rate,
+                    loan.duration_months,
+                    loan.disbursed_at,
+                    first=loan.next_installment,
+                    last=installments_due(loan.disbursed_at, loan.duration_months, business_date),
+                    system=loan.amortization_system
+                )
+            ), key=lambda row: (row.due_date, row.loan_id))
+            report["installments_materialized"] += len(rows)
+            
+            if rows:
+                chunk = {"scanned": len(rows), "paid": 0, "partial": 0, "unfunded": 0, "amount": Decimal(0),
+                         "loan_ids": set(), "user_ids": set()}
+                try:
+                    self._plan(rows, chunk, planned)
+                finally:
+                    self.db.rollback()
+                self._add_chunk(report, chunk)
+            if len(loans) < self.chunk_size:
+                return
+    
+    def _collect_chunk(
+        self,
+        business_date: date,
+        cursor: Cursor,
+        dry_run: bool,
+        planned: Optional[Dict[str, Decimal]] = None
+    ) -> dict:
+        """Cobra um lote de parcelas. Não faz commit."""
+        after_date, after_id = cursor
+        rows = self.db.query(
+            LoanPayment.payment_id,
+            LoanPayment.due_date,
+            LoanPayment.amount_due,
+            LoanPayment.amount_paid,
+            Loan.loan_id,
+            Loan.user_id,
+            Loan.investor_id,
+            Loan.pool_id,
+            Loan.credit_request_id
+        ).join(
+            Loan, Loan.loan_id == LoanPayment.loan_id
+        ).filter(
+            LoanPayment.status.in_([PaymentStatus.PENDING, PaymentStatus.OVERDUE]),
+            LoanPayment.due_date <= business_date,
+            Loan.status.in_([LoanStatus.ACTIVE, LoanStatus.DEFAULTED]),
+            or_(
+                LoanPayment.due_date > after_date,
+                and_(LoanPayment.due_date == after_date, LoanPayment.payment_id > after_id)
+            )
+        ).order_by(
+            LoanPayment.due_date, LoanPayment.payment_id
+        ).limit(self.chunk_size).with_for_update(skip_locked=True, of=LoanPayment).all()
+        
+        result = {
+            "scanned": len(rows), "paid": 0, "partial": 0, "unfunded": 0, "amount": Decimal(0),
+            "cursor": cursor, "loan_ids": set(), "user_ids": set()
+        }
+        if not rows:
+            return result
+        result["cursor"] = (rows[-1].due_date, rows[-1].payment_id)
+        
+        collections, debits, wallets = self._plan(rows, result, planned)
+        if collections and not dry_run:
+            self._apply(collections, debits, wallets)
+        return result
+    
+    def _plan(
+        self,
+        rows: list,
+        result: dict,
+        planned: Optional[Dict[str, Decimal]] = None
+    ) -> Tuple[List[Tuple[object, Decimal, bool]], Dict[str, Decimal], Dict[str, str]]:
+        """
+        Distribui o saldo das carteiras entre as parcelas e soma o plano em `result`.
+        
+        `planned` (dry_run) desconta os débitos planejados nos lotes anteriores e
+        recebe os deste lote.
+        
+        Returns:
+            (cobranças, débito por carteira, carteira BRL por tomador)
+        """
+        wallets = {
+            owner_id: wallet_id
+            for owner_id, wallet_id in self.db.query(Wallet.owner_id, Wallet.wallet_id).filter(
+                Wallet.owner_id.in_({row.user_id for row in rows}),
+                Wallet.owner_type == OwnerType.USER,
+                Wallet.currency == Currency.BRL
+            ).all()
+        }
+        available = self.wallet_repository.lock_for_debit(list(wallets.values())) if wallets else {}
+        
+        # Saldo de cada carteira consumido da parcela mais antiga para a mais nova
+        collections: List[Tuple[object, Decimal, bool]] = []
+        debits: Dict[str, Decimal] = defaultdict(Decimal)
+        for row in rows:
+            outstanding = Decimal(row.amount_due) - Decimal(row.amount_paid or 0)
+            wallet_id = wallets.get(row.user_id)
+            funds = (
+                available.get(wallet_id, Decimal(0)) - debits[wallet_id] - (planned or {}).get(wallet_id, Decimal(0))
+                if wallet_id else Decimal(0)
+            )
+            amount = min(outstanding, funds)
+            if outstanding <= 0 or amount <= 0:
+                result["unfunded"] += 1
+                continue
+            debits[wallet_id] += amount
+            full = amount >= outstanding
+            collections.append((row, amount, full))
+            result["loan_ids"].add(row.loan_id)
+            result["user_ids"].add(row.user_id)
+            result["paid" if full else "partial"] += 1
+            result["amount"] += amount
+        
+        if planned is not None:
+            for wallet_id, amount in debits.items():
+                planned[wallet_id] += amount
+        return collections, dict(debits), wallets
+    
+    def _apply(
+        self,
+        collections: List[Tuple[object, Decimal, bool]],
+        debits: Dict[str, Decimal],
+        wallets: Dict[str, str]
+    ) -> None:
+        """Grava débitos, parcelas, transações e repasses do lote em operações em lote."""
+        now = datetime.now()
+        self.wallet_repository.debit_many(debits)
+        
+        paid_ids = [row.payment_id for row, _, full in collections if full]
+        if paid_ids:
+            self.db.execute(
+                update(LoanPayment)
+                .where(LoanPayment.payment_id.in_(paid_ids))
+                .values(amount_paid=LoanPayment.amount_due, paid_at=now, status=PaymentStatus.PAID)
+                .execution_options(synchronize_session=False)
+            )
+        partial = {row.payment_id: amount for row, amount, full in collections if not full}
+        if partial:
+            self.db.execute(
+                update(LoanPayment)
+                .where(LoanPayment.payment_id.in_(list(partial)))
+                .values(amount_paid=LoanPayment.amount_paid + case(partial, value=LoanPayment.payment_id, else_=0))
+                .execution_options(synchronize_session=False)
+            )
+        
+        lenders = self._lenders([row for row, _, _ in collections])
+        transactions, repayments = [], []
+        direct_credits: Dict[str, Decimal] = defaultdict(Decimal)
+        for row, amount, full in collections:
+            transaction_id = str(uuid.uuid4())
+            shares, receiver_id = lenders[row.loan_id]
+            transactions.append({
+                "transaction_id": transaction_id,
+                "sender_id": row.user_id,
+                "sender_type": OwnerType.USER,
+                "receiver_id": receiver_id,
+                "receiver_type": OwnerType.INVESTOR if receiver_id else None,
+                "wallet_id": wallets[row.user_id],
+                "amount": amount,
+                "currency": Currency.BRL,
+                "type": TransactionType.LOAN_PAYMENT,
+                "status": TransactionStatus.COMPLETED,
+                "description": f"Parcela do empréstimo {row.loan_id} ({'quitada' if full else 'parcial'})",
+                "created_at": now
+            })
+            if shares:
+                parts = allocate(amount, [weight for _, weight in shares])
+                for (pool_id, _), part in zip(shares, parts):
+                    repayments.append(self._repayment(row, transaction_id, now, part, pool_id=pool_id))
+            else:
+                repayments.append(self._repayment(row, transaction_id, now, amount, investor_id=row.investor_id))
+                if row.investor_id:
+                    direct_credits[row.investor_id] += amount
+        
+        self.db.execute(insert(Transaction), transactions)
+        self.db.execute(insert(LoanRepayment), repayments)
+        
+        if direct_credits:
+            investor_wallets = self.wallet_repository.get_wallets_for_owners(
+                [(investor_id, OwnerType.INVESTOR) for investor_id in direct_credits], Currency.BRL
+            )
+            self.wallet_repository.credit_many({
+                investor_wallets[(investor_id, OwnerType.INVESTOR)].wallet_id: amount
+                for investor_id, amount in direct_credits.items()
+            })
+    
+    def _lenders(self, rows: list) -> Dict[str, Tuple[List[Tuple[str, Decimal]], Optional[str]]]:
+        """
+        Credores de cada empréstimo: ([(pool_id, share_percentage)], destinatário da transação).
+        
+        Lista vazia = empréstimo direto de investidor.
+        """
+        loans = {row.loan_id: row for row in rows}
+        pool_rows = self.db.query(
+            PoolLoan.credit_request_id, PoolLoan.pool_id, PoolLoan.share_percentage
+        ).filter(
+            PoolLoan.credit_request_id.in_({row.credit_request_id for row in loans.values()})
+        ).all()
+        shares_by_request: Dict[str, List[Tuple[str, Decimal]]] = defaultdict(list)
+        for credit_request_id, pool_id, share in pool_rows:
+            shares_by_request[credit_request_id].append((pool_id, share or Decimal(100)))
+        
+        pool_ids = {row.pool_id for row in loans.values() if row.pool_id}
+        owners = dict(
+            self.db.query(Pool.pool_id, Pool.investor_id).filter(Pool.pool_id.in_(pool_ids)).all()
+        ) if pool_ids else {}
+        
+        lenders = {}
+        for loan_id, row in loans.items():
+            if row.pool_id:
+                shares = shares_by_request.get(row.credit_request_id) or [(row.pool_id, Decimal(100))]
+                lenders[loan_id] = (shares, owners.get(row.pool_id))
+            else:
+                lenders[loan_id] = ([], row.investor_id)
+        return lenders
+    
+    def _repayment(self, row, transaction_id: str, now: datetime, amount: Decimal,
+                   pool_id: Optional[str] = None, investor_id: Optional[str] = None) -> dict:
+        return {
+            "repayment_id": str(uuid.uuid4()),
+            "payment_id": row.payment_id,
+            "loan_id": row.loan_id,
+            "pool_id": pool_id,
+            "investor_id": investor_id,
+            "amount": amount,
+            "transaction_id": transaction_id,
+            "collected_at": now
+        }
+
+
+def _collect_due(db: Session) -> int:
+    LoanCollectionEngine(db).run()
+    return 0
+
+
+# Worker de cobrança: repete a cada LOAN_COLLECTION_INTERVAL_SECONDS (tomadores
+# que recebem depósitos ao longo do dia têm as parcelas cobradas na rodada seguinte)
+collection_workers = WorkerPool(
+    "loan_collection",
+    handler=_collect_due,
+    workers=1,
+    idle_interval=settings.LOAN_COLLECTION_INTERVAL_SECONDS
+)
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, status, Body, Query
 from sqlalchemy.orm import Session
+from typing import Dict, Any, Optional
 
 from app.database import get_db
 from .service import LoanService
@@ -8,10 +9,149 @@ router = APIRouter(prefix="/loan", tags=["Loan"])
 
 
 @router.get("/")
-def list_loans(db: Session = Depends(get_db)):
+def list_loans(
+    user_id: Optional[str] = Query(None),
+    investor_id: Optional[str] = Query(None),
+    pool_id: Optional[str] = Query(None),
+    loan_status: Optional[str] = Query(None, alias="status"),
+    limit: int = 50,
+    offset: int = 0,
+    db: Session = Depends(get_db)
+):
     """
-    Lista empréstimos.
+    Lista empréstimos (mais recentes primeiro).
     
-    **Ainda não implementado - Placeholder**
+    Filtros opcionais: user_id, investor_id, pool_id, status (active, paid,
+    defaulted). Paginação: limit (até 200) e offset.
+    
+    Parcela e próximo vencimento são calculados a partir do empréstimo; as
+    parcelas futuras não são gravadas.
+    """
+    service = LoanService(db)
+    return service.list_loans(user_id, investor_id, pool_id, loan_status, limit, offset)
+
+
+@router.get("/user/{user_id}/payoff")
+def get_borrower_payoff_quotes(
+    user_id: str,
+    as_of: Optional[str] = Query(None, description="Data da quitação (AAAA-MM-DD, padrão: hoje)"),
+    db: Session = Depends(get_db)
+):
+    """
+    Cotações de quitação de todos os empréstimos em aberto do tomador em uma
+    chamada, com o total para quitação e o desconto total.
+    """
+    service = LoanService(db)
+    return service.get_borrower_payoff_quotes(user_id, as_of)
+
+
+@router.post("/servicing/run")
+def run_loan_servicing(
+    data: Dict[str, Any] = Body(default={}),
+    db: Session = Depends(get_db)
+):
+    """
+    Executa (ou retoma) o servicing diário de empréstimos (administrativo).
+    
+    **Body JSON (opcional):**
+    ```json
+    {
+        "business_date": "2025-01-31",  // Padrão: hoje
+        "force": false,                 // Reexecuta uma data já concluída
+        "chunk_size": 5000              // Linhas por lote
+    }
+    ```
+    
+    Marca parcelas vencidas como OVERDUE, recalcula dias de atraso e faixa de
+    inadimplência, marca DEFAULTED acima de LOAN_DEFAULT_DAYS_PAST_DUE e PAID
+    quando todas as parcelas foram pagas. Normalmente roda sozinho todo dia
+    após LOAN_SERVICING_HOUR.
+    
+    **Retorna:** status, checkpoint (fase/cursor) e, por fase, linhas, lotes,
+    tempo e linhas/s.
+    """
+    service = LoanService(db)
+    return service.run_servicing(data)
+
+
+@router.get("/servicing/runs")
+def get_loan_servicing_runs(
+    limit: int = 30,
+    db: Session = Depends(get_db)
+):
+    """Histórico das execuções de servicing (mais recentes primeiro)."""
+    service = LoanService(db)
+    return service.get_servicing_runs(limit)
+
+
+@router.post("/collection/run")
+def run_loan_collection(
+    data: Dict[str, Any] = Body(default={}),
+    db: Session = Depends(get_db)
+):
+    """
+    Cobra as parcelas vencidas nas carteiras BRL dos tomadores (administrativo).
+    
+    **Body JSON (opcional):**
+    ```json
+    {
+        "business_date": "2025-01-31",  // Parcelas vencidas até esta data (padrão: hoje)
+        "dry_run": true,                // Apenas calcula, não grava nada
+        "chunk_size": 2000              // Parcelas por lote
+    }
+    ```
+    
+    Sem saldo suficiente a parcela é paga parcialmente. Normalmente roda
+    sozinho a cada LOAN_COLLECTION_INTERVAL_SECONDS.
+    
+    **Retorna:** parcelas quitadas, parciais e sem saldo, valor cobrado e throughput.
+    """
+    service = LoanService(db)
+    return service.run_collection(data)
+
+
+@router.get("/{loan_id}")
+def get_loan(
+    loan_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Detalhes do empréstimo: parcela, próximo vencimento, total pago e
+    parcelas pagas, em atraso e restantes.
+    """
+    service = LoanService(db)
+    return service.get_loan(loan_id)
+
+
+@router.get("/{loan_id}/schedule")
+def get_loan_schedule(
+    loan_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Cronograma completo do empréstimo.
+    
+    Parcelas vencidas ou pagas vêm de loan_payments (materialized = true); as
+    futuras são calculadas a partir de principal, taxa, prazo e data de
+    desembolso (materialized = false).
+    """
+    service = LoanService(db)
+    return service.get_schedule(loan_id)
+
+
+@router.get("/{loan_id}/payoff")
+def get_loan_payoff(
+    loan_id: str,
+    as_of: Optional[str] = Query(None, description="Data da quitação (AAAA-MM-DD, padrão: hoje)"),
+    db: Session = Depends(get_db)
+):
+    """
+    Cotação de quitação antecipada na data (Price ou SAC, em forma fechada).
+    
+    **Retorna:** parcelas vencidas em aberto (arrears), saldo devedor, juros
+    pro rata desde o último vencimento, desconto em relação às parcelas
+    futuras e o valor total para quitação. Cotações ficam em cache por
+    LOAN_QUOTE_CACHE_TTL_SECONDS.
     """
-    return {"message": "Not implemented yet - Loan module"}
+    service = LoanService(db)
+    return service.get_payoff_quote(loan_id, as_of)
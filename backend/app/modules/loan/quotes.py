@@ -0,0 +1,146 @@
+"""
+Cotação de quitação antecipada (Price ou SAC), sem percorrer o cronograma.
+
+Na data da cotação, com k parcelas vencidas, i a taxa mensal e d os dias desde
+o último vencimento:
+
+- saldo devedor B_k em forma fechada (schedule.remaining_principal)
+- juros pro rata die exponencial: B_k·((1+i)^(d/30) − 1)
+- atrasados: parcelas vencidas em aberto (linhas de loan_payments, mais as
+  vencidas ainda não materializadas, somadas em forma fechada)
+- desconto: soma nominal das parcelas futuras menos (B_k + juros), ou seja,
+  os juros que deixam de ser cobrados com a quitação
+
+Lotes (todos os empréstimos de um tomador) fazem uma única consulta das
+parcelas em aberto. As cotações ficam em um cache curto por (empréstimo, data),
+invalidado quando a cobrança paga parcelas do empréstimo.
+"""
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.money import CENT
+from app.models.models import AmortizationSystem, Loan, LoanPayment, LoanStatus, PaymentStatus
+from app.modules.credit.schedule import due_date, installments_due, installments_total, remaining_principal
+
+_quote_cache = TTLCache(
+    maxsize=settings.LOAN_QUOTE_CACHE_SIZE,
+    ttl_seconds=settings.LOAN_QUOTE_CACHE_TTL_SECONDS,
+    name="loan_quotes"
+)
+
+
+def quote_loan(loan: Loan, as_of: date, open_rows: List[Tuple[int, Decimal]]) -> dict:
+    """
+    Cotação de um empréstimo (cálculo puro).
+    
+    Args:
+        loan: Empréstimo
+        as_of: Data da quitação
+        open_rows: (installment_number, valor em aberto) das parcelas materializadas não pagas
+    """
+    months = loan.duration_months
+    system = loan.amortization_system or AmortizationSystem.PRICE
+    due_count = installments_due(loan.disbursed_at, months, as_of)
+    
+    arrears = sum((outstanding for number, outstanding in open_rows if number <= due_count), Decimal(0))
+    if loan.next_due_date is not None and loan.next_installment <= due_count:
+        arrears += installments_total(
+            loan.principal, loan.interest_rate, months, loan.next_installment, due_count, system
+        )
+    
+    balance = remaining_principal(loan.principal, loan.interest_rate, months, due_count, system)
+    days = max(0, (as_of - due_date(loan.disbursed_at, due_count)).days)
+    monthly_rate = float(loan.interest_rate) / 1200
+    accrued = Decimal(str(float(balance) * ((1 + monthly_rate) ** (days / 30) - 1))).quantize(CENT)
+    
+    future = installments_total(loan.principal, loan.interest_rate, months, due_count + 1, months, system)
+    discount = max(Decimal(0), future - balance - accrued)
+    
+    return {
+        "loan_id": loan.loan_id,
+        "as_of": as_of.isoformat(),
+        "amortization_system": system.value,
+        "installments_due": due_count,
+        "installments_remaining": months - due_count,
+        "arrears": float(arrears.quantize(CENT)),
+        "principal_balance": float(balance),
+        "accrued_interest": float(accrued),
+        "remaining_installments_total": float(future),
+        "discount": float(discount),
+        "payoff_amount": float((arrears + balance + accrued).quantize(CENT))
+    }
+
+
+def invalidate_quotes(loan_ids: Iterable[str]) -> None:
+    """Descarta as cotações em cache dos empréstimos (após pagamento de parcelas)."""
+    loan_ids = set(loan_ids)
+    if loan_ids:
+        _quote_cache.pop_where(lambda key: key[0] in loan_ids)
+
+
+def quote_cache_stats() -> dict:
+    return _quote_cache.stats()
+
+
+class PayoffQuoteEngine:
+    """Cotações de quitação com cache por (empréstimo, data)."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def quote(self, loan: Loan, as_of: Optional[date] = None) -> dict:
+        return self.quote_many([loan], as_of)[0]
+    
+    def quote_many(self, loans: List[Loan], as_of: Optional[date] = None) -> List[dict]:
+        """Cotações dos empréstimos na ordem recebida; os que faltam no cache saem de uma consulta só."""
+        as_of = as_of or date.today()
+        quotes: Dict[str, dict] = {}
+        missing = []
+        for loan in loans:
+            cached = _quote_cache.get((loan.loan_id, as_of))
+            if cached is None:
+                missing.append(loan)
+            else:
+                quotes[loan.loan_id] = cached
+        
+        if missing:
+            open_rows = self._open_rows([loan.loan_id for loan in missing])
+            for loan in missing:
+                quote = quote_loan(loan, as_of, open_rows.get(loan.loan_id, []))
+                _quote_cache.set((loan.loan_id, as_of), quote)
+                quotes[loan.loan_id] = quote
+        return [quotes[loan.loan_id] for loan in loans]
+    
+    def quote_borrower(self, user_id: str, as_of: Optional[date] = None) -> dict:
+        """Cotações de todos os empréstimos em aberto (ativos ou inadimplentes) do tomador."""
+        as_of = as_of or date.today()
+        loans = self.db.query(Loan).filter(
+            Loan.user_id == user_id,
+            Loan.status.in_([LoanStatus.ACTIVE, LoanStatus.DEFAULTED])
+        ).order_by(Loan.disbursed_at).all()
+        quotes = self.quote_many(loans, as_of)
+        return {
+            "user_id": user_id,
+            "as_of": as_of.isoformat(),
+            "quotes": quotes,
+            "total_payoff": float(sum((Decimal(str(q["payoff_amount"])) for q in quotes), Decimal(0))),
+            "total_discount": float(sum((Decimal(str(q["discount"])) for q in quotes), Decimal(0)))
+        }
+    
+    def _open_rows(self, loan_ids: List[str]) -> Dict[str, List[Tuple[int, Decimal]]]:
+        """Parcelas materializadas não pagas dos empréstimos, em uma consulta."""
+        rows = self.db.query(
+            LoanPayment.loan_id, LoanPayment.installment_number, LoanPayment.amount_due, LoanPayment.amount_paid
+        ).filter(
+            LoanPayment.loan_id.in_(loan_ids),
+            LoanPayment.status != PaymentStatus.PAID
+        ).all()
+        result: Dict[str, List[Tuple[int, Decimal]]] = {}
+        for loan_id, number, amount_due, amount_paid in rows:
+            result.setdefault(loan_id, []).append((number, amount_due - (amount_paid or Decimal(0))))
+        return result
@@ -1,5 +1,13 @@
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
+from datetime import date
+from decimal import Decimal
+import uuid
+
+from app.models.models import Loan, LoanPayment, LoanStatus, PaymentStatus
+from app.modules.credit.schedule import due_date, installment_amount
 
 
 class LoanRepository:
@@ -8,5 +16,120 @@ class LoanRepository:
     def __init__(self, db: Session):
         self.db = db
     
-    # TODO: Implementar métodos do repository
-    pass
+    def get_loan_by_id(self, loan_id: str) -> Optional[Loan]:
+        """Busca empréstimo por ID."""
+        return self.db.query(Loan).filter(Loan.loan_id == loan_id).first()
+    
+    def list_loans(
+        self,
+        user_id: Optional[str] = None,
+        investor_id: Optional[str] = None,
+        pool_id: Optional[str] = None,
+        status: Optional[LoanStatus] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> List[Loan]:
+        """Lista empréstimos com filtros opcionais, mais recentes primeiro."""
+        query = self.db.query(Loan)
+        if user_id:
+            query = query.filter(Loan.user_id == user_id)
+        if investor_id:
+            query = query.filter(Loan.investor_id == investor_id)
+        if pool_id:
+            query = query.filter(Loan.pool_id == pool_id)
+        if status:
+            query = query.filter(Loan.status == status)
+        return query.order_by(Loan.disbursed_at.desc(), Loan.loan_id).offset(offset).limit(limit).all()
+    
+    def get_payments(self, loan_id: str) -> List[LoanPayment]:
+        """Parcelas materializadas do empréstimo (vencidas ou pagas)."""
+        return self.db.query(LoanPayment).filter(
+            LoanPayment.loan_id == loan_id
+        ).order_by(LoanPayment.installment_number).all()
+    
+    def get_paid_amounts(self, loan_ids: List[str]) -> Dict[str, Decimal]:
+        """Total pago por empréstimo em uma única consulta."""
+        if not loan_ids:
+            return {}
+        rows = self.db.query(
+            LoanPayment.loan_id, func.coalesce(func.sum(LoanPayment.amount_paid), 0)
+        ).filter(
+            LoanPayment.loan_id.in_(loan_ids)
+        ).group_by(LoanPayment.loan_id).all()
+        return {loan_id: Decimal(total) for loan_id, total in rows}
+    
+    def get_unmaterialized_due(self, business_date: date, after_loan_id: str, limit: int) -> list:
+        """
+        Empréstimos com parcelas vencidas até `business_date` ainda sem linha em
+        loan_payments, em páginas por loan_id. Somente leitura (dry_run da cobrança).
+        """
+        return self.db.query(
+            Loan.loan_id, Loan.user_id, Loan.principal, Loan.interest_rate, Loan.duration_months,
+            Loan.amortization_system, Loan.disbursed_at, Loan.next_installment
+        ).filter(
+            Loan.status.in_([LoanStatus.ACTIVE, LoanStatus.DEFAULTED]),
+            Loan.next_due_date <= business_date,
+            Loan.loan_id > after_loan_id
+        ).order_by(Loan.loan_id).limit(limit).all()
+    
+    def materialize_due(self, business_date: date, limit: int) -> Tuple[int, int]:
+        """
+        Grava em loan_payments as parcelas que vencem até `business_date`.
+        
+        Percorre até `limit` empréstimos com next_due_date vencido (índice
+        (status, next_due_date), SKIP LOCKED), insere as parcelas com INSERT
+        IGNORE em lote (a chave (loan_id, installment_number) torna a operação
+        idempotente) e avança next_installment/next_due_date com UPDATE ... CASE.
+        Parcelas de dias anteriores já nascem OVERDUE. Não faz commit.
+        
+        Returns:
+            (empréstimos processados, parcelas materializadas)
+        """
+        loans = self.db.query(
+            Loan.loan_id, Loan.principal, Loan.interest_rate, Loan.duration_months,
+            Loan.amortization_system, Loan.disbursed_at, Loan.next_installment
+        ).filter(
+            Loan.status.in_([LoanStatus.ACTIVE, LoanStatus.DEFAULTED]),
+            Loan.next_due_date <= business_date
+        ).order_by(
+            Loan.next_due_date, Loan.loan_id
+        ).limit(limit).with_for_update(skip_locked=True).all()
+        if not loans:
+            return 0, 0
+        
+        rows = []
+        next_installments: Dict[str, int] = {}
+        next_due_dates: Dict[str, Optional[date]] = {}
+        for loan in loans:
+            number = loan.next_installment
+            while number <= loan.duration_months and due_date(loan.disbursed_at, number) <= business_date:
+                due = due_date(loan.disbursed_at, number)
+                rows.append({
+                    "payment_id": str(uuid.uuid4()),
+                    "loan_id": loan.loan_id,
+                    "installment_number": number,
+                    "amount_due": installment_amount(
+                        loan.principal, loan.interest_rate, loan.duration_months, number, loan.amortization_system
+                    ),
+                    "amount_paid": 0,
+                    "due_date": due,
+                    "status": PaymentStatus.OVERDUE if due < business_date else PaymentStatus.PENDING
+                })
+                number += 1
+            next_installments[loan.loan_id] = number
+            next_due_dates[loan.loan_id] = (
+                due_date(loan.disbursed_at, number) if number <= loan.duration_months else None
+            )
+        
+        if rows:
+            self.db.execute(mysql_insert(LoanPayment).prefix_with("IGNORE"), rows)
+        self.db.execute(
+            update(Loan)
+            .where(Loan.loan_id.in_(list(next_installments)))
+            .values(
+                next_installment=case(next_installments, value=Loan.loan_id),
+                next_due_date=case(next_due_dates, value=Loan.loan_id)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return len(loans), len(rows)
@@ -1,8 +1,15 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+from datetime import date
+from decimal import Decimal
 
 from .repository import LoanRepository
+from .quotes import PayoffQuoteEngine
+from app.models.models import Loan, LoanStatus, PaymentStatus
+from app.modules.credit.schedule import installment_amount, scheduled_installments
+from .servicing import LoanServicingEngine
+from .collection import LoanCollectionEngine
 
 
 class LoanService:
@@ -12,5 +19,209 @@ class LoanService:
         self.db = db
         self.repository = LoanRepository(db)
     
-    # TODO: Implementar métodos do service
-    pass
+    # ========== CONSULTAS ==========
+    
+    def list_loans(
+        self,
+        user_id: Optional[str] = None,
+        investor_id: Optional[str] = None,
+        pool_id: Optional[str] = None,
+        loan_status: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0
+    ) -> List[dict]:
+        """
+        Lista empréstimos com filtros opcionais.
+        
+        O resumo de cada empréstimo vem do cronograma calculado; o total pago
+        de todos os empréstimos da página sai de uma única consulta agregada.
+        """
+        status_filter = None
+        if loan_status:
+            try:
+                status_filter = LoanStatus[loan_status.upper()]
+            except KeyError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="status deve ser active, paid ou defaulted"
+                )
+        if limit <= 0 or limit > 200 or offset < 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="limit deve estar entre 1 e 200 e offset não pode ser negativo"
+            )
+        
+        loans = self.repository.list_loans(user_id, investor_id, pool_id, status_filter, limit, offset)
+        paid = self.repository.get_paid_amounts([loan.loan_id for loan in loans])
+        return [self._loan_to_dict(loan, paid.get(loan.loan_id, Decimal(0))) for loan in loans]
+    
+    def get_loan(self, loan_id: str) -> dict:
+        """Detalhes do empréstimo com a situação das parcelas vencidas."""
+        loan = self._get_loan_or_404(loan_id)
+        payments = self.repository.get_payments(loan_id)
+        overdue = [p for p in payments if p.status == PaymentStatus.OVERDUE]
+        paid_count = sum(1 for p in payments if p.status == PaymentStatus.PAID)
+        
+        result = self._loan_to_dict(loan, sum((p.amount_paid or Decimal(0) for p in payments), Decimal(0)))
+        result.update({
+            "installments_paid": paid_count,
+            "installments_overdue": len(overdue),
+            "installments_remaining": loan.duration_months - paid_count,
+            "overdue_amount": float(sum((p.amount_due - (p.amount_paid or 0) for p in overdue), Decimal(0)))
+        })
+        return result
+    
+    def get_schedule(self, loan_id: str) -> dict:
+        """
+        Cronograma completo: parcelas materializadas como estão gravadas e as
+        futuras calculadas a partir do empréstimo (materialized = false).
+        """
+        loan = self._get_loan_or_404(loan_id)
+        stored = {p.installment_number: p for p in self.repository.get_payments(loan_id)}
+        
+        installments = []
+        for item in scheduled_installments(
+            loan.principal, loan.interest_rate, loan.duration_months, loan.disbursed_at,
+            system=loan.amortization_system
+        ):
+            payment = stored.get(item["installment_number"])
+            if payment is None:
+                installments.append({
+                    "installment_number": item["installment_number"],
+                    "due_date": item["due_date"].isoformat(),
+                    "amount_due": float(item["amount_due"]),
+                    "amount_paid": 0.0,
+                    "paid_at": None,
+                    "status": PaymentStatus.PENDING.value,
+                    "materialized": False
+                })
+            else:
+                installments.append({
+                    "installment_number": payment.installment_number,
+                    "due_date": payment.due_date.isoformat(),
+                    "amount_due": float(payment.amount_due),
+                    "amount_paid": float(payment.amount_paid or 0),
+                    "paid_at": payment.paid_at.isoformat() if payment.paid_at else None,
+                    "status": payment.status.value,
+                    "materialized": True
+                })
+        
+        return {
+            "loan_id": loan.loan_id,
+            "amortization_system": loan.amortization_system.value,
+            "installments": installments
+        }
+    
+    def get_payoff_quote(self, loan_id: str, as_of: Optional[str] = None) -> dict:
+        """
+        Cotação de quitação antecipada na data `as_of` (padrão: hoje).
+        
+        Atrasados + saldo devedor + juros pro rata, e o desconto em relação às
+        parcelas futuras, calculados em forma fechada (Price ou SAC).
+        """
+        loan = self._get_loan_or_404(loan_id)
+        if loan.status == LoanStatus.PAID:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Empréstimo já quitado"
+            )
+        return PayoffQuoteEngine(self.db).quote(loan, self._parse_date(as_of, "as_of"))
+    
+    def get_borrower_payoff_quotes(self, user_id: str, as_of: Optional[str] = None) -> dict:
+        """Cotações de quitação de todos os empréstimos em aberto do tomador, com totais."""
+        return PayoffQuoteEngine(self.db).quote_borrower(user_id, self._parse_date(as_of, "as_of"))
+    
+    def _get_loan_or_404(self, loan_id: str) -> Loan:
+        loan = self.repository.get_loan_by_id(loan_id)
+        if not loan:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Empréstimo não encontrado"
+            )
+        return loan
+    
+    def _loan_to_dict(self, loan: Loan, amount_paid: Decimal) -> dict:
+        """Converte empréstimo para dicionário (parcela e próximo vencimento calculados)."""
+        return {
+            "loan_id": loan.loan_id,
+            "credit_request_id": loan.credit_request_id,
+            "user_id": loan.user_id,
+            "investor_id": loan.investor_id,
+            "pool_id": loan.pool_id,
+            "principal": float(loan.principal),
+            "interest_rate": float(loan.interest_rate),
+            "duration_months": loan.duration_months,
+            "amortization_system": loan.amortization_system.value,
+            "installment_amount": float(installment_amount(
+                loan.principal, loan.interest_rate, loan.duration_months,
+                min(loan.next_installment or 1, loan.duration_months), loan.amortization_system
+            )),
+            "status": loan.status.value,
+            "days_past_due": loan.days_past_due or 0,
+            "delinquency_bucket": loan.delinquency_bucket.value if loan.delinquency_bucket else None,
+            "next_installment": loan.next_installment if loan.next_due_date else None,
+            "next_due_date": loan.next_due_date.isoformat() if loan.next_due_date else None,
+            "amount_paid": float(amount_paid),
+            "disbursed_at": loan.disbursed_at.isoformat() if loan.disbursed_at else None
+        }
+    
+    def _parse_date(self, value: Optional[str], field: str) -> Optional[date]:
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(str(value))
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{field} deve estar no formato AAAA-MM-DD"
+            )
+    
+    # ========== JOBS EM LOTE ==========
+    
+    def _parse_batch_options(self, data: dict):
+        """business_date (AAAA-MM-DD) e chunk_size opcionais dos jobs em lote."""
+        business_date = self._parse_date(data.get('business_date'), 'business_date')
+        
+        chunk_size = data.get('chunk_size')
+        if chunk_size is not None and (not isinstance(chunk_size, int) or chunk_size <= 0):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="chunk_size deve ser um inteiro positivo"
+            )
+        return business_date, chunk_size
+    
+    # ========== SERVICING ==========
+    
+    def run_servicing(self, data: dict) -> dict:
+        """
+        Executa (ou retoma) o servicing diário.
+        
+        Args:
+            data: Opcionalmente business_date (AAAA-MM-DD), force e chunk_size
+        
+        Returns:
+            Relatório da execução (linhas, lotes e throughput por fase)
+        """
+        business_date, chunk_size = self._parse_batch_options(data)
+        engine = LoanServicingEngine(self.db, chunk_size=chunk_size)
+        return engine.run(business_date, force=bool(data.get('force')))
+    
+    def get_servicing_runs(self, limit: int = 30) -> List[dict]:
+        """Execuções de servicing mais recentes primeiro."""
+        return LoanServicingEngine(self.db).list_runs(limit)
+    
+    # ========== COBRANÇA ==========
+    
+    def run_collection(self, data: dict) -> dict:
+        """
+        Cobra as parcelas vencidas debitando as carteiras BRL dos tomadores.
+        
+        Args:
+            data: Opcionalmente business_date (AAAA-MM-DD), dry_run e chunk_size
+        
+        Returns:
+            Totais da cobrança (quitadas, parciais, sem saldo, valor cobrado)
+        """
+        business_date, chunk_size = self._parse_batch_options(data)
+        engine = LoanCollectionEngine(self.db, chunk_size=chunk_size)
+        return engine.run(business_date, dry_run=bool(data.get('dry_run')))
@@ -0,0 +1,328 @@
+"""
+Servicing diário de empréstimos em lote.
+
+Uma execução por data de referência, em três fases set-based:
+
+1. schedule: materializa em loan_payments as parcelas que venceram (o
+   cronograma futuro é calculado, não gravado); as de dias anteriores já
+   nascem OVERDUE
+2. overdue: parcelas PENDING vencidas viram OVERDUE
+   (UPDATE ... ORDER BY due_date LIMIT n, usando o índice (status, due_date))
+3. loans: por faixas de loan_id, recalcula days_past_due e delinquency_bucket a
+   partir da parcela vencida mais antiga, marca DEFAULTED acima de
+   LOAN_DEFAULT_DAYS_PAST_DUE, marca PAID quando todas as parcelas já foram
+   materializadas e nenhuma está em aberto, e propaga o status para pool_loans
+
+Cada lote é uma transação curta (os locks duram só o lote) e grava o checkpoint
+(fase e cursor) junto com as alterações, então uma execução interrompida é
+retomada de onde parou. O relatório traz linhas, lotes e linhas/s por fase.
+
+Execução manual: python -m app.modules.loan.servicing [AAAA-MM-DD] [--force]
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+import logging
+import sys
+import time
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.workers import WorkerPool
+from app.models.models import LoanServicingRun, ServicingRunStatus
+from .repository import LoanRepository
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("schedule", "overdue", "loans")
+
+# Contador usado no cálculo de linhas/s de cada fase
+_PHASE_ROWS = {"schedule": "loans_scheduled", "overdue": "payments_overdue", "loans": "loans_scanned"}
+
+_MARK_OVERDUE = text("""
+    UPDATE loan_payments
+    SET status = 'OVERDUE'
+    WHERE status = 'PENDING' AND due_date < :today
+    ORDER BY due_date, payment_id
+    LIMIT :chunk
+""")
+
+_NEXT_LOANS = text("""
+    SELECT loan_id FROM loans
+    WHERE status = 'ACTIVE' AND loan_id > :after
+    ORDER BY loan_id
+    LIMIT :chunk
+""")
+
+_DAYS_PAST_DUE = "COALESCE(DATEDIFF(:today, o.oldest_due), 0)"
+
+_AGE_LOANS = text(f"""
+    UPDATE loans l
+    LEFT JOIN (
+        SELECT loan_id, MIN(due_date) AS oldest_due
+        FROM loan_payments
+        WHERE status = 'OVERDUE' AND loan_id > :after AND loan_id <= :upto
+        GROUP BY loan_id
+    ) o ON o.loan_id = l.loan_id
+    SET l.days_past_due = {_DAYS_PAST_DUE},
+        l.delinquency_bucket = CASE
+            WHEN {_DAYS_PAST_DUE} = 0 THEN 'CURRENT'
+            WHEN {_DAYS_PAST_DUE} <= 30 THEN 'DPD_1_30'
+            WHEN {_DAYS_PAST_DUE} <= 60 THEN 'DPD_31_60'
+            WHEN {_DAYS_PAST_DUE} <= 90 THEN 'DPD_61_90'
+            ELSE 'DPD_90_PLUS'
+        END
+    WHERE l.status = 'ACTIVE' AND l.loan_id > :after AND l.loan_id <= :upto
+""")
+
+_DEFAULT_LOANS = text("""
+    UPDATE loans
+    SET status = 'DEFAULTED'
+    WHERE status = 'ACTIVE' AND loan_id > :after AND loan_id <= :upto
+      AND days_past_due >= :threshold
+""")
+
+_PAID_LOANS = text("""
+    UPDATE loans l
+    SET l.status = 'PAID', l.days_past_due = 0, l.delinquency_bucket = 'CURRENT'
+    WHERE l.status = 'ACTIVE' AND l.loan_id > :after AND l.loan_id <= :upto
+      AND l.next_due_date IS NULL
+      AND EXISTS (SELECT 1 FROM loan_payments p WHERE p.loan_id = l.loan_id)
+      AND NOT EXISTS (
+          SELECT 1 FROM loan_payments p WHERE p.loan_id = l.loan_id AND p.status <> 'PAID'
+      )
+""")
+
+_SYNC_POOL_LOANS = text("""
+    UPDATE pool_loans pl
+    JOIN loans l ON l.credit_request_id = pl.credit_request_id
+    SET pl.status = l.status
+    WHERE l.loan_id > :after AND l.loan_id <= :upto
+      AND l.status <> 'ACTIVE' AND pl.status <> l.status
+""")
+
+
+class LoanServicingEngine:
+    """Executa (ou retoma) o servicing de uma data de referência."""
+    
+    def __init__(self, db: Session, chunk_size: Optional[int] = None):
+        self.db = db
+        self.chunk_size = chunk_size or settings.LOAN_SERVICING_CHUNK_SIZE
+        self.pause_seconds = settings.LOAN_SERVICING_PAUSE_MS / 1000
+        self.loan_repository = LoanRepository(db)
+    
+    def run(self, business_date: Optional[date] = None, force: bool = False) -> dict:
+        """
+        Executa o servicing da data (padrão: hoje).
+        
+        Uma execução já concluída é apenas reportada, a não ser com `force`.
+        
+        Raises:
+            HTTPException 409: se outra execução da mesma data está em andamento
+        """
+        business_date = business_date or date.today()
+        run = self._claim(business_date, force)
+        if run.status == ServicingRunStatus.COMPLETED:
+            return self._to_dict(run)
+        
+        logger.info(f"[Loan Servicing] {business_date}: iniciando na fase {run.phase} (cursor {run.cursor})")
+        started = time.perf_counter()
+        try:
+            for phase in PHASES[PHASES.index(run.phase):]:
+                if run.phase != phase:
+                    run.phase, run.cursor = phase, None
+                getattr(self, f"_phase_{phase}")(run, business_date)
+            run.status = ServicingRunStatus.COMPLETED
+            run.finished_at = datetime.now()
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            run.status = ServicingRunStatus.FAILED
+            run.last_error = str(e)[:2000]
+            self.db.commit()
+            metrics.increment("loan_servicing.failed")
+            logger.error(f"[Loan Servicing] {business_date}: falhou na fase {run.phase}: {str(e)}")
+            raise
+        
+        metrics.observe("loan_servicing.seconds", time.perf_counter() - started)
+        logger.info(f"[Loan Servicing] {business_date}: concluído em {time.perf_counter() - started:.1f}s {run.stats}")
+        return self._to_dict(run)
+    
+    def run_if_due(self) -> int:
+        """Chamado pelo worker: executa o servicing do dia após LOAN_SERVICING_HOUR."""
+        if datetime.now().hour < settings.LOAN_SERVICING_HOUR:
+            return 0
+        run = self.db.query(LoanServicingRun).filter(
+            LoanServicingRun.business_date == date.today()
+        ).first()
+        if run is not None and (run.status == ServicingRunStatus.COMPLETED or not self._is_stale(run)):
+            return 0
+        try:
+            self.run()
+        except HTTPException:
+            pass
+        return 0
+    
+    # ========== CHECKPOINT ==========
+    
+    def _claim(self, business_date: date, force: bool) -> LoanServicingRun:
+        """Cria ou retoma a execução da data (uma por data, via chave única)."""
+        self.db.execute(
+            mysql_insert(LoanServicingRun).values(
+                run_id=str(uuid.uuid4()),
+                business_date=business_date,
+                status=ServicingRunStatus.RUNNING,
+                phase=PHASES[0],
+                stats={}
+            ).prefix_with("IGNORE")
+        )
+        run = self.db.query(LoanServicingRun).filter(
+            LoanServicingRun.business_date == business_date
+        ).with_for_update().populate_existing().one()
+        
+        if run.status == ServicingRunStatus.RUNNING and run.heartbeat_at and not self._is_stale(run):
+            self.db.rollback()
+            raise HTTPException(status_code=409, detail=f"Servicing de {business_date} já está em execução")
+        if run.status == ServicingRunStatus.COMPLETED and not force:
+            self.db.rollback()
+            return run
+        if run.status == ServicingRunStatus.COMPLETED:
+            run.phase, run.cursor, run.stats = PHASES[0], None, {}
+        
+        run.status = ServicingRunStatus.RUNNING
+        run.last_error = None
+        run.finished_at = None
+        run.heartbeat_at = datetime.now()
+        self.db.commit()
+        return run
+    
+    def _is_stale(self, run: LoanServicingRun) -> bool:
+        if run.heartbeat_at is None:
+            return True
+        return run.heartbeat_at < datetime.now() - timedelta(seconds=settings.LOAN_SERVICING_STALE_SECONDS)
+    
+    def _checkpoint(self, run: LoanServicingRun, phase: str, rows: Dict[str, int], seconds: float, cursor: Optional[str]) -> None:
+        """Acumula contadores da fase e grava o cursor na mesma transação do lote; faz commit."""
+        stats = dict(run.stats or {})
+        phase_stats = dict(stats.get(phase) or {"chunks": 0, "seconds": 0.0})
+        for key, value in rows.items():
+            phase_stats[key] = phase_stats.get(key, 0) + value
+            metrics.increment(f"loan_servicing.{key}", value)
+        phase_stats["chunks"] += 1
+        phase_stats["seconds"] = round(phase_stats["seconds"] + seconds, 3)
+        scanned = phase_stats.get(_PHASE_ROWS[phase], 0)
+        phase_stats["rows_per_second"] = round(scanned / phase_stats["seconds"], 1) if phase_stats["seconds"] else None
+        stats[phase] = phase_stats
+        
+        run.stats = stats
+        run.cursor = cursor
+        run.heartbeat_at = datetime.now()
+        self.db.commit()
+        if self.pause_seconds:
+            time.sleep(self.pause_seconds)
+    
+    # ========== FASES ==========
+    
+    def _phase_schedule(self, run: LoanServicingRun, business_date: date) -> None:
+        """Materializa as parcelas vencidas; retomável porque o filtro é next_due_date."""
+        while True:
+            started = time.perf_counter()
+            loans, rows = self.loan_repository.materialize_due(business_date, self.chunk_size)
+            self._checkpoint(
+                run,
+                "schedule",
+                {"loans_scheduled": loans, "installments_materialized": rows},
+                time.perf_counter() - started,
+                None
+            )
+            if loans < self.chunk_size:
+                return
+    
+    def _phase_overdue(self, run: LoanServicingRun, business_date: date) -> None:
+        """Marca parcelas vencidas; retomável porque o filtro é o próprio status."""
+        while True:
+            started = time.perf_counter()
+            marked = self.db.execute(_MARK_OVERDUE, {"today": business_date, "chunk": self.chunk_size}).rowcount
+            self._checkpoint(run, "overdue", {"payments_overdue": marked}, time.perf_counter() - started, None)
+            if marked < self.chunk_size:
+                return
+    
+    def _phase_loans(self, run: LoanServicingRun, business_date: date) -> None:
+        """Atraso, inadimplência e quitação por faixas de loan_id (cursor = último loan_id)."""
+        after = run.cursor or ""
+        while True:
+            started = time.perf_counter()
+            loan_ids: List[str] = self.db.execute(
+                _NEXT_LOANS, {"after": after, "chunk": self.chunk_size}
+            ).scalars().all()
+            if not loan_ids:
+                self.db.rollback()
+                return
+            
+            params = {"after": after, "upto": loan_ids[-1]}
+            self.db.execute(_AGE_LOANS, {**params, "today": business_date})
+            defaulted = self.db.execute(
+                _DEFAULT_LOANS, {**params, "threshold": settings.LOAN_DEFAULT_DAYS_PAST_DUE}
+            ).rowcount
+            paid = self.db.execute(_PAID_LOANS, params).rowcount
+            if defaulted or paid:
+                self.db.execute(_SYNC_POOL_LOANS, params)
+            
+            after = loan_ids[-1]
+            self._checkpoint(
+                run,
+                "loans",
+                {"loans_scanned": len(loan_ids), "loans_defaulted": defaulted, "loans_paid": paid},
+                time.perf_counter() - started,
+                after
+            )
+            if len(loan_ids) < self.chunk_size:
+                return
+    
+    # ========== CONSULTAS ==========
+    
+    def _to_dict(self, run: LoanServicingRun) -> dict:
+        return {
+            "run_id": run.run_id,
+            "business_date": run.business_date.isoformat(),
+            "status": run.status.value,
+            "phase": run.phase,
+            "cursor": run.cursor,
+            "stats": run.stats or {},
+            "last_error": run.last_error,
+            "started_at": run.started_at.isoformat() if run.started_at else None,
+            "finished_at": run.finished_at.isoformat() if run.finished_at else None
+        }
+    
+    def list_runs(self, limit: int = 30) -> List[dict]:
+        runs = self.db.query(LoanServicingRun).order_by(
+            LoanServicingRun.business_date.desc()
+        ).limit(limit).all()
+        return [self._to_dict(run) for run in runs]
+
+
+# Worker que dispara o servicing do dia (verifica a cada 5 minutos)
+servicing_workers = WorkerPool(
+    "loan_servicing",
+    handler=lambda db: LoanServicingEngine(db).run_if_due(),
+    workers=1,
+    idle_interval=300
+)
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+    
+    logging.basicConfig(level=logging.INFO)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    target = date.fromisoformat(args[0]) if args else None
+    session = SessionLocal()
+    try:
+        print(LoanServicingEngine(session).run(target, force="--force" in sys.argv))
+    finally:
+        session.close()
@@ -0,0 +1,8 @@
+"""
+Módulo de participantes (índice unificado de usuários e investidores).
+"""
+
+from .resolver import PartyResolver, PartyRef, party_cache_stats
+from .repository import PartyRepository
+
+__all__ = ["PartyResolver", "PartyRef", "PartyRepository", "party_cache_stats"]
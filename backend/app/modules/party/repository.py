@@ -0,0 +1,56 @@
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, or_, select
+from typing import List, Optional, Tuple, Union
+
+from app.models.models import Party, User, Investor, OwnerType
+
+
+class PartyRepository:
+    """Repository para o índice parties (usuários + investidores)."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_by_ids(self, party_ids: List[str]) -> List[Party]:
+        """Busca participantes por ID (uma consulta IN na PK)."""
+        if not party_ids:
+            return []
+        return self.db.query(Party).filter(Party.party_id.in_(party_ids)).all()
+    
+    def find_conflicts(self, email: str, cpf_cnpj: str) -> List[Party]:
+        """Participantes que já usam o email ou o CPF/CNPJ (uma consulta, dois índices únicos)."""
+        return self.db.query(Party).filter(
+            or_(Party.email == email, Party.cpf_cnpj == cpf_cnpj)
+        ).all()
+    
+    def get_entity(
+        self,
+        party_id: Optional[str] = None,
+        email: Optional[str] = None
+    ) -> Optional[Tuple[Party, Union[User, Investor]]]:
+        """
+        Busca o participante e a entidade completa (User ou Investor) em uma consulta.
+        
+        Returns:
+            (Party, User|Investor) ou None se não encontrado
+        """
+        user = aliased(User)
+        investor = aliased(Investor)
+        query = select(Party, user, investor).outerjoin(
+            user, and_(Party.party_type == OwnerType.USER, user.user_id == Party.party_id)
+        ).outerjoin(
+            investor, and_(Party.party_type == OwnerType.INVESTOR, investor.investor_id == Party.party_id)
+        )
+        if party_id is not None:
+            query = query.where(Party.party_id == party_id)
+        elif email is not None:
+            query = query.where(Party.email == email)
+        else:
+            return None
+        
+        row = self.db.execute(query.limit(1)).first()
+        if not row:
+            return None
+        party, user_row, investor_row = row
+        entity = user_row if party.party_type == OwnerType.USER else investor_row
+        return (party, entity) if entity is not None else None
@@ -0,0 +1,121 @@
+"""
+Resolução unificada de participantes.
+
+Usuários e investidores vivem em tabelas separadas; o índice `parties`
+(mantido por triggers) carrega o tipo de cada participante, então qualquer
+consulta por ID, email ou CPF/CNPJ é uma única busca indexada em vez de uma
+por tabela. Referências leves (tipo e nome) ficam em um cache de TTL curto;
+entidades completas (para login e KYC) não são cacheadas.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.models import Party, User, Investor, OwnerType
+from .repository import PartyRepository
+
+
+@dataclass(frozen=True)
+class PartyRef:
+    party_id: str
+    party_type: OwnerType
+    email: str
+    cpf_cnpj: str
+    full_name: str
+
+
+# party_id -> PartyRef (compartilhado entre requests do processo)
+_party_cache = TTLCache(
+    maxsize=settings.PARTY_CACHE_SIZE,
+    ttl_seconds=settings.PARTY_CACHE_TTL_SECONDS,
+    name="parties"
+)
+
+
+def _to_ref(party: Party) -> PartyRef:
+    return PartyRef(
+        party_id=party.party_id,
+        party_type=party.party_type,
+        email=party.email,
+        cpf_cnpj=party.cpf_cnpj,
+        full_name=party.full_name
+    )
+
+
+class PartyResolver:
+    """Resolve usuários e investidores pelo índice parties."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.repository = PartyRepository(db)
+    
+    def get(self, party_id: str) -> Optional[PartyRef]:
+        """Participante por ID (cacheado)."""
+        return self.get_many([party_id]).get(party_id)
+    
+    def get_many(self, party_ids: Iterable[str]) -> Dict[str, PartyRef]:
+        """
+        Resolve vários IDs: acertos vêm do cache, o restante em uma consulta IN.
+        
+        Returns:
+            {party_id: PartyRef} apenas para os IDs encontrados
+        """
+        found: Dict[str, PartyRef] = {}
+        missing: List[str] = []
+        for party_id in set(party_ids):
+            if not party_id:
+                continue
+            ref = _party_cache.get(party_id)
+            if ref is None:
+                missing.append(party_id)
+            else:
+                found[party_id] = ref
+        
+        for party in self.repository.get_by_ids(missing):
+            ref = _to_ref(party)
+            _party_cache.set(ref.party_id, ref)
+            found[ref.party_id] = ref
+        return found
+    
+    def find_conflicts(self, email: str, cpf_cnpj: str) -> Tuple[bool, bool]:
+        """
+        Verifica se email e CPF/CNPJ já estão em uso (sem cache).
+        
+        Returns:
+            (email_em_uso, cpf_cnpj_em_uso)
+        """
+        conflicts = self.repository.find_conflicts(email, cpf_cnpj)
+        email_taken = any(party.email.lower() == email.lower() for party in conflicts)
+        cpf_taken = any(party.cpf_cnpj == cpf_cnpj for party in conflicts)
+        return email_taken, cpf_taken
+    
+    def load_entity(
+        self,
+        party_id: Optional[str] = None,
+        email: Optional[str] = None
+    ) -> Optional[Tuple[OwnerType, Union[User, Investor]]]:
+        """
+        Carrega a entidade completa (User ou Investor) por ID ou email em uma consulta.
+        
+        Returns:
+            (OwnerType, entidade) ou None se não encontrado
+        """
+        result = self.repository.get_entity(party_id=party_id, email=email)
+        if result is None:
+            return None
+        party, entity = result
+        _party_cache.set(party.party_id, _to_ref(party))
+        return party.party_type, entity
+    
+    @staticmethod
+    def invalidate(party_id: str) -> None:
+        """Descarta a referência cacheada (ex: nome ou email alterado)."""
+        _party_cache.pop(party_id)
+
+
+def party_cache_stats() -> dict:
+    """Estatísticas do cache de participantes."""
+    return _party_cache.stats()
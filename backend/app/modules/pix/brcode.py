@@ -0,0 +1,238 @@
+"""
+BR Code (QR Code PIX) no padrão EMV-MPM do Banco Central.
+
+O payload é uma sequência de campos TLV (ID de 2 dígitos, tamanho de 2 dígitos,
+valor) terminada pelo campo 63 com o CRC16-CCITT (polinômio 0x1021, valor
+inicial 0xFFFF) calculado sobre todo o payload, incluindo "6304".
+
+- Estático (ponto de iniciação 11): chave PIX, valor opcional, reutilizável
+- Dinâmico (ponto de iniciação 12): uso único, com valor e txid próprios
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Optional
+import base64
+import io
+import re
+import unicodedata
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+GUI_PIX = "br.gov.bcb.pix"
+
+# IDs de campos do payload
+ID_PAYLOAD_FORMAT = "00"
+ID_POINT_OF_INITIATION = "01"
+ID_MERCHANT_ACCOUNT = "26"
+ID_MERCHANT_CATEGORY = "52"
+ID_CURRENCY = "53"
+ID_AMOUNT = "54"
+ID_COUNTRY = "58"
+ID_MERCHANT_NAME = "59"
+ID_MERCHANT_CITY = "60"
+ID_ADDITIONAL_DATA = "62"
+ID_CRC = "63"
+
+# Subcampos do campo 26 (Merchant Account Information - PIX)
+ID_GUI = "00"
+ID_KEY = "01"
+ID_DESCRIPTION = "02"
+ID_URL = "25"
+
+# Subcampo do campo 62
+ID_TXID = "05"
+
+_TXID_RE = re.compile(r"^[A-Za-z0-9]{1,25}$")
+# Campo 54: até 10 dígitos inteiros e 2 decimais com ponto (exclui NaN, Infinity, expoente e sinal)
+_AMOUNT_RE = re.compile(r"^\d{1,10}(\.\d{1,2})?$")
+
+
+class BRCodeError(ValueError):
+    """Payload BR Code inválido."""
+
+
+@dataclass
+class BRCode:
+    key: Optional[str]
+    amount: Optional[Decimal]
+    txid: Optional[str]
+    merchant_name: Optional[str]
+    merchant_city: Optional[str]
+    description: Optional[str] = None
+    url: Optional[str] = None
+    dynamic: bool = False
+
+
+def crc16_ccitt(data: str) -> str:
+    """CRC16-CCITT (0x1021, init 0xFFFF) em 4 dígitos hexadecimais maiúsculos."""
+    crc = 0xFFFF
+    for byte in data.encode("utf-8"):
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return f"{crc:04X}"
+
+
+def _tlv(field_id: str, value: str) -> str:
+    if len(value) > 99:
+        raise BRCodeError(f"Campo {field_id} excede 99 caracteres")
+    return f"{field_id}{len(value):02d}{value}"
+
+
+def _ascii(value: str, limit: int) -> str:
+    """Remove acentos e limita o tamanho (nome/cidade aceitam apenas ASCII)."""
+    normalized = unicodedata.normalize("NFKD", value or "").encode("ascii", "ignore").decode("ascii")
+    return normalized.strip()[:limit]
+
+
+def build_payload(
+    key: Optional[str],
+    merchant_name: str,
+    merchant_city: str,
+    amount: Optional[Decimal] = None,
+    txid: Optional[str] = None,
+    description: Optional[str] = None,
+    url: Optional[str] = None,
+    dynamic: bool = False
+) -> str:
+    """
+    Monta o payload BR Code.
+    
+    Args:
+        key: Chave PIX do recebedor (estático)
+        merchant_name: Nome do recebedor (até 25 caracteres)
+        merchant_city: Cidade do recebedor (até 15 caracteres)
+        amount: Valor fixo (opcional no estático)
+        txid: Identificador da cobrança (até 25 alfanuméricos; "***" se ausente)
+        description: Texto livre exibido ao pagador
+        url: Location do payload dinâmico (sem "https://")
+        dynamic: True para código de uso único (ponto de iniciação 12)
+    """
+    if not key and not url:
+        raise BRCodeError("Chave PIX ou URL obrigatória")
+    if txid and not _TXID_RE.match(txid):
+        raise BRCodeError("txid deve ter até 25 caracteres alfanuméricos")
+    
+    account = _tlv(ID_GUI, GUI_PIX)
+    if url:
+        account += _tlv(ID_URL, url)
+    else:
+        account += _tlv(ID_KEY, key)
+    if description:
+        account += _tlv(ID_DESCRIPTION, _ascii(description, 40))
+    
+    payload = _tlv(ID_PAYLOAD_FORMAT, "01")
+    payload += _tlv(ID_POINT_OF_INITIATION, "12" if dynamic else "11")
+    payload += _tlv(ID_MERCHANT_ACCOUNT, account)
+    payload += _tlv(ID_MERCHANT_CATEGORY, "0000")
+    payload += _tlv(ID_CURRENCY, "986")
+    if amount is not None:
+        payload += _tlv(ID_AMOUNT, f"{Decimal(str(amount)):.2f}")
+    payload += _tlv(ID_COUNTRY, "BR")
+    payload += _tlv(ID_MERCHANT_NAME, _ascii(merchant_name, 25) or "RECEBEDOR")
+    payload += _tlv(ID_MERCHANT_CITY, _ascii(merchant_city, 15) or "BRASIL")
+    payload += _tlv(ID_ADDITIONAL_DATA, _tlv(ID_TXID, txid or "***"))
+    payload += ID_CRC + "04"
+    return payload + crc16_ccitt(payload)
+
+
+def _parse_tlv(data: str) -> Dict[str, str]:
+    fields: Dict[str, str] = {}
+    i = 0
+    while i < len(data):
+        if i + 4 > len(data):
+            raise BRCodeError("Campo TLV truncado")
+        field_id = data[i:i + 2]
+        try:
+            length = int(data[i + 2:i + 4])
+        except ValueError:
+            raise BRCodeError(f"Tamanho inválido no campo {field_id}")
+        value = data[i + 4:i + 4 + length]
+        if len(value) != length:
+            raise BRCodeError(f"Campo {field_id} truncado")
+        fields[field_id] = value
+        i += 4 + length
+    return fields
+
+
+def is_brcode(text: str) -> bool:
+    """Indica se o texto parece um payload BR Code (começa com 000201)."""
+    return isinstance(text, str) and text.startswith("000201") and len(text) > 8
+
+
+def parse_payload(payload: str) -> BRCode:
+    """
+    Lê um payload BR Code validando o CRC.
+    
+    Raises:
+        BRCodeError: se o payload estiver malformado ou o CRC não conferir
+    """
+    payload = (payload or "").strip()
+    if len(payload) < 8 or payload[-8:-4] != ID_CRC + "04":
+        raise BRCodeError("Payload sem CRC")
+    if crc16_ccitt(payload[:-4]) != payload[-4:].upper():
+        raise BRCodeError("CRC inválido")
+    
+    fields = _parse_tlv(payload[:-8])
+    if fields.get(ID_PAYLOAD_FORMAT) != "01":
+        raise BRCodeError("Formato de payload não suportado")
+    
+    account = _parse_tlv(fields.get(ID_MERCHANT_ACCOUNT, ""))
+    if account.get(ID_GUI, "").lower() != GUI_PIX:
+        raise BRCodeError("Payload não é um PIX")
+    
+    amount = None
+    if ID_AMOUNT in fields:
+        if not _AMOUNT_RE.fullmatch(fields[ID_AMOUNT]):
+            raise BRCodeError("Valor inválido")
+        amount = Decimal(fields[ID_AMOUNT])
+    
+    additional = _parse_tlv(fields.get(ID_ADDITIONAL_DATA, ""))
+    txid = additional.get(ID_TXID)
+    
+    return BRCode(
+        key=account.get(ID_KEY),
+        amount=amount,
+        txid=None if txid == "***" else txid,
+        merchant_name=fields.get(ID_MERCHANT_NAME),
+        merchant_city=fields.get(ID_MERCHANT_CITY),
+        description=account.get(ID_DESCRIPTION),
+        url=account.get(ID_URL),
+        dynamic=fields.get(ID_POINT_OF_INITIATION) == "12"
+    )
+
+
+def render_png(payload: str) -> bytes:
+    """Renderiza o payload como imagem PNG do QR Code."""
+    import qrcode
+    
+    image = qrcode.make(payload, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=8, border=2)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# Códigos estáticos renderizados por carteira: wallet_id -> {"key", "payload", "png_base64"}
+_static_codes = TTLCache(maxsize=settings.PIX_QR_CACHE_SIZE, name="pix_static_qr")
+
+
+def get_static_code(wallet_id: str, key: str, merchant_name: str, merchant_city: str) -> dict:
+    """Payload e PNG do QR estático da carteira (renderizados uma vez e cacheados)."""
+    cached = _static_codes.get(wallet_id)
+    if cached and cached["key"] == key:
+        return cached
+    payload = build_payload(key, merchant_name, merchant_city)
+    code = {
+        "key": key,
+        "payload": payload,
+        "png_base64": base64.b64encode(render_png(payload)).decode("ascii")
+    }
+    _static_codes.set(wallet_id, code)
+    return code
+
+
+def invalidate_static_code(wallet_id: str) -> None:
+    """Descarta o QR estático cacheado da carteira (ex: chave removida)."""
+    _static_codes.pop(wallet_id)
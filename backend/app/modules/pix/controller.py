@@ -1,8 +1,16 @@
-from fastapi import APIRouter, Depends, Body
+from fastapi import APIRouter, Depends, Body, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, Response
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import base64
+import json
+import time
 
-from app.database import get_db
+from app.core.config import settings
+from app.core.events import notifier
+from app.core.idempotency import run_idempotent
+from app.database import get_db, SessionLocal
 from .service import PIXService
 
 router = APIRouter(prefix="/pix", tags=["PIX"])
@@ -11,6 +19,7 @@ router = APIRouter(prefix="/pix", tags=["PIX"])
 @router.post("/send")
 def send_pix(
     data: Dict[str, Any] = Body(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db)
 ):
     """
@@ -19,9 +28,10 @@ def send_pix(
     **Body JSON:**
     ```json
     {
-        "pixCode": "u1000000-0000-0000-0000-000000000002",  // ID do destinatário (do QR Code)
+        "pixCode": "u1000000-0000-0000-0000-000000000002",  // chave PIX, payload do QR Code (BR Code) ou ID do destinatário
         "amount": 100.50,
-        "userId": "u1000000-0000-0000-0000-000000000001"  // ID do remetente
+        "userId": "u1000000-0000-0000-0000-000000000001",  // ID do remetente
+        "async": false  // opcional: false = liquida no request mesmo com PIX_SETTLEMENT_MODE=async
     }
     ```
     
@@ -35,10 +45,44 @@ def send_pix(
     - Detalhes da transação completada
     - Saldos são atualizados imediatamente
     - Transação registrada no histórico
+    
+    **Idempotência:** envie o header `Idempotency-Key` para que repetições
+    (ex: retry após timeout) retornem a resposta original sem movimentar de novo.
     """
     service = PIXService(db)
-    result = service.send_pix(data)
-    return result
+    return run_idempotent(db, idempotency_key, "pix.send", data, lambda: service.send_pix(data))
+
+
+@router.post("/send-batch")
+def send_pix_batch(
+    data: Dict[str, Any] = Body(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db)
+):
+    """
+    Envia PIX em lote de um remetente para vários destinatários
+    (folha de pagamento, pagamento de fornecedores).
+    
+    **Body JSON:**
+    ```json
+    {
+        "userId": "u1000000-0000-0000-0000-000000000001",
+        "items": [
+            {"pixCode": "u1000000-0000-0000-0000-000000000002", "amount": 2500.00, "description": "Salário"},
+            {"pixCode": "i1000000-0000-0000-0000-000000000001", "amount": 800.00}
+        ]
+    }
+    ```
+    
+    **Validações:**
+    - Itens inválidos (valor, destinatário inexistente, envio para si mesmo) são rejeitados individualmente
+    - Itens válidos são liquidados juntos: se o saldo não cobrir o total, nenhum é enviado
+    
+    **Retorna:**
+    - Totais do lote e o resultado de cada item (completed/rejected, transaction_id ou erro)
+    """
+    service = PIXService(db)
+    return run_idempotent(db, idempotency_key, "pix.send_batch", data, lambda: service.send_pix_batch(data))
 
 
 @router.post("/receive")
@@ -59,6 +103,7 @@ def receive_pix(
 @router.post("/withdraw")
 def withdraw_pix(
     data: Dict[str, Any] = Body(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db)
 ):
     """
@@ -83,5 +128,149 @@ def withdraw_pix(
     Por ora, apenas debita o valor da conta (simula envio externo).
     """
     service = PIXService(db)
-    result = service.withdraw_pix(data)
+    return run_idempotent(db, idempotency_key, "pix.withdraw", data, lambda: service.withdraw_pix(data))
+
+
+@router.get("/keys/{owner_id}")
+def list_pix_keys(
+    owner_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Lista as chaves PIX de um usuário/investidor.
+    """
+    service = PIXService(db)
+    return service.list_keys(owner_id)
+
+
+@router.post("/keys")
+def register_pix_key(
+    data: Dict[str, Any] = Body(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Cadastra chave PIX apontando para a carteira BRL do dono.
+    
+    **Body JSON:**
+    ```json
+    {
+        "userId": "u1000000-0000-0000-0000-000000000001",
+        "keyType": "PHONE",  // EMAIL, CPF, CNPJ, PHONE, EVP (aleatória, gerada pelo sistema)
+        "key": "+5511987654321"
+    }
+    ```
+    """
+    service = PIXService(db)
+    return service.register_key(data)
+
+
+@router.delete("/keys/{owner_id}/{key}")
+def delete_pix_key(
+    owner_id: str,
+    key: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Remove chave PIX do dono (o índice em memória é invalidado).
+    """
+    service = PIXService(db)
+    return service.delete_key(owner_id, key)
+
+
+@router.get("/qrcode")
+def get_pix_qrcode(
+    userId: str,
+    amount: Optional[float] = None,
+    txid: Optional[str] = None,
+    description: Optional[str] = None,
+    format: str = "json",
+    db: Session = Depends(get_db)
+):
+    """
+    Gera QR Code PIX (BR Code EMV) para receber na carteira BRL.
+    
+    - Sem `amount`/`txid`: código estático da carteira (reutilizável, cacheado)
+    - Com `amount` e/ou `txid`: código dinâmico de uso único
+    - `format=png`: retorna a imagem; `format=json`: payload (copia e cola) e PNG em base64
+    """
+    service = PIXService(db)
+    result = service.generate_qrcode(userId, amount, txid, description, with_png=True)
+    if format == "png":
+        return Response(content=base64.b64decode(result["png_base64"]), media_type="image/png")
     return result
+
+
+@router.get("/admin/velocity")
+def get_velocity_overview(
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """
+    Estado dos contadores de velocidade: limites configurados, uso de memória
+    e alertas de fan-in mais recentes.
+    """
+    service = PIXService(db)
+    return service.get_velocity_overview(limit)
+
+
+@router.get("/admin/velocity/{party_id}")
+def get_party_velocity(
+    party_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Contadores de envio (com limites) e recebimento (com limiares de alerta)
+    de um usuário/investidor por minuto, hora e dia.
+    """
+    service = PIXService(db)
+    return service.get_velocity(party_id)
+
+
+def _read_status(transaction_id: str) -> dict:
+    """Lê o status da transação em uma sessão própria (usado pelo stream SSE)."""
+    db = SessionLocal()
+    try:
+        return PIXService(db).get_transaction_status(transaction_id)
+    finally:
+        db.close()
+
+
+@router.get("/{transaction_id}")
+def get_pix_status(
+    transaction_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Status de uma transação PIX (pending, completed, failed).
+    
+    Usado para polling após um envio aceito em modo assíncrono.
+    """
+    service = PIXService(db)
+    return service.get_transaction_status(transaction_id)
+
+
+@router.get("/{transaction_id}/events")
+async def pix_status_events(transaction_id: str):
+    """
+    Server-Sent Events com o status da transação PIX.
+    
+    Envia o status atual e, se ainda estiver pendente, aguarda a liquidação e
+    envia o status final (ou encerra após PIX_SSE_TIMEOUT_SECONDS).
+    """
+    current = await run_in_threadpool(_read_status, transaction_id)
+    
+    async def stream():
+        status_data = current
+        yield f"event: status\ndata: {json.dumps(status_data)}\n\n"
+        deadline = time.monotonic() + settings.PIX_SSE_TIMEOUT_SECONDS
+        after = time.monotonic()
+        while status_data["status"] == "pending" and time.monotonic() < deadline:
+            await run_in_threadpool(notifier.wait, transaction_id, after, 2.0)
+            after = time.monotonic()
+            status_data = await run_in_threadpool(_read_status, transaction_id)
+            if status_data["status"] == "pending":
+                yield ": keep-alive\n\n"
+        if status_data["status"] != current["status"]:
+            yield f"event: status\ndata: {json.dumps(status_data)}\n\n"
+    
+    return StreamingResponse(stream(), media_type="text/event-stream")
@@ -0,0 +1,229 @@
+"""
+Diretório de chaves PIX.
+
+Mapeia chave PIX (email, CPF/CNPJ, telefone ou aleatória/EVP) para
+(owner_id, owner_type, wallet_id). A fonte da verdade é a tabela pix_keys;
+na frente dela fica um LRU em memória, então resolver um destinatário é uma
+consulta de hash na maior parte das vezes. Cadastro e remoção de chaves
+invalidam a entrada do cache.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import re
+import uuid
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.models import OwnerType, PixKeyType
+from .repository import PIXRepository
+
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_UUID_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+class InvalidPixKeyError(ValueError):
+    """Chave PIX com formato inválido para o tipo informado."""
+
+
+@dataclass(frozen=True)
+class PixKeyEntry:
+    key_value: str
+    key_type: PixKeyType
+    owner_id: str
+    owner_type: OwnerType
+    wallet_id: str
+
+
+def normalize_key(key: str, key_type: Optional[str] = None) -> Tuple[str, PixKeyType]:
+    """
+    Normaliza e valida uma chave PIX.
+    
+    Sem `key_type`, o tipo é inferido: '@' = EMAIL, UUID = EVP, '+' = PHONE,
+    11 dígitos = CPF, 14 dígitos = CNPJ.
+    
+    Raises:
+        InvalidPixKeyError: se o formato não corresponde ao tipo
+    """
+    raw = str(key or "").strip()
+    if not raw:
+        raise InvalidPixKeyError("Chave PIX vazia")
+    
+    if key_type:
+        try:
+            kind = PixKeyType[str(key_type).upper().replace("RANDOM", "EVP")]
+        except KeyError:
+            raise InvalidPixKeyError(f"Tipo de chave PIX inválido: {key_type}")
+    elif "@" in raw:
+        kind = PixKeyType.EMAIL
+    elif _UUID_RE.match(raw.lower()):
+        kind = PixKeyType.EVP
+    elif raw.startswith("+"):
+        kind = PixKeyType.PHONE
+    else:
+        digits = re.sub(r"\D", "", raw)
+        if len(digits) == 11:
+            kind = PixKeyType.CPF
+        elif len(digits) == 14:
+            kind = PixKeyType.CNPJ
+        else:
+            raise InvalidPixKeyError("Não foi possível identificar o tipo da chave PIX")
+    
+    if kind == PixKeyType.EMAIL:
+        value = raw.lower()
+        if not _EMAIL_RE.match(value):
+            raise InvalidPixKeyError("Email inválido")
+    elif kind == PixKeyType.EVP:
+        value = raw.lower()
+        if not _UUID_RE.match(value):
+            raise InvalidPixKeyError("Chave aleatória inválida")
+    elif kind == PixKeyType.PHONE:
+        digits = re.sub(r"\D", "", raw)
+        if not raw.startswith("+"):
+            digits = "55" + digits
+        if not 12 <= len(digits) <= 13:
+            raise InvalidPixKeyError("Telefone inválido")
+        value = "+" + digits
+    else:
+        value = re.sub(r"\D", "", raw)
+        expected = 11 if kind == PixKeyType.CPF else 14
+        if len(value) != expected:
+            raise InvalidPixKeyError(f"{kind.name} deve ter {expected} dígitos")
+    
+    return value, kind
+
+
+# Índice do processo: chave normalizada -> PixKeyEntry
+_key_cache = TTLCache(
+    maxsize=settings.PIX_KEY_CACHE_SIZE,
+    ttl_seconds=settings.PIX_KEY_CACHE_TTL_SECONDS,
+    name="pix_keys"
+)
+
+
+class PixKeyDirectory:
+    """Resolução e manutenção de chaves PIX (tabela pix_keys + LRU)."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.repository = PIXRepository(db)
+    
+    def resolve(self, key: str) -> Optional[PixKeyEntry]:
+        """Resolve uma chave PIX (qualquer formato aceito) ou None se não cadastrada."""
+        try:
+            value, _ = normalize_key(key)
+        except InvalidPixKeyError:
+            return None
+        return _key_cache.get_or_set(value, lambda: self._load(value))
+    
+    def resolve_many(self, keys: List[str]) -> Dict[str, PixKeyEntry]:
+        """
+        Resolve várias chaves: acertos vêm do LRU e as faltantes em uma única consulta IN.
+        
+        Returns:
+            {chave_original: PixKeyEntry} apenas para as chaves encontradas
+        """
+        normalized: Dict[str, str] = {}
+        for key in keys:
+            try:
+                normalized[key] = normalize_key(key)[0]
+            except InvalidPixKeyError:
+                continue
+        
+        entries: Dict[str, PixKeyEntry] = {}
+        missing = []
+        for value in set(normalized.values()):
+            entry = _key_cache.get(value)
+            if entry is None:
+                missing.append(value)
+            else:
+                entries[value] = entry
+        for row in self.repository.get_pix_keys(missing):
+            entry = self._to_entry(row)
+            _key_cache.set(entry.key_value, entry)
+            entries[entry.key_value] = entry
+        
+        return {key: entries[value] for key, value in normalized.items() if value in entries}
+    
+    def list_keys(self, owner_id: str) -> List[PixKeyEntry]:
+        """Chaves cadastradas de um dono."""
+        return [self._to_entry(row) for row in self.repository.get_owner_pix_keys(owner_id)]
+    
+    def register_key(
+        self,
+        owner_id: str,
+        owner_type: OwnerType,
+        wallet_id: str,
+        key_type: str,
+        key: Optional[str] = None,
+        commit: bool = True
+    ) -> Optional[PixKeyEntry]:
+        """
+        Cadastra uma chave PIX. Para EVP a chave é gerada.
+        
+        Returns:
+            A chave cadastrada, ou None se ela já pertence a outro dono
+        """
+        if str(key_type).upper() in ("EVP", "RANDOM"):
+            key = str(uuid.uuid4())
+        value, kind = normalize_key(key, key_type)
+        
+        entry = PixKeyEntry(value, kind, owner_id, owner_type, wallet_id)
+        inserted = self.repository.insert_pix_key({
+            "key_value": value,
+            "key_type": kind,
+            "owner_id": owner_id,
+            "owner_type": owner_type,
+            "wallet_id": wallet_id
+        })
+        if commit:
+            self.db.commit()
+        _key_cache.pop(value)
+        if not inserted:
+            existing = self.resolve(value)
+            return existing if existing and existing.owner_id == owner_id else None
+        return entry
+    
+    def register_default_keys(
+        self,
+        owner_id: str,
+        owner_type: OwnerType,
+        wallet_id: str,
+        email: str,
+        cpf_cnpj: str,
+        phone: Optional[str] = None
+    ) -> List[PixKeyEntry]:
+        """Cadastra as chaves padrão do cadastro (email, documento, telefone e uma EVP)."""
+        candidates = [("EMAIL", email), (None, cpf_cnpj), ("PHONE", phone), ("EVP", None)]
+        entries = []
+        for key_type, key in candidates:
+            if key_type != "EVP" and not key:
+                continue
+            try:
+                entry = self.register_key(owner_id, owner_type, wallet_id, key_type, key, commit=False)
+            except InvalidPixKeyError:
+                continue
+            if entry:
+                entries.append(entry)
+        self.db.commit()
+        return entries
+    
+    def delete_key(self, owner_id: str, key: str) -> bool:
+        """Remove uma chave do dono e invalida o cache."""
+        value, _ = normalize_key(key)
+        deleted = self.repository.delete_pix_key(value, owner_id)
+        self.db.commit()
+        _key_cache.pop(value)
+        return deleted
+    
+    def _load(self, value: str) -> Optional[PixKeyEntry]:
+        rows = self.repository.get_pix_keys([value])
+        return self._to_entry(rows[0]) if rows else None
+    
+    def _to_entry(self, row) -> PixKeyEntry:
+        return PixKeyEntry(row.key_value, row.key_type, row.owner_id, row.owner_type, row.wallet_id)
+
+
+def pix_key_cache_stats() -> dict:
+    return _key_cache.stats()
@@ -1,5 +1,9 @@
 from sqlalchemy.orm import Session
-from app.models.models import Transaction
+from sqlalchemy import insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from typing import List
+
+from app.models.models import Transaction, PixKey
 
 
 class PIXRepository:
@@ -15,3 +19,40 @@ class PIXRepository:
         self.db.commit()
         self.db.refresh(transaction)
         return transaction
+    
+    def insert_transactions(self, rows: List[dict]) -> None:
+        """Insere transações em lote (executemany). Não faz commit."""
+        if rows:
+            self.db.execute(insert(Transaction), rows)
+    
+    # ========== CHAVES PIX ==========
+    
+    def get_pix_keys(self, key_values: List[str]) -> List[PixKey]:
+        """Busca chaves PIX normalizadas (uma consulta IN)."""
+        if not key_values:
+            return []
+        return self.db.query(PixKey).filter(PixKey.key_value.in_(key_values)).all()
+    
+    def get_owner_pix_keys(self, owner_id: str) -> List[PixKey]:
+        """Lista as chaves PIX de um dono."""
+        return self.db.query(PixKey).filter(
+            PixKey.owner_id == owner_id
+        ).order_by(PixKey.created_at).all()
+    
+    def insert_pix_key(self, data: dict) -> bool:
+        """
+        Insere chave PIX com INSERT IGNORE. Não faz commit.
+        
+        Returns:
+            False se a chave já estava cadastrada
+        """
+        result = self.db.execute(mysql_insert(PixKey).values(**data).prefix_with("IGNORE"))
+        return result.rowcount == 1
+    
+    def delete_pix_key(self, key_value: str, owner_id: str) -> bool:
+        """Remove chave PIX do dono. Não faz commit."""
+        deleted = self.db.query(PixKey).filter(
+            PixKey.key_value == key_value,
+            PixKey.owner_id == owner_id
+        ).delete(synchronize_session=False)
+        return deleted > 0
@@ -1,15 +1,27 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import base64
 import uuid
 import logging
 
 from .repository import PIXRepository
-from app.modules.wallet.repository import WalletRepository
+from .keys import PixKeyDirectory, InvalidPixKeyError, normalize_key
+from .settlement import PixSettlementQueue, settlement_workers
+from .velocity import VelocityLimitExceeded, velocity_guard
+from .brcode import (
+    BRCodeError, build_payload, get_static_code, invalidate_static_code,
+    is_brcode, parse_payload, render_png
+)
+from app.core.config import settings
+from app.database import run_in_transaction
+from app.modules.party import PartyResolver
+from app.modules.wallet.repository import WalletRepository, InsufficientFundsError
 from app.models.models import (
     Transaction, TransactionType, TransactionStatus,
-    Currency, OwnerType, User
+    Currency, OwnerType
 )
 
 logger = logging.getLogger(__name__)
@@ -22,6 +34,7 @@ class PIXService:
         self.db = db
         self.repository = PIXRepository(db)
         self.wallet_repository = WalletRepository(db)
+        self.parties = PartyResolver(db)
     
     def send_pix(self, data: dict) -> dict:
         """
@@ -39,6 +52,26 @@ class PIXService:
         pix_code = data.get('pixCode')
         amount = data.get('amount')
         sender_id = data.get('userId')
+        txid = None
+        
+        # pixCode pode ser o payload do QR Code (BR Code): extrai chave, valor e txid
+        if is_brcode(pix_code):
+            try:
+                brcode = parse_payload(pix_code)
+            except BRCodeError as e:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"QR Code PIX inválido: {str(e)}"
+                )
+            if brcode.amount is not None:
+                if amount is not None and Decimal(str(amount)) != brcode.amount:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Valor informado difere do valor do QR Code"
+                    )
+                amount = float(brcode.amount)
+            pix_code = brcode.key
+            txid = brcode.txid
         
         # Validações
         if not all([pix_code, amount, sender_id]):
@@ -53,38 +86,28 @@ class PIXService:
                 detail="O valor deve ser maior que zero"
             )
         
-        # Buscar remetente (pode ser USER ou INVESTOR)
-        from app.models.models import Investor
+        # Destinatário pelo diretório de chaves PIX (email, CPF/CNPJ, telefone, EVP).
+        # Fallback: pixCode é o ID do destinatário (QR Codes gerados com o ID)
+        receiver_key = PixKeyDirectory(self.db).resolve(pix_code)
+        receiver_id = receiver_key.owner_id if receiver_key else pix_code
         
-        sender_user = self.db.query(User).filter(User.user_id == sender_id).first()
-        sender_investor = self.db.query(Investor).filter(Investor.investor_id == sender_id).first()
+        # Remetente e destinatário (USER ou INVESTOR) em uma única consulta
+        parties = self._get_parties([sender_id, receiver_id])
         
-        if not sender_user and not sender_investor:
+        if sender_id not in parties:
             raise HTTPException(
                 status_code=404,
                 detail="Remetente não encontrado"
             )
         
-        sender = sender_user if sender_user else sender_investor
-        sender_type = OwnerType.USER if sender_user else OwnerType.INVESTOR
-        sender_name = sender.full_name
-        
-        # O pixCode é o ID do destinatário (gerado no QR Code)
-        receiver_id = pix_code
-        
-        # Buscar destinatário (pode ser USER ou INVESTOR)
-        receiver_user = self.db.query(User).filter(User.user_id == receiver_id).first()
-        receiver_investor = self.db.query(Investor).filter(Investor.investor_id == receiver_id).first()
-        
-        if not receiver_user and not receiver_investor:
+        if receiver_id not in parties:
             raise HTTPException(
                 status_code=404,
                 detail="Destinatário não encontrado"
             )
         
-        receiver = receiver_user if receiver_user else receiver_investor
-        receiver_type = OwnerType.USER if receiver_user else OwnerType.INVESTOR
-        receiver_name = receiver.full_name
+        sender_type, sender_name = parties[sender_id]
+        receiver_type, receiver_name = parties[receiver_id]
         
         # Não pode enviar para si mesmo
         if sender_id == receiver_id:
@@ -93,58 +116,24 @@ class PIXService:
                 detail="Não é possível enviar PIX para si mesmo"
             )
         
-        # Buscar carteiras BRL (criar se não existir)
-        from app.models.models import Wallet
-        
-        sender_wallets = self.wallet_repository.get_wallet_by_owner(sender_id, sender_type.value.upper())
-        sender_wallet = next((w for w in sender_wallets if w.currency == 'BRL'), None)
-        
-        if not sender_wallet:
-            # Criar carteira BRL para o remetente se não existir
-            sender_wallet = Wallet(
-                wallet_id=str(uuid.uuid4()),
-                owner_id=sender_id,
-                owner_type=sender_type,
-                currency=Currency.BRL,
-                balance=0,
-                blocked=0
-            )
-            self.db.add(sender_wallet)
-            self.db.flush()
-            logger.info(f"[PIX] Carteira BRL criada para {sender_name}")
-        
-        receiver_wallets = self.wallet_repository.get_wallet_by_owner(receiver_id, receiver_type.value.upper())
-        receiver_wallet = next((w for w in receiver_wallets if w.currency == 'BRL'), None)
-        
-        if not receiver_wallet:
-            # Criar carteira BRL para o destinatário se não existir
-            receiver_wallet = Wallet(
-                wallet_id=str(uuid.uuid4()),
-                owner_id=receiver_id,
-                owner_type=receiver_type,
-                currency=Currency.BRL,
-                balance=0,
-                blocked=0
-            )
-            self.db.add(receiver_wallet)
-            self.db.flush()
-            logger.info(f"[PIX] Carteira BRL criada para {receiver_name}")
-        
-        # Validar saldo suficiente
-        if float(sender_wallet.balance) < amount:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Saldo insuficiente. Disponível: R$ {float(sender_wallet.balance):.2f}"
-            )
-        
-        try:
-            # Debitar do remetente
-            new_sender_balance = float(sender_wallet.balance) - amount
-            self.wallet_repository.update_balance(sender_wallet.wallet_id, new_sender_balance)
+        velocity_at = self._check_velocity(sender_id, amount)
+        
+        def settle() -> Transaction:
+            # Buscar carteiras BRL (criadas via upsert se não existirem)
+            sender_wallet = self.wallet_repository.get_wallet(sender_id, sender_type, Currency.BRL, create=True)
+            if receiver_key:
+                receiver_wallet_id = receiver_key.wallet_id
+            else:
+                receiver_wallet_id = self.wallet_repository.get_wallet(
+                    receiver_id, receiver_type, Currency.BRL, create=True
+                ).wallet_id
             
-            # Creditar no destinatário
-            new_receiver_balance = float(receiver_wallet.balance) + amount
-            self.wallet_repository.update_balance(receiver_wallet.wallet_id, new_receiver_balance)
+            if async_mode:
+                # Reservar no remetente; a liquidação fica com os workers
+                self.wallet_repository.reserve(sender_wallet.wallet_id, amount)
+            else:
+                # Debitar do remetente e creditar no destinatário (locks em ordem canônica)
+                self.wallet_repository.transfer(sender_wallet.wallet_id, receiver_wallet_id, amount)
             
             # Criar transação
             transaction = Transaction(
@@ -153,17 +142,30 @@ class PIXService:
                 sender_type=sender_type,
                 receiver_id=receiver_id,
                 receiver_type=receiver_type,
-                wallet_id=receiver_wallet.wallet_id,
+                wallet_id=receiver_wallet_id,
                 amount=amount,
                 currency=Currency.BRL,
                 type=TransactionType.PIX_SEND,
-                status=TransactionStatus.COMPLETED,
-                description=f"PIX enviado para {receiver_name}",
+                status=TransactionStatus.PENDING if async_mode else TransactionStatus.COMPLETED,
+                description=f"PIX enviado para {receiver_name}" + (f" (txid {txid})" if txid else ""),
                 created_at=datetime.now()
             )
-            
             self.db.add(transaction)
-            self.db.commit()
+            if async_mode:
+                PixSettlementQueue(self.db).enqueue(
+                    transaction.transaction_id, sender_wallet.wallet_id, receiver_wallet_id, amount, velocity_at
+                )
+            return transaction
+        
+        async_mode = self._is_async(data)
+        try:
+            transaction = run_in_transaction(self.db, settle, name="pix_send")
+            velocity_guard.register_incoming(receiver_id, amount)
+            
+            if async_mode:
+                settlement_workers.notify()
+                logger.info(f"[PIX] Transação aceita: {sender_name} -> {receiver_name} = R$ {amount:.2f}")
+                return self._pending_response(transaction, sender_name, receiver_name, amount)
             
             logger.info(f"[PIX] Transação concluída: {sender_name} -> {receiver_name} = R$ {amount:.2f}")
             
@@ -179,14 +181,178 @@ class PIXService:
                 }
             }
             
+        except InsufficientFundsError as e:
+            velocity_guard.rollback_outgoing(sender_id, amount, velocity_at)
+            raise HTTPException(
+                status_code=400,
+                detail=f"Saldo insuficiente. Disponível: R$ {float(e.available):.2f}"
+            )
         except Exception as e:
-            self.db.rollback()
+            velocity_guard.rollback_outgoing(sender_id, amount, velocity_at)
             logger.error(f"[PIX] Erro ao processar transação: {str(e)}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Erro ao processar PIX: {str(e)}"
             )
     
+    def send_pix_batch(self, data: dict) -> dict:
+        """
+        Envia um lote de PIX de um único remetente (folha de pagamento, fornecedores).
+        
+        Os destinatários são validados em uma única consulta; itens inválidos são
+        rejeitados individualmente e os válidos são liquidados juntos, em uma
+        única transação: um débito do total no remetente, créditos com UPDATE em
+        lote e inserção das transações com executemany. O lote inteiro passa
+        pelos limites de velocidade do remetente (quantidade de itens e total)
+        antes da liquidação, e cada recebimento conta no fan-in do destinatário.
+        
+        Args:
+            data: Dicionário contendo:
+                - userId: ID do remetente
+                - items: Lista de {pixCode, amount, description (opcional)}
+        
+        Returns:
+            Resumo do lote e resultado por item
+        """
+        sender_id = data.get('userId')
+        items = data.get('items')
+        
+        if not sender_id or not isinstance(items, list) or not items:
+            raise HTTPException(
+                status_code=400,
+                detail="Campos obrigatórios: userId, items (lista não vazia)"
+            )
+        
+        if len(items) > settings.PIX_BATCH_MAX_ITEMS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Máximo de {settings.PIX_BATCH_MAX_ITEMS} itens por lote"
+            )
+        
+        # Chaves PIX resolvidas pelo diretório (LRU + uma consulta para as faltantes);
+        # códigos que não são chaves cadastradas são tratados como ID do destinatário
+        pix_codes = [item.get('pixCode') for item in items if isinstance(item, dict) and item.get('pixCode')]
+        pix_keys = PixKeyDirectory(self.db).resolve_many(pix_codes)
+        receiver_of = {code: pix_keys[code].owner_id if code in pix_keys else code for code in pix_codes}
+        
+        # Remetente e destinatários resolvidos em uma única consulta
+        parties = self._get_parties([sender_id] + list(receiver_of.values()))
+        
+        if sender_id not in parties:
+            raise HTTPException(
+                status_code=404,
+                detail="Remetente não encontrado"
+            )
+        sender_type, sender_name = parties[sender_id]
+        
+        results: List[dict] = []
+        accepted: List[dict] = []
+        for index, item in enumerate(items):
+            result = {"index": index, "pixCode": None, "amount": None}
+            results.append(result)
+            if not isinstance(item, dict):
+                result.update(status="rejected", error="Item inválido")
+                continue
+            
+            pix_code = item.get('pixCode')
+            receiver_id = receiver_of.get(pix_code)
+            result["pixCode"] = pix_code
+            try:
+                amount = Decimal(str(item.get('amount'))).quantize(Decimal("0.01"))
+            except (InvalidOperation, ValueError):
+                result.update(status="rejected", error="Valor inválido")
+                continue
+            result["amount"] = float(amount)
+            
+            if amount <= 0:
+                result.update(status="rejected", error="O valor deve ser maior que zero")
+            elif not receiver_id or receiver_id not in parties:
+                result.update(status="rejected", error="Destinatário não encontrado")
+            elif receiver_id == sender_id:
+                result.update(status="rejected", error="Não é possível enviar PIX para si mesmo")
+            else:
+                accepted.append({
+                    "result": result,
+                    "receiver_id": receiver_id,
+                    "pix_key": pix_keys.get(pix_code),
+                    "amount": amount,
+                    "description": item.get('description')
+                })
+        
+        total = sum((line["amount"] for line in accepted), Decimal(0))
+        
+        def settle() -> List[dict]:
+            owners = [(sender_id, sender_type)] + [
+                (line["receiver_id"], parties[line["receiver_id"]][0]) for line in accepted if not line["pix_key"]
+            ]
+            wallets = self.wallet_repository.get_wallets_for_owners(owners, Currency.BRL)
+            sender_wallet = wallets[(sender_id, sender_type)]
+            
+            credits: Dict[str, Decimal] = {}
+            rows = []
+            now = datetime.now()
+            for line in accepted:
+                receiver_type, receiver_name = parties[line["receiver_id"]]
+                if line["pix_key"]:
+                    receiver_wallet_id = line["pix_key"].wallet_id
+                else:
+                    receiver_wallet_id = wallets[(line["receiver_id"], receiver_type)].wallet_id
+                credits[receiver_wallet_id] = credits.get(receiver_wallet_id, Decimal(0)) + line["amount"]
+                rows.append({
+                    "transaction_id": str(uuid.uuid4()),
+                    "sender_id": sender_id,
+                    "sender_type": sender_type,
+                    "receiver_id": line["receiver_id"],
+                    "receiver_type": receiver_type,
+                    "wallet_id": receiver_wallet_id,
+                    "amount": line["amount"],
+                    "currency": Currency.BRL,
+                    "type": TransactionType.PIX_SEND,
+                    "status": TransactionStatus.COMPLETED,
+                    "description": line["description"] or f"PIX enviado para {receiver_name}",
+                    "created_at": now
+                })
+            
+            self.wallet_repository.transfer_many(sender_wallet.wallet_id, credits)
+            self.repository.insert_transactions(rows)
+            return rows
+        
+        if accepted:
+            # O lote conta como len(accepted) envios somando `total` nos limites do remetente
+            velocity_at = self._check_velocity(sender_id, total, len(accepted))
+            try:
+                rows = run_in_transaction(self.db, settle, name="pix_send_batch")
+            except InsufficientFundsError as e:
+                velocity_guard.rollback_outgoing(sender_id, total, velocity_at, len(accepted))
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Saldo insuficiente para o lote (R$ {float(total):.2f}). Disponível: R$ {float(e.available):.2f}"
+                )
+            except Exception as e:
+                velocity_guard.rollback_outgoing(sender_id, total, velocity_at, len(accepted))
+                logger.error(f"[PIX Batch] Erro ao processar lote: {str(e)}")
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Erro ao processar lote PIX: {str(e)}"
+                )
+            
+            for line, row in zip(accepted, rows):
+                velocity_guard.register_incoming(line["receiver_id"], line["amount"])
+                line["result"].update(status="completed", transaction_id=row["transaction_id"])
+        
+        logger.info(f"[PIX Batch] {sender_name}: {len(accepted)}/{len(items)} itens, total R$ {float(total):.2f}")
+        
+        return {
+            "message": "Lote PIX processado",
+            "sender": sender_name,
+            "total_items": len(items),
+            "completed": len(accepted),
+            "rejected": len(items) - len(accepted),
+            "total_amount": float(total),
+            "date": datetime.now().isoformat(),
+            "results": results
+        }
+    
     def receive_pix(self, data: dict) -> dict:
         """
         Webhook para receber notificação de PIX recebido.
@@ -233,25 +399,29 @@ class PIXService:
                 detail="O valor deve ser maior que zero"
             )
         
-        # Buscar usuário (pode ser USER ou INVESTOR)
-        from app.models.models import Investor
+        # Validar formato da chave de destino
+        try:
+            pix_key, key_type = normalize_key(pix_key, None if pix_key_type == 'UNKNOWN' else pix_key_type)
+        except InvalidPixKeyError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Chave PIX inválida: {str(e)}"
+            )
+        pix_key_type = key_type.name
         
-        user = self.db.query(User).filter(User.user_id == user_id).first()
-        investor = self.db.query(Investor).filter(Investor.investor_id == user_id).first()
+        # Buscar usuário (pode ser USER ou INVESTOR)
+        parties = self._get_parties([user_id])
         
-        if not user and not investor:
+        if user_id not in parties:
             raise HTTPException(
                 status_code=404,
                 detail="Usuário não encontrado"
             )
         
-        entity = user if user else investor
-        owner_type = OwnerType.USER if user else OwnerType.INVESTOR
-        entity_name = entity.full_name
+        owner_type, entity_name = parties[user_id]
         
         # Buscar carteira BRL
-        wallets = self.wallet_repository.get_wallet_by_owner(user_id, owner_type.value.upper())
-        wallet = next((w for w in wallets if w.currency == 'BRL'), None)
+        wallet = self.wallet_repository.get_wallet(user_id, owner_type, Currency.BRL)
         
         if not wallet:
             raise HTTPException(
@@ -259,17 +429,15 @@ class PIXService:
                 detail="Carteira BRL não encontrada"
             )
         
-        # Validar saldo suficiente
-        if float(wallet.balance) < amount:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Saldo insuficiente. Disponível: R$ {float(wallet.balance):.2f}"
-            )
+        velocity_at = self._check_velocity(user_id, amount)
         
-        try:
-            # Debitar da carteira
-            new_balance = float(wallet.balance) - amount
-            self.wallet_repository.update_balance(wallet.wallet_id, new_balance)
+        def settle() -> Transaction:
+            if async_mode:
+                # Reservar o valor; o débito é feito pelo worker de liquidação
+                self.wallet_repository.reserve(wallet.wallet_id, amount)
+            else:
+                # Debitar da carteira (com lock e validação de saldo disponível)
+                self.wallet_repository.debit(wallet.wallet_id, amount)
             
             # Criar transação (simulando envio externo)
             transaction = Transaction(
@@ -282,13 +450,26 @@ class PIXService:
                 amount=amount,
                 currency=Currency.BRL,
                 type=TransactionType.PIX_SEND,
-                status=TransactionStatus.COMPLETED,
+                status=TransactionStatus.PENDING if async_mode else TransactionStatus.COMPLETED,
                 description=f"PIX enviado para {pix_key} ({pix_key_type})",
                 created_at=datetime.now()
             )
-            
             self.db.add(transaction)
-            self.db.commit()
+            if async_mode:
+                PixSettlementQueue(self.db).enqueue(
+                    transaction.transaction_id, wallet.wallet_id, None, amount, velocity_at
+                )
+            return transaction
+        
+        async_mode = self._is_async(data)
+        try:
+            transaction = run_in_transaction(self.db, settle, name="pix_withdraw")
+            velocity_guard.register_incoming(pix_key, amount)
+            
+            if async_mode:
+                settlement_workers.notify()
+                logger.info(f"[PIX Withdraw] Saque aceito: {entity_name} R$ {amount:.2f} para {pix_key}")
+                return self._pending_response(transaction, entity_name, pix_key, amount)
             
             logger.info(f"[PIX Withdraw] {entity_name} sacou R$ {amount:.2f} para {pix_key}")
             
@@ -304,10 +485,256 @@ class PIXService:
                 }
             }
             
+        except InsufficientFundsError as e:
+            velocity_guard.rollback_outgoing(user_id, amount, velocity_at)
+            raise HTTPException(
+                status_code=400,
+                detail=f"Saldo insuficiente. Disponível: R$ {float(e.available):.2f}"
+            )
         except Exception as e:
-            self.db.rollback()
+            velocity_guard.rollback_outgoing(user_id, amount, velocity_at)
             logger.error(f"[PIX Withdraw] Erro ao processar saque: {str(e)}")
             raise HTTPException(
                 status_code=500,
                 detail=f"Erro ao processar saque: {str(e)}"
             )
+    
+    # ========== LIMITES DE VELOCIDADE ==========
+    
+    def get_velocity(self, party_id: str) -> dict:
+        """Contadores de velocidade de um participante (inspeção administrativa)."""
+        return velocity_guard.inspect(party_id)
+    
+    def get_velocity_overview(self, limit: int = 100) -> dict:
+        """Estado dos contadores e alertas de fan-in recentes."""
+        return {
+            "counters": velocity_guard.stats(),
+            "limits": velocity_guard.limits(),
+            "alerts": velocity_guard.recent_alerts(limit)
+        }
+    
+    # ========== LIQUIDAÇÃO ASSÍNCRONA ==========
+    
+    def get_transaction_status(self, transaction_id: str) -> dict:
+        """Status de uma transação PIX (para polling após aceite assíncrono)."""
+        transaction = self.db.query(Transaction).filter(
+            Transaction.transaction_id == transaction_id
+        ).first()
+        
+        if not transaction:
+            raise HTTPException(
+                status_code=404,
+                detail="Transação não encontrada"
+            )
+        
+        return {
+            "transaction_id": transaction.transaction_id,
+            "status": transaction.status.value,
+            "amount": float(transaction.amount),
+            "description": transaction.description,
+            "date": transaction.created_at.isoformat() if transaction.created_at else None,
+            "updated_at": transaction.updated_at.isoformat() if transaction.updated_at else None
+        }
+    
+    def _get_parties(self, party_ids: List[str]) -> Dict[str, Tuple[OwnerType, str]]:
+        """{id: (OwnerType, full_name)} dos participantes encontrados (cache + índice parties)."""
+        return {
+            party_id: (ref.party_type, ref.full_name)
+            for party_id, ref in self.parties.get_many(party_ids).items()
+        }
+    
+    def _check_velocity(self, sender_id: str, amount, count: int = 1) -> Optional[float]:
+        """Aplica os limites de velocidade do remetente (429 se excedido)."""
+        try:
+            return velocity_guard.register_outgoing(sender_id, amount, count)
+        except VelocityLimitExceeded as e:
+            raise HTTPException(
+                status_code=429,
+                detail=str(e)
+            )
+    
+    def _is_async(self, data: dict) -> bool:
+        """
+        Modo de liquidação: PIX_SETTLEMENT_MODE, que o campo "async" do body só
+        pode desligar (no modo sync os workers de liquidação não rodam).
+        """
+        if settings.PIX_SETTLEMENT_MODE != "async":
+            return False
+        return data.get('async') is None or bool(data.get('async'))
+    
+    def _pending_response(self, transaction: Transaction, sender: str, receiver: str, amount) -> dict:
+        return {
+            "message": "PIX aceito para liquidação",
+            "status": "pending",
+            "transaction": {
+                "transaction_id": transaction.transaction_id,
+                "sender": sender,
+                "receiver": receiver,
+                "amount": amount,
+                "date": transaction.created_at.isoformat()
+            },
+            "status_url": f"{settings.API_V1_PREFIX}/pix/{transaction.transaction_id}",
+            "events_url": f"{settings.API_V1_PREFIX}/pix/{transaction.transaction_id}/events"
+        }
+    
+    # ========== QR CODE (BR CODE) ==========
+    
+    def generate_qrcode(
+        self,
+        owner_id: str,
+        amount: Optional[float] = None,
+        txid: Optional[str] = None,
+        description: Optional[str] = None,
+        with_png: bool = True
+    ) -> dict:
+        """
+        Gera o QR Code PIX (BR Code) para receber na carteira BRL do dono.
+        
+        Sem valor/txid gera o código estático da carteira (cacheado); com valor
+        ou txid gera um código dinâmico de uso único.
+        """
+        parties = self._get_parties([owner_id])
+        if owner_id not in parties:
+            raise HTTPException(
+                status_code=404,
+                detail="Usuário não encontrado"
+            )
+        owner_type, owner_name = parties[owner_id]
+        
+        # Chave usada no QR: a aleatória (EVP) do dono, criada se ainda não existir
+        directory = PixKeyDirectory(self.db)
+        keys = directory.list_keys(owner_id)
+        key = next((k for k in keys if k.key_type.name == "EVP"), keys[0] if keys else None)
+        if key is None:
+            wallet = self.wallet_repository.get_wallet(owner_id, owner_type, Currency.BRL, create=True)
+            key = directory.register_key(owner_id, owner_type, wallet.wallet_id, "EVP")
+        
+        try:
+            if amount is None and not txid and not description:
+                code = get_static_code(key.wallet_id, key.key_value, owner_name, settings.PIX_MERCHANT_CITY)
+                return {
+                    "type": "static",
+                    "key": key.key_value,
+                    "payload": code["payload"],
+                    "png_base64": code["png_base64"] if with_png else None
+                }
+            
+            if amount is not None and amount <= 0:
+                raise HTTPException(
+                    status_code=400,
+                    detail="O valor deve ser maior que zero"
+                )
+            txid = txid or uuid.uuid4().hex[:25]
+            payload = build_payload(
+                key.key_value,
+                owner_name,
+                settings.PIX_MERCHANT_CITY,
+                amount=Decimal(str(amount)) if amount is not None else None,
+                txid=txid,
+                description=description,
+                dynamic=True
+            )
+        except BRCodeError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=str(e)
+            )
+        
+        return {
+            "type": "dynamic",
+            "key": key.key_value,
+            "amount": amount,
+            "txid": txid,
+            "payload": payload,
+            "png_base64": base64.b64encode(render_png(payload)).decode("ascii") if with_png else None
+        }
+    
+    # ========== CHAVES PIX ==========
+    
+    def list_keys(self, owner_id: str) -> List[dict]:
+        """Lista as chaves PIX de um usuário/investidor."""
+        return [self._key_to_dict(entry) for entry in PixKeyDirectory(self.db).list_keys(owner_id)]
+    
+    def register_key(self, data: dict) -> dict:
+        """
+        Cadastra chave PIX para a carteira BRL do dono.
+        
+        Args:
+            data: Dicionário contendo:
+                - userId: ID do usuário/investidor
+                - keyType: EMAIL, CPF, CNPJ, PHONE ou EVP (aleatória, gerada)
+                - key: Valor da chave (exceto EVP)
+        """
+        owner_id = data.get('userId')
+        key_type = data.get('keyType')
+        
+        if not owner_id or not key_type:
+            raise HTTPException(
+                status_code=400,
+                detail="Campos obrigatórios: userId, keyType"
+            )
+        
+        parties = self._get_parties([owner_id])
+        if owner_id not in parties:
+            raise HTTPException(
+                status_code=404,
+                detail="Usuário não encontrado"
+            )
+        owner_type, _ = parties[owner_id]
+        
+        directory = PixKeyDirectory(self.db)
+        if len(directory.list_keys(owner_id)) >= settings.PIX_MAX_KEYS_PER_OWNER:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Limite de {settings.PIX_MAX_KEYS_PER_OWNER} chaves PIX por conta atingido"
+            )
+        
+        wallet = self.wallet_repository.get_wallet(owner_id, owner_type, Currency.BRL, create=True)
+        try:
+            entry = directory.register_key(owner_id, owner_type, wallet.wallet_id, key_type, data.get('key'))
+        except InvalidPixKeyError as e:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=400,
+                detail=f"Chave PIX inválida: {str(e)}"
+            )
+        
+        if not entry:
+            raise HTTPException(
+                status_code=409,
+                detail="Chave PIX já cadastrada para outra conta"
+            )
+        
+        return self._key_to_dict(entry)
+    
+    def delete_key(self, owner_id: str, key: str) -> dict:
+        """Remove chave PIX do dono."""
+        directory = PixKeyDirectory(self.db)
+        try:
+            entry = directory.resolve(key)
+            deleted = directory.delete_key(owner_id, key)
+        except InvalidPixKeyError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Chave PIX inválida: {str(e)}"
+            )
+        
+        if not deleted:
+            raise HTTPException(
+                status_code=404,
+                detail="Chave PIX não encontrada"
+            )
+        
+        if entry:
+            invalidate_static_code(entry.wallet_id)
+        
+        return {"message": "Chave PIX removida com sucesso"}
+    
+    def _key_to_dict(self, entry) -> dict:
+        return {
+            "key": entry.key_value,
+            "key_type": entry.key_type.name,
+            "owner_id": entry.owner_id,
+            "owner_type": entry.owner_type.value,
+            "wallet_id": entry.wallet_id
+        }
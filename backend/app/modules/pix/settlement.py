@@ -0,0 +1,156 @@
+"""
+Liquidação assíncrona de PIX.
+
+No modo assíncrono o request apenas valida, reserva o valor (wallets.blocked),
+grava a transação em PENDING e enfileira um job em pix_settlement_jobs. Um pool
+de workers reivindica jobs em micro-lotes com SELECT ... FOR UPDATE SKIP LOCKED
+(workers concorrentes nunca pegam o mesmo job) e liquida o lote em uma única
+transação. Ao concluir, a transação vai para COMPLETED/FAILED e um evento é
+publicado para quem acompanha via SSE. Um job FAILED também desconta o envio
+dos limites de velocidade do remetente (velocity_at gravado no job).
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional, Tuple
+import logging
+import uuid
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.events import notifier
+from app.core.workers import WorkerPool
+from app.database import run_in_transaction
+from app.models.models import (
+    PixSettlementJob, SettlementJobStatus, Transaction, TransactionStatus
+)
+from app.modules.wallet.repository import WalletRepository
+from .velocity import velocity_guard
+
+logger = logging.getLogger(__name__)
+
+
+class PixSettlementQueue:
+    """Fila durável de liquidação PIX (tabela pix_settlement_jobs)."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.wallet_repository = WalletRepository(db)
+    
+    def enqueue(
+        self,
+        transaction_id: str,
+        sender_wallet_id: str,
+        receiver_wallet_id: Optional[str],
+        amount,
+        velocity_at: Optional[float] = None
+    ) -> PixSettlementJob:
+        """Enfileira a liquidação de uma transação já reservada. Não faz commit."""
+        job = PixSettlementJob(
+            job_id=str(uuid.uuid4()),
+            transaction_id=transaction_id,
+            sender_wallet_id=sender_wallet_id,
+            receiver_wallet_id=receiver_wallet_id,
+            amount=Decimal(str(amount)),
+            status=SettlementJobStatus.QUEUED,
+            attempts=0,
+            available_at=datetime.utcnow(),
+            velocity_at=velocity_at
+        )
+        self.db.add(job)
+        return job
+    
+    def process_batch(self, limit: int) -> int:
+        """
+        Reivindica e liquida até `limit` jobs em uma transação.
+        
+        Se o lote falhar, os jobs são reprocessados um a um para isolar o job
+        problemático, que recebe backoff (ou FAILED após PIX_SETTLEMENT_MAX_ATTEMPTS).
+        
+        Returns:
+            Número de jobs tratados
+        """
+        claimed: List[str] = []
+        
+        def settle() -> List[str]:
+            claimed.clear()
+            jobs = self.db.query(PixSettlementJob).filter(
+                PixSettlementJob.status == SettlementJobStatus.QUEUED,
+                PixSettlementJob.available_at <= datetime.utcnow()
+            ).order_by(PixSettlementJob.available_at).limit(limit).with_for_update(skip_locked=True).all()
+            if not jobs:
+                return []
+            claimed.extend(job.job_id for job in jobs)
+            
+            self.wallet_repository.settle_reservations([
+                (job.sender_wallet_id, job.receiver_wallet_id, job.amount) for job in jobs
+            ])
+            transaction_ids = [job.transaction_id for job in jobs]
+            self.db.query(Transaction).filter(
+                Transaction.transaction_id.in_(transaction_ids)
+            ).update({Transaction.status: TransactionStatus.COMPLETED}, synchronize_session=False)
+            for job in jobs:
+                job.status = SettlementJobStatus.DONE
+                job.attempts += 1
+            return transaction_ids
+        
+        try:
+            transaction_ids = run_in_transaction(self.db, settle, name="pix_settlement")
+        except Exception as e:
+            if limit > 1 and len(claimed) > 1:
+                logger.warning(f"[PIX Settlement] Lote de {len(claimed)} falhou, reprocessando individualmente: {str(e)}")
+                return sum(self.process_batch(1) for _ in range(len(claimed)))
+            if claimed:
+                self._record_failure(claimed[0], str(e))
+                return 1
+            raise
+        
+        for transaction_id in transaction_ids:
+            notifier.publish(transaction_id, {"transaction_id": transaction_id, "status": "completed"})
+        return len(transaction_ids)
+    
+    def _record_failure(self, job_id: str, error: str) -> None:
+        """
+        Registra falha do job: backoff exponencial ou FAILED (liberando a reserva
+        e descontando o envio dos limites de velocidade do remetente).
+        """
+        failed_transaction: List[str] = []
+        rollbacks: List[Tuple[str, Decimal, float]] = []
+        
+        def fail() -> None:
+            job = self.db.query(PixSettlementJob).filter(
+                PixSettlementJob.job_id == job_id
+            ).with_for_update().first()
+            if not job or job.status != SettlementJobStatus.QUEUED:
+                return
+            job.attempts += 1
+            job.last_error = error[:2000]
+            if job.attempts < settings.PIX_SETTLEMENT_MAX_ATTEMPTS:
+                job.available_at = datetime.utcnow() + timedelta(seconds=2 ** job.attempts)
+                return
+            job.status = SettlementJobStatus.FAILED
+            self.wallet_repository.release(job.sender_wallet_id, job.amount)
+            self.db.query(Transaction).filter(
+                Transaction.transaction_id == job.transaction_id
+            ).update({Transaction.status: TransactionStatus.FAILED}, synchronize_session=False)
+            failed_transaction.append(job.transaction_id)
+            sender_id = self.db.query(Transaction.sender_id).filter(
+                Transaction.transaction_id == job.transaction_id
+            ).scalar()
+            if sender_id and job.velocity_at is not None:
+                rollbacks.append((sender_id, job.amount, job.velocity_at))
+        
+        run_in_transaction(self.db, fail, name="pix_settlement_failure")
+        logger.error(f"[PIX Settlement] Job {job_id} falhou: {error}")
+        for sender_id, amount, velocity_at in rollbacks:
+            velocity_guard.rollback_outgoing(sender_id, amount, velocity_at)
+        for transaction_id in failed_transaction:
+            notifier.publish(transaction_id, {"transaction_id": transaction_id, "status": "failed"})
+
+
+# Pool de workers de liquidação (iniciado no startup da aplicação)
+settlement_workers = WorkerPool(
+    "pix_settlement",
+    handler=lambda db: PixSettlementQueue(db).process_batch(settings.PIX_SETTLEMENT_BATCH_SIZE),
+    workers=settings.PIX_SETTLEMENT_WORKERS
+)
@@ -0,0 +1,149 @@
+"""
+Limites de velocidade e contadores antifraude do PIX.
+
+- Remetente: contagem e valor por minuto, hora e dia (bloqueia com 429)
+- Destinatário: fan-in (muitos recebimentos em pouco tempo) gera alerta, sem bloquear
+
+Tudo em memória (app.core.velocity), sem consultas ao banco no caminho do envio.
+"""
+from collections import deque
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+import logging
+import time
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.velocity import Limits, build_velocity_backend
+
+logger = logging.getLogger(__name__)
+
+
+class VelocityLimitExceeded(Exception):
+    """Envio recusado por limite de velocidade do remetente."""
+    
+    def __init__(self, window: str):
+        self.window = window
+        super().__init__(f"Limite de PIX por {_WINDOW_LABELS.get(window, window)} excedido")
+
+
+_WINDOW_LABELS = {"minute": "minuto", "hour": "hora", "day": "dia"}
+
+
+def _cents(amount) -> int:
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+def _limit(value, money: bool = False) -> Optional[int]:
+    """Converte o valor do Settings em limite (0 = sem limite; valores em centavos)."""
+    if not value:
+        return None
+    return _cents(value) if money else int(value)
+
+
+def _describe_limit(limit) -> dict:
+    max_count, max_cents = limit or (None, None)
+    return {"count_limit": max_count, "amount_limit": max_cents / 100 if max_cents is not None else None}
+
+
+class PixVelocityGuard:
+    """Aplica limites do remetente e acompanha o fan-in dos destinatários."""
+    
+    def __init__(self, backend=None, max_alerts: int = 500):
+        self.backend = backend or build_velocity_backend()
+        self.sender_limits: Limits = {
+            "minute": (_limit(settings.PIX_LIMIT_COUNT_MINUTE), _limit(settings.PIX_LIMIT_AMOUNT_MINUTE, True)),
+            "hour": (_limit(settings.PIX_LIMIT_COUNT_HOUR), _limit(settings.PIX_LIMIT_AMOUNT_HOUR, True)),
+            "day": (_limit(settings.PIX_LIMIT_COUNT_DAY), _limit(settings.PIX_LIMIT_AMOUNT_DAY, True)),
+        }
+        self.fanin_thresholds: Limits = {
+            "minute": (_limit(settings.PIX_FANIN_ALERT_COUNT_MINUTE), None),
+            "hour": (_limit(settings.PIX_FANIN_ALERT_COUNT_HOUR), None),
+            "day": (None, _limit(settings.PIX_FANIN_ALERT_AMOUNT_DAY, True)),
+        }
+        self._alerts = deque(maxlen=max_alerts)
+    
+    def register_outgoing(self, sender_id: str, amount, count: int = 1) -> Optional[float]:
+        """
+        Conta `count` envios do remetente (somando `amount`) se couberem nos limites.
+        
+        Returns:
+            Instante do registro (para `rollback_outgoing`) ou None se desativado
+        
+        Raises:
+            VelocityLimitExceeded: se algum limite seria excedido
+        """
+        if not settings.PIX_VELOCITY_ENABLED:
+            return None
+        now = time.time()
+        violated, _ = self.backend.hit(f"out:{sender_id}", _cents(amount), self.sender_limits, now, count)
+        if violated:
+            metrics.increment(f"pix.velocity.blocked.{violated}")
+            logger.warning(f"[PIX Velocity] Remetente {sender_id} bloqueado: limite por {violated}")
+            raise VelocityLimitExceeded(violated)
+        return now
+    
+    def rollback_outgoing(self, sender_id: str, amount, at: Optional[float], count: int = 1) -> None:
+        """Desconta envios que não foram concluídos (ex: saldo insuficiente)."""
+        if at is not None:
+            self.backend.undo(f"out:{sender_id}", _cents(amount), at, count)
+    
+    def register_incoming(self, receiver_id: str, amount) -> None:
+        """Conta um recebimento e alerta quando o fan-in cruza um limiar."""
+        if not settings.PIX_VELOCITY_ENABLED:
+            return
+        cents = _cents(amount)
+        _, totals = self.backend.hit(f"in:{receiver_id}", cents)
+        for window, (max_count, max_cents) in self.fanin_thresholds.items():
+            count, amount_cents = totals.get(window, (0, 0))
+            # Alerta só no recebimento que cruza o limiar (não em todos os seguintes)
+            crossed_count = max_count is not None and count > max_count >= count - 1
+            crossed_amount = max_cents is not None and amount_cents > max_cents >= amount_cents - cents
+            if crossed_count or crossed_amount:
+                self._alert(receiver_id, window, count, amount_cents)
+    
+    def _alert(self, receiver_id: str, window: str, count: int, amount_cents: int) -> None:
+        metrics.increment(f"pix.velocity.fanin_alerts.{window}")
+        logger.warning(
+            f"[PIX Velocity] Fan-in em {receiver_id}: {count} recebimentos / "
+            f"R$ {amount_cents / 100:.2f} por {_WINDOW_LABELS.get(window, window)}"
+        )
+        self._alerts.append({
+            "receiver_id": receiver_id,
+            "window": window,
+            "count": count,
+            "amount": amount_cents / 100,
+            "at": datetime.now().isoformat()
+        })
+    
+    def inspect(self, party_id: str) -> dict:
+        """Contadores atuais de envio e recebimento de um participante."""
+        def describe(totals, limits: Limits) -> Dict[str, dict]:
+            return {
+                window: {"count": count, "amount": amount_cents / 100, **_describe_limit(limits.get(window))}
+                for window, (count, amount_cents) in totals.items()
+            }
+        
+        return {
+            "party_id": party_id,
+            "outgoing": describe(self.backend.totals(f"out:{party_id}"), self.sender_limits),
+            "incoming": describe(self.backend.totals(f"in:{party_id}"), self.fanin_thresholds)
+        }
+    
+    def limits(self) -> dict:
+        """Limites de envio e limiares de fan-in configurados (valores em reais)."""
+        return {
+            "outgoing": {window: _describe_limit(limit) for window, limit in self.sender_limits.items()},
+            "incoming_alerts": {window: _describe_limit(limit) for window, limit in self.fanin_thresholds.items()}
+        }
+    
+    def recent_alerts(self, limit: int = 100) -> List[dict]:
+        """Alertas de fan-in mais recentes primeiro."""
+        return list(self._alerts)[::-1][:limit]
+    
+    def stats(self) -> dict:
+        return {"enabled": settings.PIX_VELOCITY_ENABLED, **self.backend.stats()}
+
+
+velocity_guard = PixVelocityGuard()
@@ -0,0 +1,107 @@
+"""
+Snapshot em memória da capacidade das pools ativas.
+
+Critérios de elegibilidade e capital disponível (raised_amount menos
+allocated_amount) de todas as pools ACTIVE, carregados em uma consulta e
+guardados por COMPATIBLE_POOLS_CACHE_TTL_SECONDS. Cada carga recebe uma
+versão; criação, alteração de critérios/status e desembolsos que alocam capital
+invalidam o snapshot, e caches derivados (ex: pools compatíveis) usam a versão
+na chave para nunca servir resultados de um snapshot anterior.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Tuple
+import itertools
+import threading
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.models import Pool, PoolStatus
+
+
+@dataclass(frozen=True)
+class PoolCapacity:
+    pool_id: str
+    name: str
+    investor_id: str
+    available_amount: float
+    expected_return: float
+    min_interest_rate: float
+    min_score: int
+    requires_collateral: bool
+    max_term_months: int
+    risk_profile: str
+
+
+@dataclass(frozen=True)
+class CapacitySnapshot:
+    version: int
+    pools: Tuple[PoolCapacity, ...]
+    # Limiares distintos (ordenados) usados para agrupar consultas equivalentes
+    min_scores: Tuple[int, ...]
+    max_terms: Tuple[int, ...]
+    available_amounts: Tuple[float, ...]
+
+
+_snapshot_cache = TTLCache(
+    maxsize=1,
+    ttl_seconds=settings.COMPATIBLE_POOLS_CACHE_TTL_SECONDS,
+    name="pool_capacity"
+)
+_versions = itertools.count(1)
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def _load(db: Session, version: int) -> CapacitySnapshot:
+    active_pools = db.query(Pool).filter(Pool.status == PoolStatus.ACTIVE).all()
+    pools = tuple(
+        PoolCapacity(
+            pool_id=pool.pool_id,
+            name=pool.name,
+            investor_id=pool.investor_id,
+            available_amount=float(Decimal(str(pool.raised_amount or 0)) - Decimal(str(pool.allocated_amount or 0))),
+            expected_return=float(pool.expected_return or 0),
+            min_interest_rate=float(pool.min_interest_rate or 0),
+            min_score=pool.min_score or 0,
+            requires_collateral=bool(pool.requires_collateral),
+            max_term_months=pool.max_term_months or 0,
+            risk_profile=pool.risk_profile.value if hasattr(pool.risk_profile, 'value') else pool.risk_profile
+        )
+        for pool in active_pools
+    )
+    return CapacitySnapshot(
+        version=version,
+        pools=pools,
+        min_scores=tuple(sorted({pool.min_score for pool in pools})),
+        max_terms=tuple(sorted({pool.max_term_months for pool in pools})),
+        available_amounts=tuple(sorted({pool.available_amount for pool in pools}))
+    )
+
+
+def capacity_snapshot(db: Session) -> CapacitySnapshot:
+    """Snapshot atual (carrega do banco se ausente, expirado ou invalidado)."""
+    snapshot = _snapshot_cache.get("active")
+    if snapshot is not None:
+        return snapshot
+    generation = _generation
+    snapshot = _load(db, next(_versions))
+    with _generation_lock:
+        # Uma invalidação durante a carga descarta o resultado (pode estar desatualizado)
+        if generation == _generation:
+            _snapshot_cache.set("active", snapshot)
+    return snapshot
+
+
+def invalidate_pool_capacity() -> None:
+    """Descarta o snapshot (após commit de mudanças em pools ou alocações)."""
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        _snapshot_cache.clear()
+
+
+def capacity_cache_stats() -> dict:
+    return _snapshot_cache.stats()
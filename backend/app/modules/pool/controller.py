@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, status, Body, Query
+from fastapi import APIRouter, Depends, status, Body, Query, Header
 from sqlalchemy.orm import Session
 from typing import Dict, Any, Optional
 
+from app.core.idempotency import run_idempotent
 from app.database import get_db
 from .service import PoolService
 
@@ -11,6 +12,7 @@ router = APIRouter(prefix="/pool", tags=["Pool"])
 @router.post("/", status_code=status.HTTP_201_CREATED)
 def create_pool(
     data: Dict[str, Any] = Body(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db)
 ):
     """
@@ -29,10 +31,15 @@ def create_pool(
     - requires_collateral: Se exige garantia (padrão: false)
     - min_interest_rate: Taxa mínima aceita (padrão: 0)
     - max_term_months: Prazo máximo aceito (padrão: 24)
+    
+    Header opcional `Idempotency-Key`: repetições com a mesma chave retornam
+    a pool já criada sem debitar de novo.
     """
     service = PoolService(db)
-    result = service.create_pool(data)
-    return result
+    return run_idempotent(
+        db, idempotency_key, "pool.create", data, lambda: service.create_pool(data),
+        status_code=status.HTTP_201_CREATED
+    )
 
 
 @router.get("/")
@@ -63,6 +70,53 @@ def get_investor_pools(
     return result
 
 
+@router.post("/distribution/run")
+def run_pool_distribution(
+    data: Dict[str, Any] = Body(default={}),
+    db: Session = Depends(get_db)
+):
+    """
+    Distribui os repasses cobrados das pools aos investidores (administrativo).
+    
+    **Body JSON (opcional):**
+    ```json
+    {
+        "business_date": "2025-01-31",  // Repasses cobrados até esta data (padrão: hoje)
+        "dry_run": true                 // Apenas calcula, não grava nada
+    }
+    ```
+    
+    Cotistas recebem pela share_percentage e o dono da pool pelo percentual
+    restante. Normalmente roda sozinho a cada POOL_DISTRIBUTION_INTERVAL_SECONDS.
+    """
+    service = PoolService(db)
+    return service.run_distribution(data)
+
+
+@router.get("/distribution/runs")
+def get_pool_distribution_runs(
+    limit: int = 30,
+    db: Session = Depends(get_db)
+):
+    """
+    Lista as distribuições de repasses mais recentes.
+    """
+    service = PoolService(db)
+    return service.get_distribution_runs(limit)
+
+
+@router.get("/distribution/runs/{run_id}")
+def get_pool_distribution_lines(
+    run_id: str,
+    db: Session = Depends(get_db)
+):
+    """
+    Linhas de auditoria de uma distribuição: valor e percentual por investidor em cada pool.
+    """
+    service = PoolService(db)
+    return service.get_distribution_lines(run_id)
+
+
 @router.get("/{pool_id}")
 def get_pool_details(
     pool_id: str,
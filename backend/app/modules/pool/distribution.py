@@ -0,0 +1,281 @@
+"""
+Distribuição dos repasses das pools aos investidores.
+
+A cobrança grava em loan_repayments a parte de cada pool nas parcelas pagas,
+pendente de distribuição. Uma execução, numa única transação:
+
+1. Reivindica os repasses pendentes até a data com um UPDATE que preenche
+   distribution_run_id (execuções concorrentes não distribuem a mesma linha)
+2. Soma os repasses por pool (GROUP BY) e monta as linhas de cada pool: os
+   cotistas (pool_investments) pela share_percentage e o dono da pool com o
+   percentual restante
+3. Rateia o total de todas as pools de uma vez, em centavos inteiros
+   (money.allocate_many): a soma das linhas é exatamente o total da pool
+4. Credita as carteiras BRL com um UPDATE ... CASE e grava transações
+   POOL_DISTRIBUTION, a execução e as linhas de auditoria com executemany
+
+Com dry_run o cálculo é feito e descartado (rollback).
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+import logging
+import time
+import uuid
+
+import numpy as np
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.money import allocate_many, from_cents, to_cents
+from app.core.workers import WorkerPool
+from app.database import run_in_transaction
+from app.models.models import (
+    Currency, LoanRepayment, OwnerType, Pool, PoolDistributionLine, PoolDistributionRun,
+    PoolInvestment, Transaction, TransactionStatus, TransactionType
+)
+from app.modules.wallet.repository import WalletRepository
+
+logger = logging.getLogger(__name__)
+
+# Percentuais viram pesos inteiros com 4 casas
+_SHARE_SCALE = 10000
+
+
+class PoolDistributionEngine:
+    """Distribui os repasses pendentes das pools ao dono e aos cotistas."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.wallet_repository = WalletRepository(db)
+    
+    def run(self, business_date: Optional[date] = None, dry_run: bool = False) -> dict:
+        """
+        Distribui os repasses cobrados até o fim de `business_date` (padrão: hoje).
+        
+        Returns:
+            Resumo da execução (run_id, pools, repasses, linhas, valor distribuído)
+        """
+        business_date = business_date or date.today()
+        started = time.perf_counter()
+        
+        if dry_run:
+            try:
+                report = self._distribute(business_date, dry_run=True)
+            finally:
+                self.db.rollback()
+        else:
+            report = run_in_transaction(
+                self.db, lambda: self._distribute(business_date, dry_run=False), name="pool_distribution"
+            )
+        
+        seconds = time.perf_counter() - started
+        report["seconds"] = round(seconds, 3)
+        if not dry_run and report["run_id"]:
+            metrics.increment("pool_distribution.lines", report["lines"])
+            metrics.increment("pool_distribution.amount", report["amount_distributed"])
+            metrics.observe("pool_distribution.seconds", seconds)
+        logger.info(f"[Pool Distribution] {report}")
+        return report
+    
+    def _distribute(self, business_date: date, dry_run: bool) -> dict:
+        """Reivindica, rateia e credita os repasses. Não faz commit."""
+        now = datetime.now()
+        run_id = str(uuid.uuid4())
+        report = {
+            "run_id": None,
+            "business_date": business_date.isoformat(),
+            "dry_run": dry_run,
+            "pools": 0,
+            "repayments": 0,
+            "lines": 0,
+            "amount_distributed": 0.0
+        }
+        
+        claimed = self.db.execute(
+            update(LoanRepayment)
+            .where(
+                LoanRepayment.pool_id.in_(select(Pool.pool_id)),
+                LoanRepayment.distribution_run_id.is_(None),
+                LoanRepayment.collected_at < business_date + timedelta(days=1)
+            )
+            .values(distribution_run_id=run_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            return report
+        
+        totals = self.db.query(
+            LoanRepayment.pool_id, func.sum(LoanRepayment.amount)
+        ).filter(
+            LoanRepayment.distribution_run_id == run_id
+        ).group_by(LoanRepayment.pool_id).order_by(LoanRepayment.pool_id).all()
+        pool_ids = [pool_id for pool_id, _ in totals]
+        owners = dict(self.db.query(Pool.pool_id, Pool.investor_id).filter(Pool.pool_id.in_(pool_ids)).all())
+        holdings = self.db.query(
+            PoolInvestment.pool_id, PoolInvestment.investor_id, func.sum(PoolInvestment.share_percentage)
+        ).filter(
+            PoolInvestment.pool_id.in_(pool_ids)
+        ).group_by(PoolInvestment.pool_id, PoolInvestment.investor_id).all()
+        
+        lines = self._lines(pool_ids, owners, holdings)
+        cents = allocate_many(
+            np.array([to_cents(total) for _, total in totals], dtype=np.int64),
+            np.array([line["group"] for line in lines], dtype=np.int64),
+            np.array([line["weight"] for line in lines], dtype=np.int64)
+        )
+        
+        transactions, audit = [], []
+        credits_by_investor: Dict[str, Decimal] = defaultdict(Decimal)
+        for line, amount_cents in zip(lines, cents.tolist()):
+            if amount_cents <= 0:
+                continue
+            amount = from_cents(amount_cents)
+            transaction_id = str(uuid.uuid4())
+            credits_by_investor[line["investor_id"]] += amount
+            transactions.append({
+                "transaction_id": transaction_id,
+                "sender_id": owners[line["pool_id"]],
+                "sender_type": OwnerType.INVESTOR,
+                "receiver_id": line["investor_id"],
+                "receiver_type": OwnerType.INVESTOR,
+                "amount": amount,
+                "currency": Currency.BRL,
+                "type": TransactionType.POOL_DISTRIBUTION,
+                "status": TransactionStatus.COMPLETED,
+                "description": f"Repasse da pool {line['pool_id']}",
+                "created_at": now
+            })
+            audit.append({
+                "line_id": str(uuid.uuid4()),
+                "run_id": run_id,
+                "pool_id": line["pool_id"],
+                "investor_id": line["investor_id"],
+                "is_owner": line["is_owner"],
+                "share_percentage": Decimal(line["weight"]) / _SHARE_SCALE,
+                "amount": amount,
+                "transaction_id": transaction_id
+            })
+        
+        total_amount = sum(credits_by_investor.values(), Decimal(0))
+        report.update({
+            "run_id": run_id,
+            "pools": len(totals),
+            "repayments": claimed,
+            "lines": len(audit),
+            "amount_distributed": float(total_amount)
+        })
+        if dry_run:
+            return report
+        
+        self.db.execute(insert(PoolDistributionRun).values(
+            run_id=run_id,
+            business_date=business_date,
+            pools_count=len(totals),
+            repayments_count=claimed,
+            lines_count=len(audit),
+            total_amount=total_amount,
+            created_at=now
+        ))
+        if not audit:
+            return report
+        
+        wallets = self.wallet_repository.get_wallets_for_owners(
+            [(investor_id, OwnerType.INVESTOR) for investor_id in credits_by_investor], Currency.BRL
+        )
+        for transaction in transactions:
+            transaction["wallet_id"] = wallets[(transaction["receiver_id"], OwnerType.INVESTOR)].wallet_id
+        self.db.execute(insert(Transaction), transactions)
+        self.db.execute(insert(PoolDistributionLine), audit)
+        self.wallet_repository.credit_many({
+            wallets[(investor_id, OwnerType.INVESTOR)].wallet_id: amount
+            for investor_id, amount in credits_by_investor.items()
+        })
+        return report
+    
+    def _lines(self, pool_ids: List[str], owners: Dict[str, str], holdings: list) -> List[dict]:
+        """
+        Linhas de rateio por pool: cotistas pela share_percentage e o dono com o restante.
+        
+        Se as cotas somam 100% ou mais o dono não recebe e as cotas são
+        normalizadas pelo próprio rateio.
+        """
+        shares_by_pool: Dict[str, List[tuple]] = defaultdict(list)
+        for pool_id, investor_id, share in holdings:
+            weight = int(Decimal(share or 0) * _SHARE_SCALE)
+            if weight > 0:
+                shares_by_pool[pool_id].append((investor_id, weight))
+        
+        lines = []
+        for group, pool_id in enumerate(pool_ids):
+            shares = shares_by_pool.get(pool_id, [])
+            owner_weight = 100 * _SHARE_SCALE - sum(weight for _, weight in shares)
+            if owner_weight > 0 or not shares:
+                lines.append({
+                    "group": group,
+                    "pool_id": pool_id,
+                    "investor_id": owners[pool_id],
+                    "is_owner": True,
+                    "weight": max(owner_weight, 1)
+                })
+            for investor_id, weight in shares:
+                lines.append({
+                    "group": group,
+                    "pool_id": pool_id,
+                    "investor_id": investor_id,
+                    "is_owner": False,
+                    "weight": weight
+                })
+        return lines
+    
+    # ========== CONSULTAS ==========
+    
+    def list_runs(self, limit: int = 30) -> List[dict]:
+        runs = self.db.query(PoolDistributionRun).order_by(
+            PoolDistributionRun.created_at.desc()
+        ).limit(limit).all()
+        return [
+            {
+                "run_id": run.run_id,
+                "business_date": run.business_date.isoformat(),
+                "pools": run.pools_count,
+                "repayments": run.repayments_count,
+                "lines": run.lines_count,
+                "amount_distributed": float(run.total_amount),
+                "created_at": run.created_at.isoformat() if run.created_at else None
+            }
+            for run in runs
+        ]
+    
+    def get_run_lines(self, run_id: str) -> List[dict]:
+        lines = self.db.query(PoolDistributionLine).filter(
+            PoolDistributionLine.run_id == run_id
+        ).order_by(PoolDistributionLine.pool_id, PoolDistributionLine.is_owner.desc()).all()
+        return [
+            {
+                "pool_id": line.pool_id,
+                "investor_id": line.investor_id,
+                "is_owner": line.is_owner,
+                "share_percentage": float(line.share_percentage),
+                "amount": float(line.amount),
+                "transaction_id": line.transaction_id
+            }
+            for line in lines
+        ]
+
+
+def _distribute_due(db: Session) -> int:
+    PoolDistributionEngine(db).run()
+    return 0
+
+
+# Worker de distribuição: repete a cada POOL_DISTRIBUTION_INTERVAL_SECONDS
+distribution_workers = WorkerPool(
+    "pool_distribution",
+    handler=_distribute_due,
+    workers=1,
+    idle_interval=settings.POOL_DISTRIBUTION_INTERVAL_SECONDS
+)
@@ -1,7 +1,17 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, update
+from decimal import Decimal
 from typing import Optional, List, Dict, Any
-from app.models.models import Pool, Loan, LoanStatus, PoolStatus, CreditRequest, User
+from app.models.models import Pool, PoolLoan, Loan, LoanStatus, PoolStatus, CreditRequest, User
+
+
+class PoolCapacityConflict(Exception):
+    """A pool não comporta mais a alocação (capacidade consumida por outra transação)."""
+    
+    def __init__(self, pool_id: str, amount: Decimal):
+        super().__init__(f"Pool {pool_id} sem capacidade para R$ {amount}")
+        self.pool_id = pool_id
+        self.amount = amount
 
 
 class PoolRepository:
@@ -25,10 +35,13 @@ class PoolRepository:
             query = query.filter(Pool.status == status)
         return query.all()
     
-    def create_pool(self, data: dict) -> Pool:
-        """Cria novo pool."""
+    def create_pool(self, data: dict, commit: bool = True) -> Pool:
+        """Cria novo pool. Com commit=False apenas faz flush (transação do chamador)."""
         pool = Pool(**data)
         self.db.add(pool)
+        if not commit:
+            self.db.flush()
+            return pool
         self.db.commit()
         self.db.refresh(pool)
         return pool
@@ -47,6 +60,36 @@ class PoolRepository:
         self.db.refresh(pool)
         return pool
     
+    def get_allocated_amounts(self, pool_ids: List[str]) -> Dict[str, Decimal]:
+        """Total alocado por pool (coluna allocated_amount), em uma única consulta."""
+        if not pool_ids:
+            return {}
+        rows = self.db.query(Pool.pool_id, Pool.allocated_amount).filter(Pool.pool_id.in_(pool_ids)).all()
+        return {pool_id: allocated or Decimal(0) for pool_id, allocated in rows}
+    
+    def reserve_capacity(self, pool_id: str, amount: Decimal) -> bool:
+        """
+        Reserva `amount` da capacidade da pool com um UPDATE condicional. Não faz commit.
+        
+        A verificação (allocated_amount + amount <= raised_amount, pool ACTIVE) e o
+        incremento são atômicos: duas transações concorrentes nunca alocam além do
+        capital da pool, mesmo que ambas tenham lido o mesmo disponível.
+        
+        Returns:
+            True se reservou; False se a pool não comporta mais o valor
+        """
+        result = self.db.execute(
+            update(Pool)
+            .where(
+                Pool.pool_id == pool_id,
+                Pool.status == PoolStatus.ACTIVE,
+                Pool.allocated_amount + amount <= Pool.raised_amount
+            )
+            .values(allocated_amount=Pool.allocated_amount + amount)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+    
     def get_pool_loans(self, pool_id: str) -> List[Dict[str, Any]]:
         """Busca todos os empréstimos alocados em uma pool com detalhes do tomador."""
         loans = self.db.query(
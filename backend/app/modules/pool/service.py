@@ -1,12 +1,15 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
-from typing import Dict, List, Any
-from datetime import datetime
+from typing import Dict, List, Any, Optional
+from datetime import date, datetime
 import uuid
 
+from .capacity import invalidate_pool_capacity
 from .repository import PoolRepository
-from app.modules.wallet.repository import WalletRepository
-from app.models.models import PoolStatus, LoanStatus, RiskProfile
+from .distribution import PoolDistributionEngine
+from app.database import run_in_transaction
+from app.modules.wallet.repository import WalletRepository, InsufficientFundsError
+from app.models.models import PoolStatus, LoanStatus, RiskProfile, OwnerType, Currency
 
 
 class PoolService:
@@ -45,8 +48,7 @@ class PoolService:
             )
         
         # Busca carteira BRL do investidor
-        wallets = self.wallet_repository.get_wallet_by_owner(investor_id, 'INVESTOR')
-        brl_wallet = next((w for w in wallets if w.currency == 'BRL'), None)
+        brl_wallet = self.wallet_repository.get_wallet(investor_id, OwnerType.INVESTOR, Currency.BRL)
         
         if not brl_wallet:
             raise HTTPException(
@@ -54,13 +56,6 @@ class PoolService:
                 detail="Carteira não encontrada"
             )
         
-        # Valida saldo suficiente
-        if float(brl_wallet.balance) < target_amount:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Saldo insuficiente. Disponível: R$ {float(brl_wallet.balance):.2f}"
-            )
-        
         # Cria pool
         pool_data = {
             'pool_id': str(uuid.uuid4()),
@@ -78,11 +73,19 @@ class PoolService:
             'max_term_months': data.get('max_term_months', 24),
         }
         
-        pool = self.repository.create_pool(pool_data)
+        def fund_pool():
+            # Debita da carteira (com lock e validação de saldo) e cria a pool na mesma transação
+            self.wallet_repository.debit(brl_wallet.wallet_id, target_amount)
+            return self.repository.create_pool(pool_data, commit=False)
         
-        # Debita da carteira
-        new_balance = float(brl_wallet.balance) - target_amount
-        self.wallet_repository.update_balance(brl_wallet.wallet_id, new_balance)
+        try:
+            pool = run_in_transaction(self.db, fund_pool, name="pool_create")
+        except InsufficientFundsError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Saldo insuficiente. Disponível: R$ {float(e.available):.2f}"
+            )
+        invalidate_pool_capacity()
         
         return self._pool_to_dict(pool)
     
@@ -156,6 +159,7 @@ class PoolService:
         filtered_updates = {k: v for k, v in updates.items() if k in allowed_fields}
         
         updated_pool = self.repository.update_pool(pool_id, filtered_updates)
+        invalidate_pool_capacity()
         return self._pool_to_dict(updated_pool)
     
     def update_pool_status(self, pool_id: str, new_status: str) -> dict:
@@ -171,6 +175,7 @@ class PoolService:
             raise HTTPException(status_code=400, detail=f"Invalid status: {new_status}")
         
         updated_pool = self.repository.update_pool(pool_id, {'status': status_enum})
+        invalidate_pool_capacity()
         return self._pool_to_dict(updated_pool)
     
     def increase_pool_capital(self, pool_id: str, amount: float) -> dict:
@@ -187,6 +192,44 @@ class PoolService:
         
         return self._pool_to_dict(updated_pool)
     
+    # ========== DISTRIBUIÇÃO ==========
+    
+    def run_distribution(self, data: dict) -> dict:
+        """
+        Distribui os repasses cobrados das pools ao dono e aos cotistas.
+        
+        Args:
+            data: Opcionalmente business_date (AAAA-MM-DD) e dry_run
+        
+        Returns:
+            Resumo da execução (pools, repasses, linhas, valor distribuído)
+        """
+        business_date: Optional[date] = None
+        if data.get('business_date'):
+            try:
+                business_date = date.fromisoformat(str(data['business_date']))
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="business_date deve estar no formato AAAA-MM-DD"
+                )
+        engine = PoolDistributionEngine(self.db)
+        return engine.run(business_date, dry_run=bool(data.get('dry_run')))
+    
+    def get_distribution_runs(self, limit: int = 30) -> List[dict]:
+        """Distribuições mais recentes primeiro."""
+        return PoolDistributionEngine(self.db).list_runs(limit)
+    
+    def get_distribution_lines(self, run_id: str) -> List[dict]:
+        """Linhas de auditoria (valor por investidor e pool) de uma distribuição."""
+        lines = PoolDistributionEngine(self.db).get_run_lines(run_id)
+        if not lines:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Distribuição não encontrada"
+            )
+        return lines
+    
     def _pool_to_dict(self, pool: Any) -> dict:
         """Converte entidade Pool para dicionário."""
         return {
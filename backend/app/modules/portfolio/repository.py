@@ -9,6 +9,7 @@ from app.models.models import (
     LoanPayment, CreditRequest, User, LoanStatus, PaymentStatus,
     PoolStatus, CreditRequestStatus
 )
+from app.modules.wallet.repository import WalletRepository
 
 
 class PortfolioRepository:
@@ -23,13 +24,17 @@ class PortfolioRepository:
             Wallet.owner_id == investor_id,
             Wallet.owner_type == "investor"
         ).all()
+        # Carteiras striped: saldo = principal + soma dos stripes (uma consulta agregada)
+        stripe_totals = WalletRepository(self.db).get_stripe_totals(
+            [w.wallet_id for w in wallets if w.stripe_count]
+        )
         
         return [{
             "wallet_id": w.wallet_id,
             "currency": w.currency.value,
-            "balance": float(w.balance),
+            "balance": float(w.balance + stripe_totals.get(w.wallet_id, 0)),
             "blocked": float(w.blocked),
-            "available": float(w.balance - w.blocked)
+            "available": float(w.balance + stripe_totals.get(w.wallet_id, 0) - w.blocked)
         } for w in wallets]
     
     def get_investor_pools(self, investor_id: str) -> List[Dict]:
@@ -124,21 +129,26 @@ class PortfolioRepository:
             Loan.status == LoanStatus.ACTIVE
         ).all()
         
+        # Parcela em aberto mais antiga já materializada (vencida ou paga em parte), em uma consulta
+        open_due_dates = dict(self.db.query(
+            LoanPayment.loan_id,
+            func.min(LoanPayment.due_date)
+        ).filter(
+            LoanPayment.loan_id.in_([loan.loan_id for loan, _, _ in loans]),
+            LoanPayment.status != PaymentStatus.PAID
+        ).group_by(LoanPayment.loan_id).all()) if loans else {}
+        
         investments = []
         for loan, borrower_name, amount in loans:
-            # Buscar próxima parcela
-            next_payment = self.db.query(LoanPayment).filter(
-                LoanPayment.loan_id == loan.loan_id,
-                LoanPayment.status == PaymentStatus.PENDING
-            ).order_by(LoanPayment.due_date).first()
-            
+            # Sem parcela em aberto materializada: próxima do cronograma (as futuras não têm linha)
+            next_payment = open_due_dates.get(loan.loan_id) or loan.next_due_date
             investments.append({
                 "id": loan.loan_id,
                 "borrower": borrower_name,
                 "amount": float(loan.principal),
                 "return": float(loan.interest_rate),
                 "status": loan.status.value,
-                "nextPayment": next_payment.due_date.isoformat() if next_payment else None
+                "nextPayment": next_payment.isoformat() if next_payment else None
             })
         
         return investments
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from typing import Dict, Any, List
 
+from app.modules.currency.rates import rate_table
 from .repository import PortfolioRepository
 
 
@@ -24,10 +25,17 @@ class PortfolioService:
         # Buscar carteiras
         wallets = self.repository.get_investor_wallets(investor_id)
         
-        # Calcular totais das carteiras
-        total_balance = sum(w["balance"] for w in wallets)
-        total_available = sum(w["available"] for w in wallets)
-        total_blocked = sum(w["blocked"] for w in wallets)
+        # Calcular totais das carteiras em BRL (uma conversão vetorizada para todas as carteiras)
+        totals = rate_table.convert_many(
+            [
+                [w["balance"] for w in wallets],
+                [w["available"] for w in wallets],
+                [w["blocked"] for w in wallets]
+            ],
+            [w["currency"] for w in wallets],
+            "BRL"
+        ).sum(axis=1)
+        total_balance, total_available, total_blocked = (round(float(t), 2) for t in totals)
         
         # Buscar performance
         performance = self.repository.calculate_portfolio_performance(investor_id)
@@ -45,6 +53,7 @@ class PortfolioService:
         return {
             "investor_id": investor_id,
             "balance": {
+                "currency": "BRL",
                 "total": total_balance,
                 "available": total_available,
                 "invested": total_invested,
@@ -7,6 +7,7 @@ import mimetypes
 from pathlib import Path
 
 from .repository import ScoreRepository
+from app.modules.credit.compatibility import invalidate_borrower_score
 from .llm_analyzer import OpenAIDocumentAnalyzer
 
 
@@ -536,6 +537,7 @@ class ScoreService:
         
         # Atualizar no banco
         self.repository.update_calculated_score(user_id, new_score)
+        invalidate_borrower_score(user_id)
         
         return {
             "user_id": user_id,
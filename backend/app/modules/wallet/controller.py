@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Body
 from sqlalchemy.orm import Session
+from typing import Dict, Any
 
 from app.database import get_db
 from .service import WalletService
@@ -21,3 +22,27 @@ def get_wallets(
     service = WalletService(db)
     result = service.get_user_wallets(owner_id, owner_type)
     return result
+
+
+@router.put("/{wallet_id}/stripes")
+def set_wallet_stripes(
+    wallet_id: str,
+    data: Dict[str, Any] = Body(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Ativa sub-saldos (stripes) para carteiras com muitos créditos concorrentes
+    (ex: carteira de um pool ou de um recebedor PIX muito ativo).
+    
+    **Body JSON:**
+    ```json
+    {
+        "stripes": 8  // 0 desativa
+    }
+    ```
+    
+    Créditos vão para um stripe aleatório; débitos consolidam os stripes no
+    saldo principal antes de validar o saldo disponível.
+    """
+    service = WalletService(db)
+    return service.set_stripes(wallet_id, int(data.get("stripes", 0)))
@@ -1,6 +1,46 @@
 from sqlalchemy.orm import Session
-from typing import Optional, List
-from app.models.models import Wallet
+from sqlalchemy import event, update, func, case
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from typing import Optional, List, Union, Dict, Tuple
+from decimal import Decimal
+import random
+import uuid
+
+from app.core.metrics import metrics
+from app.models.models import Wallet, WalletStripe, OwnerType, Currency
+
+# Chave do identity map de carteiras dentro de Session.info.
+# Como cada request recebe sua própria sessão (get_db), o mapa vive apenas durante o request.
+_IDENTITY_MAP_KEY = "wallet_identity_map"
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_wallet_identity_map(session):
+    """Descarta o identity map após rollback (linhas criadas na transação deixam de existir)."""
+    session.info.pop(_IDENTITY_MAP_KEY, None)
+
+
+class InsufficientFundsError(Exception):
+    """Saldo disponível (balance - blocked) insuficiente para o débito."""
+    
+    def __init__(self, wallet_id: str, available: Decimal):
+        super().__init__(f"Saldo insuficiente na carteira {wallet_id}")
+        self.wallet_id = wallet_id
+        self.available = available
+
+
+def _as_owner_type(owner_type: Union[OwnerType, str]) -> OwnerType:
+    """Normaliza owner_type ('USER', 'user' ou OwnerType) para o enum."""
+    if isinstance(owner_type, OwnerType):
+        return owner_type
+    return OwnerType[str(owner_type).upper()]
+
+
+def _as_currency(currency: Union[Currency, str]) -> Currency:
+    """Normaliza currency ('BRL', 'brl' ou Currency) para o enum."""
+    if isinstance(currency, Currency):
+        return currency
+    return Currency[str(currency).upper()]
 
 
 class WalletRepository:
@@ -16,9 +56,478 @@ class WalletRepository:
             Wallet.owner_type == owner_type
         ).all()
     
+    def get_wallet(
+        self,
+        owner_id: str,
+        owner_type: Union[OwnerType, str],
+        currency: Union[Currency, str] = Currency.BRL,
+        for_update: bool = False,
+        create: bool = False
+    ) -> Optional[Wallet]:
+        """
+        Busca a carteira de um dono em uma moeda específica.
+        
+        Usa o índice único (owner_id, owner_type, currency) e um identity map
+        por request: consultas repetidas ao mesmo dono não voltam ao banco.
+        
+        Args:
+            owner_id: ID do usuário/investidor
+            owner_type: OwnerType ou string ('USER', 'INVESTOR')
+            currency: Moeda da carteira (padrão BRL)
+            for_update: Se True, relê a linha com SELECT ... FOR UPDATE
+            create: Se True, cria a carteira (upsert) quando não existir
+        
+        Returns:
+            Carteira encontrada/criada ou None
+        """
+        owner_type = _as_owner_type(owner_type)
+        currency = _as_currency(currency)
+        key = (owner_id, owner_type, currency)
+        identity_map = self.db.info.setdefault(_IDENTITY_MAP_KEY, {})
+        
+        wallet = identity_map.get(key)
+        if wallet is not None and not for_update:
+            return wallet
+        
+        wallet = self._select_wallet(owner_id, owner_type, currency, for_update)
+        if wallet is None and create:
+            self._upsert_wallet(owner_id, owner_type, currency)
+            wallet = self._select_wallet(owner_id, owner_type, currency, for_update)
+        
+        if wallet is not None:
+            identity_map[key] = wallet
+        return wallet
+    
+    def _select_wallet(
+        self,
+        owner_id: str,
+        owner_type: OwnerType,
+        currency: Currency,
+        for_update: bool
+    ) -> Optional[Wallet]:
+        """SELECT pelo índice único (owner_id, owner_type, currency)."""
+        query = self.db.query(Wallet).filter(
+            Wallet.owner_id == owner_id,
+            Wallet.owner_type == owner_type,
+            Wallet.currency == currency
+        )
+        if for_update:
+            query = query.with_for_update().populate_existing()
+        return query.first()
+    
+    def _upsert_wallet(self, owner_id: str, owner_type: OwnerType, currency: Currency) -> None:
+        """
+        Cria carteira zerada com INSERT ... ON DUPLICATE KEY UPDATE.
+        
+        Se outro request criar a mesma carteira em paralelo, o índice único
+        transforma o INSERT em no-op em vez de gerar duplicata.
+        """
+        stmt = mysql_insert(Wallet).values(
+            wallet_id=str(uuid.uuid4()),
+            owner_id=owner_id,
+            owner_type=owner_type,
+            currency=currency,
+            balance=0,
+            blocked=0
+        )
+        stmt = stmt.on_duplicate_key_update(wallet_id=Wallet.wallet_id)
+        self.db.execute(stmt)
+    
+    def get_wallets_for_owners(
+        self,
+        owners: List[Tuple[str, OwnerType]],
+        currency: Union[Currency, str] = Currency.BRL
+    ) -> Dict[Tuple[str, OwnerType], Wallet]:
+        """
+        Busca (criando quando necessário) as carteiras de vários donos de uma vez.
+        
+        Um INSERT multi-linha com ON DUPLICATE KEY UPDATE para as que faltam e um
+        SELECT com IN para todas, independente do número de donos.
+        """
+        currency = _as_currency(currency)
+        owners = list({(owner_id, _as_owner_type(owner_type)) for owner_id, owner_type in owners})
+        if not owners:
+            return {}
+        
+        def select_all() -> Dict[Tuple[str, OwnerType], Wallet]:
+            wallets = self.db.query(Wallet).filter(
+                Wallet.owner_id.in_([owner_id for owner_id, _ in owners]),
+                Wallet.currency == currency
+            ).all()
+            return {(w.owner_id, w.owner_type): w for w in wallets}
+        
+        found = select_all()
+        missing = [key for key in owners if key not in found]
+        if missing:
+            stmt = mysql_insert(Wallet).values([
+                {
+                    "wallet_id": str(uuid.uuid4()),
+                    "owner_id": owner_id,
+                    "owner_type": owner_type,
+                    "currency": currency,
+                    "balance": 0,
+                    "blocked": 0
+                }
+                for owner_id, owner_type in missing
+            ])
+            self.db.execute(stmt.on_duplicate_key_update(wallet_id=Wallet.wallet_id))
+            found = select_all()
+        
+        identity_map = self.db.info.setdefault(_IDENTITY_MAP_KEY, {})
+        for (owner_id, owner_type), wallet in found.items():
+            identity_map[(owner_id, owner_type, currency)] = wallet
+        return found
+    
     def get_wallet_by_id(self, wallet_id: str) -> Optional[Wallet]:
-        """Busca carteira por ID."""
-        return self.db.query(Wallet).filter(Wallet.wallet_id == wallet_id).first()
+        """Busca carteira por ID (usa o identity map da sessão quando já carregada)."""
+        return self.db.get(Wallet, wallet_id)
+    
+    def lock_wallets(self, *wallet_ids: str) -> Dict[str, Wallet]:
+        """
+        Trava as carteiras com SELECT ... FOR UPDATE em ordem canônica (wallet_id).
+        
+        Uma única consulta por PK com ORDER BY wallet_id faz o InnoDB adquirir os
+        locks em ordem crescente de chave; como todas as transferências travam na
+        mesma ordem, duas transferências opostas entre as mesmas partes não entram
+        em deadlock (uma apenas espera a outra).
+        """
+        ordered_ids = sorted(set(wallet_ids))
+        with metrics.timer("wallet.lock_wait_seconds"):
+            wallets = self.db.query(Wallet).filter(
+                Wallet.wallet_id.in_(ordered_ids)
+            ).order_by(Wallet.wallet_id).with_for_update().populate_existing().all()
+        return {w.wallet_id: w for w in wallets}
+    
+    def debit(self, wallet_id: str, amount) -> Wallet:
+        """Debita valor da carteira (com lock). Não faz commit."""
+        amount = Decimal(str(amount))
+        wallet = self.lock_wallets(wallet_id)[wallet_id]
+        self._consolidate_stripes(wallet)
+        self._check_available(wallet, amount)
+        wallet.balance = wallet.balance - amount
+        self.db.flush()
+        return wallet
+    
+    def credit(self, wallet_id: str, amount) -> Wallet:
+        """
+        Credita valor na carteira. Não faz commit.
+        
+        Em carteiras striped o crédito vai para um stripe aleatório e não trava
+        a linha principal da carteira.
+        """
+        amount = Decimal(str(amount))
+        wallet = self.get_wallet_by_id(wallet_id)
+        if self._credit_stripe(wallet, amount):
+            return wallet
+        
+        wallet = self.lock_wallets(wallet_id)[wallet_id]
+        wallet.balance = wallet.balance + amount
+        self.db.flush()
+        return wallet
+    
+    def transfer(self, from_wallet_id: str, to_wallet_id: str, amount) -> Tuple[Wallet, Wallet]:
+        """
+        Transfere valor entre duas carteiras dentro da transação corrente.
+        
+        Trava as carteiras em ordem canônica, valida o saldo disponível já com a
+        linha travada e aplica débito/crédito. Se o destino for striped (e o
+        stripe sorteado existir), apenas o remetente é travado e o crédito vai
+        para o stripe; o stripe é resolvido antes dos locks, então sem stripe as
+        duas carteiras são travadas juntas. Não faz commit: use junto com
+        run_in_transaction para retry automático em deadlock.
+        
+        Raises:
+            InsufficientFundsError: se o saldo disponível do remetente for insuficiente
+        """
+        amount = Decimal(str(amount))
+        target = self.get_wallet_by_id(to_wallet_id)
+        stripe_no = self._pick_stripe(target)
+        
+        lock_ids = [from_wallet_id] if stripe_no is not None else [from_wallet_id, to_wallet_id]
+        locked = self.lock_wallets(*lock_ids)
+        source = locked[from_wallet_id]
+        
+        self._consolidate_stripes(source)
+        self._check_available(source, amount)
+        source.balance = source.balance - amount
+        
+        if not (stripe_no is not None and self._credit_stripe(target, amount, stripe_no)):
+            # Stripe removido por um redimensionamento concorrente: lock fora de ordem
+            # (raro; um deadlock resultante é repetido pelo run_in_transaction)
+            target = locked.get(to_wallet_id) or self.lock_wallets(to_wallet_id)[to_wallet_id]
+            target.balance = target.balance + amount
+        self.db.flush()
+        return source, target
+    
+    def transfer_many(self, from_wallet_id: str, credits: Dict[str, Decimal]) -> Wallet:
+        """
+        Debita o total de uma carteira e credita várias carteiras (pagamento em lote).
+        
+        Todas as carteiras não-striped são travadas em uma única consulta em ordem
+        canônica; o remetente é debitado uma vez e os créditos são aplicados com um
+        único UPDATE ... CASE. Carteiras striped recebem em um stripe. Não faz commit.
+        
+        Raises:
+            InsufficientFundsError: se o saldo disponível não cobre o total
+        """
+        credits = {wallet_id: Decimal(str(amount)) for wallet_id, amount in credits.items()}
+        total = sum(credits.values(), Decimal(0))
+        targets = self.db.query(Wallet).filter(Wallet.wallet_id.in_(list(credits))).all()
+        striped = {w.wallet_id: w for w in targets if self._is_striped(w)}
+        
+        locked = self.lock_wallets(from_wallet_id, *[wid for wid in credits if wid not in striped])
+        source = locked[from_wallet_id]
+        self._consolidate_stripes(source)
+        self._check_available(source, total)
+        source.balance = source.balance - total
+        self.db.flush()
+        
+        self._apply_credits(credits, striped)
+        return source
+    
+    def credit_many(self, credits: Dict[str, Decimal]) -> None:
+        """
+        Credita várias carteiras com um único UPDATE ... CASE (desembolso em lote).
+        
+        As linhas são travadas pelo próprio UPDATE (por PK, em ordem de índice);
+        carteiras striped recebem em um stripe. Não faz commit.
+        """
+        credits = {wallet_id: Decimal(str(amount)) for wallet_id, amount in credits.items() if amount}
+        if not credits:
+            return
+        targets = self.db.query(Wallet).filter(Wallet.wallet_id.in_(list(credits))).all()
+        self._apply_credits(credits, {w.wallet_id: w for w in targets if self._is_striped(w)})
+    
+    def lock_for_debit(self, wallet_ids: List[str]) -> Dict[str, Decimal]:
+        """
+        Trava as carteiras (ordem canônica), consolida stripes e retorna o saldo
+        disponível (balance - blocked) de cada uma. Usado antes de `debit_many`.
+        """
+        locked = self.lock_wallets(*wallet_ids)
+        available = {}
+        for wallet_id, wallet in locked.items():
+            self._consolidate_stripes(wallet)
+            available[wallet_id] = (wallet.balance or Decimal(0)) - (wallet.blocked or Decimal(0))
+        self.db.flush()
+        return available
+    
+    def debit_many(self, debits: Dict[str, Decimal]) -> None:
+        """
+        Debita várias carteiras com um único UPDATE ... CASE condicional.
+        
+        Cada linha só é alterada se o saldo disponível cobre o seu valor; se
+        alguma não passar na condição, nada deve ser gravado (o chamador faz
+        rollback). Use após `lock_for_debit`. Não faz commit.
+        
+        Raises:
+            InsufficientFundsError: se alguma carteira não tem saldo disponível
+        """
+        debits = {wallet_id: Decimal(str(amount)) for wallet_id, amount in debits.items() if amount}
+        if not debits:
+            return
+        amount = case(debits, value=Wallet.wallet_id, else_=0)
+        result = self.db.execute(
+            update(Wallet)
+            .where(
+                Wallet.wallet_id.in_(list(debits)),
+                Wallet.balance - Wallet.blocked >= amount
+            )
+            .values(balance=Wallet.balance - amount)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(debits):
+            short = self.db.query(Wallet.wallet_id, Wallet.balance - Wallet.blocked).filter(
+                Wallet.wallet_id.in_(list(debits))
+            ).all()
+            wallet_id, available = next(
+                ((wid, avail) for wid, avail in short if avail < debits[wid]),
+                short[0] if short else (next(iter(debits)), Decimal(0))
+            )
+            raise InsufficientFundsError(wallet_id, available)
+        self._expire_balances(debits)
+    
+    def _apply_credits(self, credits: Dict[str, Decimal], striped: Dict[str, Wallet]) -> None:
+        plain = {}
+        for wallet_id, amount in credits.items():
+            if not (wallet_id in striped and self._credit_stripe(striped[wallet_id], amount)):
+                plain[wallet_id] = amount
+        if plain:
+            self.db.execute(
+                update(Wallet)
+                .where(Wallet.wallet_id.in_(list(plain)))
+                .values(balance=Wallet.balance + case(plain, value=Wallet.wallet_id, else_=0))
+                .execution_options(synchronize_session=False)
+            )
+            self._expire_balances(plain)
+    
+    def _expire_balances(self, wallet_ids) -> None:
+        """Expira o saldo das carteiras carregadas na sessão após um UPDATE em lote."""
+        for wallet_id in wallet_ids:
+            wallet = self.db.identity_map.get(self.db.identity_key(Wallet, wallet_id))
+            if wallet is not None:
+                self.db.expire(wallet, ["balance"])
+    
+    # ========== RESERVAS (blocked) ==========
+    
+    def reserve(self, wallet_id: str, amount) -> Wallet:
+        """
+        Reserva valor na carteira (blocked += amount) após validar o saldo disponível.
+        
+        O saldo continua na carteira até a liquidação; débitos concorrentes já
+        enxergam o valor como indisponível. Não faz commit.
+        """
+        amount = Decimal(str(amount))
+        wallet = self.lock_wallets(wallet_id)[wallet_id]
+        self._consolidate_stripes(wallet)
+        self._check_available(wallet, amount)
+        wallet.blocked = (wallet.blocked or Decimal(0)) + amount
+        self.db.flush()
+        return wallet
+    
+    def release(self, wallet_id: str, amount) -> Wallet:
+        """Libera uma reserva sem movimentar o saldo. Não faz commit."""
+        amount = Decimal(str(amount))
+        wallet = self.lock_wallets(wallet_id)[wallet_id]
+        wallet.blocked = max((wallet.blocked or Decimal(0)) - amount, Decimal(0))
+        self.db.flush()
+        return wallet
+    
+    def settle_reservations(self, items: List[Tuple[str, Optional[str], Decimal]]) -> None:
+        """
+        Liquida várias reservas de uma vez: (carteira_origem, carteira_destino, valor).
+        
+        Todas as carteiras envolvidas (exceto destinos striped) são travadas em uma
+        única consulta em ordem canônica. Na origem o valor sai de blocked e de
+        balance; no destino é creditado (destino None = saída externa). Não faz commit.
+        """
+        if not items:
+            return
+        target_ids = {to_id for _, to_id, _ in items if to_id}
+        striped = {
+            w.wallet_id: w
+            for w in self.db.query(Wallet).filter(Wallet.wallet_id.in_(list(target_ids))).all()
+            if self._is_striped(w)
+        } if target_ids else {}
+        source_ids = {from_id for from_id, _, _ in items}
+        locked = self.lock_wallets(*(source_ids | (target_ids - set(striped))))
+        
+        for from_id, to_id, amount in items:
+            amount = Decimal(str(amount))
+            source = locked[from_id]
+            source.blocked = max((source.blocked or Decimal(0)) - amount, Decimal(0))
+            source.balance = source.balance - amount
+            if not to_id:
+                continue
+            if to_id in striped and to_id not in locked and self._credit_stripe(striped[to_id], amount):
+                continue
+            target = locked.get(to_id) or self.lock_wallets(to_id)[to_id]
+            locked[to_id] = target
+            target.balance = target.balance + amount
+        self.db.flush()
+    
+    def _check_available(self, wallet: Wallet, amount: Decimal) -> None:
+        """Valida saldo disponível (balance - blocked) de uma carteira travada."""
+        available = (wallet.balance or Decimal(0)) - (wallet.blocked or Decimal(0))
+        if available < amount:
+            raise InsufficientFundsError(wallet.wallet_id, available)
+    
+    # ========== STRIPED BALANCES ==========
+    
+    def _is_striped(self, wallet: Optional[Wallet]) -> bool:
+        return wallet is not None and (wallet.stripe_count or 0) > 0
+    
+    def _pick_stripe(self, wallet: Optional[Wallet]) -> Optional[int]:
+        """Sorteia um stripe existente da carteira (leitura sem lock); None se não houver."""
+        if not self._is_striped(wallet):
+            return None
+        stripe_no = random.randrange(wallet.stripe_count)
+        exists = self.db.query(WalletStripe.stripe_no).filter(
+            WalletStripe.wallet_id == wallet.wallet_id, WalletStripe.stripe_no == stripe_no
+        ).first()
+        return stripe_no if exists else None
+    
+    def _credit_stripe(self, wallet: Wallet, amount: Decimal, stripe_no: Optional[int] = None) -> bool:
+        """
+        Credita em um stripe (sorteado se `stripe_no` não for informado), com lock
+        de uma única linha de wallet_stripes.
+        
+        Returns:
+            False se a carteira não é striped (ou o stripe não existe) e o
+            crédito precisa ser feito no saldo principal
+        """
+        if not self._is_striped(wallet):
+            return False
+        if stripe_no is None:
+            stripe_no = random.randrange(wallet.stripe_count)
+        result = self.db.execute(
+            update(WalletStripe)
+            .where(WalletStripe.wallet_id == wallet.wallet_id, WalletStripe.stripe_no == stripe_no)
+            .values(balance=WalletStripe.balance + amount)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+    
+    def _consolidate_stripes(self, wallet: Wallet) -> None:
+        """
+        Soma os stripes no saldo principal de uma carteira já travada e zera os stripes.
+        
+        Chamado antes de débitos: a linha principal fica travada (serializa débitos)
+        e os stripes são travados em ordem de stripe_no.
+        """
+        if not self._is_striped(wallet):
+            return
+        with metrics.timer("wallet.consolidate_seconds"):
+            stripes = self.db.query(WalletStripe).filter(
+                WalletStripe.wallet_id == wallet.wallet_id
+            ).order_by(WalletStripe.stripe_no).with_for_update().populate_existing().all()
+            pending = sum((s.balance for s in stripes), Decimal(0))
+            if pending:
+                wallet.balance = wallet.balance + pending
+                for stripe in stripes:
+                    stripe.balance = Decimal(0)
+    
+    def get_stripe_totals(self, wallet_ids: List[str]) -> Dict[str, Decimal]:
+        """Soma dos stripes por carteira (uma consulta agregada para a lista toda)."""
+        if not wallet_ids:
+            return {}
+        rows = self.db.query(
+            WalletStripe.wallet_id,
+            func.sum(WalletStripe.balance)
+        ).filter(
+            WalletStripe.wallet_id.in_(wallet_ids)
+        ).group_by(WalletStripe.wallet_id).all()
+        return {wallet_id: total or Decimal(0) for wallet_id, total in rows}
+    
+    def get_balance(self, wallet: Wallet) -> Decimal:
+        """Saldo total da carteira (principal + stripes)."""
+        balance = wallet.balance or Decimal(0)
+        if self._is_striped(wallet):
+            balance += self.get_stripe_totals([wallet.wallet_id]).get(wallet.wallet_id, Decimal(0))
+        return balance
+    
+    def set_stripe_count(self, wallet_id: str, stripe_count: int) -> Wallet:
+        """
+        Ativa, redimensiona ou desativa (stripe_count=0) o modo striped. Não faz commit.
+        
+        Os stripes existentes são consolidados no saldo principal antes de serem
+        recriados, então o saldo total não muda.
+        """
+        wallet = self.lock_wallets(wallet_id)[wallet_id]
+        self._consolidate_stripes(wallet)
+        existing = self.db.query(WalletStripe).filter(
+            WalletStripe.wallet_id == wallet_id
+        ).with_for_update().all()
+        for stripe in existing:
+            if stripe.stripe_no >= stripe_count:
+                self.db.delete(stripe)
+        current = {stripe.stripe_no for stripe in existing}
+        self.db.add_all([
+            WalletStripe(wallet_id=wallet_id, stripe_no=n, balance=0)
+            for n in range(stripe_count) if n not in current
+        ])
+        wallet.stripe_count = stripe_count
+        self.db.flush()
+        return wallet
     
     def create_wallet(self, data: dict) -> Wallet:
         """Cria nova carteira."""
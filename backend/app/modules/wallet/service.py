@@ -2,6 +2,8 @@ from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from typing import Dict, List, Any
 
+from app.core.config import settings
+from app.database import run_in_transaction
 from .repository import WalletRepository
 
 
@@ -15,15 +17,44 @@ class WalletService:
     def get_user_wallets(self, owner_id: str, owner_type: str) -> List[dict]:
         """Lista carteiras de um usuário/investidor."""
         wallets = self.repository.get_wallet_by_owner(owner_id, owner_type)
-        return [self._to_dict(w) for w in wallets]
+        stripe_totals = self.repository.get_stripe_totals(
+            [w.wallet_id for w in wallets if w.stripe_count]
+        )
+        return [self._to_dict(w, stripe_totals.get(w.wallet_id, 0)) for w in wallets]
     
-    def _to_dict(self, entity: Any) -> dict:
+    def set_stripes(self, wallet_id: str, stripes: int) -> dict:
+        """
+        Ativa/desativa sub-saldos (stripes) para uma carteira de alta concorrência.
+        
+        Com N stripes, créditos simultâneos são distribuídos entre N linhas em vez
+        de disputarem o lock da linha principal. stripes=0 volta ao modo normal.
+        """
+        if stripes < 0 or stripes > settings.WALLET_MAX_STRIPES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Número de stripes deve estar entre 0 e {settings.WALLET_MAX_STRIPES}"
+            )
+        if not self.repository.get_wallet_by_id(wallet_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Carteira não encontrada"
+            )
+        
+        wallet = run_in_transaction(
+            self.db,
+            lambda: self.repository.set_stripe_count(wallet_id, stripes),
+            name="wallet_stripes"
+        )
+        return self._to_dict(wallet, self.repository.get_stripe_totals([wallet_id]).get(wallet_id, 0))
+    
+    def _to_dict(self, entity: Any, stripe_total=0) -> dict:
         """Converte entidade para dicionário."""
         return {
             "wallet_id": entity.wallet_id,
             "owner_id": entity.owner_id,
             "owner_type": entity.owner_type.value if hasattr(entity.owner_type, 'value') else entity.owner_type,
             "currency": entity.currency.value if hasattr(entity.currency, 'value') else entity.currency,
-            "balance": float(entity.balance) if entity.balance else 0.0,
+            "balance": float((entity.balance or 0) + stripe_total),
+            "stripe_count": entity.stripe_count or 0,
             "created_at": entity.created_at.isoformat() if entity.created_at else None
         }
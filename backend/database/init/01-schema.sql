@@ -55,6 +55,25 @@ CREATE TABLE IF NOT EXISTS investors (
     INDEX idx_investor_kyc (kyc_approved)
 ) ENGINE=InnoDB;
 
+-- ====================================
+-- TABELA: PARTIES (Índice unificado de usuários e investidores)
+-- ====================================
+-- Mantida pelos triggers trg_users_party_* / trg_investors_party_*; permite
+-- resolver qualquer participante por ID, email ou CPF/CNPJ em uma consulta
+-- e garante email/documento únicos entre as duas tabelas.
+CREATE TABLE IF NOT EXISTS parties (
+    party_id CHAR(36) PRIMARY KEY,
+    party_type ENUM('INVESTOR', 'USER') NOT NULL,
+    email VARCHAR(255) NOT NULL UNIQUE,
+    cpf_cnpj VARCHAR(14) NOT NULL UNIQUE,
+    full_name VARCHAR(255) NOT NULL
+) ENGINE=InnoDB;
+
+INSERT IGNORE INTO parties (party_id, party_type, email, cpf_cnpj, full_name)
+SELECT user_id, 'USER', email, cpf_cnpj, full_name FROM users
+UNION ALL
+SELECT investor_id, 'INVESTOR', email, cpf_cnpj, full_name FROM investors;
+
 -- ====================================
 -- TABELA: CREDIT_REQUESTS (Solicitações de Crédito)
 -- ====================================
@@ -69,13 +88,17 @@ CREATE TABLE IF NOT EXISTS credit_requests (
     collateral_docs JSON,
     collateral_type ENUM('VEHICLE', 'PROPERTY', 'INVESTMENT', 'NONE') DEFAULT 'NONE',
     collateral_description TEXT,
+    approval_type ENUM('AUTOMATIC', 'MANUAL', 'BOTH') DEFAULT 'AUTOMATIC',
+    matching_status ENUM('QUEUED', 'MATCHING', 'DONE') NULL COMMENT 'Matching em background (NULL = feito no request)',
+    matching_claimed_at DATETIME NULL,
     requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     approved_at TIMESTAMP NULL,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (investor_id) REFERENCES investors(investor_id) ON DELETE SET NULL,
     INDEX idx_credit_status (status, requested_at),
-    INDEX idx_credit_user (user_id)
+    INDEX idx_credit_user (user_id),
+    INDEX idx_credit_matching (matching_status, requested_at)
 ) ENGINE=InnoDB;
 
 -- ====================================
@@ -85,16 +108,33 @@ CREATE TABLE IF NOT EXISTS wallets (
     wallet_id CHAR(36) PRIMARY KEY DEFAULT (UUID()),
     owner_id CHAR(36) NOT NULL,
     owner_type ENUM('INVESTOR', 'USER') NOT NULL,
-    currency ENUM('BRL', 'USDT', 'USDC', 'EUR') DEFAULT 'BRL',
+    currency ENUM('BRL', 'USDT', 'USDC', 'EUR') NOT NULL DEFAULT 'BRL',
     balance DECIMAL(15, 2) DEFAULT 0.00,
     blocked DECIMAL(15, 2) DEFAULT 0.00,
     wallet_address VARCHAR(255),
+    stripe_count INT NOT NULL DEFAULT 0 COMMENT 'Sub-saldos para carteiras de alta concorrência (0 = desativado)',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    INDEX idx_wallet_owner (owner_id, owner_type),
+    -- Uma carteira por (dono, moeda); o prefixo (owner_id, owner_type) atende a listagem por dono
+    UNIQUE KEY uq_wallet_owner_currency (owner_id, owner_type, currency),
     INDEX idx_wallet_currency (currency)
 ) ENGINE=InnoDB;
 
+-- ====================================
+-- TABELA: WALLET_STRIPES (Sub-saldos de carteiras "quentes")
+-- ====================================
+-- Créditos concorrentes vão para um stripe aleatório (lock de uma única linha);
+-- débitos travam a carteira e consolidam os stripes no saldo principal.
+-- Saldo total = wallets.balance + SUM(wallet_stripes.balance)
+CREATE TABLE IF NOT EXISTS wallet_stripes (
+    wallet_id CHAR(36) NOT NULL,
+    stripe_no INT NOT NULL,
+    balance DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (wallet_id, stripe_no),
+    FOREIGN KEY (wallet_id) REFERENCES wallets(wallet_id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
 -- ====================================
 -- TABELA: POOLS (Pools de Investimento)
 -- ====================================
@@ -104,6 +144,7 @@ CREATE TABLE IF NOT EXISTS pools (
     name VARCHAR(255) NOT NULL,
     target_amount DECIMAL(15, 2) NOT NULL,
     raised_amount DECIMAL(15, 2) DEFAULT 0.00,
+    allocated_amount DECIMAL(15, 2) NOT NULL DEFAULT 0.00 COMMENT 'Capital alocado em empréstimos (nunca excede raised_amount)',
     risk_profile ENUM('LOW', 'MEDIUM', 'HIGH') DEFAULT 'MEDIUM',
     expected_return DECIMAL(5, 2),
     duration_months INT NOT NULL,
@@ -145,6 +186,7 @@ CREATE TABLE IF NOT EXISTS pool_loans (
     pool_id CHAR(36) NOT NULL,
     credit_request_id CHAR(36) NOT NULL,
     allocated_amount DECIMAL(15, 2) NOT NULL,
+    share_percentage DECIMAL(7, 4) DEFAULT 100.0000 COMMENT 'Participação da pool no empréstimo (%)',
     status ENUM('ACTIVE', 'PAID', 'DEFAULTED') DEFAULT 'ACTIVE',
     allocated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (pool_id) REFERENCES pools(pool_id) ON DELETE CASCADE,
@@ -165,7 +207,12 @@ CREATE TABLE IF NOT EXISTS loans (
     principal DECIMAL(15, 2) NOT NULL,
     interest_rate DECIMAL(5, 2) NOT NULL,
     duration_months INT NOT NULL,
+    amortization_system ENUM('PRICE', 'SAC') NOT NULL DEFAULT 'PRICE',
     status ENUM('ACTIVE', 'PAID', 'DEFAULTED') DEFAULT 'ACTIVE',
+    days_past_due INT NOT NULL DEFAULT 0 COMMENT 'Atraso da parcela vencida mais antiga',
+    delinquency_bucket ENUM('CURRENT', 'DPD_1_30', 'DPD_31_60', 'DPD_61_90', 'DPD_90_PLUS') DEFAULT 'CURRENT',
+    next_installment INT NOT NULL DEFAULT 1 COMMENT 'Próxima parcela a materializar em loan_payments',
+    next_due_date DATE NULL COMMENT 'Vencimento de next_installment (NULL = todas materializadas)',
     disbursed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (credit_request_id) REFERENCES credit_requests(request_id) ON DELETE CASCADE,
@@ -174,12 +221,16 @@ CREATE TABLE IF NOT EXISTS loans (
     FOREIGN KEY (pool_id) REFERENCES pools(pool_id) ON DELETE SET NULL,
     INDEX idx_loans_status_user (user_id, status),
     INDEX idx_loans_investor (investor_id),
-    INDEX idx_loans_pool (pool_id)
+    INDEX idx_loans_pool (pool_id),
+    INDEX idx_loans_status_dpd (status, days_past_due),
+    INDEX idx_loans_next_due (status, next_due_date)
 ) ENGINE=InnoDB;
 
 -- ====================================
 -- TABELA: LOAN_PAYMENTS (Parcelas de Empréstimo)
 -- ====================================
+-- Só as parcelas vencidas (ou pagas) têm linha; as futuras são calculadas a
+-- partir de (principal, taxa, prazo, disbursed_at)
 CREATE TABLE IF NOT EXISTS loan_payments (
     payment_id CHAR(36) PRIMARY KEY DEFAULT (UUID()),
     loan_id CHAR(36) NOT NULL,
@@ -190,9 +241,11 @@ CREATE TABLE IF NOT EXISTS loan_payments (
     paid_at TIMESTAMP NULL,
     status ENUM('PENDING', 'PAID', 'OVERDUE') DEFAULT 'PENDING',
     FOREIGN KEY (loan_id) REFERENCES loans(loan_id) ON DELETE CASCADE,
+    UNIQUE KEY uq_payment_installment (loan_id, installment_number),
     INDEX idx_payment_loan (loan_id),
     INDEX idx_payment_status (status),
-    INDEX idx_payment_due_date (due_date)
+    INDEX idx_payment_due_date (due_date),
+    INDEX idx_payment_status_due (status, due_date)
 ) ENGINE=InnoDB;
 
 -- ====================================
@@ -207,7 +260,7 @@ CREATE TABLE IF NOT EXISTS transactions (
     wallet_id CHAR(36),
     amount DECIMAL(15, 2) NOT NULL,
     currency ENUM('BRL', 'USDT', 'USDC', 'EUR') DEFAULT 'BRL',
-    type ENUM('PIX_SEND', 'PIX_RECEIVE', 'LOAN_PAYMENT', 'INVESTMENT', 'SWAP', 'POOL_CONTRIBUTION') NOT NULL,
+    type ENUM('PIX_SEND', 'PIX_RECEIVE', 'LOAN_PAYMENT', 'INVESTMENT', 'SWAP', 'POOL_CONTRIBUTION', 'POOL_DISTRIBUTION') NOT NULL,
     status ENUM('PENDING', 'COMPLETED', 'FAILED') DEFAULT 'PENDING',
     description TEXT,
     blockchain_tx_hash VARCHAR(255),
@@ -217,13 +270,202 @@ CREATE TABLE IF NOT EXISTS transactions (
     INDEX idx_transactions_wallet_date (wallet_id, created_at DESC),
     INDEX idx_transactions_sender (sender_id, sender_type),
     INDEX idx_transactions_receiver (receiver_id, receiver_type),
-    INDEX idx_transactions_status (status)
+    INDEX idx_transactions_status (status),
+    INDEX idx_transactions_created (created_at, transaction_id)
+) ENGINE=InnoDB;
+
+-- ====================================
+-- TABELA: PIX_KEYS (Diretório de Chaves PIX)
+-- ====================================
+-- key_value é a chave normalizada (email minúsculo, CPF/CNPJ/telefone só dígitos, EVP UUID)
+CREATE TABLE IF NOT EXISTS pix_keys (
+    key_value VARCHAR(255) PRIMARY KEY,
+    key_type ENUM('EMAIL', 'CPF', 'CNPJ', 'PHONE', 'EVP') NOT NULL,
+    owner_id CHAR(36) NOT NULL,
+    owner_type ENUM('INVESTOR', 'USER') NOT NULL,
+    wallet_id CHAR(36) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (wallet_id) REFERENCES wallets(wallet_id) ON DELETE CASCADE,
+    INDEX idx_pix_keys_owner (owner_id, owner_type)
+) ENGINE=InnoDB;
+
+-- ====================================
+-- TABELA: PIX_SETTLEMENT_JOBS (Fila de Liquidação PIX)
+-- ====================================
+-- PIX aceitos em modo assíncrono: o valor fica reservado em wallets.blocked e a
+-- transação em PENDING até um worker liquidar o job (SELECT ... SKIP LOCKED)
+CREATE TABLE IF NOT EXISTS pix_settlement_jobs (
+    job_id CHAR(36) PRIMARY KEY,
+    transaction_id CHAR(36) NOT NULL UNIQUE,
+    sender_wallet_id CHAR(36) NOT NULL,
+    receiver_wallet_id CHAR(36),
+    amount DECIMAL(15, 2) NOT NULL,
+    status ENUM('QUEUED', 'DONE', 'FAILED') NOT NULL DEFAULT 'QUEUED',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    available_at DATETIME(6) NOT NULL,
+    velocity_at DOUBLE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_pix_jobs_queue (status, available_at)
+) ENGINE=InnoDB;
+
+-- ====================================
+-- TABELA: IDEMPOTENCY_KEYS (Respostas de POSTs com Idempotency-Key)
+-- ====================================
+-- key_hash = SHA-256(escopo + chave do cliente); request_fingerprint = SHA-256 do body
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key_hash CHAR(64) PRIMARY KEY,
+    scope VARCHAR(64) NOT NULL,
+    request_fingerprint CHAR(64) NOT NULL,
+    status ENUM('IN_PROGRESS', 'COMMITTED', 'COMPLETED', 'FAILED') NOT NULL DEFAULT 'IN_PROGRESS',
+    claim_token CHAR(36),
+    claimed_at DATETIME(6),
+    response_status INT,
+    response_body JSON,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL,
+    INDEX idx_idempotency_expires (expires_at)
+) ENGINE=InnoDB;
+
+-- ====================================
+-- TABELA: FX_RATE_HISTORY (Histórico de Cotações)
+-- ====================================
+-- Série append-only: BRL por unidade da moeda em cada instante observado
+CREATE TABLE IF NOT EXISTS fx_rate_history (
+    currency ENUM('BRL', 'USDT', 'USDC', 'EUR') NOT NULL,
+    observed_at DATETIME(6) NOT NULL,
+    rate DECIMAL(18, 8) NOT NULL,
+    PRIMARY KEY (currency, observed_at)
+) ENGINE=InnoDB;
+
+-- ====================================
+-- TABELA: LOAN_REPAYMENTS (Cobranças de parcelas por credor)
+-- ====================================
+-- Uma linha por credor de cada cobrança: empréstimos via pool geram uma linha
+-- por pool financiadora, pendente de distribuição até distribution_run_id
+CREATE TABLE IF NOT EXISTS loan_repayments (
+    repayment_id CHAR(36) PRIMARY KEY DEFAULT (UUID()),
+    payment_id CHAR(36) NOT NULL,
+    loan_id CHAR(36) NOT NULL,
+    pool_id CHAR(36) NULL,
+    investor_id CHAR(36) NULL,
+    amount DECIMAL(15, 2) NOT NULL,
+    transaction_id CHAR(36) NOT NULL,
+    collected_at DATETIME NOT NULL,
+    distribution_run_id CHAR(36) NULL,
+    FOREIGN KEY (payment_id) REFERENCES loan_payments(payment_id) ON DELETE CASCADE,
+    FOREIGN KEY (loan_id) REFERENCES loans(loan_id) ON DELETE CASCADE,
+    INDEX idx_repayments_payment (payment_id),
+    INDEX idx_repayments_loan (loan_id),
+    INDEX idx_repayments_pending (pool_id, distribution_run_id, collected_at)
+) ENGINE=InnoDB;
+
+-- ====================================
+-- TABELA: POOL_DISTRIBUTION_RUNS / LINES (Repasses das pools aos investidores)
+-- ====================================
+-- Cada execução marca os loan_repayments que distribuiu (distribution_run_id)
+-- e grava uma linha por investidor creditado em cada pool
+CREATE TABLE IF NOT EXISTS pool_distribution_runs (
+    run_id CHAR(36) PRIMARY KEY DEFAULT (UUID()),
+    business_date DATE NOT NULL,
+    pools_count INT NOT NULL DEFAULT 0,
+    repayments_count INT NOT NULL DEFAULT 0,
+    lines_count INT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_distribution_runs_date (business_date)
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS pool_distribution_lines (
+    line_id CHAR(36) PRIMARY KEY DEFAULT (UUID()),
+    run_id CHAR(36) NOT NULL,
+    pool_id CHAR(36) NOT NULL,
+    investor_id CHAR(36) NOT NULL,
+    is_owner BOOLEAN NOT NULL DEFAULT FALSE,
+    share_percentage DECIMAL(7, 4) NOT NULL,
+    amount DECIMAL(15, 2) NOT NULL,
+    transaction_id CHAR(36) NULL,
+    FOREIGN KEY (run_id) REFERENCES pool_distribution_runs(run_id) ON DELETE CASCADE,
+    FOREIGN KEY (pool_id) REFERENCES pools(pool_id) ON DELETE CASCADE,
+    INDEX idx_distribution_lines_run (run_id),
+    INDEX idx_distribution_lines_pool (pool_id),
+    INDEX idx_distribution_lines_investor (investor_id)
+) ENGINE=InnoDB;
+
+-- ====================================
+-- TABELA: LOAN_SERVICING_RUNS (Servicing diário de empréstimos)
+-- ====================================
+-- Uma execução por data de referência; phase/cursor são o checkpoint gravado
+-- a cada lote, para retomar uma execução interrompida de onde parou
+CREATE TABLE IF NOT EXISTS loan_servicing_runs (
+    run_id CHAR(36) PRIMARY KEY DEFAULT (UUID()),
+    business_date DATE NOT NULL UNIQUE,
+    status ENUM('RUNNING', 'COMPLETED', 'FAILED') NOT NULL DEFAULT 'RUNNING',
+    phase VARCHAR(32) NOT NULL,
+    cursor CHAR(36) NULL,
+    stats JSON,
+    last_error TEXT,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    heartbeat_at DATETIME NULL,
+    finished_at DATETIME NULL
 ) ENGINE=InnoDB;
 
 -- ====================================
 -- TRIGGERS PARA AUDITORIA
 -- ====================================
 
+-- Triggers que mantêm o índice parties sincronizado com users/investors
+DELIMITER //
+CREATE TRIGGER trg_users_party_insert
+AFTER INSERT ON users
+FOR EACH ROW
+BEGIN
+    INSERT INTO parties (party_id, party_type, email, cpf_cnpj, full_name)
+    VALUES (NEW.user_id, 'USER', NEW.email, NEW.cpf_cnpj, NEW.full_name);
+END//
+
+CREATE TRIGGER trg_users_party_update
+AFTER UPDATE ON users
+FOR EACH ROW
+BEGIN
+    UPDATE parties
+    SET email = NEW.email, cpf_cnpj = NEW.cpf_cnpj, full_name = NEW.full_name
+    WHERE party_id = OLD.user_id;
+END//
+
+CREATE TRIGGER trg_users_party_delete
+AFTER DELETE ON users
+FOR EACH ROW
+BEGIN
+    DELETE FROM parties WHERE party_id = OLD.user_id;
+END//
+
+CREATE TRIGGER trg_investors_party_insert
+AFTER INSERT ON investors
+FOR EACH ROW
+BEGIN
+    INSERT INTO parties (party_id, party_type, email, cpf_cnpj, full_name)
+    VALUES (NEW.investor_id, 'INVESTOR', NEW.email, NEW.cpf_cnpj, NEW.full_name);
+END//
+
+CREATE TRIGGER trg_investors_party_update
+AFTER UPDATE ON investors
+FOR EACH ROW
+BEGIN
+    UPDATE parties
+    SET email = NEW.email, cpf_cnpj = NEW.cpf_cnpj, full_name = NEW.full_name
+    WHERE party_id = OLD.investor_id;
+END//
+
+CREATE TRIGGER trg_investors_party_delete
+AFTER DELETE ON investors
+FOR EACH ROW
+BEGIN
+    DELETE FROM parties WHERE party_id = OLD.investor_id;
+END//
+DELIMITER ;
+
 -- Trigger para atualizar raised_amount em pools
 DELIMITER //
 CREATE TRIGGER trg_pool_investment_insert
@@ -639,6 +639,22 @@ SELECT * FROM (
 ) AS tmp
 WHERE @user_count = 0;
 
+-- Próxima parcela a materializar de cada empréstimo ativo (as futuras são
+-- calculadas a partir do cronograma, sem linha em loan_payments)
+UPDATE loans l
+LEFT JOIN (
+    SELECT loan_id, MAX(installment_number) AS last_number
+    FROM loan_payments
+    GROUP BY loan_id
+) p ON p.loan_id = l.loan_id
+SET l.next_installment = COALESCE(p.last_number, 0) + 1,
+    l.next_due_date = IF(
+        COALESCE(p.last_number, 0) < l.duration_months,
+        DATE_ADD(DATE(l.disbursed_at), INTERVAL 30 * (COALESCE(p.last_number, 0) + 1) DAY),
+        NULL
+    )
+WHERE l.status = 'ACTIVE' AND l.next_due_date IS NULL;
+
 -- TRANSACTIONS
 INSERT INTO transactions (transaction_id, sender_id, sender_type, receiver_id, receiver_type, wallet_id, amount, currency, type, status, description, blockchain_tx_hash)
 SELECT * FROM (
@@ -676,6 +692,27 @@ SELECT * FROM (
 ) AS tmp
 WHERE @user_count = 0;
 
+-- PIX_KEYS (email e CPF/CNPJ de cada dono apontando para a carteira BRL)
+INSERT IGNORE INTO pix_keys (key_value, key_type, owner_id, owner_type, wallet_id)
+SELECT LOWER(u.email), 'EMAIL', u.user_id, 'USER', w.wallet_id
+FROM users u
+JOIN wallets w ON w.owner_id = u.user_id AND w.owner_type = 'USER' AND w.currency = 'BRL';
+
+INSERT IGNORE INTO pix_keys (key_value, key_type, owner_id, owner_type, wallet_id)
+SELECT u.cpf_cnpj, UPPER(u.document_type), u.user_id, 'USER', w.wallet_id
+FROM users u
+JOIN wallets w ON w.owner_id = u.user_id AND w.owner_type = 'USER' AND w.currency = 'BRL';
+
+INSERT IGNORE INTO pix_keys (key_value, key_type, owner_id, owner_type, wallet_id)
+SELECT LOWER(i.email), 'EMAIL', i.investor_id, 'INVESTOR', w.wallet_id
+FROM investors i
+JOIN wallets w ON w.owner_id = i.investor_id AND w.owner_type = 'INVESTOR' AND w.currency = 'BRL';
+
+INSERT IGNORE INTO pix_keys (key_value, key_type, owner_id, owner_type, wallet_id)
+SELECT i.cpf_cnpj, UPPER(i.document_type), i.investor_id, 'INVESTOR', w.wallet_id
+FROM investors i
+JOIN wallets w ON w.owner_id = i.investor_id AND w.owner_type = 'INVESTOR' AND w.currency = 'BRL';
+
 -- ====================================
 -- FIM DO SEED DATA
 -- ====================================
@@ -0,0 +1,227 @@
+"""
+Teste de carga do matching concorrente contra o banco configurado (DATABASE_URL).
+Execute a partir de backend/:
+
+    python -m scripts.allocation_loadtest --requests 400 --pools 4 --threads 32
+
+Cria um investidor, pools com pouca capacidade e tomadores com solicitações
+'automatic' (IDs com prefixo próprio), roda CreditService.run_matching em
+paralelo, uma sessão por thread, e confere o resultado:
+
+- nenhuma pool com allocated_amount > raised_amount
+- allocated_amount de cada pool == soma dos seus pool_loans
+- cada solicitação aprovada tem exatamente um empréstimo, com principal igual
+  à soma das suas alocações, e o tomador recebeu esse valor na carteira
+- solicitações não aprovadas não têm alocação nem empréstimo
+
+Os dados criados são removidos ao final (use --keep para inspecionar).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, List, Optional
+import argparse
+import random
+import time
+import uuid
+
+from sqlalchemy import func
+
+from app.core.metrics import metrics
+from app.database import SessionLocal
+from app.models.models import (
+    ApprovalType, CollateralType, CreditRequest, CreditRequestStatus, Currency, DocumentType,
+    Investor, Loan, OwnerType, Pool, PoolLoan, PoolStatus, RiskProfile, Transaction, User, Wallet
+)
+from app.modules.credit.service import CreditService
+
+PREFIX = "lt"
+
+
+def _id() -> str:
+    return f"{PREFIX}{uuid.uuid4().hex[:34]}"
+
+
+def setup(n_requests: int, n_pools: int, pool_capacity: float, seed: Optional[int] = 42) -> dict:
+    """Grava investidor, pools ACTIVE, tomadores e solicitações PENDING."""
+    rng = random.Random(seed)
+    db = SessionLocal()
+    try:
+        investor_id = _id()
+        db.add(Investor(
+            investor_id=investor_id,
+            email=f"{investor_id}@loadtest.local",
+            password_hash="x",
+            full_name="Load Test Investor",
+            cpf_cnpj=investor_id[-14:],
+            document_type=DocumentType.CNPJ
+        ))
+        pool_ids = [_id() for _ in range(n_pools)]
+        for number, pool_id in enumerate(pool_ids):
+            db.add(Pool(
+                pool_id=pool_id,
+                investor_id=investor_id,
+                name=f"Load Test Pool {number + 1}",
+                target_amount=pool_capacity,
+                raised_amount=pool_capacity,
+                allocated_amount=0,
+                duration_months=24,
+                expected_return=rng.uniform(8, 20),
+                status=PoolStatus.ACTIVE,
+                risk_profile=RiskProfile.MEDIUM,
+                min_score=0,
+                requires_collateral=False,
+                max_term_months=48
+            ))
+        user_ids, request_ids = [], []
+        for _ in range(n_requests):
+            user_id, request_id = _id(), _id()
+            db.add(User(
+                user_id=user_id,
+                email=f"{user_id}@loadtest.local",
+                password_hash="x",
+                full_name="Load Test Borrower",
+                cpf_cnpj=user_id[-14:],
+                document_type=DocumentType.CPF,
+                credit_score=700,
+                calculated_score=700
+            ))
+            db.add(CreditRequest(
+                request_id=request_id,
+                user_id=user_id,
+                amount_requested=rng.choice([500, 1000, 2000, 3000, 5000]),
+                duration_months=12,
+                interest_rate=2,
+                status=CreditRequestStatus.PENDING,
+                collateral_type=CollateralType.NONE,
+                approval_type=ApprovalType.AUTOMATIC
+            ))
+            user_ids.append(user_id)
+            request_ids.append(request_id)
+        db.commit()
+        return {"investor_id": investor_id, "pool_ids": pool_ids, "user_ids": user_ids, "request_ids": request_ids}
+    finally:
+        db.close()
+
+
+def _match_one(request_id: str) -> bool:
+    db = SessionLocal()
+    try:
+        credit_request = db.query(CreditRequest).filter(CreditRequest.request_id == request_id).one()
+        user = db.query(User).filter(User.user_id == credit_request.user_id).one()
+        return CreditService(db).run_matching(credit_request, user)
+    finally:
+        db.close()
+
+
+def verify(fixture: dict) -> List[str]:
+    """Invariantes de alocação após a carga; retorna as violações encontradas."""
+    errors: List[str] = []
+    db = SessionLocal()
+    try:
+        pool_loans = dict(db.query(PoolLoan.pool_id, func.sum(PoolLoan.allocated_amount)).filter(
+            PoolLoan.pool_id.in_(fixture["pool_ids"])
+        ).group_by(PoolLoan.pool_id).all())
+        for pool in db.query(Pool).filter(Pool.pool_id.in_(fixture["pool_ids"])).all():
+            if pool.allocated_amount > pool.raised_amount:
+                errors.append(f"pool {pool.pool_id}: alocado {pool.allocated_amount} > capital {pool.raised_amount}")
+            if pool.allocated_amount != (pool_loans.get(pool.pool_id) or Decimal(0)):
+                errors.append(
+                    f"pool {pool.pool_id}: allocated_amount {pool.allocated_amount} != "
+                    f"pool_loans {pool_loans.get(pool.pool_id) or 0}"
+                )
+        
+        requests = db.query(CreditRequest).filter(CreditRequest.request_id.in_(fixture["request_ids"])).all()
+        loans: Dict[str, List[Loan]] = {}
+        for loan in db.query(Loan).filter(Loan.credit_request_id.in_(fixture["request_ids"])).all():
+            loans.setdefault(loan.credit_request_id, []).append(loan)
+        allocations = dict(db.query(PoolLoan.credit_request_id, func.sum(PoolLoan.allocated_amount)).filter(
+            PoolLoan.credit_request_id.in_(fixture["request_ids"])
+        ).group_by(PoolLoan.credit_request_id).all())
+        balances = dict(db.query(Wallet.owner_id, Wallet.balance).filter(
+            Wallet.owner_id.in_(fixture["user_ids"]),
+            Wallet.owner_type == OwnerType.USER,
+            Wallet.currency == Currency.BRL
+        ).all())
+        for credit_request in requests:
+            request_loans = loans.get(credit_request.request_id, [])
+            allocated = allocations.get(credit_request.request_id) or Decimal(0)
+            if credit_request.status == CreditRequestStatus.APPROVED:
+                if len(request_loans) != 1:
+                    errors.append(f"solicitação {credit_request.request_id}: {len(request_loans)} empréstimos")
+                    continue
+                principal = request_loans[0].principal
+                if allocated != principal:
+                    errors.append(f"solicitação {credit_request.request_id}: alocado {allocated} != principal {principal}")
+                if (balances.get(credit_request.user_id) or Decimal(0)) != principal:
+                    errors.append(f"tomador {credit_request.user_id}: saldo diferente do principal {principal}")
+            elif request_loans or allocated:
+                errors.append(f"solicitação {credit_request.request_id} ({credit_request.status.value}) com alocação")
+        return errors
+    finally:
+        db.close()
+
+
+def cleanup(fixture: dict) -> None:
+    db = SessionLocal()
+    try:
+        owners = fixture["user_ids"] + [fixture["investor_id"]]
+        db.query(Transaction).filter(Transaction.receiver_id.in_(fixture["user_ids"])).delete(synchronize_session=False)
+        db.query(Loan).filter(Loan.credit_request_id.in_(fixture["request_ids"])).delete(synchronize_session=False)
+        db.query(PoolLoan).filter(PoolLoan.pool_id.in_(fixture["pool_ids"])).delete(synchronize_session=False)
+        db.query(CreditRequest).filter(CreditRequest.request_id.in_(fixture["request_ids"])).delete(synchronize_session=False)
+        db.query(Wallet).filter(Wallet.owner_id.in_(owners)).delete(synchronize_session=False)
+        db.query(Pool).filter(Pool.pool_id.in_(fixture["pool_ids"])).delete(synchronize_session=False)
+        db.query(User).filter(User.user_id.in_(fixture["user_ids"])).delete(synchronize_session=False)
+        db.query(Investor).filter(Investor.investor_id == fixture["investor_id"]).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def run(n_requests: int, n_pools: int, pool_capacity: float, threads: int, keep: bool = False) -> dict:
+    fixture = setup(n_requests, n_pools, pool_capacity)
+    conflicts_before = metrics.snapshot()["counters"].get("credit.matching.capacity_conflicts", 0)
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(_match_one, fixture["request_ids"]))
+        seconds = time.perf_counter() - started
+        errors = verify(fixture)
+        
+        db = SessionLocal()
+        try:
+            allocated = db.query(func.sum(Pool.allocated_amount)).filter(
+                Pool.pool_id.in_(fixture["pool_ids"])
+            ).scalar() or Decimal(0)
+        finally:
+            db.close()
+        return {
+            "requests": n_requests,
+            "pools": n_pools,
+            "threads": threads,
+            "seconds": round(seconds, 3),
+            "matched": sum(results),
+            "capacity": round(pool_capacity * n_pools, 2),
+            "allocated": float(allocated),
+            "capacity_conflicts": metrics.snapshot()["counters"].get("credit.matching.capacity_conflicts", 0)
+            - conflicts_before,
+            "violations": errors[:20],
+            "ok": not errors
+        }
+    finally:
+        if not keep:
+            cleanup(fixture)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga do matching concorrente")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--pools", type=int, default=4)
+    parser.add_argument("--pool-capacity", type=float, default=50000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+    report = run(args.requests, args.pools, args.pool_capacity, args.threads, args.keep)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    raise SystemExit(0 if report["ok"] else 1)
@@ -0,0 +1,31 @@
+"""
+Matching concorrente contra o banco de DATABASE_URL (mesmos checks de
+scripts/allocation_loadtest.py). Ignorado se o banco não estiver acessível.
+"""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.database import engine
+from scripts.allocation_loadtest import run
+
+pytestmark = pytest.mark.integration
+
+
+@pytest.fixture(scope="module", autouse=True)
+def database():
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except OperationalError as e:
+        pytest.skip(f"Banco indisponível: {e.orig}")
+
+
+def test_concurrent_matching_never_over_allocates():
+    # Capacidade bem menor que a demanda para forçar disputa entre as threads
+    report = run(n_requests=120, n_pools=3, pool_capacity=20000, threads=16)
+    
+    assert report["violations"] == []
+    assert report["ok"]
+    assert 0 < report["matched"] < report["requests"]
+    assert report["allocated"] <= report["capacity"]
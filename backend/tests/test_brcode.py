@@ -0,0 +1,68 @@
+"""BR Code: CRC16 contra o exemplo do manual do Banco Central e validação do parser."""
+from decimal import Decimal
+
+import pytest
+
+from app.modules.pix.brcode import BRCodeError, build_payload, crc16_ccitt, parse_payload
+
+# Exemplo de BR Code estático do Manual de Padrões para Iniciação do PIX (BCB)
+BCB_REFERENCE = (
+    "00020126580014br.gov.bcb.pix0136123e4567-e12b-12d1-a456-426655440000"
+    "5204000053039865802BR5913Fulano de Tal6008BRASILIA62070503***63041D3D"
+)
+
+
+def _with_crc(body: str) -> str:
+    return body + crc16_ccitt(body)
+
+
+def _with_amount(amount: str) -> str:
+    base = build_payload("fulano@example.com", "Fulano de Tal", "BRASILIA")[:-4]
+    field = f"54{len(amount):02d}{amount}"
+    return _with_crc(base.replace("5303986", "5303986" + field))
+
+
+def test_crc_matches_bcb_reference():
+    assert crc16_ccitt(BCB_REFERENCE[:-4]) == "1D3D"
+
+
+def test_crc_known_vector():
+    # CRC-16/CCITT-FALSE de "123456789"
+    assert crc16_ccitt("123456789") == "29B1"
+
+
+def test_parse_bcb_reference():
+    code = parse_payload(BCB_REFERENCE)
+    
+    assert code.key == "123e4567-e12b-12d1-a456-426655440000"
+    assert code.merchant_name == "Fulano de Tal"
+    assert code.merchant_city == "BRASILIA"
+    assert code.amount is None
+    assert code.txid is None
+    assert not code.dynamic
+
+
+def test_build_and_parse_round_trip():
+    payload = build_payload("fulano@example.com", "Fulano de Tal", "Brasília", amount=Decimal("10.5"), txid="PEDIDO42")
+    code = parse_payload(payload)
+    
+    assert payload.endswith(crc16_ccitt(payload[:-4]))
+    assert code.amount == Decimal("10.50")
+    assert code.txid == "PEDIDO42"
+    assert code.merchant_city == "Brasilia"
+
+
+def test_parse_rejects_tampered_payload():
+    with pytest.raises(BRCodeError, match="CRC"):
+        parse_payload(BCB_REFERENCE.replace("Fulano", "Ciclano"))
+
+
+@pytest.mark.parametrize("amount", ["0.01", "5", "1234567890.99"])
+def test_parse_accepts_valid_amounts(amount):
+    assert parse_payload(_with_amount(amount)).amount == Decimal(amount)
+
+
+@pytest.mark.parametrize("amount", ["NaN", "Infinity", "1e3", "-1.00", "1.234", "12345678901", "1,50", " 1.00"])
+def test_parse_rejects_invalid_amounts(amount):
+    with pytest.raises(BRCodeError, match="Valor inválido"):
+        parse_payload(_with_amount(amount))
@@ -0,0 +1,68 @@
+"""Invariantes do clearing em lote (cálculo puro, sem banco)."""
+import numpy as np
+import pytest
+
+from app.modules.credit.clearing import ClearingInput, clear, eligibility_mask
+from scripts.clearing_benchmark import synthetic_batch
+
+
+def _check_invariants(batch: ClearingInput, assignment: np.ndarray) -> None:
+    eligible = eligibility_mask(batch)
+    assigned = np.flatnonzero(assignment >= 0)
+    
+    # Cada solicitação alocada cumpre os critérios da pool escolhida
+    assert eligible[assigned, assignment[assigned]].all()
+    
+    # Nenhuma pool recebe mais que a sua capacidade
+    allocated = np.bincount(assignment[assigned], weights=batch.amounts[assigned], minlength=len(batch.pool_capacity))
+    assert (allocated <= batch.pool_capacity + 1e-6).all()
+    
+    # Solicitação sem alocação não cabe em nenhuma pool elegível com o que sobrou
+    remaining = batch.pool_capacity - allocated
+    for i in np.flatnonzero(assignment < 0):
+        assert not (eligible[i] & (remaining >= batch.amounts[i])).any()
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("n_requests, n_pools, max_capacity", [
+    (300, 20, 500000),
+    (500, 10, 20000),
+    (50, 200, 100000),
+])
+def test_clear_respects_eligibility_and_capacity(seed, n_requests, n_pools, max_capacity):
+    batch = synthetic_batch(n_requests, n_pools, max_capacity, seed)
+    _check_invariants(batch, clear(batch))
+
+
+def test_clear_is_deterministic():
+    batch = synthetic_batch(400, 30, 50000, seed=7)
+    np.testing.assert_array_equal(clear(batch), clear(batch))
+
+
+def test_clear_empty_inputs():
+    batch = synthetic_batch(5, 3, seed=1)
+    no_pools = ClearingInput(
+        amounts=batch.amounts, scores=batch.scores, has_collateral=batch.has_collateral, terms=batch.terms,
+        pool_capacity=np.array([]), pool_min_score=np.array([], dtype=np.int64),
+        pool_requires_collateral=np.array([], dtype=bool), pool_max_term=np.array([], dtype=np.int64),
+        pool_expected_return=np.array([])
+    )
+    np.testing.assert_array_equal(clear(no_pools), np.full(5, -1))
+    
+    empty = synthetic_batch(0, 3, seed=1)
+    assert clear(empty).shape == (0,)
+
+
+def test_clear_prefers_higher_scores_when_capacity_is_short():
+    batch = ClearingInput(
+        amounts=np.array([1000.0, 1000.0]),
+        scores=np.array([500, 900]),
+        has_collateral=np.array([False, False]),
+        terms=np.array([12, 12]),
+        pool_capacity=np.array([1000.0]),
+        pool_min_score=np.array([400]),
+        pool_requires_collateral=np.array([False]),
+        pool_max_term=np.array([24]),
+        pool_expected_return=np.array([10.0])
+    )
+    np.testing.assert_array_equal(clear(batch), [-1, 0])
@@ -0,0 +1,110 @@
+"""Cobrança com dry_run: nada é gravado e o saldo planejado é descontado entre lotes."""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.models import (
+    Currency, Loan, LoanPayment, LoanStatus, OwnerType, PaymentStatus, Wallet, WalletStripe
+)
+from app.modules.credit.schedule import due_date, installment_amount
+from app.modules.loan.collection import LoanCollectionEngine
+
+DISBURSED = datetime(2026, 1, 1, 10, 0, 0)
+BUSINESS_DATE = due_date(DISBURSED, 3)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    for model in (Loan, LoanPayment, Wallet, WalletStripe):
+        model.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _loan(db, loan_id: str, user_id: str, next_installment: int = 1) -> Loan:
+    loan = Loan(
+        loan_id=loan_id,
+        credit_request_id=f"cr-{loan_id}",
+        user_id=user_id,
+        investor_id="investor",
+        principal=Decimal("1200.00"),
+        interest_rate=Decimal("12.00"),
+        duration_months=12,
+        status=LoanStatus.ACTIVE,
+        next_installment=next_installment,
+        next_due_date=due_date(DISBURSED, next_installment),
+        disbursed_at=DISBURSED
+    )
+    db.add(loan)
+    return loan
+
+
+def _payment(db, loan: Loan, number: int) -> None:
+    db.add(LoanPayment(
+        payment_id=f"{loan.loan_id}-{number}",
+        loan_id=loan.loan_id,
+        installment_number=number,
+        amount_due=installment_amount(loan.principal, loan.interest_rate, loan.duration_months, number),
+        amount_paid=0,
+        due_date=due_date(DISBURSED, number),
+        status=PaymentStatus.OVERDUE
+    ))
+
+
+def _wallet(db, user_id: str, balance: str) -> None:
+    db.add(Wallet(
+        wallet_id=f"w-{user_id}",
+        owner_id=user_id,
+        owner_type=OwnerType.USER,
+        currency=Currency.BRL,
+        balance=Decimal(balance),
+        blocked=0
+    ))
+
+
+def _snapshot(db) -> tuple:
+    db.expire_all()
+    return (
+        [(loan.loan_id, loan.next_installment) for loan in db.query(Loan).order_by(Loan.loan_id)],
+        db.query(LoanPayment).count(),
+        [wallet.balance for wallet in db.query(Wallet).order_by(Wallet.wallet_id)]
+    )
+
+
+def test_dry_run_writes_nothing_and_counts_unmaterialized_installments(db):
+    # Parcela 1 materializada; 2 e 3 venceram mas ainda não têm linha
+    loan = _loan(db, "loan-a", "user-a", next_installment=2)
+    _payment(db, loan, 1)
+    _wallet(db, "user-a", "1000.00")
+    db.commit()
+    before = _snapshot(db)
+    
+    report = LoanCollectionEngine(db).run(BUSINESS_DATE, dry_run=True)
+    
+    assert _snapshot(db) == before
+    assert report["installments_materialized"] == 2
+    assert report["installments_scanned"] == 3
+    assert report["installments_paid"] == 3
+    installment = installment_amount(Decimal("1200.00"), Decimal("12.00"), 12)
+    assert report["amount_collected"] == float(installment * 3)
+
+
+def test_dry_run_does_not_spend_the_same_balance_in_two_chunks(db):
+    installment = installment_amount(Decimal("1200.00"), Decimal("12.00"), 12)
+    for name in ("a", "b", "c"):
+        loan = _loan(db, f"loan-{name}", "user-a", next_installment=2)
+        _payment(db, loan, 1)
+    # Saldo para uma parcela e meia: a segunda é parcial e a terceira fica sem saldo
+    _wallet(db, "user-a", str(installment * Decimal("1.5")))
+    db.commit()
+    
+    report = LoanCollectionEngine(db, chunk_size=1).run(due_date(DISBURSED, 1), dry_run=True)
+    
+    assert report["chunks"] == 3
+    assert (report["installments_paid"], report["installments_partial"], report["installments_unfunded"]) == (1, 1, 1)
+    assert report["amount_collected"] == float(installment * Decimal("1.5"))
@@ -0,0 +1,133 @@
+"""Grafo de transferências: union-find, busca de ciclos e ingestão com commits fora de ordem."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.models import OwnerType, Transaction, TransactionStatus, TransactionType
+from app.modules.graph import ingest
+from app.modules.graph.graph import TransferEdge, TransferGraph
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def _edge(number: int, sender: str, receiver: str, minutes: float = 0, amount: float = 100) -> TransferEdge:
+    return TransferEdge(f"t{number:04d}", sender, receiver, amount, START + timedelta(minutes=minutes))
+
+
+def _graph(**kwargs) -> TransferGraph:
+    options = {"window_seconds": 3600, "max_cycle_length": 4, "dedupe_seconds": 600}
+    options.update(kwargs)
+    return TransferGraph(**options)
+
+
+def test_components_union_parties_and_count_degrees():
+    graph = _graph()
+    graph.add_many([_edge(1, "a", "b"), _edge(2, "c", "d", 1), _edge(3, "b", "c", 2), _edge(4, "x", "y", 3)])
+    
+    component = graph.component("a")
+    assert component["size"] == 4
+    assert {member["party_id"] for member in component["members"]} == {"a", "b", "c", "d"}
+    assert graph.component("x")["size"] == 2
+    assert graph.component("missing") is None
+    
+    b = graph.component("b")["party"]
+    assert (b["in_degree"], b["out_degree"], b["received"], b["sent"]) == (1, 1, 100, 100)
+
+
+def test_component_member_listing_respects_limit():
+    graph = _graph()
+    graph.add_many([_edge(i, "hub", f"p{i}", i) for i in range(10)])
+    
+    component = graph.component("hub", limit=3)
+    assert component["size"] == 11
+    assert len(component["members"]) == 3
+
+
+def test_cycle_is_detected_when_money_returns_to_origin():
+    graph = _graph()
+    assert graph.add_many([_edge(1, "a", "b", 0), _edge(2, "b", "c", 1)]) == 0
+    
+    assert graph.add_many([_edge(3, "c", "a", 2, amount=90)]) == 1
+    cycle = graph.cycles()[0]
+    assert sorted(cycle["parties"]) == ["a", "b", "c"]
+    assert cycle["min_amount"] == 90
+    assert graph.cycles(party_id="a") and not graph.cycles(party_id="z")
+
+
+def test_cycle_requires_non_decreasing_timestamps():
+    graph = _graph()
+    # b -> c aconteceu antes de a -> b: o dinheiro de a não pode ter seguido por ele
+    graph.add_many([_edge(1, "b", "c", 0), _edge(2, "a", "b", 5)])
+    
+    assert graph.add_many([_edge(3, "c", "a", 10)]) == 0
+
+
+def test_cycle_outside_window_or_too_long_is_ignored():
+    graph = _graph(window_seconds=600)
+    graph.add_many([_edge(1, "a", "b", 0), _edge(2, "b", "a", 20)])
+    assert graph.cycles() == []
+    
+    graph = _graph(max_cycle_length=3)
+    assert graph.add_many([_edge(i, f"p{i}", f"p{i + 1}", i) for i in range(3)] + [_edge(9, "p3", "p0", 5)]) == 0
+
+
+def test_repeated_cycle_counts_occurrences():
+    graph = _graph()
+    graph.add_many([_edge(1, "a", "b", 0), _edge(2, "b", "a", 1), _edge(3, "a", "b", 2), _edge(4, "b", "a", 3)])
+    
+    cycles = graph.cycles()
+    assert len(cycles) == 1
+    assert cycles[0]["occurrences"] >= 2
+
+
+def test_duplicate_transfers_are_ignored_and_cursor_only_advances():
+    graph = _graph()
+    graph.add_many([_edge(1, "a", "b", 0), _edge(2, "b", "c", 5)])
+    
+    graph.add_many([_edge(1, "a", "b", 0), _edge(3, "c", "d", 1)])
+    
+    assert graph.edges_total == 3
+    assert graph.cursor == (START + timedelta(minutes=5), "t0002")
+    assert graph.is_known("t0003")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://")
+    Transaction.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setattr(ingest, "transfer_graph", _graph(window_seconds=7 * 24 * 3600))
+    yield session
+    session.close()
+
+
+def _insert(db, transaction_id: str, sender: str, receiver: str, created_at: datetime) -> None:
+    db.add(Transaction(
+        transaction_id=transaction_id,
+        sender_id=sender,
+        sender_type=OwnerType.USER,
+        receiver_id=receiver,
+        receiver_type=OwnerType.USER,
+        amount=100,
+        type=TransactionType.PIX_SEND,
+        status=TransactionStatus.COMPLETED,
+        created_at=created_at
+    ))
+    db.commit()
+
+
+def test_ingest_picks_up_transfers_committed_behind_the_cursor(db):
+    now = datetime.now() - timedelta(minutes=1)
+    _insert(db, "early", "a", "b", now - timedelta(seconds=30))
+    _insert(db, "later", "b", "c", now)
+    assert ingest.ingest_new_transfers(db, 100) == 2
+    
+    # INSERT feito antes de "later", mas só commitado depois que o cursor passou
+    _insert(db, "slow-commit", "c", "a", now - timedelta(seconds=10))
+    ingest.ingest_new_transfers(db, 100)
+    ingest.ingest_new_transfers(db, 100)
+    
+    assert ingest.transfer_graph.edges_total == 3
+    assert ingest.transfer_graph.cursor == (now, "later")
@@ -0,0 +1,199 @@
+"""
+Transições de estado da Idempotency-Key (IN_PROGRESS → COMMITTED → COMPLETED/FAILED,
+liberação e assunção de lease) sobre SQLite em memória.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+
+import app.core.idempotency as idempotency
+from app.core.config import settings
+from app.models.models import IdempotencyKey, IdempotencyStatus
+
+PAYLOAD = {"amount": 10}
+
+
+class _InsertIgnore:
+    """INSERT IGNORE do MySQL expresso como INSERT OR IGNORE do SQLite."""
+    
+    def __init__(self, table):
+        self.table = table
+        self.values_kwargs = {}
+    
+    def values(self, **kwargs):
+        self.values_kwargs = kwargs
+        return self
+    
+    def prefix_with(self, _prefix):
+        return sqlite_insert(self.table).values(**self.values_kwargs).prefix_with("OR IGNORE")
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    monkeypatch.setattr(idempotency, "mysql_insert", _InsertIgnore)
+    monkeypatch.setattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 0.2)
+    idempotency._cache.clear()
+    engine = create_engine("sqlite://")
+    IdempotencyKey.__table__.create(engine)
+    factory = sessionmaker(bind=engine)
+    yield factory
+    idempotency._cache.clear()
+
+
+def _key_hash(key: str) -> str:
+    return idempotency._sha256(f"test:{key}")
+
+
+def _row(db, key: str) -> IdempotencyKey:
+    db.expire_all()
+    return db.get(IdempotencyKey, _key_hash(key))
+
+
+def _call(db, key: str, handler, payload=PAYLOAD):
+    return idempotency.run_idempotent(db, key, "test", payload, handler)
+
+
+class Handler:
+    """Handler que "efetiva" um commit na sessão e pode falhar antes ou depois dele."""
+    
+    def __init__(self, db, fail_before=None, fail_after=None):
+        self.db = db
+        self.fail_before = fail_before
+        self.fail_after = fail_after
+        self.calls = 0
+    
+    def __call__(self):
+        self.calls += 1
+        if self.fail_before:
+            raise self.fail_before
+        self.db.commit()
+        if self.fail_after:
+            raise self.fail_after
+        return {"call": self.calls}
+
+
+def _stale_row(db, key: str, status: IdempotencyStatus) -> None:
+    now = datetime.utcnow()
+    db.add(IdempotencyKey(
+        key_hash=_key_hash(key),
+        scope="test",
+        request_fingerprint=idempotency.request_fingerprint(PAYLOAD),
+        status=status,
+        claim_token="dead-worker",
+        claimed_at=now - timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS + 1),
+        expires_at=now + timedelta(hours=1)
+    ))
+    db.commit()
+
+
+def test_success_is_stored_and_replayed(sessions):
+    db = sessions()
+    handler = Handler(db)
+    
+    assert _call(db, "k", handler) == {"call": 1}
+    assert _row(db, "k").status == IdempotencyStatus.COMPLETED
+    
+    idempotency._cache.clear()
+    assert _call(db, "k", handler) == {"call": 1}
+    assert handler.calls == 1
+
+
+def test_same_key_with_other_body_is_rejected(sessions):
+    db = sessions()
+    _call(db, "k", Handler(db))
+    
+    with pytest.raises(HTTPException) as error:
+        _call(db, "k", Handler(db), payload={"amount": 11})
+    assert error.value.status_code == 422
+
+
+def test_failure_before_commit_releases_key(sessions):
+    db = sessions()
+    
+    with pytest.raises(HTTPException):
+        _call(db, "k", Handler(db, fail_before=HTTPException(status_code=503)))
+    assert _row(db, "k") is None
+    
+    assert _call(db, "k", Handler(db)) == {"call": 1}
+
+
+def test_client_error_is_stored(sessions):
+    db = sessions()
+    handler = Handler(db, fail_before=HTTPException(status_code=400, detail="Saldo insuficiente"))
+    
+    for _ in range(2):
+        with pytest.raises(HTTPException) as error:
+            _call(db, "k", handler)
+        assert error.value.status_code == 400
+    assert handler.calls == 1
+
+
+def test_failure_after_commit_marks_key_failed(sessions):
+    db = sessions()
+    
+    with pytest.raises(RuntimeError):
+        _call(db, "k", Handler(db, fail_after=RuntimeError("boom")))
+    assert _row(db, "k").status == IdempotencyStatus.FAILED
+    
+    retry = Handler(db)
+    with pytest.raises(HTTPException) as error:
+        _call(db, "k", retry)
+    assert error.value.status_code == 409
+    assert retry.calls == 0
+
+
+def test_in_progress_key_makes_retry_wait_then_409(sessions):
+    db, other = sessions(), sessions()
+    _stale_row(other, "k", IdempotencyStatus.IN_PROGRESS)
+    other.query(IdempotencyKey).update({IdempotencyKey.claimed_at: datetime.utcnow()})
+    other.commit()
+    
+    retry = Handler(db)
+    with pytest.raises(HTTPException) as error:
+        _call(db, "k", retry)
+    assert error.value.status_code == 409
+    assert retry.calls == 0
+
+
+def test_expired_in_progress_lease_is_taken_over(sessions):
+    db = sessions()
+    _stale_row(db, "k", IdempotencyStatus.IN_PROGRESS)
+    
+    assert _call(db, "k", Handler(db)) == {"call": 1}
+    row = _row(db, "k")
+    assert row.status == IdempotencyStatus.COMPLETED
+    assert row.claim_token != "dead-worker"
+
+
+def test_expired_committed_lease_becomes_failed(sessions):
+    db = sessions()
+    _stale_row(db, "k", IdempotencyStatus.COMMITTED)
+    
+    retry = Handler(db)
+    with pytest.raises(HTTPException) as error:
+        _call(db, "k", retry)
+    assert error.value.status_code == 409
+    assert retry.calls == 0
+    assert _row(db, "k").status == IdempotencyStatus.FAILED
+
+
+def test_owner_that_lost_its_lease_cannot_commit(sessions):
+    db, other = sessions(), sessions()
+    
+    def handler():
+        # Outra requisição assume a chave enquanto este handler ainda executa
+        other.query(IdempotencyKey).update({IdempotencyKey.claim_token: "new-owner"})
+        other.commit()
+        db.commit()
+        return {"ok": True}
+    
+    with pytest.raises(HTTPException) as error:
+        _call(db, "k", handler)
+    assert error.value.status_code == 409
+    row = _row(db, "k")
+    assert row.status == IdempotencyStatus.IN_PROGRESS
+    assert row.claim_token == "new-owner"
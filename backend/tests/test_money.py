@@ -0,0 +1,66 @@
+"""Invariantes do rateio em centavos (app.core.money)."""
+from decimal import Decimal
+import random
+
+import numpy as np
+import pytest
+
+from app.core.money import allocate, allocate_many, from_cents, to_cents
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_allocate_parts_sum_exactly_to_total(seed):
+    rng = random.Random(seed)
+    amount = Decimal(rng.randint(1, 10_000_000)) / 100
+    weights = [rng.choice([rng.random(), Decimal(rng.randint(1, 999)) / 7, rng.randint(1, 50)]) for _ in range(rng.randint(1, 30))]
+    
+    parts = allocate(amount, weights)
+    
+    assert len(parts) == len(weights)
+    assert sum(parts, Decimal(0)) == amount
+    assert all(part == part.quantize(Decimal("0.01")) and part >= 0 for part in parts)
+
+
+def test_allocate_distributes_leftover_cents_by_largest_remainder():
+    assert allocate("0.10", [1, 1, 1]) == [Decimal("0.04"), Decimal("0.03"), Decimal("0.03")]
+    assert allocate("100.00", [1, 2]) == [Decimal("33.33"), Decimal("66.67")]
+
+
+def test_allocate_parts_never_deviate_more_than_one_cent_from_exact_share():
+    amount, weights = Decimal("1234.57"), [3, 5, 7, 11]
+    for part, weight in zip(allocate(amount, weights), weights):
+        exact = amount * weight / sum(weights)
+        assert abs(part - exact) < Decimal("0.01")
+
+
+@pytest.mark.parametrize("weights", [[], [0, 0], [1, -1]])
+def test_allocate_rejects_non_positive_weights(weights):
+    with pytest.raises(ValueError):
+        allocate("10.00", weights)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_allocate_many_sums_exactly_per_group(seed):
+    rng = np.random.default_rng(seed)
+    n_groups = int(rng.integers(1, 40))
+    sizes = rng.integers(1, 12, n_groups)
+    groups = np.repeat(np.arange(n_groups), sizes)
+    weights = rng.integers(1, 1_000_000, len(groups))
+    totals = rng.integers(0, 10**9, n_groups)
+    
+    parts = allocate_many(totals, groups, weights)
+    
+    assert (parts >= 0).all()
+    np.testing.assert_array_equal(np.bincount(groups, weights=parts, minlength=n_groups).astype(np.int64), totals)
+
+
+def test_allocate_many_matches_allocate():
+    weights = [2500, 2500, 5000, 1]
+    totals_cents = [to_cents("999.99"), to_cents("0.03")]
+    groups = np.array([0, 0, 0, 0, 1, 1, 1, 1])
+    
+    parts = allocate_many(np.array(totals_cents), groups, np.array(weights * 2))
+    
+    for group, total in enumerate(totals_cents):
+        expected = allocate(from_cents(total), weights)
+        assert [from_cents(cents) for cents in parts[groups == group]] == expected
@@ -0,0 +1,50 @@
+"""Normalização de chaves PIX: inferência de tipo, forma canônica e rejeições."""
+import pytest
+
+from app.models.models import PixKeyType
+from app.modules.pix.keys import InvalidPixKeyError, normalize_key
+
+EVP = "123e4567-e89b-12d3-a456-426614174000"
+
+
+@pytest.mark.parametrize("key, expected", [
+    ("  Joao.Silva@Email.COM ", ("joao.silva@email.com", PixKeyType.EMAIL)),
+    (EVP.upper(), (EVP, PixKeyType.EVP)),
+    ("+55 (11) 98765-4321", ("+5511987654321", PixKeyType.PHONE)),
+    ("123.456.789-01", ("12345678901", PixKeyType.CPF)),
+    ("12.345.678/0001-90", ("12345678000190", PixKeyType.CNPJ)),
+])
+def test_type_is_inferred_and_value_canonicalized(key, expected):
+    assert normalize_key(key) == expected
+
+
+@pytest.mark.parametrize("key, key_type, expected", [
+    ("11987654321", "phone", ("+5511987654321", PixKeyType.PHONE)),
+    ("(11) 8765-4321", "PHONE", ("+551187654321", PixKeyType.PHONE)),
+    ("12345678901", "cpf", ("12345678901", PixKeyType.CPF)),
+    (EVP, "random", (EVP, PixKeyType.EVP)),
+])
+def test_explicit_type_overrides_inference(key, key_type, expected):
+    assert normalize_key(key, key_type) == expected
+
+
+def test_equivalent_spellings_normalize_to_the_same_key():
+    spellings = ["+55 11 98765-4321", "+5511987654321", "+55-11-98765-4321"]
+    assert {normalize_key(key) for key in spellings} == {("+5511987654321", PixKeyType.PHONE)}
+    assert normalize_key("11987654321", "phone") == normalize_key("+5511987654321")
+
+
+@pytest.mark.parametrize("key, key_type", [
+    ("", None),
+    ("   ", None),
+    ("12345", None),
+    ("a@b", None),
+    ("not-an-evp", "evp"),
+    ("+55 11", None),
+    ("1234567890", "cpf"),
+    ("12345678901", "cnpj"),
+    ("12345678901", "boleto"),
+])
+def test_invalid_keys_are_rejected(key, key_type):
+    with pytest.raises(InvalidPixKeyError):
+        normalize_key(key, key_type)
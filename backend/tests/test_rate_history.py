@@ -0,0 +1,81 @@
+"""Histórico de cotações: consulta point-in-time escalar e vetorizada."""
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.models.models import Currency
+from app.modules.currency import history
+from app.modules.currency.history import RateHistory, RateSeries, to_epoch
+from app.modules.currency.rates import RateTable, StaticRateProvider
+
+
+def _series(*points) -> RateSeries:
+    series = RateSeries()
+    for ts, rate in points:
+        series.append(ts, rate)
+    return series
+
+
+def test_append_ignores_out_of_order_and_unchanged_points():
+    series = RateSeries()
+    assert series.append(100, 5.0)
+    assert not series.append(50, 4.0)
+    assert not series.append(200, 5.0)
+    assert series.append(200, 5.5)
+    assert len(series) == 2
+
+
+def test_at_returns_rate_in_force_at_each_instant():
+    series = _series((100, 5.0), (200, 5.5), (300, 6.0))
+    
+    assert series.at(100) == 5.0
+    assert series.at(199.9) == 5.0
+    assert series.at(200) == 5.5
+    assert series.at(10_000) == 6.0
+    # Antes do primeiro ponto vale o primeiro
+    assert series.at(0) == 5.0
+    assert RateSeries().at(100) is None
+
+
+def test_lookup_many_matches_scalar_lookup():
+    series = _series(*[(100 * i, 5.0 + i / 10) for i in range(1, 50)])
+    ts = np.random.default_rng(3).uniform(0, 6000, 500)
+    
+    np.testing.assert_array_equal(series.lookup_many(ts), [series.at(t) for t in ts])
+    # As views do buffer são liberadas: a série continua aceitando pontos
+    assert series.append(10_000, 1.0)
+
+
+def test_naive_datetimes_are_utc():
+    assert to_epoch(datetime(2026, 1, 1)) == to_epoch(datetime(2026, 1, 1, tzinfo=timezone.utc))
+    assert to_epoch(1234.5) == 1234.5
+
+
+@pytest.fixture
+def rate_history(monkeypatch):
+    table = RateTable(StaticRateProvider({"USDT": 5.0, "USDC": 5.0, "EUR": 6.0}), ttl_seconds=3600)
+    monkeypatch.setattr(history, "rate_table", table)
+    rate_history = RateHistory()
+    rate_history._loaded = True
+    rate_history._series[Currency.USDT] = _series((100, 4.0), (200, 5.0))
+    rate_history._series[Currency.EUR] = _series((150, 6.0))
+    return rate_history
+
+
+def test_rate_at_triangulates_historical_rates(rate_history):
+    assert rate_history.rate_at("USDT", "BRL", 150) == 4.0
+    assert rate_history.rate_at("USDT", "EUR", 250) == pytest.approx(5 / 6)
+    # Sem histórico para USDC: usa a cotação atual
+    assert rate_history.rate_at("USDC", "USDT", 120) == pytest.approx(5 / 4)
+
+
+def test_convert_at_many_uses_each_rows_timestamp(rate_history):
+    converted = rate_history.convert_at_many(
+        [10, 10, 10, 10], ["USDT", "USDT", "BRL", "USDC"], "BRL", [120, 220, 120, 120]
+    )
+    np.testing.assert_array_equal(converted, [40.0, 50.0, 10.0, 50.0])
+    
+    np.testing.assert_array_equal(rate_history.convert_at_many([12], "EUR", "USDT", [120]), [18.0])
+    with pytest.raises(ValueError):
+        rate_history.convert_at_many([10, 10], "USDT", "BRL", [120])
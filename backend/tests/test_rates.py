@@ -0,0 +1,102 @@
+"""Tabela de câmbio: triangulação via BRL, conversão vetorizada e refresh com fallback."""
+import numpy as np
+import pytest
+
+from app.models.models import Currency
+from app.modules.currency.rates import RateProvider, RateTable, StaticRateProvider
+
+RATES = {"BRL": 1.0, "USDT": 5.0, "USDC": 4.0, "EUR": 6.0}
+
+
+class FlakyProvider(RateProvider):
+    """Devolve as cotações da fila; um item Exception é lançado."""
+    
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+    
+    def fetch(self):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return dict(result)
+
+
+def _table(rates=RATES) -> RateTable:
+    return RateTable(StaticRateProvider(rates), ttl_seconds=3600)
+
+
+def test_cross_rates_are_triangulated_through_brl():
+    table = _table()
+    
+    assert table.rate("USDT", "BRL") == 5.0
+    assert table.rate(Currency.BRL, Currency.EUR) == pytest.approx(1 / 6)
+    assert table.rate("usdt", "eur") == pytest.approx(5 / 6)
+    assert table.rate("EUR", "USDC") == pytest.approx(6 / 4)
+    for a in RATES:
+        for b in RATES:
+            assert table.rate(a, b) * table.rate(b, a) == pytest.approx(1.0)
+        assert table.rate(a, a) == 1.0
+
+
+def test_unsupported_currency_is_rejected():
+    with pytest.raises(ValueError):
+        _table().rate("JPY", "BRL")
+
+
+def test_convert_many_with_one_or_many_source_currencies():
+    table = _table()
+    
+    np.testing.assert_array_equal(table.convert_many([10, 3.33], "USDT", "EUR"), [8.33, 2.78])
+    np.testing.assert_array_equal(
+        table.convert_many([10, 10, 10], ["BRL", "USDT", Currency.EUR], "BRL"), [10.0, 50.0, 60.0]
+    )
+    with pytest.raises(ValueError):
+        table.convert_many([10, 10], ["BRL"], "BRL")
+
+
+def test_snapshot_is_relative_to_the_base():
+    snapshot = _table().snapshot("EUR")
+    
+    assert snapshot["EUR"] == 1.0
+    assert snapshot["USDT"] == pytest.approx(5 / 6)
+    assert snapshot["BRL"] == pytest.approx(1 / 6)
+
+
+def test_unknown_feed_currencies_are_ignored_and_brl_is_pinned():
+    table = _table({"USDT": 5.5, "JPY": 0.03, "BRL": 2.0})
+    
+    assert table.rate("USDT", "BRL") == 5.5
+    assert table.rate("BRL", "BRL") == 1.0
+
+
+def test_failed_refresh_keeps_last_valid_table():
+    provider = FlakyProvider(RATES, RuntimeError("feed fora do ar"), {"USDT": -1.0})
+    table = RateTable(provider, ttl_seconds=3600)
+    assert table.rate("USDT", "BRL") == 5.0
+    
+    table.invalidate()
+    assert table.rate("USDT", "BRL") == 5.0
+    table.invalidate()
+    assert table.rate("USDT", "BRL") == 5.0
+    assert provider.calls == 3
+
+
+def test_first_load_failure_is_raised():
+    table = RateTable(FlakyProvider(RuntimeError("feed fora do ar")), ttl_seconds=3600)
+    with pytest.raises(RuntimeError):
+        table.rate("USDT", "BRL")
+
+
+def test_listeners_receive_every_refresh():
+    table = _table()
+    received = []
+    table.add_listener(received.append)
+    
+    table.vector()
+    table.invalidate()
+    table.vector()
+    
+    assert len(received) == 2
+    assert received[0] == {c.value: RATES[c.value] for c in Currency}
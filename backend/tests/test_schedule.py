@@ -0,0 +1,75 @@
+"""Formas fechadas do cronograma contra o cronograma percorrido parcela a parcela."""
+from decimal import Decimal
+
+import pytest
+
+from app.models.models import AmortizationSystem
+from app.modules.credit.schedule import (
+    installment_amount, installments_total, price_installment, remaining_principal
+)
+
+CASES = [
+    (10000, 24.0, 12),
+    (5000, 0.0, 10),
+    (150000, 18.5, 48),
+    (999.99, 36.0, 7),
+]
+SYSTEMS = [AmortizationSystem.PRICE, AmortizationSystem.SAC]
+
+
+def _walk_balance(principal: float, annual_rate: float, months: int, paid: int, system) -> float:
+    """Saldo devedor amortizando parcela a parcela (referência para a forma fechada)."""
+    rate = annual_rate / 1200
+    balance = principal
+    for _ in range(paid):
+        if system == AmortizationSystem.SAC:
+            balance -= principal / months
+        else:
+            balance -= price_installment(principal, annual_rate, months) - balance * rate
+    return max(balance, 0.0)
+
+
+@pytest.mark.parametrize("system", SYSTEMS)
+@pytest.mark.parametrize("principal, annual_rate, months", CASES)
+def test_remaining_principal_matches_amortization(principal, annual_rate, months, system):
+    for paid in range(months + 1):
+        expected = _walk_balance(principal, annual_rate, months, paid, system)
+        actual = remaining_principal(principal, annual_rate, months, paid, system)
+        assert abs(float(actual) - expected) <= 0.01
+
+
+@pytest.mark.parametrize("system", SYSTEMS)
+@pytest.mark.parametrize("principal, annual_rate, months", CASES)
+def test_remaining_principal_bounds(principal, annual_rate, months, system):
+    assert remaining_principal(principal, annual_rate, months, 0, system) == Decimal(str(principal)).quantize(Decimal("0.01"))
+    assert remaining_principal(principal, annual_rate, months, months, system) == Decimal("0.00")
+    assert remaining_principal(principal, annual_rate, months, months + 3, system) == Decimal("0.00")
+    balances = [remaining_principal(principal, annual_rate, months, paid, system) for paid in range(months + 1)]
+    assert balances == sorted(balances, reverse=True)
+
+
+@pytest.mark.parametrize("system", SYSTEMS)
+@pytest.mark.parametrize("principal, annual_rate, months", CASES)
+def test_installments_total_matches_sum_of_installments(principal, annual_rate, months, system):
+    for first, last in [(1, months), (1, 1), (2, months - 1), (months, months)]:
+        walked = sum(
+            (installment_amount(principal, annual_rate, months, number, system) for number in range(first, last + 1)),
+            Decimal(0)
+        )
+        total = installments_total(principal, annual_rate, months, first, last, system)
+        # Forma fechada arredonda a soma; o cronograma arredonda cada parcela
+        assert abs(total - walked) <= Decimal("0.01") * (last - first + 1)
+        if system == AmortizationSystem.PRICE:
+            assert total == walked
+
+
+def test_installments_total_empty_range():
+    assert installments_total(1000, 12, 12, 5, 4) == Decimal("0.00")
+
+
+@pytest.mark.parametrize("principal, annual_rate, months", CASES)
+def test_sac_installments_repay_principal_plus_interest(principal, annual_rate, months):
+    total = installments_total(principal, annual_rate, months, 1, months, AmortizationSystem.SAC)
+    # Juros do SAC: i·P·(n+1)/2
+    interest = annual_rate / 1200 * principal * (months + 1) / 2
+    assert abs(float(total) - (principal + interest)) <= 0.01
@@ -0,0 +1,73 @@
+"""Simulação em grade contra o cálculo escalar do cronograma, célula a célula."""
+import numpy as np
+import pytest
+
+from app.modules.credit.schedule import price_installment
+from app.modules.credit.simulation import axis_values, simulate_grid
+
+AMOUNTS = np.array([1000.0, 25000.0])
+TERMS = np.array([1.0, 12.0, 48.0])
+RATES = np.array([0.0, 18.0, 36.0])
+
+
+def _present_value(payment: float, rate: float, months: int) -> float:
+    return sum(payment / (1 + rate) ** k for k in range(1, months + 1))
+
+
+def test_grid_matches_scalar_price_installment():
+    grid = simulate_grid(AMOUNTS, TERMS, RATES)
+    
+    assert grid["shape"] == [2, 3, 3] and grid["count"] == 18
+    for i, amount in enumerate(AMOUNTS):
+        for j, months in enumerate(TERMS):
+            for k, rate in enumerate(RATES):
+                payment = price_installment(amount, rate, int(months))
+                assert grid["monthly_payment"][i][j][k] == round(payment, 2)
+                assert grid["total_interest"][i][j][k] == pytest.approx(payment * months - amount, abs=0.01)
+
+
+def test_cet_without_fee_is_the_contract_rate():
+    grid = simulate_grid(AMOUNTS, TERMS, RATES)
+    
+    for k, rate in enumerate(RATES):
+        assert grid["cet_monthly_percent"][0][1][k] == pytest.approx(rate / 12, abs=1e-4)
+
+
+def test_cet_with_fee_discounts_installments_to_the_net_amount():
+    grid = simulate_grid(np.array([10000.0]), np.array([24.0]), np.array([0.0, 24.0]), upfront_fee_percent=3)
+    
+    for k, rate in enumerate([0.0, 24.0]):
+        payment = price_installment(10000.0, rate, 24)
+        cet = grid["cet_monthly_percent"][0][0][k] / 100
+        assert cet > rate / 1200
+        assert _present_value(payment, cet, 24) == pytest.approx(9700.0, rel=1e-5)
+
+
+@pytest.mark.parametrize("amounts, terms, rates, fee", [
+    ([0.0], [12.0], [10.0], 0),
+    ([1000.0], [0.0], [10.0], 0),
+    ([1000.0], [1.5], [10.0], 0),
+    ([1000.0], [12.0], [-1.0], 0),
+    ([1000.0], [12.0], [10.0], 100),
+])
+def test_grid_rejects_invalid_axes(amounts, terms, rates, fee):
+    with pytest.raises(ValueError):
+        simulate_grid(np.array(amounts), np.array(terms), np.array(rates), upfront_fee_percent=fee)
+
+
+def test_axis_from_range_includes_stop():
+    np.testing.assert_allclose(axis_values("terms", {"start": 6, "stop": 24, "step": 6}, 10), [6, 12, 18, 24])
+    np.testing.assert_allclose(axis_values("rates", [12, 18.5], 10), [12, 18.5])
+
+
+@pytest.mark.parametrize("spec", [
+    {"start": 1, "stop": 1e9, "step": 1e-9},
+    [],
+    ["a"],
+    [float("nan")],
+    {"start": 10, "stop": 1},
+    "12",
+])
+def test_axis_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        axis_values("amounts", spec, 1000)
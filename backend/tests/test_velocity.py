@@ -0,0 +1,100 @@
+"""Contadores de velocidade em anéis (backend local) e configuração do backend compartilhado."""
+import pytest
+
+from app.core import velocity
+from app.core.config import settings
+from app.core.velocity import LocalVelocityBackend, SharedVelocityBackend, Window
+
+WINDOWS = (Window("minute", 60, 12), Window("hour", 3600, 12))
+T0 = 1_700_000_000.0
+
+
+def _backend(**kwargs) -> LocalVelocityBackend:
+    return LocalVelocityBackend(windows=WINDOWS, **kwargs)
+
+
+def test_hits_are_summed_per_window():
+    backend = _backend()
+    backend.hit("k", 1000, now=T0)
+    _, totals = backend.hit("k", 500, now=T0 + 30, count=2)
+    
+    assert totals == {"minute": (3, 1500), "hour": (3, 1500)}
+    assert backend.totals("k", now=T0 + 30) == totals
+    assert backend.totals("other", now=T0) == {"minute": (0, 0), "hour": (0, 0)}
+
+
+def test_old_buckets_leave_the_window():
+    backend = _backend()
+    backend.hit("k", 1000, now=T0)
+    backend.hit("k", 200, now=T0 + 120)
+    
+    assert backend.totals("k", now=T0 + 120) == {"minute": (1, 200), "hour": (2, 1200)}
+    assert backend.totals("k", now=T0 + 2 * 3600) == {"minute": (0, 0), "hour": (0, 0)}
+
+
+def test_reused_bucket_from_another_lap_is_reset():
+    backend = _backend()
+    backend.hit("k", 1000, now=T0)
+    # Uma volta completa do anel do minuto depois: mesmo índice, outro instante
+    _, totals = backend.hit("k", 300, now=T0 + 60)
+    
+    assert totals["minute"] == (1, 300)
+    assert totals["hour"] == (2, 1300)
+
+
+def test_limit_violation_records_nothing():
+    backend = _backend()
+    limits = {"minute": (2, None), "hour": (None, 1500)}
+    assert backend.hit("k", 1000, limits, now=T0)[0] is None
+    
+    violated, totals = backend.hit("k", 600, limits, now=T0 + 1)
+    assert violated == "hour"
+    assert totals["hour"] == (1, 1000)
+    
+    assert backend.hit("k", 100, limits, now=T0 + 2)[0] is None
+    assert backend.hit("k", 100, limits, now=T0 + 3)[0] == "minute"
+    assert backend.totals("k", now=T0 + 3)["minute"] == (2, 1100)
+
+
+def test_undo_removes_the_hit_while_its_bucket_is_live():
+    backend = _backend()
+    backend.hit("k", 1000, now=T0)
+    backend.hit("k", 400, now=T0 + 10)
+    
+    backend.undo("k", 1000, at=T0)
+    assert backend.totals("k", now=T0 + 10) == {"minute": (1, 400), "hour": (1, 400)}
+    
+    backend.undo("missing", 1000, at=T0)
+    assert "missing" not in backend._keys
+
+
+def test_least_recently_used_key_is_evicted():
+    backend = _backend(max_keys=2)
+    backend.hit("a", 100, now=T0)
+    backend.hit("b", 100, now=T0)
+    backend.hit("a", 100, now=T0 + 1)
+    backend.hit("c", 100, now=T0 + 2)
+    
+    assert backend.stats()["evictions"] == 1
+    assert backend.totals("b", now=T0 + 2)["minute"] == (0, 0)
+    assert backend.totals("a", now=T0 + 2)["minute"] == (2, 200)
+
+
+def test_shared_backend_requires_an_explicit_authkey(monkeypatch):
+    monkeypatch.setattr(settings, "VELOCITY_BACKEND", "shared")
+    monkeypatch.setattr(settings, "VELOCITY_SHARED_AUTHKEY", "")
+    with pytest.raises(RuntimeError):
+        velocity.build_velocity_backend()
+    with pytest.raises(RuntimeError):
+        velocity.serve_velocity_backend("127.0.0.1:0", b"", 10)
+    
+    monkeypatch.setattr(settings, "VELOCITY_SHARED_AUTHKEY", "secret")
+    backend = velocity.build_velocity_backend()
+    assert isinstance(backend, SharedVelocityBackend)
+    assert backend.authkey == b"secret"
+
+
+def test_local_backend_does_not_need_an_authkey(monkeypatch):
+    monkeypatch.setattr(settings, "VELOCITY_BACKEND", "local")
+    monkeypatch.setattr(settings, "VELOCITY_SHARED_AUTHKEY", "")
+    assert isinstance(velocity.build_velocity_backend(), LocalVelocityBackend)